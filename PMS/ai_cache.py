@@ -0,0 +1,84 @@
+"""
+Persistent cache of LLM extraction results.
+
+Entries are keyed by (prompt template + version, model, SHA-256 of the input text), so asking
+for the same TDS text or chemical name again returns the stored answer instead of calling
+Gemini/Groq. Each entry keeps the raw response text and its parsed JSON. Bump a template's
+version in PROMPT_VERSIONS when its prompt or generation settings change; old entries are
+then simply never read again.
+
+Entries are JSON files under .cache/ai_extractions (override with AI_CACHE_DIR). Failed or
+empty responses are not cached, so they are retried on the next call.
+"""
+
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+
+CACHE_DIR = Path(os.getenv(
+    "AI_CACHE_DIR", Path(__file__).resolve().parent.parent / ".cache" / "ai_extractions"
+))
+
+PROMPT_VERSIONS = {
+    "tds_extract": 1,
+    "tds_extract_retry": 1,
+    "tds_extract_groq": 1,
+    "chemical_groq": 1,
+    "chemical_gemini": 1,
+    "chemical_gemini_retry": 1,
+}
+
+
+def cache_key(template: str, model: str, input_text: str) -> str:
+    digest = hashlib.sha256((input_text or "").encode("utf-8")).hexdigest()
+    return hashlib.sha256(f"{template}@v{PROMPT_VERSIONS[template]}\n{model}\n{digest}".encode()).hexdigest()
+
+
+def _entry_path(key: str) -> Path:
+    return CACHE_DIR / key[:2] / f"{key}.json"
+
+
+def get(template: str, model: str, input_text: str) -> dict | None:
+    """The cached entry ({"raw", "parsed", ...}) or None."""
+    try:
+        with open(_entry_path(cache_key(template, model, input_text)), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def put(template: str, model: str, input_text: str, raw: str, parsed):
+    path = _entry_path(cache_key(template, model, input_text))
+    entry = {
+        "template": template,
+        "version": PROMPT_VERSIONS[template],
+        "model": model,
+        "created_at": time.time(),
+        "raw": raw,
+        "parsed": parsed,
+    }
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(entry, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, path)
+    except (OSError, TypeError, ValueError):
+        pass  # unserializable results or a read-only disk just aren't cached
+
+
+def cached_generate(template: str, model: str, input_text: str, generate, parse):
+    """
+    (raw, parsed) for a prompt: from the cache, or by calling ``generate()`` -> raw text and
+    ``parse(raw)``. Exceptions from ``generate`` propagate and nothing is cached.
+    """
+    entry = get(template, model, input_text)
+    if entry is not None:
+        return entry.get("raw") or "", entry.get("parsed")
+    raw = generate()
+    if not raw:
+        return raw, None
+    parsed = parse(raw)
+    put(template, model, input_text, raw, parsed)
+    return raw, parsed
@@ -0,0 +1,259 @@
+"""
+Content-addressed, deduplicating storage for PMS product documents (TDS and supporting files).
+
+Files are stored in the product-documents bucket under the SHA-256 of their content
+(``objects/ab/abcdef….pdf``). Uploading a file that is already stored costs no transfer:
+only a reference is added. References are counted in the storage_objects table
+(supabase/migrations/20240327000000_content_addressed_documents.sql). Releasing the last
+reference deletes the object.
+
+Without the migration the store still deduplicates (by checking whether the object exists),
+but it never deletes content-addressed objects, because another record may use them.
+Objects uploaded before content addressing (``tds_files/<id>/<uuid>.ext`` and
+``supporting_docs/...``) belong to a single record and are deleted directly.
+
+Documents can be given as bytes, a file path (streamed from disk), or an in-memory upload
+such as Streamlit's UploadedFile (hashed and sent straight from its buffer, without a
+getvalue() copy). upload_many sends several documents at once with bounded parallelism and
+retries.
+
+Like pms_data.py, functions take the Supabase client as their first argument.
+"""
+
+import hashlib
+import io
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+
+BUCKET = "product-documents"
+OBJECT_PREFIX = "objects"
+PUBLIC_URL_MARKER = f"/storage/v1/object/public/{BUCKET}/"
+
+CONTENT_TYPES = {
+    "pdf": "application/pdf",
+    "docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    "doc": "application/msword",
+    "png": "image/png",
+    "jpg": "image/jpeg",
+    "jpeg": "image/jpeg",
+}
+
+
+CHUNK_SIZE = 1024 * 1024
+UPLOAD_WORKERS = int(os.getenv("PMS_UPLOAD_WORKERS", "4"))
+UPLOAD_ATTEMPTS = 3
+RETRY_BACKOFF_SECONDS = 1.0
+
+
+class _BufferReader(io.RawIOBase):
+    """Seekable, read-only raw stream over a buffer; closing it leaves the buffer alone."""
+
+    def __init__(self, buffer):
+        self._view = memoryview(buffer).cast("B")
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._pos, io.SEEK_END: len(self._view)}[whence]
+        self._pos = max(0, min(base + offset, len(self._view)))
+        return self._pos
+
+    def readinto(self, b):
+        n = min(len(b), len(self._view) - self._pos)
+        b[:n] = self._view[self._pos:self._pos + n]
+        self._pos += n
+        return n
+
+
+def _buffer(source):
+    """The in-memory bytes of a source (no copy where possible), or None for file paths."""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return source
+    if isinstance(source, (str, os.PathLike)):
+        return None
+    if hasattr(source, "getbuffer"):
+        return source.getbuffer()
+    return source.getvalue()
+
+
+def source_size(source) -> int:
+    buffer = _buffer(source)
+    return os.path.getsize(source) if buffer is None else memoryview(buffer).nbytes
+
+
+def source_sha256(source) -> str:
+    buffer = _buffer(source)
+    if buffer is not None:
+        return hashlib.sha256(buffer).hexdigest()
+    digest = hashlib.sha256()
+    with open(source, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _open_body(source) -> io.BufferedReader:
+    """A fresh stream of the source for one upload attempt, read in chunks by the HTTP client."""
+    buffer = _buffer(source)
+    if buffer is None:
+        return open(source, "rb")
+    return io.BufferedReader(_BufferReader(buffer), buffer_size=CHUNK_SIZE)
+
+
+def file_extension(filename: str) -> str:
+    return (filename or "").split(".")[-1].lower()
+
+
+def content_key(source, ext: str) -> tuple[str, str]:
+    """(object key, sha256 hex) of a document's content."""
+    digest = source_sha256(source)
+    return f"{OBJECT_PREFIX}/{digest[:2]}/{digest}.{ext}", digest
+
+
+def public_url(supabase_url: str, key: str) -> str:
+    return f"https://{supabase_url.split('//')[1]}{PUBLIC_URL_MARKER}{key}"
+
+
+def key_from_public_url(url: str) -> str | None:
+    if PUBLIC_URL_MARKER in (url or ""):
+        return url.split(PUBLIC_URL_MARKER, 1)[1]
+    return None
+
+
+def object_exists(client, key: str) -> bool:
+    folder, name = key.rsplit("/", 1)
+    try:
+        rows = client.storage.from_(BUCKET).list(folder, {"search": name, "limit": 1}) or []
+    except Exception:
+        return False
+    return any(row.get("name") == name for row in rows)
+
+
+def _rpc(client, name: str, params: dict):
+    """Scalar result of a reference-count RPC, or None when it is unavailable."""
+    try:
+        return client.rpc(name, params).execute().data
+    except Exception:
+        return None
+
+
+def store_document(client, source, filename: str, attempts: int = 1) -> tuple[str, bool]:
+    """
+    Store a document (bytes, path or in-memory upload) and take a reference to it.
+    Returns (key, uploaded): ``uploaded`` is False when identical content was already stored
+    and nothing was transferred. A failed upload is retried up to ``attempts`` times.
+    """
+    ext = file_extension(filename)
+    key, digest = content_key(source, ext)
+    content_type = CONTENT_TYPES.get(ext, "application/octet-stream")
+    refs = _rpc(client, "acquire_storage_object", {
+        "p_key": key, "p_sha256": digest, "p_size": source_size(source), "p_content_type": content_type,
+    })
+    # Other references do not prove the object is there: their upload may still be running or
+    # may have failed. Identical content is only skipped once it is actually stored; a
+    # concurrent upload of the same key writes the same bytes (x-upsert).
+    if object_exists(client, key):
+        return key, False
+    try:
+        for attempt in range(1, attempts + 1):
+            try:
+                with _open_body(source) as body:
+                    client.storage.from_(BUCKET).upload(key, body, {"content-type": content_type, "x-upsert": "true"})
+                break
+            except Exception:
+                if attempt == attempts:
+                    raise
+                time.sleep(RETRY_BACKOFF_SECONDS * 2 ** (attempt - 1))
+    except Exception:
+        if refs is not None:
+            _rpc(client, "release_storage_object", {"p_key": key})
+        raise
+    return key, True
+
+
+def release_document(client, key: str) -> bool:
+    """Drop one reference to a stored document; returns True when the object was deleted."""
+    if not key:
+        return False
+    if key.startswith(OBJECT_PREFIX + "/"):
+        remaining = _rpc(client, "release_storage_object", {"p_key": key})
+        if remaining != 0:
+            return False  # still referenced, untracked, or reference counts unavailable
+    client.storage.from_(BUCKET).remove([key])
+    return True
+
+
+@dataclass
+class UploadResult:
+    """Outcome of one document in upload_many."""
+    name: str
+    size: int = 0
+    key: str | None = None
+    uploaded: bool = False  # False for duplicates (no transfer) and failures
+    seconds: float = 0.0
+    error: str = ""
+    done: bool = False
+
+    @property
+    def ok(self) -> bool:
+        return self.done and not self.error
+
+    @property
+    def mb_per_second(self) -> float:
+        if not self.uploaded or self.seconds <= 0:
+            return 0.0
+        return self.size / (1024 * 1024) / self.seconds
+
+    def row(self) -> dict:
+        """Per-file throughput, for display."""
+        return {
+            "File": self.name,
+            "Size (MB)": round(self.size / (1024 * 1024), 2),
+            "Seconds": round(self.seconds, 2),
+            "MB/s": round(self.mb_per_second, 2) if self.uploaded else None,
+            "Status": self.error or ("uploaded" if self.uploaded else "already stored"),
+        }
+
+
+def upload_many(client, files, *, max_workers: int = UPLOAD_WORKERS, attempts: int = UPLOAD_ATTEMPTS,
+                on_progress=None, poll_seconds: float = 0.25) -> list[UploadResult]:
+    """
+    Store several documents concurrently; ``files`` is a list of (filename, source).
+    Returns one UploadResult per file, in order. Failures are reported, not raised, so
+    the caller can offer to retry them. on_progress(results) is called on the calling thread
+    while uploads run and once at the end.
+    """
+    results = [UploadResult(name=name) for name, _ in files]
+
+    def upload(result, source):
+        started = time.perf_counter()
+        try:
+            result.size = source_size(source)
+            result.key, result.uploaded = store_document(client, source, result.name, attempts=attempts)
+        except Exception as e:
+            result.error = str(e)
+        finally:
+            result.seconds = time.perf_counter() - started
+            result.done = True
+
+    if not files:
+        return results
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(files))), thread_name_prefix="pms-upload") as executor:
+        pending = {executor.submit(upload, result, source) for result, (_, source) in zip(results, files)}
+        while pending:
+            _, pending = wait(pending, timeout=poll_seconds, return_when=FIRST_COMPLETED)
+            if on_progress:
+                on_progress(results)
+    if on_progress:
+        on_progress(results)
+    return results
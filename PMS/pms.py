@@ -1,12 +1,10 @@
 import streamlit as st
 from dotenv import load_dotenv
 import os
-from supabase import create_client, Client
+import sys
+from supabase import create_client
 import uuid
 import google.generativeai as genai
-import PyPDF2
-import io
-from docx import Document
 import base64
 from datetime import datetime
 from typing import Any, Dict
@@ -14,6 +12,28 @@ try:
     from groq import Groq  # type: ignore
 except Exception:  # groq sdk may not be installed in some environments
     Groq = None  # type: ignore
+from pms_repository import CachedSupabase, QueryCache
+from pms_data import (
+    ChemicalTypeFacets,
+    PartnerIndex,
+    PriceMatrix,
+    VERSION_PAGE_SIZE,
+    fetch_chemical_type_facets,
+    fetch_chemical_type_versions,
+    fetch_partner_index,
+    fetch_price_matrix,
+    fetch_price_point,
+    fetch_tds_names,
+    fetch_tds_product_types,
+    query_tds,
+    record_chemical_type_version,
+    tds_display_name,
+)
+from text_extraction import extract_document_text
+import tds_ingest
+import ai_cache
+import table_export
+import document_store
 
 # Page config
 def main():
@@ -473,6 +493,10 @@ h2 {
 
 # Env and client
 load_dotenv()
+# Shared helpers (import_data.py) live at the repository root
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
@@ -483,14 +507,37 @@ EMAIL_REDIRECT_URL = os.getenv("EMAIL_REDIRECT_URL", "")
 # If set to "false", we will not require email confirmation and will auto-login after signup
 # Default is false to avoid any email configuration out of the box
 SUPABASE_REQUIRE_EMAIL_CONFIRM = os.getenv("SUPABASE_REQUIRE_EMAIL_CONFIRM", "false").strip().lower() == "true"
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+# Supabase access goes through a write-through query cache (pms_repository.py): reads are
+# cached per table and coalesced within a rerun, writes invalidate the table.
+SHOW_QUERY_STATS = os.getenv("PMS_SHOW_QUERY_STATS", "false").strip().lower() == "true"
+
+@st.cache_resource
+def get_query_cache() -> QueryCache:
+    return QueryCache()
+
+supabase = CachedSupabase(
+    create_client(SUPABASE_URL, SUPABASE_KEY),
+    get_query_cache(),
+    scope="authenticated" if "sb_session" in st.session_state else "anon",
+)
+# With PMS_SHOW_QUERY_STATS=true, report the previous rerun of this session (complete, even
+# if it ended in st.stop/st.rerun)
+_previous_db = st.session_state.get("_pms_db")
+if SHOW_QUERY_STATS and _previous_db is not None:
+    print(f"[pms] rerun queries: {_previous_db.summary()}")
+    st.sidebar.caption(f"Last rerun: {_previous_db.summary()}")
+st.session_state["_pms_db"] = supabase
+
+# Model names are part of the AI result cache key (ai_cache.py)
+GEMINI_MODEL_NAME = "gemini-2.5-flash"
+GROQ_MODEL_NAME = "llama-3.1-70b-versatile"
 
 # Configure Gemini AI
 if GEMINI_API_KEY:
     try:
         genai.configure(api_key=GEMINI_API_KEY)
         gemini_model = genai.GenerativeModel(
-            'gemini-2.5-flash',
+            GEMINI_MODEL_NAME,
             generation_config={
                 "temperature": 0.2,
                 "top_p": 0.9,
@@ -1284,13 +1331,54 @@ def get_category_type_mapping() -> dict:
     except Exception:
         return {}
 
+# Facet index over chemical_types (category -> types, segment -> functional categories).
+# One scan of the table serves every taxonomy dropdown; shared by all sessions and
+# rebuilt after writes to chemical_types (invalidate_chemical_type_facets) or after the TTL
+# for changes made outside this app.
+@st.cache_resource(ttl=300, show_spinner=False)
+def get_chemical_type_facets() -> ChemicalTypeFacets:
+    return fetch_chemical_type_facets(supabase)
+
+def invalidate_chemical_type_facets():
+    """Call after inserting, updating or deleting chemical_types rows."""
+    try:
+        get_chemical_type_facets.clear()
+        get_all_categories.clear()
+    except Exception:
+        pass
+
+# Partner names for the duplicate checks in Partner Master Data (exact + fuzzy). Rebuilt
+# after partner writes (invalidate_partner_index) or after the TTL.
+@st.cache_resource(ttl=300, show_spinner=False)
+def get_partner_index() -> PartnerIndex:
+    return fetch_partner_index(supabase)
+
+def invalidate_partner_index():
+    """Call after inserting, renaming or deleting partner_data rows."""
+    try:
+        get_partner_index.clear()
+    except Exception:
+        pass
+
+# Latest price of every TDS for every incoterm (LeanChem portfolio, pricing View tab).
+# Rebuilt after pricing writes (invalidate_price_matrix) or after the TTL.
+@st.cache_resource(ttl=300, show_spinner=False)
+def get_price_matrix() -> PriceMatrix:
+    return fetch_price_matrix(supabase)
+
+def invalidate_price_matrix():
+    """Call after inserting, updating or deleting costing_pricing_data rows."""
+    try:
+        get_price_matrix.clear()
+    except Exception:
+        pass
+
 # Dynamic categories sourced from database (chemical_types.category) plus fixed list
 @st.cache_data(ttl=30)
 def get_all_categories() -> list[str]:
     try:
-        # Pull distinct categories from chemical_types
-        res = supabase.table("chemical_types").select("category").execute()
-        db_cats = {str((row or {}).get("category") or "").strip() for row in (res.data or [])}
+        # Distinct categories from the chemical_types facet index
+        db_cats = set(get_chemical_type_facets().categories)
     except Exception:
         db_cats = set()
     # Also include categories from optional categories table if present
@@ -1376,48 +1464,21 @@ def validate_file(uploaded_file) -> tuple[bool, str]:
 
 def get_distinct_product_types() -> list[str]:
     try:
-        res = supabase.table("chemical_types").select("name").execute()
-        values = sorted({(row.get("name") or "").strip() for row in (res.data or []) if row.get("name")})
-        return [v for v in values if v]
+        return list(get_chemical_type_facets().product_types)
     except Exception:
         return []
 
 def get_distinct_industry_segments() -> list[str]:
     """Distinct industry segments from Chemical Master Data."""
     try:
-        res = supabase.table("chemical_types").select("industry_segments").execute()
-        rows = res.data or []
-        values: set[str] = set()
-        for row in rows:
-            segs = row.get("industry_segments") or []
-            try:
-                for s in segs:
-                    s_str = str(s).strip()
-                    if s_str:
-                        values.add(s_str)
-            except Exception:
-                continue
-        return sorted(values)
+        return list(get_chemical_type_facets().segments)
     except Exception:
         return []
 
 def get_functional_categories_for_segment(segment: str) -> list[str]:
     """Distinct functional categories for chemicals that belong to a segment."""
     try:
-        if not segment:
-            return []
-        wanted = segment.strip().lower()
-        res = supabase.table("chemical_types").select("industry_segments,functional_categories").execute()
-        rows = res.data or []
-        fc: set[str] = set()
-        for row in rows:
-            segs = [str(s).strip().lower() for s in (row.get("industry_segments") or []) if str(s).strip()]
-            if any(wanted == s or wanted in s for s in segs):
-                for c in (row.get("functional_categories") or []):
-                    c_str = str(c).strip()
-                    if c_str:
-                        fc.add(c_str)
-        return sorted(fc)
+        return list(get_chemical_type_facets().functional_categories_for_segment(segment))
     except Exception:
         return []
 
@@ -1438,13 +1499,7 @@ def get_types_for_category(category: str) -> list[str]:
     if not category:
         return []
     try:
-        res_db = supabase.table("chemical_types").select("name,category").eq("category", category).execute()
-        names = []
-        for row in (res_db.data or []):
-            nm = (row.get("name") or "").strip()
-            if nm:
-                names.append(nm)
-        return sorted(set(names))
+        return list(get_chemical_type_facets().types_for_category(category))
     except Exception:
         return []
 
@@ -1459,83 +1514,80 @@ def get_types_for_category_enriched(category: str) -> list[str]:
         base = set(get_types_for_category(category) or [])
     except Exception:
         base = set()
-    # Enrich from TDS metadata
+    # Enrich from TDS metadata (filtered by category in Postgres)
     try:
-        rows = supabase.table("tds_data").select("metadata").execute().data or []
-        for r in rows:
-            md = r.get("metadata") or {}
-            if (md.get("category") or "").strip() == category:
-                pt = (md.get("product_type") or "").strip()
-                if pt:
-                    base.add(pt)
+        base.update(fetch_tds_product_types(supabase, category))
     except Exception:
         pass
     return sorted([t for t in base if t])
 
+def _store_uploaded_document(uploaded_file):
+    """Store an upload content-addressed (see document_store.py); identical files are stored once."""
+    ext = document_store.file_extension(uploaded_file.name)
+    key, _ = document_store.store_document(
+        supabase, uploaded_file, uploaded_file.name, attempts=document_store.UPLOAD_ATTEMPTS
+    )
+    return document_store.public_url(SUPABASE_URL, key), uploaded_file.name, uploaded_file.size, ext.upper()
+
+def stored_document_url(uploaded_file) -> str:
+    """Public URL an upload is (or would be) stored under; equal for identical content."""
+    key, _ = document_store.content_key(uploaded_file, document_store.file_extension(uploaded_file.name))
+    return document_store.public_url(SUPABASE_URL, key)
+
 def upload_tds_to_supabase(uploaded_file, product_id: str):
     if not uploaded_file:
         return None, None, None, None
-    ext = uploaded_file.name.split(".")[-1].lower()
-    content_types = {
-        "pdf": "application/pdf",
-        "docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-        "doc": "application/msword",
-        "png": "image/png",
-        "jpg": "image/jpeg",
-        "jpeg": "image/jpeg",
-    }
-    content_type = content_types.get(ext, "application/octet-stream")
-    key = f"tds_files/{product_id}/{uuid.uuid4()}.{ext}"
-    supabase.storage.from_("product-documents").upload(
-        key,
-        uploaded_file.getvalue(),
-        {"content-type": content_type, "x-upsert": "true"}
-    )
-    public_url = f"https://{SUPABASE_URL.split('//')[1]}/storage/v1/object/public/product-documents/{key}"
-    return public_url, uploaded_file.name, uploaded_file.size, ext.upper()
+    return _store_uploaded_document(uploaded_file)
 
 def _storage_key_from_public_url(public_url: str) -> str | None:
     """Extract storage object key from a public URL."""
     try:
-        marker = "/storage/v1/object/public/product-documents/"
-        if marker in (public_url or ""):
-            return public_url.split(marker, 1)[1]
-        return None
+        return document_store.key_from_public_url(public_url)
     except Exception:
         return None
 
 def _delete_storage_object_by_url(public_url: str) -> bool:
-    """Best-effort delete of a storage object given its public URL."""
+    """Best-effort release of a stored document given its public URL.
+
+    Shared (content-addressed) objects are only deleted once no record references them.
+    """
     try:
         key = _storage_key_from_public_url(public_url)
         if not key:
             return False
-        supabase.storage.from_("product-documents").remove([key])
-        return True
+        return document_store.release_document(supabase, key)
     except Exception:
         return False
 
 def upload_supporting_doc(uploaded_file, tds_id: str):
     if not uploaded_file:
         return None, None, None, None
-    ext = uploaded_file.name.split(".")[-1].lower()
-    content_types = {
-        "pdf": "application/pdf",
-        "docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-        "doc": "application/msword",
-        "png": "image/png",
-        "jpg": "image/jpeg",
-        "jpeg": "image/jpeg",
-    }
-    content_type = content_types.get(ext, "application/octet-stream")
-    key = f"supporting_docs/{tds_id}/{uuid.uuid4()}.{ext}"
-    supabase.storage.from_("product-documents").upload(
-        key,
-        uploaded_file.getvalue(),
-        {"content-type": content_type, "x-upsert": "true"}
-    )
-    public_url = f"https://{SUPABASE_URL.split('//')[1]}/storage/v1/object/public/product-documents/{key}"
-    return public_url, uploaded_file.name, uploaded_file.size, ext.upper()
+    return _store_uploaded_document(uploaded_file)
+
+def upload_supporting_docs(uploaded_files, tds_id: str) -> list[tuple[tuple | None, str]]:
+    """Upload several supporting documents concurrently, with a progress bar.
+
+    Returns ((url, name, size, type) or None, error) per file, in order. The per-file
+    throughput is kept in st.session_state["tds_upload_report"] for the next rerun.
+    """
+    progress = st.progress(0.0, text=f"Uploading {len(uploaded_files)} file(s)…")
+
+    def _show(results):
+        done = [r for r in results if r.done]
+        sent = sum(r.size for r in done if r.uploaded) / (1024 * 1024)
+        progress.progress(len(done) / max(len(results), 1), text=f"{len(done)}/{len(results)} files, {sent:.1f} MB sent")
+
+    results = document_store.upload_many(supabase, [(f.name, f) for f in uploaded_files], on_progress=_show)
+    progress.empty()
+    st.session_state["tds_upload_report"] = [r.row() for r in results]
+    out = []
+    for f, r in zip(uploaded_files, results):
+        if not r.ok:
+            out.append((None, r.error))
+            continue
+        ext = document_store.file_extension(f.name)
+        out.append(((document_store.public_url(SUPABASE_URL, r.key), f.name, f.size, ext.upper()), ""))
+    return out
 
 # ------------------
 # Global session-state reset helpers (used across modules)
@@ -1683,6 +1735,11 @@ def _has_unsaved_sourcing_changes() -> bool:
             if any(k for k in tds_keys if k not in excluded_keys):
                 return True
         
+        # Extractions waiting in the Bulk Upload review queue are not saved yet
+        elif current_section == "bulk":
+            if any(i.status == tds_ingest.REVIEW for i in st.session_state.get("tds_bulk_items") or []):
+                return True
+
         # Check for unsaved changes in Manage TDS tab
         elif current_section == "manage":
             # Check for any TDS manage form data that might indicate editing
@@ -1980,142 +2037,66 @@ def create_tds_sourcing_entity(*, chemical_type_id: str | None, brand: str | Non
     except Exception as e:
         return False, str(e)
 
+def save_ingested_tds(fields: dict, file_info: tuple, *, product_name: str, category: str,
+                      product_type: str, tds_source: str | None, is_leanchems_product: str | None):
+    """Create the tds_data record for one bulk-ingested TDS (same shape as Add TDS)."""
+    tds_url, tds_name, tds_size, tds_type = file_info
+    chem_type_id = _resolve_chemical_type_id(product_type, category)
+    brand, grade = _split_brand_grade(fields.get("trade_name"))
+    specs = {k: v for k, v in {
+        "technical_specification": fields.get("technical_specification"),
+        "hs_code": fields.get("hs_code"),
+        "net_weight": fields.get("net_weight"),
+    }.items() if v}
+    metadata = {
+        "product_name": product_name.strip(),
+        "product_type": product_type.strip(),
+        "category": category,
+        "is_leanchems_product": is_leanchems_product,
+        "is_active": True,
+        "generic_product_name": fields.get("generic_product_name") or None,
+        "trade_name": fields.get("trade_name") or None,
+        "supplier_name": fields.get("supplier_name") or None,
+        "packaging_size_type": fields.get("packaging_size_type") or None,
+        "net_weight": fields.get("net_weight") or None,
+        "technical_spec": fields.get("technical_specification") or None,
+        "description": None,
+        "tds_file_url": tds_url,
+        "tds_file_name": tds_name,
+        "tds_file_size": tds_size,
+        "tds_file_type": tds_type,
+        "tds_source": tds_source,
+    }
+    return create_tds_sourcing_entity(
+        chemical_type_id=chem_type_id,
+        brand=(brand or fields.get("supplier_name") or None),
+        grade=grade,
+        owner=tds_source,
+        source="TDS Bulk Upload",
+        specs=specs,
+        metadata=metadata,
+    )
+
 def extract_text_from_file(uploaded_file):
     """Extract text from uploaded file (PDF, DOCX, or image) with OCR fallbacks.
 
-    PDFs: PyPDF2 → pdfplumber → OCR (pdf2image + pytesseract)
+    PDFs: PyPDF2 → pdfplumber → pdfminer → OCR of the pages without text (parallel)
     Images: OCR (pytesseract)
-    Optional env vars: TESSERACT_CMD, POPPLER_PATH
+    Results are cached by file hash (see text_extraction.py), so re-uploads are instant.
+    Optional env vars: TESSERACT_CMD, POPPLER_PATH, TDS_TEXT_CACHE_DIR, OCR_MAX_WORKERS
     """
     try:
-        file_extension = uploaded_file.name.split('.')[-1].lower()
-
-        def _normalize_text(txt: str) -> str:
-            try:
-                return (txt or "").replace("\r", "\n").replace("\u0000", "").strip()
-            except Exception:
-                return txt or ""
-
-        if file_extension == 'pdf':
-            raw = uploaded_file.getvalue()
-            text = ""
-            # 1) PyPDF2
-            try:
-                pdf_reader = PyPDF2.PdfReader(io.BytesIO(raw))
-                for page in pdf_reader.pages:
-                    try:
-                        page_text = page.extract_text() or ""
-                    except Exception:
-                        page_text = ""
-                    if page_text:
-                        text += page_text + "\n"
-            except Exception:
-                pass
-
-            def _is_insufficient(t: str) -> bool:
-                return len((t or "").strip()) < 150
-
-            # 2) pdfplumber fallback for text-based but complex PDFs
-            if _is_insufficient(text):
-                try:
-                    import pdfplumber  # type: ignore
-                    with pdfplumber.open(io.BytesIO(raw)) as pdf:
-                        txt_parts = []
-                        for p in pdf.pages:
-                            try:
-                                txt_parts.append(p.extract_text() or "")
-                            except Exception:
-                                txt_parts.append("")
-                        text = "\n".join(txt_parts)
-                except Exception:
-                    pass
-
-            # 2b) pdfminer.six fallback if still insufficient
-            if _is_insufficient(text):
-                try:
-                    # Optional dependency: pdfminer.six
-                    from pdfminer.high_level import extract_text as _pdfminer_extract  # type: ignore
-                    try:
-                        miner_text = _pdfminer_extract(io.BytesIO(raw)) or ""
-                    except Exception:
-                        miner_text = ""
-                    if miner_text and len(miner_text.strip()) > len(text.strip()):
-                        text = miner_text
-                except Exception:
-                    pass
-
-            # 3) OCR fallback for scanned/image PDFs
-            if _is_insufficient(text):
-                try:
-                    from pdf2image import convert_from_bytes  # type: ignore
-                    import pytesseract  # type: ignore
-                    import os as _os
-                    tess_cmd = _os.getenv("TESSERACT_CMD")
-                    if tess_cmd:
-                        try:
-                            pytesseract.pytesseract.tesseract_cmd = tess_cmd
-                        except Exception:
-                            pass
-                    poppler_path = _os.getenv("POPPLER_PATH")
-                    # Convert first up to 10 pages to images for OCR
-                    if poppler_path:
-                        images = convert_from_bytes(raw, dpi=200, poppler_path=poppler_path)
-                    else:
-                        images = convert_from_bytes(raw, dpi=200)
-                    ocr_text_parts = []
-                    for img in images[:10]:
-                        try:
-                            ocr_text_parts.append(pytesseract.image_to_string(img) or "")
-                        except Exception:
-                            ocr_text_parts.append("")
-                    text = "\n".join(ocr_text_parts)
-                except Exception:
-                    pass
-
-            return _normalize_text(text)
-
-        elif file_extension in ['docx', 'doc']:
-            # Extract text from DOCX
-            doc = Document(io.BytesIO(uploaded_file.getvalue()))
-            text = ""
-            for paragraph in doc.paragraphs:
-                text += paragraph.text + "\n"
-            return _normalize_text(text)
-
-        elif file_extension in ['png', 'jpg', 'jpeg', 'heic', 'heif', 'webp']:
-            # OCR for images
-            try:
-                import PIL.Image as _PIL_Image  # type: ignore
-                # Optional HEIC/HEIF support
-                try:
-                    import pillow_heif  # type: ignore
-                    try:
-                        pillow_heif.register_heif_opener()
-                    except Exception:
-                        pass
-                except Exception:
-                    pass
-                import pytesseract  # type: ignore
-                import os as _os
-                tess_cmd = _os.getenv("TESSERACT_CMD")
-                if tess_cmd:
-                    try:
-                        pytesseract.pytesseract.tesseract_cmd = tess_cmd
-                    except Exception:
-                        pass
-                img = _PIL_Image.open(io.BytesIO(uploaded_file.getvalue()))
-                return _normalize_text(pytesseract.image_to_string(img) or "")
-            except Exception:
-                return ""
-
-        else:
-            return "Unsupported file format"
-
+        return extract_document_text(uploaded_file.getvalue(), uploaded_file.name)
+    except ValueError:
+        return "Unsupported file format"
     except Exception as e:
         return f"Error extracting text: {str(e)}"
 
-def extract_tds_info_with_ai(text_content):
-    """Use Gemini AI to extract TDS information from text content"""
+def extract_tds_info_with_ai(text_content, notify: bool = True):
+    """Use Gemini AI to extract TDS information from text content.
+
+    notify=False suppresses the st.* messages (for calls from bulk-ingest worker threads).
+    """
     if not gemini_model:
         return None
     
@@ -2144,8 +2125,6 @@ def extract_tds_info_with_ai(text_content):
         HS Code: 3904.30.00
         Technical Specification: Vinyl acetate-ethylene copolymer, solid content 99%, particle size <1mm
         """
-        
-        response = gemini_model.generate_content(prompt)
 
         # Robustly extract text from candidates, handling safety blocks
         def _response_to_text(resp) -> str:
@@ -2175,7 +2154,11 @@ def extract_tds_info_with_ai(text_content):
             except Exception:
                 return ""
 
-        raw_text = _response_to_text(response)
+        # Cached by prompt version, model and text (see ai_cache.py)
+        raw_text, parsed_json = ai_cache.cached_generate(
+            "tds_extract", GEMINI_MODEL_NAME, text_content,
+            lambda: _response_to_text(gemini_model.generate_content(prompt)), _parse_lenient_json,
+        )
         if not raw_text:
             # Retry with a safer, shorter prompt and truncated content to avoid safety blocks
             safe_text = (text_content or "")[:5000]
@@ -2186,16 +2169,18 @@ def extract_tds_info_with_ai(text_content):
             Use empty strings where unknown.
             """
             try:
-                retry_resp = gemini_model.generate_content(retry_prompt)
-                raw_text = _response_to_text(retry_resp)
+                raw_text, parsed_json = ai_cache.cached_generate(
+                    "tds_extract_retry", GEMINI_MODEL_NAME, safe_text,
+                    lambda: _response_to_text(gemini_model.generate_content(retry_prompt)), _parse_lenient_json,
+                )
             except Exception:
                 raw_text = ""
         if not raw_text:
-            st.warning("⚠️ AI response was blocked or empty. Please try another file or smaller excerpt.")
+            if notify:
+                st.warning("⚠️ AI response was blocked or empty. Please try another file or smaller excerpt.")
             return None
         
         # Prefer JSON parsing when possible
-        parsed_json = _parse_lenient_json(raw_text)
         if isinstance(parsed_json, dict):
             return parsed_json
 
@@ -2213,6 +2198,8 @@ def extract_tds_info_with_ai(text_content):
         return extracted_info
          
     except Exception as e:
+        if not notify:
+            return None
         st.error(f"AI extraction error: {str(e)}")
         st.info("💡 This could be due to content filtering, network issues, or API limits. You can still manually fill in the fields below.")
         return None
@@ -2227,18 +2214,21 @@ def extract_tds_info_with_groq(text_content):
             "['Generic Product Name','Trade Name','Supplier Name','Packaging Size & Type','Net Weight','HS Code','Technical Specification']. "
             "Use empty strings when unknown. Text follows:\n\n" + (text_content or "")
         )
-        chat = groq_client.chat.completions.create(
-            model="llama-3.1-70b-versatile",
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant that outputs valid JSON only."},
-                {"role": "user", "content": prompt},
-            ],
-            temperature=0.1,
-            response_format={"type": "json_object"},
-            max_tokens=900,
-        )
-        raw = (chat.choices[0].message.content or "").strip()
-        data = _parse_lenient_json(raw)
+
+        def _generate():
+            chat = groq_client.chat.completions.create(
+                model=GROQ_MODEL_NAME,
+                messages=[
+                    {"role": "system", "content": "You are a helpful assistant that outputs valid JSON only."},
+                    {"role": "user", "content": prompt},
+                ],
+                temperature=0.1,
+                response_format={"type": "json_object"},
+                max_tokens=900,
+            )
+            return (chat.choices[0].message.content or "").strip()
+
+        raw, data = ai_cache.cached_generate("tds_extract_groq", GROQ_MODEL_NAME, text_content, _generate, _parse_lenient_json)
         if isinstance(data, dict):
             return data
         # Fallback: make a minimal dict from key: value lines
@@ -2251,6 +2241,27 @@ def extract_tds_info_with_groq(text_content):
     except Exception:
         return None
 
+def _heuristic_tds_fields(text_content: str) -> dict:
+    """Last resort: simple key: value lines from the source text."""
+    guess = {}
+    for line in (text_content or "").splitlines():
+        if ":" in line and len(line) < 200:
+            k, v = line.split(":", 1)
+            if k and v:
+                guess[k.strip()] = v.strip()
+    return guess
+
+def extract_tds_fields(text_content: str, notify: bool = True) -> tuple[dict | None, str]:
+    """TDS fields from extracted text and where they came from ("gemini", "groq" or "heuristic")."""
+    # Prefer Gemini; fallback to Groq; final fallback to key: value parse
+    extracted_info = extract_tds_info_with_ai(text_content, notify=notify)
+    if extracted_info:
+        return extracted_info, "gemini"
+    extracted_info = extract_tds_info_with_groq(text_content)
+    if extracted_info:
+        return extracted_info, "groq"
+    return _heuristic_tds_fields(text_content) or None, "heuristic"
+
 def process_tds_with_ai(uploaded_file):
     """Process TDS file with AI to extract information"""
     if not uploaded_file:
@@ -2265,21 +2276,9 @@ def process_tds_with_ai(uploaded_file):
             st.error(f"Could not extract text from file: {text_content}")
             return None
 
-        # Prefer Gemini; fallback to Groq; final fallback to key: value parse
-        extracted_info = extract_tds_info_with_ai(text_content)
-        if not extracted_info:
-            extracted_info = extract_tds_info_with_groq(text_content)
-        if not extracted_info:
-            # Last resort: try to parse simple key: value lines from the source text
-            guess = {}
-            for line in (text_content or "").splitlines():
-                if ":" in line and len(line) < 200:
-                    k, v = line.split(":", 1)
-                    if k and v:
-                        guess[k.strip()] = v.strip()
-            if guess:
-                st.warning("AI extraction fell back to heuristic parsing.")
-                extracted_info = guess
+        extracted_info, extraction_source = extract_tds_fields(text_content)
+        if extracted_info and extraction_source == "heuristic":
+            st.warning("AI extraction fell back to heuristic parsing.")
 
         if not extracted_info:
             st.error("❌ AI extraction failed. Please check your file.")
@@ -2496,549 +2495,6 @@ if st.session_state.get("main_section") == "partner_master" and not has_sourcing
     st.info("Please contact your administrator if you believe you should have access to this module.")
     st.stop()
 
-# Enhanced Sourcing sub-navigation when active
-if st.session_state.get("main_section") == "sourcing" and has_sourcing_master_access(user_email):
-    st.markdown('<div class="form-card" style="margin: 2rem 0;">', unsafe_allow_html=True)
-    st.markdown('''
-    <div style="text-align: center; margin-bottom: 1.5rem;">
-        <h3 style="color: #4a5568; font-weight: 600; margin-bottom: 0.5rem;">TDS Master Data</h3>
-        <p style="color: #718096; font-size: 0.9rem; margin: 0;">Technical Data Sheet Management</p>
-    </div>
-    ''', unsafe_allow_html=True)
-    
-    if "sourcing_section" not in st.session_state:
-        st.session_state["sourcing_section"] = "add"
-    
-    sub_cols = st.columns(3)
-    sub_nav_items = [
-        {"key": "add", "icon": "➕", "title": "Add TDS", "desc": "Upload new technical data sheets"},
-        {"key": "manage", "icon": "⚙️", "title": "Manage TDS", "desc": "Edit and organize existing TDS"},
-        {"key": "view", "icon": "👁️", "title": "View TDS", "desc": "Browse and search TDS library"}
-    ]
-    
-    for i, item in enumerate(sub_nav_items):
-        with sub_cols[i]:
-            is_active = st.session_state.get("sourcing_section") == item["key"]
-            
-            if st.button(
-                f"""{item["icon"]} {item["title"]}""",
-                key=f"sub_nav_{item['key']}",
-                use_container_width=True,
-                type="primary" if is_active else "secondary"
-            ):
-                # Check for unsaved changes when switching tabs within sourcing
-                current_section = st.session_state.get("sourcing_section")
-                if (current_section != item["key"] and current_section and _has_unsaved_sourcing_changes()):
-                    # Set pending navigation instead of showing dialog immediately
-                    st.session_state["pending_sourcing_section"] = item["key"]
-                    st.rerun()
-                else:
-                    st.session_state["sourcing_section"] = item["key"]
-                    st.rerun()
-            
-            st.markdown(f'''
-            <div style="text-align: center; margin-top: 0.5rem;">
-                <small style="color: #718096; font-size: 0.8rem;">
-                    {item["desc"]}
-                </small>
-            </div>
-            ''', unsafe_allow_html=True)
-    
-    st.markdown('</div>', unsafe_allow_html=True)
-    
-    # Handle pending TDS section changes with confirmation dialog
-    if st.session_state.get("pending_sourcing_section"):
-        new_section = st.session_state.get("pending_sourcing_section")
-        current_section = st.session_state.get("sourcing_section")
-        
-        if current_section == "add":
-            st.warning("⚠️ You have unsaved changes in the Add TDS tab.")
-            col1, col2, col3 = st.columns([1, 1, 2])
-            with col1:
-                if st.button("🗑️ Discard & Continue", key="discard_tds_add", type="primary"):
-                    _clear_sourcing_session()
-                    st.session_state["sourcing_section"] = new_section
-                    st.session_state.pop("pending_sourcing_section")
-                    st.rerun()
-            with col2:
-                if st.button("❌ Cancel", key="cancel_tds_add"):
-                    st.session_state.pop("pending_sourcing_section")
-                    st.rerun()
-            with col3:
-                st.caption("Your unsaved changes will be lost if you continue.")
-            st.stop()
-        elif current_section == "manage":
-            st.warning("⚠️ You have unsaved changes in the Manage TDS tab.")
-            col1, col2, col3 = st.columns([1, 1, 2])
-            with col1:
-                if st.button("🗑️ Discard & Continue", key="discard_tds_manage", type="primary"):
-                    _clear_sourcing_session()
-                    st.session_state["sourcing_section"] = new_section
-                    st.session_state.pop("pending_sourcing_section")
-                    st.rerun()
-            with col2:
-                if st.button("❌ Cancel", key="cancel_tds_manage"):
-                    st.session_state.pop("pending_sourcing_section")
-                    st.rerun()
-            with col3:
-                st.caption("Your unsaved changes will be lost if you continue.")
-            st.stop()
-
-# UI - Add Product
-if st.session_state.get("main_section") == "sourcing" and st.session_state.get("sourcing_section") == "add" and has_sourcing_master_access(user_email):
-    st.markdown('<h1 style="color:#1976d2; font-weight:700;">Add TDS</h1>', unsafe_allow_html=True)
-    st.markdown('<div class="form-card">', unsafe_allow_html=True)
-
-    with st.container():
-        st.subheader("Basic Information")
-        # Category select (selection only; no add) with placeholder
-        _cat_placeholder = "— Select —"
-        try:
-            _cat_options = [_cat_placeholder] + get_all_categories()
-        except Exception:
-            _cat_options = [_cat_placeholder] + FIXED_CATEGORIES
-        _category_sel = st.selectbox(
-            "Chemical Category *",
-            _cat_options,
-            key="category_select"
-        )
-        category = "" if _category_sel == _cat_placeholder else _category_sel
-        # Reset type controls when category changes
-        prev_cat = st.session_state.get("category_select_prev")
-        if prev_cat != category:
-            if prev_cat:
-                prev_key_base = (prev_cat or 'none').replace(' ', '_').replace('&', 'and')
-                prev_type_checkbox_key = f"add_new_type_{prev_key_base}"
-                prev_type_select_key = f"type_select_{prev_key_base}"
-                prev_type_input_key = f"new_type_name_{prev_key_base}"
-                st.session_state.pop(prev_type_checkbox_key, None)
-                st.session_state.pop(prev_type_select_key, None)
-                st.session_state.pop(prev_type_input_key, None)
-            st.session_state["category_select_prev"] = category
-            # Force a rerun so dependent widgets refresh their options for the new category
-            st.rerun()
-
-        # Product Type filtered by selected category (selection only; no add)
-        existing_types = get_types_for_category(category)
-        type_options = existing_types
-        if type_options:
-            _type_placeholder = "— Select —"
-            _type_opts = [_type_placeholder] + type_options
-            _type_sel = st.selectbox(
-                "Product Type *",
-                options=_type_opts,
-                key=f"type_select_{(category or 'none').replace(' ', '_').replace('&', 'and')}"
-            )
-            selected_type = "" if _type_sel == _type_placeholder else _type_sel
-        else:
-            st.info("No mapped product types for this category in Chemical Master Data.")
-            selected_type = ""
-
-        # Product Code after selecting category and type
-        name = st.text_input("Product Code *", placeholder="Unique product code", key="tds_product_code")
-
-        description = st.text_area("Description", placeholder="Optional description", height=100, key="tds_description")
-
-        st.markdown("---")
-        st.subheader("Product Status")
-        _yn_placeholder = "— Select —"
-        _yn_sel = st.selectbox(
-            "Is it Leanchems legacy/existing/coming product?",
-            [_yn_placeholder, "Yes", "No"],
-            index=0,
-            key="tds_product_status"
-        )
-        is_leanchems_product = None if _yn_sel == _yn_placeholder else _yn_sel
-
-        st.markdown("---")
-        st.subheader("Source of TDS")
-        _src_placeholder = "— Select —"
-        _src_sel = st.selectbox(
-            "Where did the TDS come from?",
-            [_src_placeholder, "Supplier", "Customer", "Competitor"],
-            index=0,
-            key="tds_source_select"
-        )
-        tds_source = None if _src_sel == _src_placeholder else _src_sel
-
-        st.markdown("---")
-        st.subheader("Technical Data Sheet (TDS)")
-        st.warning("⚠️ TDS upload is required. Products cannot be saved without a TDS file.")
-        # Single file picker only (mobile-friendly)
-        # Reset-aware file uploader (tokenized key so it fully clears after save)
-        _tds_file_token = st.session_state.get("tds_file_reset_token", "0")
-        uploaded_file = st.file_uploader(
-            "Upload TDS (PDF/DOCX/Images) — max 10MB *",
-            type=ALLOWED_FILE_EXTS,
-            key=f"tds_file_picker_{_tds_file_token}",
-            accept_multiple_files=False,
-            help="Tip: On mobile, choose 'Files' or 'Browse' to pick from device storage."
-        )
-
-        # If user removes the uploaded file after extraction, clear hydrated fields and extracted data
-        if not uploaded_file and (
-            st.session_state.get("extracted_tds_data") or st.session_state.get("tds_defaults")
-        ):
-            _cleared_any = False
-            for _k in [
-                "extracted_tds_data",
-                "extracted_tds_data_norm",
-                "tds_defaults",
-                "tds_hydrate_pending",
-            ]:
-                if _k in st.session_state:
-                    st.session_state.pop(_k, None)
-                    _cleared_any = True
-            # Clear widget values back to empty
-            for _w in [
-                "tds_generic_name",
-                "tds_trade_name",
-                "tds_supplier_name",
-                "tds_packaging",
-                "tds_net_weight",
-                "tds_tech_spec",
-            ]:
-                if st.session_state.get(_w):
-                    st.session_state[_w] = ""
-                    _cleared_any = True
-            if _cleared_any:
-                st.info("TDS removed — cleared AI-extracted fields.")
-                st.rerun()
-
-        # AI Processing Button (single source)
-        if uploaded_file and gemini_model:
-            col_ai_process1, col_ai_process2 = st.columns([1, 3])
-            with col_ai_process1:
-                if st.button("🤖 Extract with AI", type="secondary"):
-                    extracted_data = process_tds_with_ai(uploaded_file)
-                    if extracted_data is not None:
-                        # Normalize keys robustly (case/space/punctuation variations)
-                        import re as _re_norm_keys
-                        def _normalize_key(s: str) -> str:
-                            ns = str(s or "").strip().lower()
-                            ns = ns.replace("&", " and ")
-                            ns = ns.replace("-", "_")
-                            ns = ns.replace(" ", "_")
-                            ns = ns.replace("\u2013", "_").replace("\u2014", "_")
-                            ns = ns.replace('"', '').replace("'", "")
-                            ns = _re_norm_keys.sub(r"[^a-z0-9_]+", "", ns)
-                            return ns
-                        norm = { _normalize_key(k): v for k, v in extracted_data.items() }
-                        st.session_state["extracted_tds_data"] = extracted_data
-                        st.session_state["extracted_tds_data_norm"] = norm
-                        st.session_state["tds_hydrate_pending"] = True
-                        st.success("✅ AI extraction completed!")
-                        st.rerun()
-                    else:
-                        st.error("❌ AI extraction failed. Please check your file.")
-            with col_ai_process2:
-                if st.session_state.get("extracted_tds_data"):
-                    st.success("AI data extracted and ready to use!")
-
-        st.markdown("---")
-        st.subheader("AI Product Management System – TDS Information Extraction")
-        if gemini_model:
-            st.info("🤖 AI will automatically extract information from the uploaded TDS file")
-        else:
-            st.warning("⚠️ Gemini AI not configured. Please set GEMINI_API_KEY in your environment variables.")
-
-        # (Debug section removed)
-        
-        # AI TDS Information Extraction fields
-        # One-time hydration after an extract click
-        def _ensure_hydrated():
-            _n = st.session_state.get("extracted_tds_data_norm") or {}
-            if not _n and st.session_state.get("extracted_tds_data"):
-                # Build norm from legacy stored dict
-                _tmp = st.session_state.get("extracted_tds_data") or {}
-                import re as _re_norm_keys
-                def _normalize_key(s: str) -> str:
-                    ns = str(s or "").strip().lower()
-                    ns = ns.replace("&", " and ")
-                    ns = ns.replace("-", "_")
-                    ns = ns.replace(" ", "_")
-                    ns = ns.replace("\u2013", "_").replace("\u2014", "_")
-                    ns = ns.replace('"', '').replace("'", "")
-                    ns = _re_norm_keys.sub(r"[^a-z0-9_]+", "", ns)
-                    return ns
-                _n = {_normalize_key(k): v for k, v in _tmp.items()}
-                st.session_state["extracted_tds_data_norm"] = _n
-            if not _n:
-                st.stop()
-            def _get_first(keys: list[str], default: str = ""):
-                for k in keys:
-                    if k in _n and _n.get(k):
-                        return _n.get(k)
-                return default
-            # Store hydrated defaults in a separate dict to avoid widget key conflicts
-            st.session_state["tds_defaults"] = {
-                "generic_product_name": _get_first(["generic_product_name","generic_name","genericproductname"]) or "",
-                "trade_name": _get_first(["trade_name","model_name","tradename","modelname"]) or "",
-                "supplier_name": _get_first(["supplier_name","manufacturer","suppliername"]) or "",
-                # Include common normalized variants including double-underscore from " & " replacement
-                "packaging_size_type": _get_first([
-                    "packaging_size_type",
-                    "packaging_size_and_type",
-                    "packagingsizeandtype",
-                    "packaging_size__and__type",
-                    "packaging_sizeandtype",
-                    "packaging_and_type",
-                    "packaging",
-                    "packaging_size"
-                ]) or "",
-                "net_weight": _get_first(["net_weight","netweight","weight"]) or "",
-                "hs_code": _get_first(["hs_code","hscode","hs"]) or "",
-                "technical_specification": _get_first(["technical_specification","technical_specs","technicalspecification","technicalspecs","specification","specifications"]) or "",
-            }
-
-        # Capture whether we are in the immediate hydration pass to decide if we overwrite widget values
-        _hydrate_now = bool(st.session_state.get("tds_hydrate_pending"))
-        if _hydrate_now:
-            _ensure_hydrated()
-            st.session_state["tds_hydrate_pending"] = False
-        else:
-            # Also hydrate opportunistically if fields are empty but we have extracted data
-            if st.session_state.get("extracted_tds_data") and not st.session_state.get("tds_defaults"):
-                _ensure_hydrated()
-
-        # If we have defaults, push them into widget state before rendering inputs.
-        # Only overwrite existing user entries on the immediate hydration pass, otherwise fill blanks only.
-        _tds_defs_for_widgets = st.session_state.get("tds_defaults") or {}
-        if _tds_defs_for_widgets:
-            _widget_defaults_map = {
-                "tds_generic_name": _tds_defs_for_widgets.get("generic_product_name", ""),
-                "tds_trade_name": _tds_defs_for_widgets.get("trade_name", ""),
-                "tds_supplier_name": _tds_defs_for_widgets.get("supplier_name", ""),
-                "tds_packaging": _tds_defs_for_widgets.get("packaging_size_type", ""),
-                "tds_net_weight": _tds_defs_for_widgets.get("net_weight", ""),
-                "tds_tech_spec": _tds_defs_for_widgets.get("technical_specification", ""),
-            }
-            for _wkey, _wval in _widget_defaults_map.items():
-                if _hydrate_now or not st.session_state.get(_wkey):
-                    st.session_state[_wkey] = _wval
-
-        col_ai1, col_ai2 = st.columns(2)
-        _norm_vals = st.session_state.get("extracted_tds_data_norm") or {}
-        
-        with col_ai1:
-            _tds_defs = st.session_state.get("tds_defaults") or {}
-            _gen_default = _tds_defs.get("generic_product_name") or _norm_vals.get("generic_product_name", "")
-            _trade_default = _tds_defs.get("trade_name") or _norm_vals.get("trade_name", "")
-            _supp_default = _tds_defs.get("supplier_name") or _norm_vals.get("supplier_name", "")
-            # Resolve value from defaults or normalized key variants
-            _pkg_val = _tds_defs.get("packaging_size_type")
-            if not _pkg_val:
-                for _k in [
-                    "packaging_size_type",
-                    "packaging_size_and_type",
-                    "packagingsizeandtype",
-                    "packaging_size__and__type",
-                    "packaging_sizeandtype",
-                    "packaging_and_type",
-                    "packaging",
-                    "packaging_size",
-                ]:
-                    if _norm_vals.get(_k):
-                        _pkg_val = _norm_vals.get(_k)
-                        break
-            # Only pass value if key not in session state to avoid warning
-            _gen_kwargs = {"key": "tds_generic_name", "placeholder": "AI extracted generic name"}
-            if "tds_generic_name" not in st.session_state:
-                _gen_kwargs["value"] = _gen_default
-            generic_product_name = st.text_input("Generic Product Name", **_gen_kwargs)
-
-            _trade_kwargs = {"key": "tds_trade_name", "placeholder": "AI extracted trade/model name"}
-            if "tds_trade_name" not in st.session_state:
-                _trade_kwargs["value"] = _trade_default
-            trade_name = st.text_input("Trade Name (Model Name)", **_trade_kwargs)
-
-            _supp_kwargs = {"key": "tds_supplier_name", "placeholder": "AI extracted supplier name"}
-            if "tds_supplier_name" not in st.session_state:
-                _supp_kwargs["value"] = _supp_default
-            supplier_name = st.text_input("Supplier Name", **_supp_kwargs)
-
-            _pkg_kwargs = {"key": "tds_packaging", "placeholder": "AI extracted packaging info"}
-            if "tds_packaging" not in st.session_state:
-                _pkg_kwargs["value"] = _pkg_val or ""
-            packaging_size_type = st.text_input("Packaging Size & Type", **_pkg_kwargs)
-        with col_ai2:
-            _net_default = _tds_defs.get("net_weight") or _norm_vals.get("net_weight", "")
-            _net_kwargs = {"key": "tds_net_weight", "placeholder": "AI extracted weight"}
-            if "tds_net_weight" not in st.session_state:
-                _net_kwargs["value"] = _net_default
-            net_weight = st.text_input("Net Weight", **_net_kwargs)
-            # HS Code input removed; use AI-extracted/default value silently
-            hs_code = _tds_defs.get("hs_code") or _norm_vals.get("hs_code", "")
-            _tech_default = _tds_defs.get("technical_specification") or _norm_vals.get("technical_specification", "")
-            _tech_kwargs = {"key": "tds_tech_spec", "placeholder": "AI extracted technical specifications", "height": 100}
-            if "tds_tech_spec" not in st.session_state:
-                _tech_kwargs["value"] = _tech_default
-            technical_spec = st.text_area("Technical Specification", **_tech_kwargs)
-
-
-
-        submitted = st.button("Save Record", type="primary")
-
-    if submitted:
-        # Validate name
-        ok, msg = validate_product_name(name)
-        if not ok:
-            st.error(msg)
-        elif not category:
-            st.error("Category is required. Select a category or enter a new one.")
-        elif name_exists(name):
-            st.error("A product with this name already exists")
-        elif not selected_type:
-            st.error("Product Type is required. Select a type or enter a new one.")
-        elif not uploaded_file:
-            st.error("TDS file is required. Please upload a TDS file before saving the product.")
-        else:
-            # Validate file
-            source_file = uploaded_file
-            f_ok, f_msg = validate_file(source_file)
-            if not f_ok:
-                st.error(f_msg)
-            else:
-                try:
-                    # Create a placeholder ID to use for storage path
-                    product_id = str(uuid.uuid4())
-
-                    # Upload TDS if provided
-                    tds_url, tds_name, tds_size, tds_type = upload_tds_to_supabase(source_file, product_id)
-
-                    # Save everything to tds_data table only
-                    # First, find or create the chemical type
-                    try:
-                        # Try to find existing chemical type
-                        existing_type = supabase.table("chemical_types").select("id").eq("name", selected_type.strip()).eq("category", category).limit(1).execute()
-                        if existing_type.data:
-                            chem_type_id = existing_type.data[0]["id"]
-                        else:
-                            # Create new chemical type if it doesn't exist
-                            new_type_payload = {
-                        "id": product_id,
-                                "name": selected_type.strip(),
-                        "category": category,
-                            }
-                            supabase.table("chemical_types").insert(new_type_payload).execute()
-                            chem_type_id = product_id
-                    except Exception as e:
-                        st.error(f"Failed to handle chemical type: {e}")
-                        st.stop()
-                    brand, grade = _split_brand_grade(trade_name)
-                    
-                    # Build specs (actual technical specifications from TDS)
-                    specs = {}
-                    if technical_spec:
-                        specs["technical_specification"] = technical_spec
-                    if hs_code:
-                        specs["hs_code"] = hs_code
-                    if net_weight:
-                        specs["net_weight"] = net_weight
-                    
-                    # Build metadata (ALL TDS information goes here)
-                    metadata = {
-                        # Product info
-                        "product_name": name.strip(),
-                        "product_type": selected_type.strip(),
-                        "category": category,
-                        "is_leanchems_product": is_leanchems_product,
-                        "is_active": True,
-                        # TDS extracted info
-                        "generic_product_name": (generic_product_name or None),
-                        "trade_name": (trade_name or None),
-                        "supplier_name": (supplier_name or None),
-                        "packaging_size_type": (packaging_size_type or None),
-                        # Duplicate important fields for UI rendering (also stored in specs)
-                        "net_weight": (net_weight or None),
-                        "technical_spec": (technical_spec or None),
-                        "description": (description or None),
-                        # TDS file info
-                        "tds_file_url": tds_url,
-                        "tds_file_name": tds_name,
-                        "tds_file_size": tds_size,
-                        "tds_file_type": tds_type,
-                        "tds_source": tds_source,
-                    }
-                    
-                    # Create tds_data entry
-                    ok_entity, err_entity = create_tds_sourcing_entity(
-                        chemical_type_id=chem_type_id,
-                        brand=(brand or supplier_name or None),
-                        grade=grade,
-                        owner=tds_source,  # Supplier / Customer / Competitor
-                        source="TDS Upload",  # Where it came from
-                        specs=specs,
-                        metadata=metadata,
-                    )
-                    if not ok_entity:
-                        st.warning(f"Saved product, but failed to create sourcing entity: {err_entity}")
-                    st.success("✅ Record saved successfully")
-                    # Clear Add TDS session artifacts and reset the form for a fresh insert
-                    try:
-                        for k in [
-                            "extracted_tds_data",
-                            "extracted_tds_data_norm",
-                            "tds_defaults",
-                            "tds_hydrate_pending",
-                            # old file uploader key (prior versions)
-                            "tds_file_picker",
-                            "category_select_prev",
-                            # Explicit keys for Add TDS widgets
-                            "tds_product_code",
-                            "tds_description",
-                            "tds_product_status",
-                            "tds_source_select",
-                            # Explicit input widget keys used in Add TDS
-                            "tds_generic_name",
-                            "tds_trade_name",
-                            "tds_supplier_name",
-                            "tds_packaging",
-                            "tds_net_weight",
-                            "tds_hs_code",
-                            "tds_tech_spec",
-                            # Selection keys
-                            "category_select",
-                        ]:
-                            st.session_state.pop(k, None)
-                        # Also clear dynamic type select key for the selected category if exists
-                        try:
-                            _cat = category or st.session_state.get("category_select_prev") or ""
-                            if _cat:
-                                _key_base = (_cat or 'none').replace(' ', '_').replace('&', 'and')
-                                st.session_state.pop(f"type_select_{_key_base}", None)
-                        except Exception:
-                            pass
-                        # Bump file-uploader token so Streamlit remounts the widget (clears selected file)
-                        try:
-                            st.session_state["tds_file_reset_token"] = str(uuid.uuid4())
-                        except Exception:
-                            pass
-                        # Explicitly reset key widget values back to placeholders/empty
-                        try:
-                            st.session_state["category_select"] = "— Select —"
-                        except Exception:
-                            pass
-                        try:
-                            st.session_state["tds_product_code"] = ""
-                            st.session_state["tds_description"] = ""
-                            st.session_state["tds_product_status"] = "— Select —"
-                            st.session_state["tds_source_select"] = "— Select —"
-                        except Exception:
-                            pass
-
-                        # Stay in Add tab with a fresh/empty form
-                        st.session_state["sourcing_section"] = "add"
-                    except Exception:
-                        pass
-                    st.rerun()
-                except Exception as e:
-                    st.error(f"Failed to save product: {e}")
-        
-        # Add clear session button if there are unsaved changes
-
-    st.markdown('</div>', unsafe_allow_html=True)
-
 # ==========================
 # Chemical Master Data: Helpers
 # ==========================
@@ -3190,7 +2646,9 @@ def create_chemical(ui_payload: dict):
     # Remove None id to let DB default generate
     if not type_rec.get("id"):
         type_rec.pop("id", None)
-    return supabase.table("chemical_types").insert(type_rec).execute()
+    res = supabase.table("chemical_types").insert(type_rec).execute()
+    invalidate_chemical_type_facets()
+    return res
 
 def update_chemical(chemical_id: str, updates: dict):
     # Merge strategy: update core columns when present; push everything into metadata as well
@@ -3207,10 +2665,15 @@ def update_chemical(chemical_id: str, updates: dict):
         curr_meta = {}
     new_meta = {**curr_meta, **ui_map.get("metadata", {})}
     type_updates["metadata"] = new_meta
-    return supabase.table("chemical_types").update(type_updates).eq("id", chemical_id).execute()
+    res = supabase.table("chemical_types").update(type_updates).eq("id", chemical_id).execute()
+    invalidate_chemical_type_facets()
+    record_version(chemical_id, updates)
+    return res
 
 def delete_chemical(chemical_id: str):
-    return supabase.table("chemical_types").delete().eq("id", chemical_id).execute()
+    res = supabase.table("chemical_types").delete().eq("id", chemical_id).execute()
+    invalidate_chemical_type_facets()
+    return res
 
 def analyze_chemical_with_ai(chemical_name: str) -> dict | None:
     if not gemini_model:
@@ -3401,19 +2864,21 @@ Required JSON schema keys (arrays can be empty):
   "data_completeness": number
 }}
 """
-                chat = groq_client.chat.completions.create(
-                    model="llama-3.1-70b-versatile",
-                    messages=[
-                        {"role": "system", "content": "You are a helpful assistant that outputs valid JSON only."},
-                        {"role": "user", "content": groq_schema_prompt},
-                    ],
-                    temperature=0.1,
-                    response_format={"type": "json_object"},
-                    max_tokens=1200,
-                )
-                raw = (chat.choices[0].message.content or "").strip()
+                def _generate_groq():
+                    chat = groq_client.chat.completions.create(
+                        model=GROQ_MODEL_NAME,
+                        messages=[
+                            {"role": "system", "content": "You are a helpful assistant that outputs valid JSON only."},
+                            {"role": "user", "content": groq_schema_prompt},
+                        ],
+                        temperature=0.1,
+                        response_format={"type": "json_object"},
+                        max_tokens=1200,
+                    )
+                    return (chat.choices[0].message.content or "").strip()
+
+                raw, groq_data = ai_cache.cached_generate("chemical_groq", GROQ_MODEL_NAME, name, _generate_groq, _parse_lenient_json)
                 if raw:
-                    groq_data = _parse_lenient_json(raw)
                     if groq_data and isinstance(groq_data, dict):
                         norm = _normalize(groq_data)
                         try:
@@ -3486,7 +2951,9 @@ Required JSON schema keys (arrays can be empty):
             except Exception:
                 return None
 
-        raw = _try_generate_text(prompt_primary)
+        raw, data = ai_cache.cached_generate(
+            "chemical_gemini", GEMINI_MODEL_NAME, name, lambda: _try_generate_text(prompt_primary), _parse_lenient_json
+        )
         if not raw:
             st.warning("⚠️ AI response was blocked or empty.")
             return None
@@ -3494,8 +2961,7 @@ Required JSON schema keys (arrays can be empty):
             st.session_state["chem_ai_last_raw"] = raw
         except Exception:
             pass
-        # Try full-text JSON, then embedded JSON object
-        data = _parse_lenient_json(raw)
+        # Try full-text JSON, then embedded JSON object (parsed by cached_generate)
         if not data or not isinstance(data, dict):
             # Strict retry: ask for JSON-only, same keys
             prompt_retry = f"""
@@ -3509,13 +2975,15 @@ IMPORTANT: Focus on extracting:
 Keys: ["generic_name","family","synonyms","cas_ids","hs_codes","functional_categories","industry_segments","key_applications","typical_dosage","appearance","physical_snapshot","compatibilities","incompatibilities","sensitivities","shelf_life_months","storage_conditions","packaging_options","summary_80_20","summary_technical","data_completeness"].
 Material: "{name}"
 """
-            raw_retry = _try_generate_text(prompt_retry)
+            raw_retry, data_retry = ai_cache.cached_generate(
+                "chemical_gemini_retry", GEMINI_MODEL_NAME, name, lambda: _try_generate_text(prompt_retry), _parse_lenient_json
+            )
             if raw_retry:
                 try:
                     st.session_state["chem_ai_last_raw"] = raw_retry
                 except Exception:
                     pass
-                data = _parse_lenient_json(raw_retry)
+                data = data_retry
             if not data or not isinstance(data, dict):
                 # Final fallback: parse key: value lines heuristically
                 def _kv_lines_to_dict(txt: str) -> Dict[str, Any]:
@@ -3586,17 +3054,19 @@ def fetch_products():
         st.error(f"Failed to fetch products: {e}")
         return []
 
-def fetch_tds_data():
-    """Fetch TDS data from tds_data table"""
+def fetch_tds_data(**filters):
+    """Fetch TDS data from tds_data table; ``filters`` (category, product_type, brand, owner) are applied in Postgres"""
     try:
-        res = supabase.table("tds_data").select("*").order("created_at", desc=True).execute()
-        return res.data or []
+        return query_tds(supabase, "*", **filters)
     except Exception as e:
         st.error(f"Failed to fetch TDS data: {e}")
         return []
 
 def update_product(product_id: str, updates: dict):
-    return supabase.table("chemical_types").update(updates).eq("id", product_id).execute()
+    res = supabase.table("chemical_types").update(updates).eq("id", product_id).execute()
+    invalidate_chemical_type_facets()
+    record_version(product_id, updates)
+    return res
 
 def name_exists_other(name: str, current_id: str) -> bool:
     res = supabase.table("chemical_types").select("id").eq("name", name.strip()).neq("id", current_id).limit(1).execute()
@@ -3604,3356 +3074,81 @@ def name_exists_other(name: str, current_id: str) -> bool:
 
 
 
-def build_version_entry(prod, updates):
-    from datetime import datetime
-    changed = {k: updates.get(k) for k in updates.keys()}
-    entry = {
-        "ts": datetime.utcnow().isoformat() + "Z",
-        "changed": changed
-    }
-    history = prod.get("version_history") or []
-    history.append(entry)
-    return history
-
-# UI - Manage Products
-if st.session_state.get("main_section") == "sourcing" and st.session_state.get("sourcing_section") == "manage" and has_sourcing_master_access(user_email):
-    st.markdown('<h1 style="color:#1976d2; font-weight:700;">Manage TDS</h1>', unsafe_allow_html=True)
-    st.markdown('<div class="form-card">', unsafe_allow_html=True)
-
-    # Authorization: only managers can access Manage tab
-    if not sb_user:
-        st.info("Please sign in to access Manage Products.")
-    elif not is_manager:
-        if not st.session_state.get("user_name"):
-            pass
-        st.error("You do not have permission to access Manage Products.")
-    else:
-        # Enhanced Filters
-        st.subheader("📊 Filter TDS Records")
-        colf1, colf2, colf3 = st.columns([2, 2, 2])
-        with colf1:
-            filter_category = st.selectbox("Filter by Category", ["All"] + FIXED_CATEGORIES)
-        with colf2:
-            # Brand Filter
-            all_brands = []
-            try:
-                res = supabase.table("tds_data").select("brand").execute()
-                all_brands = sorted(list(set([row.get("brand") for row in (res.data or []) if row.get("brand")])))
-            except Exception:
-                pass
-            filter_brand = st.selectbox("Filter by Brand", ["All"] + all_brands)
-        with colf3:
-            # Owner Filter
-            filter_owner = st.selectbox("Filter by Owner", ["All", "Supplier", "Customer", "Competitor"])
-
-        # Search filter
-        search = st.text_input("Search by product name/brand/supplier", placeholder="Start typing...")
-
-        tds_records = fetch_tds_data()
-        # Apply enhanced filters
-        filtered = []
-        for tds in tds_records:
-            metadata = tds.get("metadata", {})
-            # Category filter
-            if filter_category != "All" and metadata.get("category") != filter_category:
-                continue
-            # Brand filter
-            if filter_brand != "All" and tds.get("brand") != filter_brand:
-                continue
-            # Owner filter
-            if filter_owner != "All" and tds.get("owner") != filter_owner:
-                    continue
-            # (Source filter removed)
-            # Search filter
-            if search:
-                search_text = " ".join([
-                    metadata.get("product_name", ""),
-                    tds.get("brand", ""),
-                    metadata.get("supplier_name", ""),
-                    metadata.get("generic_product_name", "")
-                ]).lower()
-                if search.lower() not in search_text:
-                    continue
-            filtered.append(tds)
-
-        # Display filter summary
-        if filtered:
-            st.success(f"📋 Found {len(filtered)} TDS records matching your filters")
-        else:
-            st.info("No TDS records match the current filters.")
+def build_version_entry(updates: dict) -> dict:
+    """The ``changed`` payload of a chemical_type_versions row: the fields an edit wrote."""
+    return {k: updates.get(k) for k in updates.keys()}
 
-        if not filtered:
-            st.info("No TDS records match the current filters.")
-        else:
-            # Group by category then brand
-            by_cat = {}
-            for tds in filtered:
-                metadata = tds.get("metadata", {})
-                category = metadata.get("category", "Unknown")
-                brand = tds.get("brand", "Unknown")
-                by_cat.setdefault(category, {}).setdefault(brand, []).append(tds)
-
-            for cat, brands in by_cat.items():
-                with st.expander(f"📁 {cat}", expanded=False):
-                    for brand, items in brands.items():
-                        for tds in items:
-                            tid = tds["id"]
-                            metadata = tds.get("metadata", {})
-                            cols = st.columns([3, 2, 2, 2])
-                            with cols[0]:
-                                _ptype = metadata.get('product_type', '') or 'N/A'
-                                _brand = tds.get('brand', '') or 'N/A'
-                                st.markdown(f"**{_ptype} — {_brand}**")
-                                st.caption(f"Product: {metadata.get('product_name', 'Unknown Product')}")
-                                st.caption(f"Generic: {metadata.get('generic_product_name', 'N/A')}")
-                                st.caption(f"Supplier: {metadata.get('supplier_name', 'N/A')}")
-                            with cols[1]:
-                                st.write(f"Owner: {tds.get('owner', 'N/A')}")
-                                st.write(f"Source: {tds.get('source', 'N/A')}")
-                            with cols[2]:
-                                tds_url = metadata.get("tds_file_url")
-                                if tds_url:
-                                    st.markdown(f"[📄 Download TDS]({tds_url})")
-                                else:
-                                    st.write("No TDS file")
-                            with cols[3]:
-                                if st.button("✏️ Edit", key=f"edit_{tid}"):
-                                    st.session_state[f"editing_{tid}"] = True
-
-                            if st.session_state.get(f"editing_{tid}"):
-                                # Use a refresh token to force expander identity change and collapse after save/cancel
-                                _tds_refresh_token = st.session_state.get("tds_manage_refresh_token", "")
-                                try:
-                                    _nzw_t = ((sum(ord(ch) for ch in _tds_refresh_token) % 5) + 1) if _tds_refresh_token else 0
-                                except Exception:
-                                    _nzw_t = 0
-                                _zw_sfx_t = "\u200B" * _nzw_t if _nzw_t else ""
-                                with st.expander(f"Edit: {metadata.get('product_name', 'Unknown Product')}{_zw_sfx_t}", expanded=False):
-                                    # Editable fields for TDS data
-                                    ename = st.text_input("Product Name", value=metadata.get("product_name", ""), key=f"n_{tid}")
-                                    ecat = st.selectbox("Category", FIXED_CATEGORIES, index=FIXED_CATEGORIES.index(metadata.get("category", "Others")), key=f"c_{tid}")
-                                    etype = st.text_input("Product Type", value=metadata.get("product_type", ""), key=f"t_{tid}")
-                                    ebrand = st.text_input("Brand", value=tds.get("brand", ""), key=f"b_{tid}")
-                                    egrade = st.text_input("Grade", value=tds.get("grade", ""), key=f"g_{tid}")
-                                    eowner = st.selectbox("Owner", ["Supplier", "Customer", "Competitor"], index=["Supplier", "Customer", "Competitor"].index(tds.get("owner", "Supplier")), key=f"o_{tid}")
-                                    esource = st.text_input("Source", value=tds.get("source", ""), key=f"s_{tid}")
-                                    egenname = st.text_input("Generic Product Name", value=metadata.get("generic_product_name", ""), key=f"gn_{tid}")
-                                    etradename = st.text_input("Trade Name", value=metadata.get("trade_name", ""), key=f"tn_{tid}")
-                                    esupplier = st.text_input("Supplier Name", value=metadata.get("supplier_name", ""), key=f"sn_{tid}")
-                                    epackaging = st.text_input("Packaging Size & Type", value=metadata.get("packaging_size_type", ""), key=f"p_{tid}")
-                                    _specs_src = tds.get("specs") or {}
-                                    _net_w_fallback = metadata.get("net_weight") or _specs_src.get("net_weight") or ""
-                                    _tech_fallback = (
-                                        metadata.get("technical_spec")
-                                        or _specs_src.get("technical_specification")
-                                        or _specs_src.get("technical_spec")
-                                        or ""
-                                    )
-                                    enetweight = st.text_input("Net Weight", value=_net_w_fallback, key=f"nw_{tid}")
-                                    etspec = st.text_area("Technical Specification", value=_tech_fallback, key=f"ts_{tid}")
-                                    edesc = st.text_area("Description", value=metadata.get("description", ""), key=f"desc_{tid}")
-                                    
-                                    # LeanChems Product Status
-                                    eleanchems = st.selectbox(
-                                        "Is it Leanchems legacy/existing/coming product?",
-                                        ["Yes", "No"],
-                                        index=0 if metadata.get("is_leanchems_product") == "Yes" else 1,
-                                        key=f"leanchems_{tid}"
-                                    )
-                                    
-                                    # Supporting Documents section (upload, list, delete)
-                                    st.markdown("---")
-                                    st.subheader("📎 Supporting Documents")
-                                    st.info("Upload any related files (e.g., brochures, test reports). Stored under this TDS record.")
-                                    supporting_files = metadata.get("supporting_files", [])
-                                    if supporting_files:
-                                        st.write("**Current Supporting Files:**")
-                                        sel_indices = st.multiselect(
-                                            "Select files to delete",
-                                            options=list(range(len(supporting_files))),
-                                            format_func=lambda i: supporting_files[i].get('name', f'File {i+1}') if i is not None else "",
-                                            key=f"supp_del_sel_{tid}"
-                                        )
-                                        for i, fobj in enumerate(supporting_files):
-                                            col_s1, col_s2, col_s3 = st.columns([4,1,1])
-                                            with col_s1:
-                                                name = fobj.get('name', 'Unknown file')
-                                                url = fobj.get('url')
-                                                if url:
-                                                    st.markdown(f"[📄 {name}]({url})")
-                                                else:
-                                                    st.write(f"📄 {name}")
-                                            with col_s2:
-                                                st.write(f"{(fobj.get('size') or 0) / 1024:.1f} KB")
-                                            with col_s3:
-                                                st.caption(fobj.get('type', '').upper())
-                                        if st.button("🗑️ Delete selected", key=f"del_supp_{tid}"):
-                                            try:
-                                                remaining = []
-                                                for i, f in enumerate(supporting_files):
-                                                    if i in sel_indices:
-                                                        _delete_storage_object_by_url(f.get('url') or '')
-                                                    else:
-                                                        remaining.append(f)
-                                                updated_meta = metadata.copy()
-                                                updated_meta["supporting_files"] = remaining
-                                                supabase.table("tds_data").update({"metadata": updated_meta}).eq("id", tid).execute()
-                                                st.success("Selected supporting files deleted")
-                                                st.rerun()
-                                            except Exception as e:
-                                                st.error(f"Failed to delete files: {e}")
-                                    
-                                    new_supporting = st.file_uploader(
-                                        "Upload Supporting Files",
-                                        type=ALLOWED_FILE_EXTS, 
-                                        accept_multiple_files=True,
-                                        key=f"supp_up_{tid}"
-                                    )
-
-                                    # Actions
-                                    ac1, ac2 = st.columns(2)
-                                    with ac1:
-                                        if st.button("💾 Save", key=f"save_{tid}"):
-                                            # Validations
-                                            n_ok, n_msg = validate_product_name(ename)
-                                            if not n_ok:
-                                                st.error(n_msg)
-                                            elif name_exists_other(ename, tds.get("chemical_type_id") or ""):
-                                                st.error("Another product already uses this name")
-                                            else:
-                                                # Build updates
-                                                def _strip_or_empty(v: str | None) -> str:
-                                                    try:
-                                                        return (v or "").strip()
-                                                    except Exception:
-                                                        return ""
-                                                def _strip_or_none(v: str | None):
-                                                    s = _strip_or_empty(v)
-                                                    return s if s else None
-                                                updates = {
-                                                    "name": _strip_or_empty(ename),
-                                                    "category": ecat,
-                                                    "description": _strip_or_none(edesc),
-                                                    "is_leanchems_product": eleanchems,
-                                                }
-
-                                                # Upload supporting files
-                                                if new_supporting:
-                                                    supp_files = metadata.get("supporting_files", []).copy()
-                                                    for uploaded_file in new_supporting:
-                                                        okf, msgf = validate_file(uploaded_file)
-                                                        if not okf:
-                                                            st.error(f"File {uploaded_file.name}: {msgf}")
-                                                            continue
-                                                        try:
-                                                            url, fname, fsize, ftype = upload_supporting_doc(uploaded_file, tid)
-                                                            supp_files.append({
-                                                                "url": url,
-                                                                "name": fname,
-                                                                "size": fsize,
-                                                                "type": ftype,
-                                                                "uploaded_at": datetime.utcnow().isoformat() + "Z"
-                                                            })
-                                                        except Exception as e:
-                                                            st.error(f"Failed to upload {uploaded_file.name}: {e}")
-                                                    updates["supporting_files"] = supp_files
-
-                                                # Update TDS data
-                                                try:
-                                                    # Update metadata
-                                                    updated_metadata = metadata.copy()
-                                                    updated_metadata.update({
-                                                        "product_name": _strip_or_empty(ename),
-                                                        "category": ecat,
-                                                        "product_type": _strip_or_empty(etype),
-                                                        "generic_product_name": _strip_or_none(egenname),
-                                                        "trade_name": _strip_or_none(etradename),
-                                                        "supplier_name": _strip_or_none(esupplier),
-                                                        "packaging_size_type": _strip_or_none(epackaging),
-                                                        "net_weight": _strip_or_none(enetweight),
-                                                        "technical_spec": _strip_or_none(etspec),
-                                                        "description": _strip_or_none(edesc),
-                                                        "is_leanchems_product": eleanchems,
-                                                    })
-                                                    # Bring through file-related updates into metadata for consistency
-                                                    if "supporting_files" in updates:
-                                                        updated_metadata["supporting_files"] = updates["supporting_files"]
-                                                    for _k in ["tds_file_url","tds_file_name","tds_file_size","tds_file_type"]:
-                                                        if _k in updates:
-                                                            updated_metadata[_k] = updates[_k]
-                                                    
-                                                    # Update TDS record
-                                                    tds_updates = {
-                                                        "brand": _strip_or_none(ebrand),
-                                                        "grade": _strip_or_none(egrade),
-                                                        "owner": eowner,
-                                                        "source": _strip_or_none(esource),
-                                                        "metadata": updated_metadata
-                                                    }
-                                                    
-                                                    supabase.table("tds_data").update(tds_updates).eq("id", tid).execute()
-                                                    st.success("✅ TDS record updated")
-                                                    st.session_state.pop(f"editing_{tid}", None)
-                                                    # Bump token so the expander resets on rerun
-                                                    st.session_state["tds_manage_refresh_token"] = str(uuid.uuid4())
-                                                    st.rerun()
-                                                except Exception as e:
-                                                    st.error(f"Failed to update: {e}")
-
-                                    with ac2:
-                                        if st.button("❌ Cancel", key=f"cancel_{tid}"):
-                                            st.session_state.pop(f"editing_{tid}", None)
-                                            st.session_state["tds_manage_refresh_token"] = str(uuid.uuid4())
+def record_version(type_id: str, updates: dict):
+    """Append an edit to chemical_type_versions. History is best-effort: a failure here
+    (e.g. before the migration) never fails the edit itself."""
+    try:
+        user = st.session_state.get("sb_user") or {}
+        record_chemical_type_version(
+            supabase, type_id, build_version_entry(updates),
+            changed_by=user.get("email") or st.session_state.get("user_email"),
+        )
+    except Exception:
+        pass
 
-    st.markdown('</div>', unsafe_allow_html=True)
 
-# UI - View TDS
-if st.session_state.get("main_section") == "sourcing" and st.session_state.get("sourcing_section") == "view" and has_sourcing_master_access(user_email):
-    st.markdown('<h1 style="color:#1976d2; font-weight:700;">View TDS</h1>', unsafe_allow_html=True)
-    st.markdown('<div class="form-card">', unsafe_allow_html=True)
-
-    # Filters (Category, Brand, Owner, Source, Search)
-    st.subheader("📊 Filter TDS Records")
-    colf1, colf2, colf3 = st.columns([2, 2, 2])
-    with colf1:
-        filter_category_v = st.selectbox("Filter by Category", ["All"] + FIXED_CATEGORIES, key="view_filter_category")
-    with colf2:
-        all_product_types_v = []
+def render_export(key: str, file_stem: str, columns: list[str], rows, sheet_title: str = "Export"):
+    """
+    Export controls: a CSV/Excel choice and an Export button. ``rows`` is a zero-argument
+    callable returning an iterable of row dicts (e.g. a table_export.iter_table pipeline);
+    it is only called when the user clicks Export, and the rows are streamed into the file.
+    """
+    col_fmt, col_btn = st.columns([1, 1])
+    with col_fmt:
+        fmt = st.radio("Format", ["csv", "xlsx"], format_func=lambda f: "CSV" if f == "csv" else "Excel",
+                       horizontal=True, key=f"{key}_format", label_visibility="collapsed")
+    with col_btn:
+        clicked = st.button("📊 Export", type="secondary", key=key)
+    if clicked:
         try:
-            _res_v = supabase.table("tds_data").select("metadata").execute()
-            for row in (_res_v.data or []):
-                metadata = row.get("metadata", {})
-                product_type = metadata.get("product_type")
-                if product_type:
-                    all_product_types_v.append(product_type)
-            all_product_types_v = sorted(list(set(all_product_types_v)))
-        except Exception:
-            pass
-        filter_product_type_v = st.selectbox("Filter by Product Type", ["All"] + all_product_types_v, key="view_filter_product_type")
-    with colf3:
-        filter_owner_v = st.selectbox("Filter by Owner", ["All", "Supplier", "Customer", "Competitor"], key="view_filter_owner")
-
-    search_view = st.text_input("Search by product name/brand/supplier", placeholder="Start typing...", key="view_filter_search")
-
-    # Fetch TDS records and apply filters
-    try:
-        tds_records = supabase.table("tds_data").select("*").execute()
-        all_tds = tds_records.data or []
-    except Exception as e:
-        st.error(f"Failed to fetch TDS records: {e}")
-        all_tds = []
-
-    filtered_tds = []
-    for tds in all_tds:
-        metadata = tds.get("metadata", {})
-        if filter_category_v != "All" and metadata.get("category") != filter_category_v:
-            continue
-        if filter_product_type_v != "All" and metadata.get("product_type") != filter_product_type_v:
-            continue
-        if filter_owner_v != "All" and tds.get("owner") != filter_owner_v:
-            continue
-        # (Source filter removed)
-        if search_view:
-            search_text = " ".join([
-                metadata.get("product_name", ""),
-                tds.get("brand", ""),
-                metadata.get("supplier_name", ""),
-                metadata.get("generic_product_name", "")
-            ]).lower()
-            if search_view.lower() not in search_text:
-                continue
-        filtered_tds.append(tds)
+            with st.spinner("Preparing export..."):
+                out, count = table_export.export_file(rows(), columns, fmt, sheet_title=sheet_title)
+                with out:
+                    data = out.read()
+            st.download_button(
+                label=f"💾 Download {'CSV' if fmt == 'csv' else 'Excel'} ({count} rows)",
+                data=data,
+                file_name=f"{file_stem}_{datetime.utcnow().strftime('%Y%m%d')}.{fmt}",
+                mime=table_export.FORMATS[fmt],
+                key=f"{key}_download",
+            )
+        except Exception as e:
+            st.error(f"Export failed: {e}")
 
-    if not filtered_tds:
-        st.info("📭 No TDS records found with current filters.")
-        st.markdown("💡 Adjust filters or add new TDS records in the Add tab.")
-    else:
-        # Group by product type
-        by_product_type = {}
-        for tds in filtered_tds:
-            metadata = tds.get("metadata", {})
-            product_type = metadata.get("product_type", "Unknown")
-            by_product_type.setdefault(product_type, []).append(tds)
-
-        # Export button
-        col_export1, col_export2 = st.columns([1, 3])
-        with col_export1:
-            if st.button("📊 Export CSV", type="secondary", key="export_csv_view_tds"):
-                try:
-                    import pandas as pd
-                    # Prepare data for export
-                    export_data = []
-                    for tds in filtered_tds:
-                        metadata = tds.get("metadata", {})
-                        export_data.append({
-                            "Product Name": metadata.get("product_name", ""),
-                            "Generic Name": metadata.get("generic_product_name", ""),
-                            "Trade Name": metadata.get("trade_name", ""),
-                            "Brand": tds.get("brand", ""),
-                            "Grade": tds.get("grade", ""),
-                            "Supplier": metadata.get("supplier_name", ""),
-                            "Owner": tds.get("owner", ""),
-                            "Source": tds.get("source", ""),
-                            "Category": metadata.get("category", ""),
-                            "TDS File": metadata.get("tds_file_name", "No TDS"),
-                            "Leanchems Product": metadata.get("is_leanchems_product", "No"),
-                            "Created": tds.get("created_at", "")
-                        })
-                    
-                    df = pd.DataFrame(export_data)
-                    csv = df.to_csv(index=False)
-                    st.download_button(
-                        label="💾 Download CSV",
-                        data=csv,
-                        file_name=f"tds_records_{pd.Timestamp.now().strftime('%Y%m%d')}.csv",
-                        mime="text/csv"
-                    )
-                except Exception as e:
-                    st.error(f"Export failed: {e}")
-
-        st.markdown(f"**Found {len(filtered_tds)} TDS records**")
-
-        # Display TDS records grouped by product type
-        for product_type, tds_list in by_product_type.items():
-            with st.expander(f"🏷️ {product_type} ({len(tds_list)} records)", expanded=False):
-                for tds in tds_list:
-                    tid = tds["id"]
-                    metadata = tds.get("metadata", {})
-                    
-                    # TDS record card
-                    with st.container():
-                        st.markdown("---")
-                        
-                        # Main info row
-                        col1, col2, col3 = st.columns([3, 2, 1])
-                        with col1:
-                            _ptype = metadata.get('product_type', '') or 'N/A'
-                            _brand = tds.get('brand', '') or 'N/A'
-                            st.markdown(f"**{_ptype} — {_brand}**")
-                            st.caption(f"Product: {metadata.get('product_name', 'Unknown Product')}")
-                            st.caption(f"Generic: {metadata.get('generic_product_name', 'N/A')}")
-                            # Show LeanChems status
-                            leanchems_status = metadata.get("is_leanchems_product", "No")
-                            if leanchems_status == "Yes":
-                                st.caption("🏢 Leanchems Product")
-                        
-                        with col2:
-                            # TDS status and download
-                            tds_url = metadata.get("tds_file_url")
-                            if tds_url:
-                                st.markdown("📄 **TDS:** Available")
-                                st.markdown(f"[Download TDS]({tds_url})")
-                                st.caption(f"File: {metadata.get('tds_file_name', 'Unknown')}")
-                            else:
-                                st.markdown("📄 **TDS:** Not available")
-                        
-                        with col3:
-                            if st.button("👁️ View Details", key=f"view_{tid}"):
-                                st.session_state[f"viewing_{tid}"] = True
-
-                        # View Details Modal
-                        if st.session_state.get(f"viewing_{tid}"):
-                            with st.expander(f"📋 Full Details: {metadata.get('product_name', 'Unknown Product')}", expanded=False):
-                                st.markdown("**Product Information**")
-                                st.write(f"**Product Name:** {metadata.get('product_name', 'N/A')}")
-                                st.write(f"**Generic Product Name:** {metadata.get('generic_product_name', 'N/A')}")
-                                st.write(f"**Trade Name:** {metadata.get('trade_name', 'N/A')}")
-                                st.write(f"**Category:** {metadata.get('category', 'N/A')}")
-                                st.write(f"**Product Type:** {metadata.get('product_type', 'N/A')}")
-                                
-                                st.markdown("**Supplier Information**")
-                                st.write(f"**Supplier Name:** {metadata.get('supplier_name', 'N/A')}")
-                                st.write(f"**Brand:** {tds.get('brand', 'N/A')}")
-                                st.write(f"**Grade:** {tds.get('grade', 'N/A')}")
-                                st.write(f"**Owner:** {tds.get('owner', 'N/A')}")
-                                st.write(f"**Source:** {tds.get('source', 'N/A')}")
-                                
-                                st.markdown("**Packaging & Specifications**")
-                                _specs_src = tds.get("specs") or {}
-                                _net_w = metadata.get('net_weight') or _specs_src.get('net_weight') or 'N/A'
-                                st.write(f"**Packaging Size & Type:** {metadata.get('packaging_size_type', 'N/A')}")
-                                st.write(f"**Net Weight:** {_net_w}")
-                                
-                                # Technical Specification (render as normal text to keep consistent font)
-                                tech_spec = metadata.get("technical_spec") or _specs_src.get("technical_specification") or _specs_src.get("technical_spec")
-                                if tech_spec:
-                                    st.markdown("**Technical Specification:**")
-                                    st.text(tech_spec)
-                                
-                                # TDS Information
-                                st.markdown("**Technical Data Sheet**")
-                                tds_url = metadata.get("tds_file_url")
-                                if tds_url:
-                                    col_tds1, col_tds2 = st.columns(2)
-                                    with col_tds1:
-                                        st.write(f"**TDS File:** {metadata.get('tds_file_name', 'Unknown')}")
-                                        st.write(f"**Size:** {metadata.get('tds_file_size', 0) / 1024:.1f} KB")
-                                    with col_tds2:
-                                        st.write(f"**Type:** {metadata.get('tds_file_type', 'Unknown')}")
-                                        st.markdown(f"[📥 Download TDS]({tds_url})")
-                                else:
-                                    st.write("No TDS file uploaded")
-                                
-                                # Close button
-                                if st.button("❌ Close Details", key=f"close_{tid}"):
-                                    st.session_state.pop(f"viewing_{tid}", None)
+# Export pages are read with the underlying client: they are read once and would only
+# crowd the shared query cache (pms_repository.py).
+def export_rows(table: str, columns: str = "*", **kwargs):
+    return table_export.iter_table(supabase.client, table, columns, **kwargs)
 
-    st.markdown('</div>', unsafe_allow_html=True)
 
 # ==========================
-# UI - Chemical Master Data
+# Module pages
 # ==========================
-if st.session_state.get("main_section") == "chemical" and has_chemical_master_access(user_email):
-    st.markdown('<h1 style="color:#1976d2; font-weight:700;">Chemical Master Data</h1>', unsafe_allow_html=True)
-    st.markdown('<div class="form-card">', unsafe_allow_html=True)
+# Each module's UI lives in sections/<module>.py and only the active module is loaded and
+# run. Pages execute in this script's namespace, so they see the helpers and state above
+# exactly as when they were inline. Compiled once per file version, shared by all sessions.
+SECTION_PAGES = {
+    "chemical": "chemical.py",
+    "sourcing": "sourcing.py",
+    "partner_master": "partner_master.py",
+    "pricing": "pricing.py",
+    "leanchem": "leanchem.py",
+    "market": "market.py",
+}
+SECTIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sections")
 
-    # Track current chemical tab to detect tab switches
-    if "chemical_current_tab" not in st.session_state:
-        st.session_state["chemical_current_tab"] = "Add Chemical"
-    
-    # Create custom tab navigation with proper change detection
-    tab_col1, tab_col2, tab_col3 = st.columns(3)
-    
-    with tab_col1:
-        if st.button("Add Chemical", key="chem_tab_add", type="primary" if st.session_state.get("chemical_current_tab") == "Add Chemical" else "secondary", use_container_width=True):
-            previous_tab = st.session_state.get("chemical_current_tab")
-            if previous_tab and previous_tab != "Add Chemical" and _has_unsaved_chemical_changes():
-                st.session_state["pending_chemical_tab"] = "Add Chemical"
-                st.rerun()
-            else:
-                st.session_state["chemical_current_tab"] = "Add Chemical"
-                st.rerun()
-    
-    with tab_col2:
-        if st.button("Manage Chemicals", key="chem_tab_manage", type="primary" if st.session_state.get("chemical_current_tab") == "Manage Chemicals" else "secondary", use_container_width=True):
-            previous_tab = st.session_state.get("chemical_current_tab")
-            if previous_tab and previous_tab != "Manage Chemicals" and _has_unsaved_chemical_changes():
-                st.session_state["pending_chemical_tab"] = "Manage Chemicals"
-                st.rerun()
-            else:
-                st.session_state["chemical_current_tab"] = "Manage Chemicals"
-                st.rerun()
-    
-    with tab_col3:
-        if st.button("View Chemicals", key="chem_tab_view", type="primary" if st.session_state.get("chemical_current_tab") == "View Chemicals" else "secondary", use_container_width=True):
-            previous_tab = st.session_state.get("chemical_current_tab")
-            if previous_tab and previous_tab != "View Chemicals" and _has_unsaved_chemical_changes():
-                st.session_state["pending_chemical_tab"] = "View Chemicals"
-                st.rerun()
-            else:
-                st.session_state["chemical_current_tab"] = "View Chemicals"
-                st.rerun()
-    
-    # Handle pending tab changes with confirmation dialog
-    if st.session_state.get("pending_chemical_tab"):
-        new_tab = st.session_state.get("pending_chemical_tab")
-        previous_tab = st.session_state.get("chemical_current_tab")
-        
-        if previous_tab == "Add Chemical":
-            st.warning("⚠️ You have unsaved changes in the Add Chemical tab.")
-            col1, col2, col3 = st.columns([1, 1, 2])
-            with col1:
-                if st.button("🗑️ Discard & Continue", key="discard_chem_add", type="primary"):
-                    _clear_chemical_editing_session()
-                    st.session_state["chemical_current_tab"] = new_tab
-                    st.session_state.pop("pending_chemical_tab")
-                    st.rerun()
-            with col2:
-                if st.button("❌ Cancel", key="cancel_chem_add"):
-                    st.session_state.pop("pending_chemical_tab")
-                    st.rerun()
-            with col3:
-                st.caption("Your unsaved changes will be lost if you continue.")
-            st.stop()
-        elif previous_tab == "Manage Chemicals":
-            st.warning("⚠️ You have unsaved changes in the Manage Chemicals tab.")
-            col1, col2, col3 = st.columns([1, 1, 2])
-            with col1:
-                if st.button("🗑️ Discard & Continue", key="discard_chem_manage", type="primary"):
-                    _clear_chemical_editing_session()
-                    st.session_state["chemical_current_tab"] = new_tab
-                    st.session_state.pop("pending_chemical_tab")
-                    st.rerun()
-            with col2:
-                if st.button("❌ Cancel", key="cancel_chem_manage"):
-                    st.session_state.pop("pending_chemical_tab")
-                    st.rerun()
-            with col3:
-                st.caption("Your unsaved changes will be lost if you continue.")
-            st.stop()
-    
-    # Get current tab for rendering
-    current_tab = st.session_state.get("chemical_current_tab", "Add Chemical")
-
-    # -------- Add Chemical --------
-    if current_tab == "Add Chemical":
-        st.subheader("Add Chemical")
-        if gemini_model:
-            st.caption("Type a chemical name and press Enter to analyze with AI and check duplicates.")
-        else:
-            st.caption("Type a chemical name and press Enter to check duplicates. AI analysis is not available.")
+@st.cache_resource(show_spinner=False, max_entries=len(SECTION_PAGES) * 2)
+def _compile_section(path: str, mtime_ns: int):
+    with open(path, encoding="utf-8") as f:
+        return compile(f.read(), path, "exec")
 
-        # Mapping selects at the top (before Type Chemical Name)
-        st.markdown("---")
-        st.caption("Select Category and Product Type from mapping")
-        _chem_cat_placeholder = "— Select —"
-        try:
-            _chem_cat_options = [_chem_cat_placeholder] + get_all_categories()
-        except Exception:
-            _chem_cat_options = [_chem_cat_placeholder] + FIXED_CATEGORIES
-        st.markdown("**Category**")
-        # Apply any pending selection before the widget is created to avoid Streamlit key mutation errors
-        try:
-            _pending_sel = st.session_state.get("chem_seg_select_pending")
-            if _pending_sel and _pending_sel in _chem_cat_options:
-                st.session_state["chem_seg_select"] = _pending_sel
-                st.session_state.pop("chem_seg_select_pending", None)
-        except Exception:
-            pass
-        _chem_cat_sel = st.selectbox(
-            "Category",
-            options=_chem_cat_options,
-            key="chem_seg_select",
-            label_visibility="collapsed"
-        )
-        selected_segment = "" if _chem_cat_sel == _chem_cat_placeholder else _chem_cat_sel
-        add_new_seg = st.checkbox("Add new category", key="chem_add_new_seg")
-        if add_new_seg:
-            new_seg = st.text_input("New Category Name", key="chem_new_seg")
-            # Save immediately when user presses the save button; keep selection synced
-            col_nc1, col_nc2 = st.columns([1,3])
-            with col_nc1:
-                if st.button("Save Category", key="chem_save_new_category", type="secondary"):
-                    if not (new_seg or "").strip():
-                        st.warning("Enter a category name first")
-                    else:
-                        saved = save_category_if_possible(new_seg)
-                        if saved:
-                            st.success("Category saved")
-                            try:
-                                get_all_categories.clear()
-                            except Exception:
-                                pass
-                            # Defer selection to next run before widget instantiation
-                            st.session_state["chem_seg_select_pending"] = new_seg.strip()
-                            st.rerun()
-                        else:
-                            st.info("Saved locally. It will appear after first record uses it.")
-            with col_nc2:
-                st.caption("Type a new category then click Save Category")
-            if new_seg:
-                selected_segment = new_seg.strip()
-
-        # Persist selections for save logic (no direct widget key to avoid conflicts)
-        st.session_state["chem_selected_category"] = selected_segment
-        st.markdown(f"**Selected Category:** {selected_segment or '-'}")
-
-        with st.form("chem_add_form", clear_on_submit=False):
-            st.markdown("**Type Chemical Name**")
-            chem_name_input = st.text_input("Type Chemical Name:", placeholder="e.g., Redispersible Polymer Powder", label_visibility="collapsed")
-            if gemini_model:
-                analyze_submit = st.form_submit_button("Analyze & Prefill")
-            else:
-                analyze_submit = st.form_submit_button("Check Duplicates")
-
-        # Always get the latest extracted data from session state
-        extracted = st.session_state.get("chem_ai_extracted", {})
-
-        # Trigger analysis when Enter pressed (form submitted)
-        if analyze_submit:
-            # Duplicate suggestions
-            duplicates = search_chemicals_by_name(chem_name_input)
-            if duplicates:
-                st.warning(f"Found {len(duplicates)} possible duplicates:")
-                for d in duplicates[:5]:
-                    dup_name = d.get("generic_name") or "(unnamed)"
-                    dup_seg = ", ".join(d.get("industry_segments") or [])
-                    dup_cat = ", ".join(d.get("functional_categories") or [])
-                    st.write(f"• {dup_name} — {dup_seg} | {dup_cat}")
-
-            # AI extraction
-            if gemini_model:
-                with st.spinner("Analyzing chemical with AI..."):
-                    ai_data = analyze_chemical_with_ai(chem_name_input)
-                    if ai_data:
-                        st.session_state["chem_ai_extracted"] = ai_data
-                        extracted = ai_data
-                        st.success("AI extraction completed.")
-                        st.rerun()  # Refresh the form to show prefilled data
-                    else:
-                        st.error("AI extraction failed or not configured.")
-            else:
-                st.info("AI analysis is not available. You can still manually fill in the fields below.")
-
-        # Helpers
-        def csv_default(val):
-            return ", ".join(val) if isinstance(val, list) else (val or "")
-        def parse_csv_list(text_val: str) -> list[str]:
-            return [s.strip() for s in (text_val or "").split(",") if s.strip()]
-        def parse_json_list(text_val: str):
-            try:
-                import json
-                data = json.loads(text_val)
-                return data if isinstance(data, list) else []
-            except Exception:
-                return []
-        # Accept either a JSON array or one-JSON-object-per-line without brackets
-        def parse_json_lines_or_array(text_val: str):
-            try:
-                import json as _json_p
-                txt = (text_val or "").strip()
-                if not txt:
-                    return []
-                # Try array first
-                try:
-                    arr = _json_p.loads(txt)
-                    if isinstance(arr, list):
-                        return arr
-                    if isinstance(arr, dict):
-                        return [arr]
-                except Exception:
-                    pass
-                # Fallback: parse one JSON object per non-empty line
-                items = []
-                for line in txt.splitlines():
-                    line = line.strip()
-                    if not line:
-                        continue
-                    try:
-                        obj = _json_p.loads(line)
-                        if isinstance(obj, dict):
-                            items.append(obj)
-                    except Exception:
-                        # ignore unparsable lines
-                        continue
-                return items
-            except Exception:
-                return []
-
-        # Helper to show AI suggestion text under each control
-        import json as _json_for_ai_view
-        def _ai_view(value):
-            if value is None:
-                return ""
-            if isinstance(value, (list, dict)):
-                try:
-                    return _json_for_ai_view.dumps(value, ensure_ascii=False)
-                except Exception:
-                    return str(value)
-            return str(value)
-        # Render list of objects as newline-delimited JSON objects (no square brackets)
-        def _ai_list_as_lines(value):
-            try:
-                if isinstance(value, list):
-                    # Render list of dicts as human-readable key: value pairs per line
-                    rendered_lines = []
-                    for item in value:
-                        if isinstance(item, dict):
-                            parts = []
-                            for k, v in item.items():
-                                if v is None:
-                                    continue
-                                parts.append(f"{k}: {v}")
-                            rendered_lines.append(", ".join(parts) if parts else _json_for_ai_view.dumps(item, ensure_ascii=False)
-                            )
-                        else:
-                            rendered_lines.append(str(item))
-                    return "\n".join(rendered_lines)
-                return _ai_view(value)
-            except Exception:
-                return _ai_view(value)
-
-        # Parse relaxed human-readable "key: value, key: value" lines into list of dicts
-        def _parse_kv_lines(text_val: str):
-            items = []
-            try:
-                txt = (text_val or "").strip()
-                if not txt:
-                    return []
-                for line in txt.splitlines():
-                    line = line.strip()
-                    if not line:
-                        continue
-                    entry = {}
-                    for pair in [p for p in line.split(",") if p.strip()]:
-                        if ":" in pair:
-                            k, v = pair.split(":", 1)
-                            k = k.strip()
-                            v = v.strip()
-                            if k:
-                                entry[k] = v
-                    if entry:
-                        items.append(entry)
-                return items
-            except Exception:
-                return items
-
-        # Prefilled editable fields (reordered to requested sequence)
-        # 1) Summary 80/20
-        st.markdown("**Summary 80/20 (5–7 bullets)**")
-        chem_sum_8020 = st.text_area("Summary 80/20 (5–7 bullets)", value=extracted.get("summary_80_20", ""), height=80, label_visibility="collapsed")
-        # 2) Synonyms
-        st.markdown("**Synonyms (comma-separated)**")
-        chem_syn = st.text_input("Synonyms (comma-separated)", value=csv_default(extracted.get("synonyms", [])), label_visibility="collapsed")
-        # 3) Family
-        st.markdown("**Family**")
-        chem_family = st.text_input("Family", value=extracted.get("family", ""), label_visibility="collapsed")
-        # 4) Generic Name
-        st.markdown("**Generic Name**")
-        chem_gen = st.text_input("Generic Name", value=extracted.get("generic_name", ""), label_visibility="collapsed")
-        # 5) HS Codes (code only)
-        def _hs_codes_as_csv():
-            try:
-                items = extracted.get("hs_codes") if extracted else []
-                codes = []
-                for it in items or []:
-                    if isinstance(it, dict) and it.get("code"):
-                        codes.append(str(it.get("code")))
-                return ", ".join(codes)
-            except Exception:
-                return ""
-        st.markdown("**HS Codes**")
-        chem_hs_codes = st.text_input("HS Codes", value=_hs_codes_as_csv(), label_visibility="collapsed")
-        # 6) CAS IDs
-        st.markdown("**CAS IDs**")
-        chem_cas = st.text_input("CAS IDs", value=csv_default(extracted.get("cas_ids", [])), label_visibility="collapsed")
-        # 7) Summary Technical
-        st.markdown("**Summary Technical**")
-        chem_sum_tech = st.text_area("Summary Technical", value=extracted.get("summary_technical", ""), height=100, label_visibility="collapsed")
-        # 8) Functional Categories
-        st.markdown("**Functional Categories**")
-        chem_func = st.text_input("Functional Categories", value=csv_default(extracted.get("functional_categories", [])), label_visibility="collapsed")
-        # 9) Industry Segments
-        st.markdown("**Industry Segments**")
-        chem_inds = st.text_input("Industry Segments", value=csv_default(extracted.get("industry_segments", [])), label_visibility="collapsed")
-        # 10) Key Applications
-        st.markdown("**Key Applications**")
-        chem_keys = st.text_input("Key Applications", value=csv_default(extracted.get("key_applications", [])), label_visibility="collapsed")
-        # 11) Typical Dosage
-        st.markdown("**Typical Dosage**")
-        chem_dosage_json = st.text_area("Typical Dosage", value=_ai_list_as_lines(extracted.get("typical_dosage")) if extracted else "", height=80, label_visibility="collapsed")
-        # 12) Physical Snapshot
-        st.markdown("**Physical Snapshot**")
-        chem_phys_json = st.text_area("Physical Snapshot", value=_ai_list_as_lines(extracted.get("physical_snapshot")) if extracted else "", height=80, label_visibility="collapsed")
-        # 13) Compatibilities
-        st.markdown("**Compatibilities**")
-        chem_compat = st.text_input("Compatibilities", value=csv_default(extracted.get("compatibilities", [])), label_visibility="collapsed")
-        # 14) Incompatibilities
-        st.markdown("**Incompatibilities**")
-        chem_incompat = st.text_input("Incompatibilities", value=csv_default(extracted.get("incompatibilities", [])), label_visibility="collapsed")
-        # 15) Sensitivities
-        st.markdown("**Sensitivities**")
-        chem_sens = st.text_input("Sensitivities", value=csv_default(extracted.get("sensitivities", [])), label_visibility="collapsed")
-        # 16) Appearance
-        st.markdown("**Appearance**")
-        chem_appearance = st.text_input("Appearance", value=extracted.get("appearance", ""), label_visibility="collapsed")
-        # 17) Storage Conditions
-        st.markdown("**Storage Conditions**")
-        chem_storage = st.text_input("Storage Conditions", value=extracted.get("storage_conditions", ""), label_visibility="collapsed")
-        # 18) Packaging Options
-        st.markdown("**Packaging Options**")
-        chem_pack = st.text_input("Packaging Options", value=csv_default(extracted.get("packaging_options", [])), label_visibility="collapsed")
-        # 19) Shelf Life (months)
-        st.markdown("**Shelf Life (months)**")
-        chem_shelf = st.number_input("Shelf Life (months)", min_value=0, max_value=120, value=int(extracted.get("shelf_life_months", 0) if extracted else 0), step=1, label_visibility="collapsed")
-        # 20) Data Completeness
-        st.markdown("**Data Completeness**")
-        chem_dc = st.slider("Data Completeness", min_value=0.0, max_value=1.0, value=float(extracted.get("data_completeness", 0.0) if extracted else 0.0), step=0.05, label_visibility="collapsed")
-
-        # Show one-line source indicator
-        if extracted:
-            src = st.session_state.get("chem_ai_source")
-            if src:
-                st.caption(f"Source: {src}")
-
-        if st.button("Save Chemical", type="primary"):
-            # Basic validations
-            base_name = normalize_chemical_name(chem_gen)
-            if not base_name:
-                st.error("Chemical name is required")
-            elif chemical_name_exists(base_name):
-                st.error("A chemical with this name already exists")
-            else:
-                try:
-                    ai = st.session_state.get("chem_ai_extracted", {}) or {}
-                    # Helper to choose manual value else AI
-                    def prefer_manual_str(manual: str, ai_key: str):
-                        v = (manual or "").strip()
-                        if v:
-                            return v
-                        return (ai.get(ai_key) or "").strip() or None
-                    def prefer_manual_csv(manual: str, ai_key: str):
-                        lst = parse_csv_list(manual)
-                        if lst:
-                            return lst
-                        return ai.get(ai_key) or []
-                    def prefer_manual_jsonarr(manual: str, ai_key: str):
-                        arr = parse_json_lines_or_array(manual)
-                        if arr:
-                            return arr
-                        return ai.get(ai_key) or []
-
-                    payload = {
-                        "id": str(uuid.uuid4()),
-                        "generic_name": base_name or ai.get("generic_name"),
-                        "family": prefer_manual_str(chem_family, "family"),
-                        "synonyms": prefer_manual_csv(chem_syn, "synonyms"),
-                        "cas_ids": prefer_manual_csv(chem_cas, "cas_ids"),
-                        "hs_codes": (
-                            [
-                                {"region": "WCO", "code": code}
-                                for code in parse_csv_list(chem_hs_codes)
-                            ]
-                            or ai.get("hs_codes")
-                            or []
-                        ),
-                        "functional_categories": prefer_manual_csv(chem_func, "functional_categories"),
-                        "industry_segments": prefer_manual_csv(chem_inds, "industry_segments"),
-                        "key_applications": prefer_manual_csv(chem_keys, "key_applications"),
-                        "typical_dosage": (
-                            _parse_kv_lines(chem_dosage_json)
-                            or prefer_manual_jsonarr(chem_dosage_json, "typical_dosage")
-                        ),
-                        "appearance": prefer_manual_str(chem_appearance, "appearance"),
-                        "physical_snapshot": (
-                            _parse_kv_lines(chem_phys_json)
-                            or prefer_manual_jsonarr(chem_phys_json, "physical_snapshot")
-                        ),
-                        "compatibilities": prefer_manual_csv(chem_compat, "compatibilities"),
-                        "incompatibilities": prefer_manual_csv(chem_incompat, "incompatibilities"),
-                        "sensitivities": prefer_manual_csv(chem_sens, "sensitivities"),
-                        "shelf_life_months": int(chem_shelf or ai.get("shelf_life_months") or 0),
-                        "storage_conditions": prefer_manual_str(chem_storage, "storage_conditions"),
-                        "packaging_options": prefer_manual_csv(chem_pack, "packaging_options"),
-                        "summary_80_20": prefer_manual_str(chem_sum_8020, "summary_80_20"),
-                        "summary_technical": prefer_manual_str(chem_sum_tech, "summary_technical"),
-                        "data_completeness": float(chem_dc or ai.get("data_completeness") or 0.0),
-                    }
-                    create_chemical(payload)
-                    st.success("✅ Chemical saved successfully")
-                    # Clear AI/session state and refresh Add form
-                    try:
-                        for k in [
-                            "chem_ai_extracted",
-                            "chem_ai_source",
-                            "chem_ai_last_raw",
-                        ]:
-                            st.session_state.pop(k, None)
-                    except Exception:
-                        pass
-                    st.rerun()
-                except Exception as e:
-                    st.error(f"Failed to save chemical: {e}")
-        
-        # Add clear session button if there are unsaved changes
-
-    # -------- Manage Chemicals --------
-    elif current_tab == "Manage Chemicals":
-        st.subheader("Manage Chemicals")
-        # Auth gate similar to Manage Products
-        if not sb_user:
-            st.info("Please sign in to access Manage Chemicals.")
-        elif not is_manager:
-            st.error("You do not have permission to access Manage Chemicals.")
-        else:
-            # Filters
-            colmf1, colmf2 = st.columns(2)
-            with colmf1:
-                seg_filter = st.text_input("Filter by Industry Segment", placeholder="e.g., Dry-mix")
-            with colmf2:
-                cat_filter = st.text_input("Filter by Functional Category", placeholder="e.g., Polymer")
-            search_chem = st.text_input("Search by generic name, synonym or application", placeholder="Start typing...")
-            if st.button("Reset Filters", type="secondary"):
-                seg_filter = ""
-                cat_filter = ""
-                search_chem = ""
-
-            chems = fetch_chemicals()
-            filtered_chems = []
-            # If no filters provided, show everything by default
-            if not seg_filter and not cat_filter and not search_chem:
-                filtered_chems = chems
-            else:
-                filtered_chems = []
-            for c in chems:
-                # Normalize fields for matching
-                seg_text = ", ".join(c.get("industry_segments") or []).lower()
-                cat_text = ", ".join(c.get("functional_categories") or []).lower()
-                gen_text = (c.get("generic_name") or "").lower()
-                syn_text = ", ".join(c.get("synonyms") or []).lower()
-                app_text = ", ".join(c.get("key_applications") or []).lower()
-
-                if seg_filter and seg_filter.lower() not in seg_text:
-                    continue
-                if cat_filter and cat_filter.lower() not in cat_text:
-                    continue
-                if search_chem:
-                    q = search_chem.lower()
-                    if all(q not in field for field in [gen_text, syn_text, cat_text, seg_text, app_text]):
-                        continue
-                if seg_filter or cat_filter or search_chem:
-                    filtered_chems.append(c)
-
-            if filtered_chems:
-                st.success(f"📋 Found {len(filtered_chems)} chemicals")
-            else:
-                # Fallback: show all chemicals so user can edit/delete
-                if chems:
-                    st.warning("No chemicals match the filters. Showing all chemicals.")
-                    filtered_chems = chems
-                else:
-                    st.info("No chemicals found in the database.")
-
-            for chem in filtered_chems:
-                cid = chem.get("id")
-                # Expander reset suffix to force collapse after save via refresh token
-                _chem_refresh_token = st.session_state.get("chem_manage_refresh_token", "")
-                try:
-                    _nzw = ((sum(ord(ch) for ch in _chem_refresh_token) % 5) + 1) if _chem_refresh_token else 0
-                except Exception:
-                    _nzw = 0
-                _zw_suffix = "\u200B" * _nzw if _nzw else ""
-                with st.expander(f"🧪 {chem.get('generic_name')}{_zw_suffix}", expanded=False):
-                    ec1, ec2 = st.columns(2)
-                    with ec1:
-                        ename = st.text_input("Generic Name", value=chem.get("generic_name", ""), key=f"cn_{cid}")
-                        efamily = st.text_input("Family", value=chem.get("family", ""), key=f"cf_{cid}")
-                        esyn = st.text_input("Synonyms (comma-separated)", value=", ".join(chem.get("synonyms") or []), key=f"csy_{cid}")
-                        ecas = st.text_input("CAS IDs (comma-separated)", value=", ".join(chem.get("cas_ids") or []), key=f"cca_{cid}")
-                    with ec2:
-                        # Human-readable HS Codes (comma-separated)
-                        _hs_list = []
-                        try:
-                            for it in (chem.get("hs_codes") or []):
-                                if isinstance(it, dict) and it.get("code"):
-                                    _hs_list.append(str(it.get("code")))
-                        except Exception:
-                            pass
-                        if not _hs_list and chem.get("hs_code"):
-                            _hs_list = [str(chem.get("hs_code"))]
-                        ehs_text = st.text_input("HS Codes (comma-separated)", value=", ".join(_hs_list), key=f"ch_{cid}")
-                        efunc = st.text_input("Functional Categories (comma-separated)", value=", ".join(chem.get("functional_categories") or []), key=f"cc_{cid}")
-                        eind = st.text_input("Industry Segments (comma-separated)", value=", ".join(chem.get("industry_segments") or []), key=f"ci_{cid}")
-                    ekeys = st.text_input("Key Applications (comma-separated)", value=", ".join(chem.get("key_applications") or []), key=f"cak_{cid}")
-                    # Human-readable Typical Dosage: one per line as "application: range"
-                    edosage_lines = st.text_area("Typical Dosage (one per line: application: range)", value=_ai_list_as_lines(chem.get("typical_dosage")) if chem.get("typical_dosage") else "", height=70, key=f"cdj_{cid}")
-                    eappearance = st.text_input("Appearance", value=chem.get("appearance", ""), key=f"cap_{cid}")
-                    # Human-readable Physical Snapshot: one per line as "key: value, unit: U, method: M"
-                    ephys_lines = st.text_area("Physical Snapshot (one per line: name: value, unit: U, method: M)", value=_ai_list_as_lines(chem.get("physical_snapshot")) if chem.get("physical_snapshot") else "", height=70, key=f"cps_{cid}")
-                    ecompat = st.text_input("Compatibilities (comma-separated)", value=", ".join(chem.get("compatibilities") or []), key=f"ccom_{cid}")
-                    eincompat = st.text_input("Incompatibilities (comma-separated)", value=", ".join(chem.get("incompatibilities") or []), key=f"cinc_{cid}")
-                    esens = st.text_input("Sensitivities (comma-separated)", value=", ".join(chem.get("sensitivities") or []), key=f"csen_{cid}")
-                    cs1, cs2 = st.columns(2)
-                    with cs1:
-                        eshelf = st.number_input("Shelf Life (months)", min_value=0, max_value=120, value=int(chem.get("shelf_life_months") or 0), step=1, key=f"csh_{cid}")
-                        estorage = st.text_input("Storage Conditions", value=chem.get("storage_conditions", ""), key=f"cst_{cid}")
-                    with cs2:
-                        epack = st.text_input("Packaging Options (comma-separated)", value=", ".join(chem.get("packaging_options") or []), key=f"cpa_{cid}")
-                        edc = st.slider("Data Completeness", 0.0, 1.0, float(chem.get("data_completeness") or 0.0), 0.05, key=f"cdc_{cid}")
-                    e8020 = st.text_area("Summary 80/20", value=chem.get("summary_80_20", ""), height=60, key=f"c80_{cid}")
-                    esumtech = st.text_area("Summary Technical", value=chem.get("summary_technical", ""), height=80, key=f"cstt_{cid}")
-
-                    colb1, colb2, colb3 = st.columns([1,1,6])
-                    with colb1:
-                        if st.button("💾 Save", key=f"csave_{cid}"):
-                            if not ename.strip():
-                                st.error("Generic name cannot be empty")
-                            elif chemical_name_exists(ename) and ename.strip() != (chem.get("generic_name") or ""):
-                                # Re-use product helper for duplicate logic semantics
-                                st.error("Another record already uses this name")
-                            else:
-                                try:
-                                    updates = {
-                                        "generic_name": ename.strip(),
-                                        "family": efamily.strip() or None,
-                                        "synonyms": [s.strip() for s in esyn.split(",") if s.strip()],
-                                        "cas_ids": [s.strip() for s in ecas.split(",") if s.strip()],
-                                        "hs_codes": (
-                                            [
-                                                {"region": "WCO", "code": code}
-                                                for code in [s.strip() for s in ehs_text.split(",") if s.strip()]
-                                            ]
-                                        ),
-                                        "functional_categories": [s.strip() for s in efunc.split(",") if s.strip()],
-                                        "industry_segments": [s.strip() for s in eind.split(",") if s.strip()],
-                                        "key_applications": [s.strip() for s in ekeys.split(",") if s.strip()],
-                                        "typical_dosage": _parse_kv_lines(edosage_lines),
-                                        "appearance": eappearance.strip() or None,
-                                        "physical_snapshot": _parse_kv_lines(ephys_lines),
-                                        "compatibilities": [s.strip() for s in ecompat.split(",") if s.strip()],
-                                        "incompatibilities": [s.strip() for s in eincompat.split(",") if s.strip()],
-                                        "sensitivities": [s.strip() for s in esens.split(",") if s.strip()],
-                                        "shelf_life_months": int(eshelf or 0),
-                                        "storage_conditions": estorage.strip() or None,
-                                        "packaging_options": [s.strip() for s in epack.split(",") if s.strip()],
-                                        "summary_80_20": e8020.strip() or None,
-                                        "summary_technical": esumtech.strip() or None,
-                                        "data_completeness": float(edc or 0.0),
-                                    }
-                                    update_chemical(cid, updates)
-                                    st.success("✅ Updated")
-                                    # Bump token so the expander identity changes and collapses on rerun
-                                    st.session_state["chem_manage_refresh_token"] = str(uuid.uuid4())
-                                    st.rerun()
-                                except Exception as e:
-                                    st.error(f"Failed to update: {e}")
-                    with colb2:
-                        if st.button("🗑️ Delete", key=f"cdel_{cid}"):
-                            try:
-                                delete_chemical(cid)
-                                st.success("Deleted")
-                                st.session_state["chem_manage_refresh_token"] = str(uuid.uuid4())
-                                st.rerun()
-                            except Exception as e:
-                                st.error(f"Failed to delete: {e}")
-
-    # -------- View Chemicals --------
-    elif current_tab == "View Chemicals":
-        st.subheader("View Chemicals")
-        vcol1, vcol2 = st.columns(2)
-        with vcol1:
-            v_seg = st.text_input("Filter by Industry Segment")
-        with vcol2:
-            v_cat = st.text_input("Filter by Functional Category")
-        v_search = st.text_input("Search by generic name or applications")
-
-        chems = fetch_chemicals()
-        v_filtered = []
-        for c in chems:
-            if v_seg and (", ".join(c.get("industry_segments") or [])).lower().find(v_seg.lower()) < 0:
-                continue
-            if v_cat and (", ".join(c.get("functional_categories") or [])).lower().find(v_cat.lower()) < 0:
-                continue
-            if v_search:
-                hay = " ".join([
-                    c.get("generic_name", ""),
-                    ", ".join(c.get("industry_segments") or []),
-                    ", ".join(c.get("functional_categories") or []),
-                    ", ".join(c.get("key_applications") or []),
-                ]).lower()
-                if v_search.lower() not in hay:
-                    continue
-            v_filtered.append(c)
-
-        # Compact table view from mapping
-        if v_filtered:
-            try:
-                import pandas as _pd_view
-            except Exception:
-                _pd_view = None
-            rows = _build_chem_view_rows(v_filtered, CHEM_VIEW_TABLE_FIELDS)
-            if rows:
-                try:
-                    import pandas as pd
-                    dfv = pd.DataFrame(rows)
-                    st.dataframe(dfv, use_container_width=True, hide_index=True)
-                except Exception:
-                    # Fallback simple list rendering
-                    for r in rows:
-                        st.write(r)
-
-        # Export CSV
-        if st.button("📊 Export CSV", type="secondary", key="export_csv_view_chemicals"):
-            try:
-                import pandas as pd
-                rows_csv = _build_chem_view_rows(v_filtered, CHEM_VIEW_TABLE_FIELDS)
-                df = pd.DataFrame(rows_csv)
-                csv = df.to_csv(index=False)
-                st.download_button(
-                    label="💾 Download CSV",
-                    data=csv,
-                    file_name=f"chemicals_{datetime.utcnow().strftime('%Y%m%d')}.csv",
-                    mime="text/csv"
-                )
-            except Exception as e:
-                st.error(f"Export failed: {e}")
-
-        if not v_filtered:
-            st.info("No chemicals found with current filters.")
-        else:
-            for c in v_filtered:
-                title_suffix = ", ".join(c.get('industry_segments') or [])
-                with st.expander(f"🧪 {c.get('generic_name')} — {title_suffix}"):
-                    for key, label in CHEM_VIEW_DETAIL_FIELDS:
-                        st.markdown(f"**{label}:** {_format_chem_field(c.get(key))}")
-
-    st.markdown('</div>', unsafe_allow_html=True)
-
-# ==========================
-# UI - LeanChem Product Master Data (placeholder)
-# ==========================
-if st.session_state.get("main_section") == "leanchem":
-    st.markdown('<h1 style="color:#1976d2; font-weight:700;">LeanChem Product Master Data</h1>', unsafe_allow_html=True)
-    st.markdown('<div class="form-card">', unsafe_allow_html=True)
-    # Show post-save success message after rerun
-    if st.session_state.get("lc_saved_ok"):
-        st.success("✅ LeanChem product saved")
-        st.session_state.pop("lc_saved_ok", None)
-    # Apply deferred reset of widget states safely before rendering widgets
-    if st.session_state.get("lc_reset"):
-        try:
-            _clear_leanchem_session()
-        except Exception:
-            pass
-        st.session_state.pop("lc_reset", None)
-
-    # Helpers
-    def _fetch_tds_by_cat_type(cat: str, ptype: str) -> list[dict]:
-        try:
-            rows = supabase.table("tds_data").select("id,chemical_type_id,brand,grade,metadata").order("created_at", desc=True).execute().data or []
-            out = []
-            for r in rows:
-                md = r.get("metadata") or {}
-                if cat and (md.get("category") or "") != cat:
-                    continue
-                if ptype and (md.get("product_type") or "") != ptype:
-                    continue
-                out.append(r)
-            return out
-        except Exception:
-            return []
-
-    def _fetch_price_for_incoterm(tds_id: str, incoterm: str) -> dict:
-        try:
-            recs = supabase.table("costing_pricing_data").select("rows,created_at").eq("tds_id", tds_id).order("created_at", desc=True).limit(5).execute().data or []
-            for rec in recs:
-                for row in rec.get("rows") or []:
-                    try:
-                        if (row.get("incoterm") or "").strip().lower() == incoterm.strip().lower():
-                            return {
-                                "price_usd": row.get("price_usd") or "",
-                                "price_etb": row.get("price_etb") or "",
-                            }
-                    except Exception:
-                        continue
-        except Exception:
-            pass
-        return {"price_usd": "", "price_etb": ""}
-
-    def _save_leanchem_product(payload: dict) -> tuple[bool, str]:
-        """Save LeanChem product to primary table if available; otherwise
-        fallback to embedding under the referenced TDS record's metadata.
-
-        Returns (ok, message).
-        """
-        try:
-            # Try primary table first
-            try:
-                supabase.table("leanchem_products").insert(payload).execute()
-                return True, "saved"
-            except Exception as e:
-                # Probe whether table exists by attempting a trivial select
-                try:
-                    supabase.table("leanchem_products").select("id").limit(1).execute()
-                except Exception:
-                    # Table likely missing → fallback store under TDS metadata
-                    pass
-                # Fallback path: attach under tds_data.metadata.leanchem_product
-                tds_id = payload.get("tds_id")
-                if not tds_id:
-                    return False, "Missing TDS reference for fallback save"
-                rec = supabase.table("tds_data").select("metadata").eq("id", tds_id).limit(1).execute()
-                if not rec.data:
-                    return False, "Referenced TDS not found"
-                md = ((rec.data or [{}])[0] or {}).get("metadata") or {}
-                # Store a minimized snapshot (JSON-serializable)
-                md["leanchem_product"] = {
-                    "category": payload.get("category"),
-                    "product_type": payload.get("product_type"),
-                    "sample_addis": payload.get("sample_addis"),
-                    "stock_addis": payload.get("stock_addis"),
-                    "stock_nairobi": payload.get("stock_nairobi"),
-                    "prices": payload.get("prices"),
-                    "saved_at": datetime.utcnow().isoformat() + "Z",
-                }
-                supabase.table("tds_data").update({"metadata": md}).eq("id", tds_id).execute()
-                return True, "saved_fallback"
-        except Exception as e:
-            return False, str(e)
-
-    def _lean_fetch_all() -> list[dict]:
-        """Fetch LeanChem products from primary table when present; otherwise
-        assemble from TDS metadata fallback. Returns list of dicts with keys:
-        id, source ('table'|'tds'), tds_id, category, product_type, sample_addis,
-        stock_addis, stock_nairobi, prices, tds_name.
-        """
-        out: list[dict] = []
-        # Try table first
-        try:
-            rows = supabase.table("leanchem_products").select("*").order("created_at", desc=True).execute().data or []
-            for r in rows:
-                tds_id = r.get("tds_id")
-                tds_name = None
-                try:
-                    if tds_id:
-                        md = ((supabase.table("tds_data").select("metadata").eq("id", tds_id).limit(1).execute().data or [{}])[0] or {}).get("metadata") or {}
-                        tds_name = md.get("product_name") or md.get("generic_product_name") or md.get("tds_file_name")
-                except Exception:
-                    tds_name = None
-                out.append({
-                    "id": r.get("id"),
-                    "source": "table",
-                    "tds_id": tds_id,
-                    "category": r.get("category"),
-                    "product_type": r.get("product_type"),
-                    "sample_addis": r.get("sample_addis") or {},
-                    "stock_addis": r.get("stock_addis") or {},
-                    "stock_nairobi": r.get("stock_nairobi") or {},
-                    "prices": r.get("prices") or {},
-                    "tds_name": tds_name,
-                })
-        except Exception:
-            pass
-        if out:
-            return out
-        # Fallback: derive from TDS metadata
-        try:
-            rows = supabase.table("tds_data").select("id,metadata").order("created_at", desc=True).execute().data or []
-            for r in rows:
-                md = r.get("metadata") or {}
-                lcp = md.get("leanchem_product")
-                if not lcp:
-                    continue
-                out.append({
-                    "id": f"tds:{r.get('id')}",
-                    "source": "tds",
-                    "tds_id": r.get("id"),
-                    "category": lcp.get("category"),
-                    "product_type": lcp.get("product_type"),
-                    "sample_addis": lcp.get("sample_addis") or {},
-                    "stock_addis": lcp.get("stock_addis") or {},
-                    "stock_nairobi": lcp.get("stock_nairobi") or {},
-                    "prices": lcp.get("prices") or {},
-                    "tds_name": md.get("product_name") or md.get("generic_product_name") or md.get("tds_file_name"),
-                })
-        except Exception:
-            pass
-        return out
-
-    def _lean_update_record(record_id: str, source: str, updates: dict) -> tuple[bool, str]:
-        try:
-            if source == "table":
-                supabase.table("leanchem_products").update(updates).eq("id", record_id).execute()
-                return True, "updated"
-            # tds metadata fallback
-            if not record_id.startswith("tds:"):
-                return False, "invalid tds record id"
-            tds_id = record_id.split(":", 1)[1]
-            rec = supabase.table("tds_data").select("metadata").eq("id", tds_id).limit(1).execute()
-            if not rec.data:
-                return False, "tds not found"
-            md = ((rec.data or [{}])[0] or {}).get("metadata") or {}
-            curr = md.get("leanchem_product") or {}
-            curr.update(updates)
-            md["leanchem_product"] = curr
-            supabase.table("tds_data").update({"metadata": md}).eq("id", tds_id).execute()
-            return True, "updated"
-        except Exception as e:
-            return False, str(e)
-
-    def _lean_delete_record(record_id: str, source: str) -> tuple[bool, str]:
-        try:
-            if source == "table":
-                supabase.table("leanchem_products").delete().eq("id", record_id).execute()
-                return True, "deleted"
-            if not record_id.startswith("tds:"):
-                return False, "invalid tds record id"
-            tds_id = record_id.split(":", 1)[1]
-            rec = supabase.table("tds_data").select("metadata").eq("id", tds_id).limit(1).execute()
-            if not rec.data:
-                return False, "tds not found"
-            md = ((rec.data or [{}])[0] or {}).get("metadata") or {}
-            if "leanchem_product" in md:
-                del md["leanchem_product"]
-            supabase.table("tds_data").update({"metadata": md}).eq("id", tds_id).execute()
-            return True, "deleted"
-        except Exception as e:
-            return False, str(e)
-
-    # -------- LeanChem session helpers --------
-    def _has_unsaved_leanchem_changes() -> bool:
-        try:
-            if st.session_state.get("main_section") != "leanchem":
-                return False
-            # Any of these keys indicate in-progress edits
-            keys = [
-                "lc_category","lc_type","lc_tds",
-                "lc_sample_addis","lc_sample_addis_unit","lc_sample_addis_qty",
-                "lc_stock_addis","lc_stock_addis_unit","lc_stock_addis_qty",
-                "lc_stock_nairobi","lc_stock_nairobi_unit","lc_stock_nairobi_qty",
-            ]
-            return any(k in st.session_state and st.session_state.get(k) not in (None, "", "— Select —") for k in keys)
-        except Exception:
-            return False
-
-    def _clear_leanchem_session():
-        try:
-            for k in [
-                "lc_category","lc_type","lc_tds",
-                "lc_sample_addis","lc_sample_addis_unit","lc_sample_addis_qty",
-                "lc_stock_addis","lc_stock_addis_unit","lc_stock_addis_qty",
-                "lc_stock_nairobi","lc_stock_nairobi_unit","lc_stock_nairobi_qty",
-                "lc_price_addis","lc_price_nairobi",
-            ]:
-                st.session_state.pop(k, None)
-        except Exception:
-            pass
-
-    # Sub-tabs
-    if "leanchem_current_tab" not in st.session_state:
-        st.session_state["leanchem_current_tab"] = "Add"
-    col_tab1, col_tab2, col_tab3 = st.columns(3)
-    with col_tab1:
-        if st.button("Add", key="lc_tab_add", type="primary" if st.session_state.get("leanchem_current_tab") == "Add" else "secondary", use_container_width=True):
-            prev = st.session_state.get("leanchem_current_tab")
-            if prev != "Add" and _has_unsaved_leanchem_changes():
-                st.session_state["pending_leanchem_tab"] = "Add"
-                st.rerun()
-            else:
-                st.session_state["leanchem_current_tab"] = "Add"
-                st.rerun()
-    with col_tab2:
-        if st.button("Manage", key="lc_tab_manage", type="primary" if st.session_state.get("leanchem_current_tab") == "Manage" else "secondary", use_container_width=True):
-            prev = st.session_state.get("leanchem_current_tab")
-            if prev != "Manage" and _has_unsaved_leanchem_changes():
-                st.session_state["pending_leanchem_tab"] = "Manage"
-                st.rerun()
-            else:
-                st.session_state["leanchem_current_tab"] = "Manage"
-                st.rerun()
-    with col_tab3:
-        if st.button("View", key="lc_tab_view", type="primary" if st.session_state.get("leanchem_current_tab") == "View" else "secondary", use_container_width=True):
-            prev = st.session_state.get("leanchem_current_tab")
-            if prev != "View" and _has_unsaved_leanchem_changes():
-                st.session_state["pending_leanchem_tab"] = "View"
-                st.rerun()
-            else:
-                st.session_state["leanchem_current_tab"] = "View"
-                st.rerun()
-
-    # Pending tab change dialog
-    if st.session_state.get("pending_leanchem_tab"):
-        new_tab = st.session_state.get("pending_leanchem_tab")
-        st.warning("⚠️ You have unsaved changes in LeanChem Add.")
-        c1, c2, c3 = st.columns([1,1,2])
-        with c1:
-            if st.button("🗑️ Discard & Continue", key="lc_discard", type="primary"):
-                _clear_leanchem_session()
-                st.session_state["leanchem_current_tab"] = new_tab
-                st.session_state.pop("pending_leanchem_tab")
-                st.rerun()
-        with c2:
-            if st.button("❌ Cancel", key="lc_cancel"):
-                st.session_state.pop("pending_leanchem_tab")
-                st.rerun()
-        with c3:
-            st.caption("Your unsaved changes will be lost if you continue.")
-        st.stop()
-
-    current_lc_tab = st.session_state.get("leanchem_current_tab", "Add")
-
-    # Dynamic selectors (outside form for immediate rerun on change) - only for Add tab
-    if current_lc_tab == "Add":
-        col1, col2 = st.columns(2)
-        with col1:
-            lc_cat_placeholder = "— Select —"
-            lc_cat_sel = st.selectbox("Select Category", [lc_cat_placeholder] + FIXED_CATEGORIES, key="lc_category")
-            lc_category = "" if lc_cat_sel == lc_cat_placeholder else lc_cat_sel
-            # Product Type options depend on category using chemical master mapping
-            lc_types = get_types_for_category_enriched(lc_category)
-            lc_type_placeholder = "— Select —"
-            lc_type_sel = st.selectbox("Select Product Type", [lc_type_placeholder] + (lc_types or []), key="lc_type")
-            lc_product_type = "" if lc_type_sel == lc_type_placeholder else lc_type_sel
-            # TDS filtered by selected category immediately; further narrowed by product type if chosen
-            tds_items = _fetch_tds_by_cat_type(lc_category, lc_product_type) if lc_category else []
-            tds_label_map = {}
-            for r in tds_items:
-                md = r.get("metadata") or {}
-                label = md.get("product_name") or md.get("generic_product_name") or (r.get("brand") or "Unnamed")
-                tds_label_map[f"{label}"] = r.get("id")
-            tds_placeholder = "— Select —"
-            lc_tds_label = st.selectbox("Select TDS", [tds_placeholder] + list(tds_label_map.keys()), key="lc_tds")
-            lc_tds_id = tds_label_map.get(lc_tds_label) if lc_tds_label != tds_placeholder else None
-        with col2:
-            st.empty()
-
-    # Wide, centered Sample & Stock section (Add tab only)
-    if current_lc_tab == "Add":
-        st.markdown("---")
-        st.subheader("Sample & Stock")
-
-        # Add form (buttons and sample/stock fields)
-        with st.form("leanchem_add_form", clear_on_submit=False):
-            # Sample - Addis
-            s1_col1, s1_col2, s1_col3 = st.columns([1,1,1])
-            with s1_col1:
-                lc_sample_addis_yes = st.selectbox("Sample - Addis Ababa", ["No", "Yes"], key="lc_sample_addis")
-            with s1_col2:
-                lc_sample_addis_unit = st.text_input("Unit of measurement", key="lc_sample_addis_unit")
-            with s1_col3:
-                lc_sample_addis_qty = st.text_input("Qty", key="lc_sample_addis_qty")
-
-            # Stock - Addis
-            s2_col1, s2_col2, s2_col3 = st.columns([1,1,1])
-            with s2_col1:
-                lc_stock_addis_yes = st.selectbox("Stock - Addis Ababa", ["No", "Yes"], key="lc_stock_addis")
-            with s2_col2:
-                lc_stock_addis_unit = st.text_input("Unit of measurement", key="lc_stock_addis_unit")
-            with s2_col3:
-                lc_stock_addis_qty = st.text_input("Qty", key="lc_stock_addis_qty")
-
-            # Stock - Nairobi
-            s3_col1, s3_col2, s3_col3 = st.columns([1,1,1])
-            with s3_col1:
-                lc_stock_nairobi_yes = st.selectbox("Stock - Nairobi", ["No", "Yes"], key="lc_stock_nairobi")
-            with s3_col2:
-                lc_stock_nairobi_unit = st.text_input("Unit of measurement", key="lc_stock_nairobi_unit")
-            with s3_col3:
-                lc_stock_nairobi_qty = st.text_input("Qty", key="lc_stock_nairobi_qty")
-
-            st.markdown("---")
-            # Fetch data from master data
-            colf1, colf2 = st.columns([1,1])
-            with colf1:
-                fetch_clicked = st.form_submit_button("Fetch data from master data", type="secondary")
-            with colf2:
-                save_clicked = st.form_submit_button("Save", type="primary")
-
-    # Handle fetch (Add tab only)
-    if current_lc_tab == "Add" and st.session_state.get("lc_tds") and fetch_clicked:
-        pass
-    if current_lc_tab == "Add" and fetch_clicked:
-        if not lc_tds_id:
-            st.warning("Select TDS first.")
-        else:
-            # Selling Price pull from pricing master
-            price_addis = _fetch_price_for_incoterm(lc_tds_id, "Addis Ababa")
-            price_nairobi = _fetch_price_for_incoterm(lc_tds_id, "Nairobi")
-            st.success("Fetched pricing from master data")
-            st.write(f"Selling Price — Addis Ababa: USD {price_addis.get('price_usd') or '-'} | ETB {price_addis.get('price_etb') or '-'}")
-            st.write(f"Selling Price — Nairobi: USD {price_nairobi.get('price_usd') or '-'} | ETB {price_nairobi.get('price_etb') or '-'}")
-            try:
-                st.session_state["lc_price_addis"] = price_addis
-                st.session_state["lc_price_nairobi"] = price_nairobi
-            except Exception:
-                pass
-            # TDS link
-            try:
-                rec = supabase.table("tds_data").select("metadata").eq("id", lc_tds_id).limit(1).execute()
-                md = ((rec.data or [{}])[0] or {}).get("metadata") or {}
-                if md.get("tds_file_url"):
-                    st.markdown(f"[📄 TDS]({md.get('tds_file_url')})")
-            except Exception:
-                pass
-
-    # Save (Add tab only)
-    if current_lc_tab == "Add" and save_clicked:
-        # Basic validation
-        if not (lc_category and lc_product_type and lc_tds_id):
-            st.error("Category, Product Type and TDS are required")
-        else:
-            try:
-                payload = {
-                    "id": str(uuid.uuid4()),
-                    "category": lc_category,
-                    "product_type": lc_product_type,
-                    "tds_id": lc_tds_id,
-                    "sample_addis": {
-                        "yes": lc_sample_addis_yes,
-                        "unit": lc_sample_addis_unit,
-                        "qty": lc_sample_addis_qty,
-                    },
-                    "stock_addis": {
-                        "yes": lc_stock_addis_yes,
-                        "unit": lc_stock_addis_unit,
-                        "qty": lc_stock_addis_qty,
-                    },
-                    "stock_nairobi": {
-                        "yes": lc_stock_nairobi_yes,
-                        "unit": lc_stock_nairobi_unit,
-                        "qty": lc_stock_nairobi_qty,
-                    },
-                    "prices": {
-                        "addis_ababa": st.session_state.get("lc_price_addis") or {},
-                        "nairobi": st.session_state.get("lc_price_nairobi") or {},
-                    },
-                }
-                ok, msg = _save_leanchem_product(payload)
-                if ok:
-                    if msg == "saved_fallback":
-                        st.warning("Saved under the selected TDS record (metadata) because the 'leanchem_products' table is missing or insert was blocked by RLS. See setup instructions below.")
-                    # Mark for reset on next run to avoid modifying after widget instantiation
-                    st.session_state["lc_saved_ok"] = True
-                    st.session_state["lc_reset"] = True
-                    st.rerun()
-                else:
-                    st.error(f"Failed to save LeanChem product: {msg}")
-            except Exception as e:
-                st.error(f"Failed to save LeanChem product: {e}")
-
-    # Manage tab
-    if current_lc_tab == "Manage":
-        recs = _lean_fetch_all()
-        if not recs:
-            st.info("No LeanChem products found")
-        else:
-            for r in recs:
-                rid = r.get("id")
-                with st.expander(f"{r.get('product_type') or '-'} — {r.get('tds_name') or '-'}", expanded=False):
-                    c1, c2 = st.columns(2)
-                    with c1:
-                        ecat = st.text_input("Category", value=r.get("category") or "", key=f"lc_m_cat_{rid}")
-                        etype = st.text_input("Product Type", value=r.get("product_type") or "", key=f"lc_m_type_{rid}")
-                        esamp_yes = st.selectbox("Sample - Addis Ababa", ["No","Yes"], index=(0 if (r.get('sample_addis') or {}).get('yes') != 'Yes' else 1), key=f"lc_m_s_yes_{rid}")
-                        esamp_unit = st.text_input("Sample Unit", value=(r.get("sample_addis") or {}).get("unit") or "", key=f"lc_m_s_unit_{rid}")
-                        esamp_qty = st.text_input("Sample Qty", value=(r.get("sample_addis") or {}).get("qty") or "", key=f"lc_m_s_qty_{rid}")
-                    with c2:
-                        estock_yes = st.selectbox("Stock - Addis Ababa", ["No","Yes"], index=(0 if (r.get('stock_addis') or {}).get('yes') != 'Yes' else 1), key=f"lc_m_st_yes_{rid}")
-                        estock_unit = st.text_input("Stock Unit", value=(r.get("stock_addis") or {}).get("unit") or "", key=f"lc_m_st_unit_{rid}")
-                        estock_qty = st.text_input("Stock Qty", value=(r.get("stock_addis") or {}).get("qty") or "", key=f"lc_m_st_qty_{rid}")
-                        enairobi_yes = st.selectbox("Stock - Nairobi", ["No","Yes"], index=(0 if (r.get('stock_nairobi') or {}).get('yes') != 'Yes' else 1), key=f"lc_m_n_yes_{rid}")
-                        enairobi_unit = st.text_input("Nairobi Unit", value=(r.get("stock_nairobi") or {}).get("unit") or "", key=f"lc_m_n_unit_{rid}")
-                        enairobi_qty = st.text_input("Nairobi Qty", value=(r.get("stock_nairobi") or {}).get("qty") or "", key=f"lc_m_n_qty_{rid}")
-                    b1, b2 = st.columns(2)
-                    with b1:
-                        if st.button("💾 Save", key=f"lc_m_save_{rid}"):
-                            updates = {
-                                "category": ecat.strip() or None,
-                                "product_type": etype.strip() or None,
-                                "sample_addis": {"yes": esamp_yes, "unit": esamp_unit.strip(), "qty": esamp_qty.strip()},
-                                "stock_addis": {"yes": estock_yes, "unit": estock_unit.strip(), "qty": estock_qty.strip()},
-                                "stock_nairobi": {"yes": enairobi_yes, "unit": enairobi_unit.strip(), "qty": enairobi_qty.strip()},
-                            }
-                            ok, msg = _lean_update_record(rid, r.get("source"), updates)
-                            if ok:
-                                st.success("Updated")
-                                # Clear LeanChem session state after save and return to Manage tab
-                                try:
-                                    _clear_leanchem_session()
-                                except Exception:
-                                    pass
-                                st.session_state["leanchem_current_tab"] = "Manage"
-                                st.rerun()
-                            else:
-                                st.error(f"Failed to update: {msg}")
-                    with b2:
-                        if st.button("🗑️ Delete", key=f"lc_m_del_{rid}"):
-                            ok, msg = _lean_delete_record(rid, r.get("source"))
-                            if ok:
-                                st.success("Deleted")
-                                st.rerun()
-                            else:
-                                st.error(f"Failed to delete: {msg}")
-
-    # View tab
-    if current_lc_tab == "View":
-        recs = _lean_fetch_all()
-        if not recs:
-            st.info("No LeanChem products found")
-        else:
-            try:
-                import pandas as pd
-                rows = []
-                for r in recs:
-                    rows.append({
-                        "Category": r.get("category") or "",
-                        "Product Type": r.get("product_type") or "",
-                        "TDS": r.get("tds_name") or "",
-                        "Sample Addis": (r.get("sample_addis") or {}).get("qty") or "",
-                        "Stock Addis": (r.get("stock_addis") or {}).get("qty") or "",
-                        "Stock Nairobi": (r.get("stock_nairobi") or {}).get("qty") or "",
-                    })
-                df = pd.DataFrame(rows)
-                st.dataframe(df, use_container_width=True, hide_index=True)
-                if st.button("📊 Export CSV", type="secondary", key="lc_view_export"):
-                    csv = df.to_csv(index=False)
-                    st.download_button("💾 Download CSV", data=csv, file_name=f"leanchem_{datetime.utcnow().strftime('%Y%m%d')}.csv", mime="text/csv")
-            except Exception:
-                for r in recs:
-                    st.write(f"- {r.get('category') or '-'} | {r.get('product_type') or '-'} | {r.get('tds_name') or '-'}")
-
-    st.markdown('</div>', unsafe_allow_html=True)
-
-# ==========================
-# UI - Market Master Data
-# ==========================
-if st.session_state.get("main_section") == "market":
-    st.markdown('<h1 style="color:#1976d2; font-weight:700;">Market Master Data</h1>', unsafe_allow_html=True)
-    st.markdown('<div class="form-card">', unsafe_allow_html=True)
-
-    # Track current market tab to detect tab switches
-    if "market_current_tab" not in st.session_state:
-        st.session_state["market_current_tab"] = "Add"
-    
-    # Create custom tab navigation with proper change detection
-    tab_col1, tab_col2, tab_col3 = st.columns(3)
-    
-    with tab_col1:
-        if st.button("Add", key="market_tab_add", type="primary" if st.session_state.get("market_current_tab") == "Add" else "secondary", use_container_width=True):
-            previous_tab = st.session_state.get("market_current_tab")
-            if previous_tab and previous_tab != "Add" and _has_unsaved_market_changes():
-                st.session_state["pending_market_tab"] = "Add"
-                st.rerun()
-            else:
-                st.session_state["market_current_tab"] = "Add"
-                st.rerun()
-    
-    with tab_col2:
-        if st.button("Manage", key="market_tab_manage", type="primary" if st.session_state.get("market_current_tab") == "Manage" else "secondary", use_container_width=True):
-            previous_tab = st.session_state.get("market_current_tab")
-            if previous_tab and previous_tab != "Manage" and _has_unsaved_market_changes():
-                st.session_state["pending_market_tab"] = "Manage"
-                st.rerun()
-            else:
-                st.session_state["market_current_tab"] = "Manage"
-                st.rerun()
-    
-    with tab_col3:
-        if st.button("View", key="market_tab_view", type="primary" if st.session_state.get("market_current_tab") == "View" else "secondary", use_container_width=True):
-            previous_tab = st.session_state.get("market_current_tab")
-            if previous_tab and previous_tab != "View" and _has_unsaved_market_changes():
-                st.session_state["pending_market_tab"] = "View"
-                st.rerun()
-            else:
-                st.session_state["market_current_tab"] = "View"
-                st.rerun()
-
-    # Pending tab change dialog
-    if st.session_state.get("pending_market_tab"):
-        st.warning("⚠️ You have unsaved changes. Do you want to discard them and switch tabs?")
-        col1, col2 = st.columns(2)
-        with col1:
-            if st.button("Yes, discard changes", key="market_discard_yes"):
-                _clear_market_session()
-                st.session_state["market_current_tab"] = st.session_state["pending_market_tab"]
-                st.session_state.pop("pending_market_tab", None)
-                st.rerun()
-        with col2:
-            if st.button("No, stay here", key="market_discard_no"):
-                st.session_state.pop("pending_market_tab", None)
-                st.rerun()
-
-    current_tab = st.session_state.get("market_current_tab", "Add")
-
-    # Helpers
-    def _fetch_market_rows(*, hs_code: str | None, brand: str | None, chemical_type_id: str | None) -> list[dict]:
-        try:
-            q = supabase.table("market_opportunities").select("*")
-            # Basic server-side filters when possible
-            if chemical_type_id:
-                q = q.eq("chemical_entity_id", chemical_type_id)
-            # We cannot ilike inside jsonb easily; fetch and filter client-side for hs_code/brand
-            res = q.order("period", desc=False).limit(5000).execute()
-            rows = res.data or []
-            out = []
-            hs = (hs_code or "").strip().lower()
-            br = (brand or "").strip().lower()
-            for r in rows:
-                meta = r.get("metadata") or {}
-                raw = r.get("raw_data") or {}
-                hay_json = " ".join([
-                    str(meta.get("hs_code") or ""),
-                    str(meta.get("brand") or ""),
-                    str(meta.get("commercial_name") or ""),
-                    str(raw)
-                ]).lower()
-                if hs and hs not in hay_json:
-                    continue
-                if br and br not in hay_json:
-                    continue
-                out.append(r)
-            return out
-        except Exception as e:
-            st.error(f"Failed to fetch market data: {e}")
-            return []
-
-    def _resolve_type_id_by_cat_type(category: str, type_name: str) -> str | None:
-        try:
-            if not category or not type_name:
-                return None
-            res = supabase.table("chemical_types").select("id").eq("category", category).eq("name", type_name).limit(1).execute()
-            rows = res.data or []
-            return (rows[0] or {}).get("id") if rows else None
-        except Exception:
-            return None
-
-    def _fetch_all_market_data() -> list[dict]:
-        """Fetch all market data for display"""
-        try:
-            res = supabase.table("market_opportunities").select("*").order("created_at", desc=True).execute()
-            return res.data or []
-        except Exception as e:
-            st.error(f"Failed to fetch market data: {e}")
-            return []
-
-    def _update_market_record(record_id: str, updates: dict) -> tuple[bool, str]:
-        """Update a market record"""
-        try:
-            res = supabase.table("market_opportunities").update(updates).eq("id", record_id).execute()
-            if res.data:
-                return True, "Market record updated successfully"
-            else:
-                return False, "Failed to update market record"
-        except Exception as e:
-            return False, f"Error updating market record: {str(e)}"
-
-    def _delete_market_record(record_id: str) -> tuple[bool, str]:
-        """Delete a market record"""
-        try:
-            res = supabase.table("market_opportunities").delete().eq("id", record_id).execute()
-            if res.data:
-                return True, "Market record deleted successfully"
-            else:
-                return False, "Failed to delete market record"
-        except Exception as e:
-            return False, f"Error deleting market record: {str(e)}"
-
-    # -------- Add Market Data --------
-    if current_tab == "Add":
-        st.subheader("Add Market Data")
-        
-        mc1, mc2 = st.columns(2)
-        with mc1:
-            _market_cat_placeholder = "— Select —"
-            try:
-                _market_cats = [_market_cat_placeholder] + get_all_categories()
-            except Exception:
-                _market_cats = [_market_cat_placeholder] + FIXED_CATEGORIES
-            m_cat = st.selectbox("Select Category", _market_cats, key="market_cat_select")
-            sel_cat = "" if m_cat == _market_cat_placeholder else m_cat
-        with mc2:
-            m_types = get_types_for_category(sel_cat) if sel_cat else []
-            _market_type_placeholder = "— Select —"
-            m_type = st.selectbox("Select Product Type", [_market_type_placeholder] + (m_types or []), key="market_type_select")
-            sel_type = "" if m_type == _market_type_placeholder else m_type
-
-        mcol1, mcol2, mcol3 = st.columns([1,1,2])
-        with mcol1:
-            hs_code_in = st.text_input("HS Code", key="market_hs_code", placeholder="e.g., 390430")
-        with mcol2:
-            brand_in = st.text_input("Commercial/Brand Name", key="market_brand", placeholder="e.g., VINNAPAS 5010N")
-        with mcol3:
-            st.caption("Click to fetch from Import RAG Document (via stored market data)")
-            fetch_market = st.button("📥 Fetch Import Data", type="primary", key="market_fetch_btn")
-
-        # Results area
-        if fetch_market:
-            # Read Import Data RAG Excel file
-            try:
-                import pandas as pd
-                from pathlib import Path
-                from fuzzywuzzy import fuzz
-                
-                excel_path = Path("assets") / "Import Data - RAG.xlsx"
-                
-                if not excel_path.exists():
-                    st.error(f"❌ Import Data RAG file not found at: {excel_path}")
-                    st.stop()
-                
-                # Read Excel file
-                df = pd.read_excel(excel_path, engine='openpyxl')
-                
-                if df.empty:
-                    st.error("❌ Import Data RAG file is empty")
-                    st.stop()
-                
-                # Clean trader names
-                df['Trader'] = df['Trader'].astype(str).str.strip()
-                
-                # Filter data based on HS Code and Brand name if provided
-                filtered_df = df.copy()
-                
-                if hs_code_in and hs_code_in.strip():
-                    # For HS Code filtering, we'll search in trader names (as HS codes might be in company names)
-                    hs_code = hs_code_in.strip().lower()
-                    filtered_df = filtered_df[filtered_df['Trader'].str.lower().str.contains(hs_code, na=False)]
-                
-                if brand_in and brand_in.strip():
-                    # For brand filtering, search in trader names
-                    brand = brand_in.strip().lower()
-                    filtered_df = filtered_df[filtered_df['Trader'].str.lower().str.contains(brand, na=False)]
-                
-                if filtered_df.empty:
-                    st.info("No matching records found in Import Data RAG file.")
-                    st.stop()
-                
-                # Calculate total volumes by year
-                years = [2022, 2023, 2024, 2025]
-                volumes_by_year = {}
-                for year in years:
-                    if year in df.columns:
-                        volumes_by_year[year] = filtered_df[year].sum() if year in filtered_df.columns else 0.0
-                    else:
-                        volumes_by_year[year] = 0.0
-                
-                # Calculate total volume across all years
-                total_volume = sum(volumes_by_year.values())
-                
-                # Output 1: Volume of Import by Year
-                st.markdown("---")
-                st.subheader("📊 Output 1: Volume of Import by Year")
-                
-                if total_volume > 0:
-                    # Create a chart for volume by year
-                    chart_data = pd.DataFrame({
-                        'Year': list(volumes_by_year.keys()),
-                        'Volume': list(volumes_by_year.values())
-                    })
-                    
-                    st.bar_chart(chart_data.set_index('Year'))
-                    
-                    # Display summary table
-                    summary_data = []
-                    for year, volume in volumes_by_year.items():
-                        percentage = (volume / total_volume * 100) if total_volume > 0 else 0
-                        summary_data.append({
-                            'Year': year,
-                            'Volume (Tons)': f"{volume:,.2f}",
-                            'Percentage': f"{percentage:.1f}%"
-                        })
-                    
-                    st.dataframe(pd.DataFrame(summary_data), use_container_width=True)
-                else:
-                    st.info("No volume data available for the selected criteria.")
-                
-                # Output 2: Pareto Analysis (80/20 rule)
-                st.markdown("---")
-                st.subheader("📈 Output 2: Pareto Analysis - Key Customers (80/20 Rule)")
-                
-                # Calculate customer totals
-                customer_totals = filtered_df.groupby('Trader')['Grand Total'].sum().sort_values(ascending=False)
-                
-                if not customer_totals.empty:
-                    # Calculate cumulative percentages
-                    total_volume_all = customer_totals.sum()
-                    cumulative_percentage = (customer_totals.cumsum() / total_volume_all * 100)
-                    
-                    # Find customers that make up 80% of volume
-                    pareto_customers = customer_totals[cumulative_percentage <= 80]
-                    
-                    st.write(f"**Total Customers:** {len(customer_totals)}")
-                    st.write(f"**Key Customers (80% of volume):** {len(pareto_customers)}")
-                    st.write(f"**Volume Concentration:** {cumulative_percentage.iloc[len(pareto_customers)-1]:.1f}%")
-                    
-                    # Display top customers
-                    top_customers_data = []
-                    for i, (customer, volume) in enumerate(pareto_customers.items(), 1):
-                        percentage = (volume / total_volume_all * 100)
-                        top_customers_data.append({
-                            'Rank': i,
-                            'Customer': customer,
-                            'Total Volume (Tons)': f"{volume:,.2f}",
-                            'Percentage': f"{percentage:.1f}%"
-                        })
-                    
-                    st.dataframe(pd.DataFrame(top_customers_data), use_container_width=True)
-                    
-                    # Pareto chart
-                    pareto_chart_data = pd.DataFrame({
-                        'Customer': pareto_customers.index[:10],  # Top 10 for chart
-                        'Volume': pareto_customers.values[:10]
-                    })
-                    st.bar_chart(pareto_chart_data.set_index('Customer'))
-                
-                # Output 3: Customer Consumption by Year and Brand
-                st.markdown("---")
-                st.subheader("🏢 Output 3: Customer Consumption by Year and Brand")
-                
-                if not filtered_df.empty:
-                    # Prepare detailed customer data
-                    customer_details = []
-                    
-                    for _, row in filtered_df.iterrows():
-                        customer = row['Trader']
-                        for year in years:
-                            if year in df.columns and pd.notna(row[year]):
-                                volume = row[year]
-                                if volume > 0:
-                                    customer_details.append({
-                                        'Customer': customer,
-                                        'Year': year,
-                                        'Volume (Tons)': volume,
-                                        'Brand/Commercial': brand_in if brand_in else 'N/A',
-                                        'HS Code': hs_code_in if hs_code_in else 'N/A'
-                                    })
-                    
-                    if customer_details:
-                        details_df = pd.DataFrame(customer_details)
-                        
-                        # Group by customer and year for summary
-                        summary_df = details_df.groupby(['Customer', 'Year'])['Volume (Tons)'].sum().reset_index()
-                        summary_pivot = summary_df.pivot(index='Customer', columns='Year', values='Volume (Tons)').fillna(0)
-                        
-                        # Add total column
-                        summary_pivot['Total'] = summary_pivot.sum(axis=1)
-                        summary_pivot = summary_pivot.sort_values('Total', ascending=False)
-                        
-                        st.write("**Customer Consumption Summary by Year:**")
-                        st.dataframe(summary_pivot, use_container_width=True)
-                        
-                        # Detailed view
-                        with st.expander("📋 Detailed Customer Data"):
-                            st.dataframe(details_df, use_container_width=True)
-                    else:
-                        st.info("No detailed consumption data available for the selected criteria.")
-                else:
-                    st.info("No data available for detailed analysis.")
-                    
-            except Exception as e:
-                st.error(f"❌ Error processing Import Data RAG file: {str(e)}")
-                st.write("Please ensure the Excel file exists and is accessible.")
-
-    # -------- View Market Data --------
-    elif current_tab == "View":
-        st.subheader("View Market Data")
-        
-        # Filters
-        col1, col2, col3 = st.columns(3)
-        with col1:
-            hs_filter = st.text_input("Filter by HS Code", placeholder="e.g., 390430")
-        with col2:
-            brand_filter = st.text_input("Filter by Brand/Commercial Name", placeholder="e.g., VINNAPAS")
-        with col3:
-            search_filter = st.text_input("Search in all fields", placeholder="Search...")
-        
-        if st.button("Reset Filters", type="secondary"):
-            hs_filter = ""
-            brand_filter = ""
-            search_filter = ""
-            st.rerun()
-        
-        # Fetch and display data
-        market_data = _fetch_all_market_data()
-        filtered_data = []
-        
-        for record in market_data:
-            metadata = record.get("metadata", {})
-            raw_data = record.get("raw_data", {})
-            
-            # Apply filters
-            if hs_filter and hs_filter.lower() not in str(metadata.get("hs_code", "")).lower():
-                continue
-            if brand_filter and brand_filter.lower() not in str(metadata.get("brand", "")).lower():
-                continue
-            if search_filter:
-                search_text = " ".join([
-                    str(metadata.get("hs_code", "")),
-                    str(metadata.get("brand", "")),
-                    str(metadata.get("commercial_name", "")),
-                    str(raw_data)
-                ]).lower()
-                if search_filter.lower() not in search_text:
-                    continue
-            
-            filtered_data.append(record)
-        
-        if filtered_data:
-            st.success(f"Found {len(filtered_data)} market records")
-            
-            # Display data in expandable cards
-            for i, record in enumerate(filtered_data):
-                metadata = record.get("metadata", {})
-                raw_data = record.get("raw_data", {})
-                
-                with st.expander(f"📊 {metadata.get('commercial_name', 'Unnamed')} - {metadata.get('hs_code', 'No HS Code')}"):
-                    col1, col2 = st.columns(2)
-                    
-                    with col1:
-                        st.markdown("**Basic Information:**")
-                        st.write(f"**HS Code:** {metadata.get('hs_code', 'N/A')}")
-                        st.write(f"**Brand:** {metadata.get('brand', 'N/A')}")
-                        st.write(f"**Commercial Name:** {metadata.get('commercial_name', 'N/A')}")
-                        st.write(f"**Period:** {record.get('period', 'N/A')}")
-                    
-                    with col2:
-                        st.markdown("**Market Data:**")
-                        if raw_data:
-                            for key, value in raw_data.items():
-                                if isinstance(value, dict):
-                                    st.write(f"**{key}:**")
-                                    for sub_key, sub_value in value.items():
-                                        st.write(f"  - {sub_key}: {sub_value}")
-                                else:
-                                    st.write(f"**{key}:** {value}")
-                        else:
-                            st.write("No detailed market data available")
-                    
-                    st.markdown("---")
-                    st.write(f"**Created:** {record.get('created_at', 'N/A')}")
-        else:
-            st.info("No market data found matching the current filters.")
-
-    # -------- Manage Market Data --------
-    elif current_tab == "Manage":
-        st.subheader("Manage Market Data")
-        
-        # Auth gate
-        if not sb_user:
-            st.info("Please sign in to access Manage Market Data.")
-        elif not is_manager:
-            st.error("You do not have permission to access Manage Market Data.")
-        else:
-            # Filters for management
-            col1, col2, col3 = st.columns(3)
-            with col1:
-                manage_hs_filter = st.text_input("Filter by HS Code", key="manage_hs_filter", placeholder="e.g., 390430")
-            with col2:
-                manage_brand_filter = st.text_input("Filter by Brand", key="manage_brand_filter", placeholder="e.g., VINNAPAS")
-            with col3:
-                manage_search_filter = st.text_input("Search", key="manage_search_filter", placeholder="Search...")
-            
-            if st.button("Reset Filters", key="manage_reset_filters", type="secondary"):
-                manage_hs_filter = ""
-                manage_brand_filter = ""
-                manage_search_filter = ""
-                st.rerun()
-            
-            # Fetch and display data for management
-            market_data = _fetch_all_market_data()
-            filtered_data = []
-            
-            for record in market_data:
-                metadata = record.get("metadata", {})
-                raw_data = record.get("raw_data", {})
-                
-                # Apply filters
-                if manage_hs_filter and manage_hs_filter.lower() not in str(metadata.get("hs_code", "")).lower():
-                    continue
-                if manage_brand_filter and manage_brand_filter.lower() not in str(metadata.get("brand", "")).lower():
-                    continue
-                if manage_search_filter:
-                    search_text = " ".join([
-                        str(metadata.get("hs_code", "")),
-                        str(metadata.get("brand", "")),
-                        str(metadata.get("commercial_name", "")),
-                        str(raw_data)
-                    ]).lower()
-                    if manage_search_filter.lower() not in search_text:
-                        continue
-                
-                filtered_data.append(record)
-            
-            if filtered_data:
-                st.success(f"Found {len(filtered_data)} market records")
-                
-                # Display data in management table
-                for i, record in enumerate(filtered_data):
-                    metadata = record.get("metadata", {})
-                    record_id = record.get("id")
-                    
-                    with st.container():
-                        st.markdown("---")
-                        col1, col2, col3 = st.columns([3, 1, 1])
-                        
-                        with col1:
-                            st.markdown(f"**{metadata.get('commercial_name', 'Unnamed')}**")
-                            st.caption(f"HS Code: {metadata.get('hs_code', 'N/A')} | Brand: {metadata.get('brand', 'N/A')} | Period: {record.get('period', 'N/A')}")
-                        
-                        with col2:
-                            if st.button("✏️ Edit", key=f"edit_market_{record_id}"):
-                                st.session_state[f"editing_market_{record_id}"] = True
-                                st.rerun()
-                        
-                        with col3:
-                            if st.button("🗑️ Delete", key=f"delete_market_{record_id}"):
-                                success, message = _delete_market_record(record_id)
-                                if success:
-                                    st.success(message)
-                                else:
-                                    st.error(message)
-                                st.rerun()
-                        
-                        # Edit form
-                        if st.session_state.get(f"editing_market_{record_id}"):
-                            st.markdown("**Edit Market Record:**")
-                            
-                            edit_col1, edit_col2 = st.columns(2)
-                            with edit_col1:
-                                new_hs_code = st.text_input("HS Code", value=metadata.get("hs_code", ""), key=f"edit_hs_{record_id}")
-                                new_brand = st.text_input("Brand", value=metadata.get("brand", ""), key=f"edit_brand_{record_id}")
-                                new_commercial_name = st.text_input("Commercial Name", value=metadata.get("commercial_name", ""), key=f"edit_commercial_{record_id}")
-                            
-                            with edit_col2:
-                                new_period = st.text_input("Period", value=record.get("period", ""), key=f"edit_period_{record_id}")
-                                new_notes = st.text_area("Notes", value=record.get("notes", ""), key=f"edit_notes_{record_id}")
-                            
-                            save_col1, save_col2 = st.columns(2)
-                            with save_col1:
-                                if st.button("💾 Save Changes", key=f"save_market_{record_id}"):
-                                    updates = {
-                                        "metadata": {
-                                            **metadata,
-                                            "hs_code": new_hs_code,
-                                            "brand": new_brand,
-                                            "commercial_name": new_commercial_name
-                                        },
-                                        "period": new_period,
-                                        "notes": new_notes
-                                    }
-                                    success, message = _update_market_record(record_id, updates)
-                                    if success:
-                                        st.success(message)
-                                        st.session_state.pop(f"editing_market_{record_id}", None)
-                                    else:
-                                        st.error(message)
-                                    st.rerun()
-                            
-                            with save_col2:
-                                if st.button("❌ Cancel", key=f"cancel_market_{record_id}"):
-                                    st.session_state.pop(f"editing_market_{record_id}", None)
-                                    st.rerun()
-            else:
-                st.info("No market data found matching the current filters.")
-
-    st.markdown('</div>', unsafe_allow_html=True)
-
-# ==========================
-# UI - Sourcing Master Data (coming soon)
-# ==========================
-if st.session_state.get("main_section") == "partner_master" and has_sourcing_master_access(user_email):
-    st.markdown('<h1 style="color:#1976d2; font-weight:700;">Partner Master Data</h1>', unsafe_allow_html=True)
-    st.markdown('<div class="form-card">', unsafe_allow_html=True)
-    st.caption("Business partner")
-
-    # If requested, programmatically switch to Manage tab after a save
-    if st.session_state.get("partner_go_manage"):
-        st.session_state.pop("partner_go_manage", None)
-        st.markdown(
-            """
-            <script>
-            setTimeout(function(){
-              const tabs = Array.from(document.querySelectorAll('button[role="tab"]'));
-              const manage = tabs.find(el => el.innerText && el.innerText.trim().toLowerCase().includes('manage'));
-              if (manage) { manage.click(); }
-            }, 50);
-            </script>
-            """,
-            unsafe_allow_html=True,
-        )
-
-    # Create custom tab navigation with proper change detection
-    tab_col1, tab_col2, tab_col3, tab_col4 = st.columns(4)
-    
-    with tab_col1:
-        if st.button("Add Partner", key="partner_tab_add", type="primary" if st.session_state.get("partner_current_tab") == "Add Partner" else "secondary", use_container_width=True):
-            previous_tab = st.session_state.get("partner_current_tab")
-            if previous_tab and previous_tab != "Add Partner" and _has_unsaved_partner_changes():
-                st.session_state["pending_partner_tab"] = "Add Partner"
-                st.rerun()
-            else:
-                st.session_state["partner_current_tab"] = "Add Partner"
-                st.rerun()
-    
-    with tab_col2:
-        if st.button("Add Chemical", key="partner_tab_chem", type="primary" if st.session_state.get("partner_current_tab") == "Add Chemical" else "secondary", use_container_width=True):
-            previous_tab = st.session_state.get("partner_current_tab")
-            if previous_tab and previous_tab != "Add Chemical" and _has_unsaved_partner_changes():
-                st.session_state["pending_partner_tab"] = "Add Chemical"
-                st.rerun()
-            else:
-                st.session_state["partner_current_tab"] = "Add Chemical"
-                st.rerun()
-    
-    with tab_col3:
-        if st.button("Manage", key="partner_tab_manage", type="primary" if st.session_state.get("partner_current_tab") == "Manage" else "secondary", use_container_width=True):
-            previous_tab = st.session_state.get("partner_current_tab")
-            if previous_tab and previous_tab != "Manage" and _has_unsaved_partner_changes():
-                st.session_state["pending_partner_tab"] = "Manage"
-                st.rerun()
-            else:
-                st.session_state["partner_current_tab"] = "Manage"
-                st.rerun()
-    
-    with tab_col4:
-        if st.button("View", key="partner_tab_view", type="primary" if st.session_state.get("partner_current_tab") == "View" else "secondary", use_container_width=True):
-            previous_tab = st.session_state.get("partner_current_tab")
-            if previous_tab and previous_tab != "View" and _has_unsaved_partner_changes():
-                st.session_state["pending_partner_tab"] = "View"
-                st.rerun()
-            else:
-                st.session_state["partner_current_tab"] = "View"
-                st.rerun()
-    
-    # Handle pending partner tab changes with confirmation dialog
-    if st.session_state.get("pending_partner_tab"):
-        new_tab = st.session_state.get("pending_partner_tab")
-        previous_tab = st.session_state.get("partner_current_tab")
-        
-        if previous_tab == "Add Partner":
-            st.warning("⚠️ You have unsaved changes in the Add Partner tab.")
-            col1, col2, col3 = st.columns([1, 1, 2])
-            with col1:
-                if st.button("🗑️ Discard & Continue", key="discard_partner_add", type="primary"):
-                    _clear_partner_session()
-                    st.session_state["partner_current_tab"] = new_tab
-                    st.session_state.pop("pending_partner_tab")
-                    st.rerun()
-            with col2:
-                if st.button("❌ Cancel", key="cancel_partner_add"):
-                    st.session_state.pop("pending_partner_tab")
-                    st.rerun()
-            with col3:
-                st.caption("Your unsaved changes will be lost if you continue.")
-            st.stop()
-        elif previous_tab == "Add Chemical":
-            st.warning("⚠️ You have unsaved changes in the Add Chemical tab.")
-            col1, col2, col3 = st.columns([1, 1, 2])
-            with col1:
-                if st.button("🗑️ Discard & Continue", key="discard_partner_chem", type="primary"):
-                    _clear_partner_session()
-                    st.session_state["partner_current_tab"] = new_tab
-                    st.session_state.pop("pending_partner_tab")
-                    st.rerun()
-            with col2:
-                if st.button("❌ Cancel", key="cancel_partner_chem"):
-                    st.session_state.pop("pending_partner_tab")
-                    st.rerun()
-            with col3:
-                st.caption("Your unsaved changes will be lost if you continue.")
-            st.stop()
-        elif previous_tab == "Manage":
-            st.warning("⚠️ You have unsaved changes in the Manage tab.")
-            col1, col2, col3 = st.columns([1, 1, 2])
-            with col1:
-                if st.button("🗑️ Discard & Continue", key="discard_partner_manage", type="primary"):
-                    _clear_partner_session()
-                    st.session_state["partner_current_tab"] = new_tab
-                    st.session_state.pop("pending_partner_tab")
-                    st.rerun()
-            with col2:
-                if st.button("❌ Cancel", key="cancel_partner_manage"):
-                    st.session_state.pop("pending_partner_tab")
-                    st.rerun()
-            with col3:
-                st.caption("Your unsaved changes will be lost if you continue.")
-            st.stop()
-    
-    # Get current tab for rendering
-    current_partner_tab = st.session_state.get("partner_current_tab", "Add Partner")
-
-    # Helpers for partner_data
-    def fetch_partners():
-        try:
-            res = supabase.table("partner_data").select("*").order("partner").execute()
-            return res.data or []
-        except Exception as e:
-            st.error(f"Failed to fetch partners: {e}")
-            return []
-
-    def _normalize_partner_name(name: str) -> str:
-        try:
-            return (name or "").strip().lower()
-        except Exception:
-            return name or ""
-
-    def _fuzzy_match_partners(partner: str, country: str | None = None, threshold: float = 0.8) -> list[dict]:
-        """Find similar partners using fuzzy matching"""
-        try:
-            from difflib import SequenceMatcher
-            
-            pname = _normalize_partner_name(partner)
-            if not pname:
-                return []
-            
-            rows = supabase.table("partner_data").select("id,partner,partner_country").execute().data or []
-            similar_partners = []
-            
-            for r in rows:
-                rn = _normalize_partner_name(r.get("partner") or "")
-                rc = (r.get("partner_country") or "").strip().lower()
-                country_match = country is None or rc == (country or "").strip().lower()
-                
-                # Calculate similarity score
-                similarity = SequenceMatcher(None, pname, rn).ratio()
-                
-                if similarity >= threshold and country_match:
-                    similar_partners.append({
-                        "id": r.get("id"),
-                        "partner": r.get("partner"),
-                        "partner_country": r.get("partner_country"),
-                        "similarity": similarity
-                    })
-            
-            # Sort by similarity score (highest first)
-            return sorted(similar_partners, key=lambda x: x["similarity"], reverse=True)
-        except Exception:
-            return []
-
-    def partner_exists(partner: str, country: str | None = None) -> bool:
-        """Return True if a partner with same name (case-insensitive) and optional country exists."""
-        try:
-            pname = _normalize_partner_name(partner)
-            if not pname:
-                return False
-            rows = supabase.table("partner_data").select("id,partner,partner_country").execute().data or []
-            for r in rows:
-                rn = _normalize_partner_name(r.get("partner") or "")
-                if rn != pname:
-                    continue
-                if country is None:
-                    return True
-                rc = (r.get("partner_country") or "").strip().lower()
-                if rc == (country or "").strip().lower():
-                    return True
-            return False
-        except Exception:
-            return False
-
-    def create_partner(partner: str, country: str, selected_products: list[dict]):
-        try:
-            # Prevent duplicate partner by name+country
-            if partner_exists(partner, country):
-                st.error("Partner already exists with the same name and country")
-                return None
-            payload = {
-                # id generated by DB default
-                "partner": (partner or "").strip(),
-                "partner_country": (country or "").strip(),
-                # is_active defaults to true in DB
-            }
-            return supabase.table("partner_data").insert(payload).execute()
-        except Exception as e:
-            st.error(f"Failed to create partner: {e}")
-            return None
-
-    def update_partner(pid: str, updates: dict):
-        try:
-            updates_with_ts = {**updates, "updated_at": datetime.utcnow().isoformat() + "Z"}
-            return supabase.table("partner_data").update(updates_with_ts).eq("id", pid).execute()
-        except Exception as e:
-            st.error(f"Failed to update partner: {e}")
-            return None
-
-    def delete_partner(pid: str):
-        try:
-            return supabase.table("partner_data").delete().eq("id", pid).execute()
-        except Exception as e:
-            st.error(f"Failed to delete partner: {e}")
-            return None
-
-    def list_all_tds():
-        """Return list of products (name/category) that have a TDS uploaded, including file name/url."""
-        try:
-            res = supabase.table("tds_data").select("id,chemical_type_id,brand,grade,metadata").order("created_at", desc=True).execute()
-            rows = res.data or []
-            items = []
-            for r in rows:
-                meta = r.get("metadata") or {}
-                # Only include when a TDS file URL exists
-                if not meta.get("tds_file_url"):
-                    continue
-                items.append({
-                    "id": r.get("id"),  # tds record id (for unique widget keys)
-                    "chemical_type_id": r.get("chemical_type_id"),
-                    "name": meta.get("product_name") or meta.get("generic_product_name") or (r.get("brand") or "Unnamed"),
-                    "category": meta.get("category") or "Others",
-                    "brand": r.get("brand"),
-                    "tds_file_url": meta.get("tds_file_url"),
-                    "tds_file_name": meta.get("tds_file_name"),
-                })
-            # Sort by category then name for stable UI
-            items.sort(key=lambda x: (x.get("category") or "", x.get("name") or ""))
-            return items
-        except Exception as e:
-            st.error(f"Failed to fetch list: {e}")
-            return []
-
-    def _ensure_chemical_type(name: str, category: str) -> str | None:
-        """Find or create a chemical_types row by name and category; return id."""
-        try:
-            nm = (name or "").strip()
-            cat = (category or "").strip() or "Others"
-            if not nm:
-                return None
-            # Try find existing
-            res = supabase.table("chemical_types").select("id").eq("name", nm).eq("category", cat).limit(1).execute()
-            rows = res.data or []
-            if rows:
-                return rows[0].get("id")
-            # Create minimal record
-            payload = {"name": nm, "category": cat, "metadata": {}}
-            ins = supabase.table("chemical_types").insert(payload).execute()
-            # Fetch id from insert result
-            newid = None
-            try:
-                newid = ((ins.data or [{}])[0] or {}).get("id")
-            except Exception:
-                newid = None
-            if not newid:
-                # Last resort: re-query
-                res2 = supabase.table("chemical_types").select("id").eq("name", nm).eq("category", cat).limit(1).execute()
-                rows2 = res2.data or []
-                if rows2:
-                    newid = rows2[0].get("id")
-            return newid
-        except Exception:
-            return None
-
-    def partner_get_products(partner_row: dict) -> list[dict]:
-        """Return assigned products from metadata.tds_products field.
-        Since tds_products and products columns don't exist, we only check metadata.tds_products.
-        """
-        try:
-            md = partner_row.get("metadata") or {}
-            if isinstance(md.get("tds_products"), list):
-                result = md.get("tds_products") or []
-                if result:
-                    return result
-        except Exception:
-            pass
-        return []
-
-    def partner_set_products(partner_id: str, products: list[dict]) -> None:
-        """Persist assigned products into metadata field.
-        Since tds_products and products columns don't exist, we use metadata.tds_products.
-        """
-        try:
-            curr = supabase.table("partner_data").select("metadata").eq("id", partner_id).limit(1).execute()
-            curr_meta = ((curr.data or [{}])[0] or {}).get("metadata") or {}
-            curr_meta["tds_products"] = products
-            supabase.table("partner_data").update({"metadata": curr_meta}).eq("id", partner_id).execute()
-        except Exception as e:
-            st.error(f"Failed to update partner products: {e}")
-            pass
-
-    def _reset_session_keys(keys: list[str]):
-        try:
-            for k in keys:
-                try:
-                    st.session_state.pop(k, None)
-                except Exception:
-                    pass
-        except Exception:
-            pass
-
-    def _reset_session_by_prefix(prefixes: list[str]):
-        try:
-            for k in list(st.session_state.keys()):
-                if any(k.startswith(pfx) for pfx in prefixes):
-                    try:
-                        st.session_state.pop(k, None)
-                    except Exception:
-                        pass
-        except Exception:
-            pass
-
-    if current_partner_tab == "Add Partner":
-        st.subheader("Add Partner")
-        partner_name = st.text_input("Partner Name *")
-        # Country dropdown (ISO list)
-        partner_country = st.selectbox("Partner Country *", COUNTRIES)
-        # Add Partner is now only for creating the partner record
-        st.markdown("---")
-        st.caption("Fill in partner info and save. Assign chemicals in the 'Add Chemical' tab.")
-
-        # Check for similar partners as user types
-        if partner_name and partner_country:
-            similar_partners = _fuzzy_match_partners(partner_name, partner_country, threshold=0.7)
-            if similar_partners:
-                st.warning("⚠️ Similar partners found:")
-                for similar in similar_partners[:3]:  # Show top 3 matches
-                    similarity_percent = int(similar["similarity"] * 100)
-                    st.write(f"• {similar['partner']} ({similar['partner_country']}) - {similarity_percent}% similar")
-                st.caption("Please review the list above to avoid creating duplicate partners.")
-
-        if st.button("Save Partner", type="primary"):
-            if not (partner_name and partner_country):
-                st.error("Partner name and country are required")
-            elif partner_exists(partner_name, partner_country):
-                st.error("Partner already exists with the same name and country")
-            else:
-                # Check for very similar partners (high threshold) and block if found
-                very_similar = _fuzzy_match_partners(partner_name, partner_country, threshold=0.9)
-                if very_similar:
-                    st.error("❌ Cannot create partner: Very similar partner already exists!")
-                    st.write("**Similar partners found:**")
-                    for similar in very_similar:
-                        similarity_percent = int(similar["similarity"] * 100)
-                        st.write(f"• {similar['partner']} ({similar['partner_country']}) - {similarity_percent}% similar")
-                    st.caption("Please use a different name or check if this is the same partner.")
-                else:
-                    resp = create_partner(partner_name, partner_country, [])
-                    if resp is not None:
-                        st.success("✅ Partner saved")
-                        # Reset Add Partner inputs
-                        _reset_session_by_prefix(["pn_","pc_"]) 
-                        st.rerun()
-        
-        # Add clear session button if there are unsaved changes
-
-    elif current_partner_tab == "Add Chemical":
-        st.subheader("Add Chemical to Partner")
-        partners = fetch_partners()
-        if not partners:
-            st.info("No partners found. Please add a partner first in 'Add Partner'.")
-        else:
-            partner_labels = {f"{p.get('partner')} ({p.get('partner_country')})": p for p in partners}
-            sel_label = st.selectbox("Select Partner", list(partner_labels.keys()))
-            partner_obj = partner_labels.get(sel_label)
-            tds_records = list_all_tds()
-            if not tds_records:
-                st.info("No TDS-backed chemicals found. Upload TDS in the TDS Master Data module.")
-            else:
-                # Get already assigned chemicals for this partner
-                existing = partner_get_products(partner_obj)
-                already_ids = {item.get('tds_id') for item in existing if isinstance(item, dict)}
-                
-                # Build label → id map only for unassigned chemicals
-                options_map = {}
-                for r in tds_records:
-                    # Skip if already assigned to this partner
-                    if r.get('id') in already_ids:
-                        continue
-                    
-                    meta = r
-                    label = f"{meta.get('name') or 'Unnamed'} — {meta.get('category') or 'Others'}"
-                    # Prefer showing Product Type — Brand
-                    label = f"{meta.get('name') or 'Unnamed'}"
-                    options_map[f"{label}"] = r.get('id')
-                
-                if not options_map:
-                    st.info("✅ All available chemicals are already assigned to this partner.")
-                else:
-                    st.markdown("**Select chemicals (with TDS) to assign**")
-                    sel_labels = st.multiselect(
-                        "Chemicals",
-                        options=list(options_map.keys()),
-                    )
-                    
-                    if st.button("Assign to Partner", type="primary"):
-                        to_add = []
-                        for lb in sel_labels:
-                            tid = options_map.get(lb)
-                            if not tid or tid in already_ids:
-                                continue
-                            rec = next((r for r in tds_records if r.get('id') == tid), None)
-                            if not rec:
-                                continue
-                            to_add.append({
-                                "tds_id": rec.get("id"),
-                                "chemical_type_id": rec.get("chemical_type_id"),
-                                "name": rec.get("name"),
-                                "category": rec.get("category"),
-                            })
-                        new_list = existing + to_add
-                        partner_set_products(partner_obj.get("id"), new_list)
-                        st.success("Assigned chemicals to partner")
-                        # Reset selection inputs
-                        _reset_session_by_prefix(["rem_","add_more_"])
-                        st.rerun()
-
-    elif current_partner_tab == "Manage":
-        st.subheader("Manage Partners")
-        partners = fetch_partners()
-        if not partners:
-            st.info("No partners found")
-        else:
-            for p in partners:
-                pid = p.get("id")
-                with st.expander(f"🤝 {p.get('partner')} ({p.get('partner_country')})", expanded=False):
-                    col1, col2 = st.columns([3,2])
-                    with col1:
-                        e_name = st.text_input("Partner", value=p.get("partner", ""), key=f"pn_{pid}")
-                    with col2:
-                        e_country = st.selectbox("Country", COUNTRIES, index=(COUNTRIES.index(p.get("partner_country", "")) if p.get("partner_country") in COUNTRIES else 0), key=f"pc_{pid}")
-
-                    # (Actions moved under TDS-backed Products below)
-
-                    st.markdown("---")
-                    st.subheader("Assigned TDS-backed Products")
-                    assigned = partner_get_products(p)
-                    if not assigned:
-                        st.caption("No chemicals assigned to this partner.")
-                    else:
-                        # Group by category for display
-                        by_cat_ro: dict[str, list[dict]] = {}
-                        for r in assigned:
-                            by_cat_ro.setdefault(r.get("category") or "Others", []).append(r)
-                        for cat, items in by_cat_ro.items():
-                            with st.expander(f"📁 {cat}", expanded=False):
-                                for rec in items:
-                                    st.write(rec.get("name") or "Unnamed")
-
-                    # 2) Remove link(s) from already linked TDS
-                    if assigned:
-                        st.markdown("**Remove linked chemicals**")
-                        # build label -> index mapping for assigned
-                        rem_labels_map = {}
-                        for idx, rec in enumerate(assigned):
-                            label = rec.get("name") or f"Item {idx+1}"
-                            rem_labels_map[f"{label}"] = idx
-                        to_remove_labels = st.multiselect(
-                            "Select assigned items to remove",
-                            list(rem_labels_map.keys()),
-                            key=f"rem_{pid}"
-                        )
-                        if st.button("Remove Selected", key=f"btn_rem_{pid}"):
-                            keep = []
-                            drop_indices = {rem_labels_map[lbl] for lbl in to_remove_labels}
-                            for idx, rec in enumerate(assigned):
-                                if idx not in drop_indices:
-                                    keep.append(rec)
-                            partner_set_products(pid, keep)
-                            st.success("Removed selected links")
-                            st.rerun()
-
-                    # Add additional chemicals to this partner
-                    st.markdown("---")
-                    st.subheader("Add Additional Chemical TDS")
-                    tds_records_all = list_all_tds()
-                    # 3) Only show unlinked TDS for adding
-                    current_ids = {it.get('tds_id') for it in assigned if isinstance(it, dict)}
-                    unlinked = [r for r in tds_records_all if r.get('id') not in current_ids]
-                    
-                    
-                    opts = {f"{r.get('name') or 'Unnamed'}": r.get('id') for r in unlinked}
-                    add_labels = st.multiselect("Select chemicals to add", list(opts.keys()), key=f"add_more_{pid}")
-                    if st.button("Add Selected", key=f"btn_add_more_{pid}"):
-                        add_items = []
-                        for lb in add_labels:
-                            tid = opts.get(lb)
-                            if tid in current_ids:
-                                continue
-                            rec = next((r for r in tds_records_all if r.get('id') == tid), None)
-                            if rec:
-                                add_items.append({
-                                    "tds_id": rec.get("id"),
-                                    "chemical_type_id": rec.get("chemical_type_id"),
-                                    "name": rec.get("name"),
-                                    "category": rec.get("category"),
-                                })
-                        new_list = assigned + add_items
-                        partner_set_products(pid, new_list)
-                        st.success("Added")
-                        _reset_session_by_prefix(["add_more_"])
-                        st.rerun()
-                    # Compact action buttons placed under TDS-backed Products
-                    st.markdown('<div class="partner-actions partner-actions-cta">', unsafe_allow_html=True)
-                    btn_col1, btn_col2 = st.columns([1,1])
-                    with btn_col1:
-                        if st.button("💾 Save", key=f"ps_{pid}"):
-                            if not e_name.strip() or not e_country.strip():
-                                st.error("Name and country cannot be empty")
-                            elif partner_exists(e_name, e_country) and _normalize_partner_name(e_name) != _normalize_partner_name(p.get("partner") or ""):
-                                st.error("Another partner already exists with the same name and country")
-                            else:
-                                # Check for very similar partners (excluding current partner)
-                                very_similar = _fuzzy_match_partners(e_name, e_country, threshold=0.9)
-                                # Filter out current partner from similar matches
-                                very_similar = [s for s in very_similar if s["id"] != pid]
-                                
-                                if very_similar:
-                                    st.error("❌ Cannot update partner: Very similar partner already exists!")
-                                    st.write("**Similar partners found:**")
-                                    for similar in very_similar:
-                                        similarity_percent = int(similar["similarity"] * 100)
-                                        st.write(f"• {similar['partner']} ({similar['partner_country']}) - {similarity_percent}% similar")
-                                    st.caption("Please use a different name or check if this is the same partner.")
-                                else:
-                                    update_partner(pid, {"partner": e_name.strip(), "partner_country": e_country.strip()})
-                                    st.success("Updated")
-                                    st.rerun()
-                    with btn_col2:
-                        if st.button("🗑️ Delete", key=f"pd_{pid}"):
-                            delete_partner(pid)
-                            st.success("Deleted")
-                            st.rerun()
-                    st.markdown('</div>', unsafe_allow_html=True)
-
-    elif current_partner_tab == "View":
-        st.subheader("View Partners")
-        partners = fetch_partners()
-        if not partners:
-            st.info("No partners found")
-        else:
-            # Fetch all TDS once for matching
-            try:
-                tds_records_all = supabase.table("tds_data").select("id,brand,metadata,chemical_type_id").execute().data or []
-            except Exception:
-                tds_records_all = []
-            # Index by chemical_type_id for quick partner links resolution
-            tds_by_type: dict[str, list[dict]] = {}
-            try:
-                for _tds in tds_records_all:
-                    _ctid = (_tds.get("chemical_type_id") or "").strip()
-                    if not _ctid:
-                        continue
-                    tds_by_type.setdefault(_ctid, []).append(_tds)
-            except Exception:
-                tds_by_type = {}
-
-            # Simple view-only list of partners with their TDS-backed products
-            for p in partners:
-                pname = (p.get("partner") or "").strip()
-                pcountry = (p.get("partner_country") or "").strip()
-                pname_l = pname.lower()
-                # Build robust tokens for matching (strip parentheses/punctuation)
-                import re as _re_pv
-                _base_name = _re_pv.sub(r"\(.*?\)", "", pname_l)  # remove parenthetical e.g., (china)
-                _base_name = _re_pv.sub(r"[^a-z0-9\s]", " ", _base_name)
-                partner_tokens = [t for t in _base_name.split() if len(t) >= 3]
-
-                # Prefer explicit TDS-backed products stored on partner record
-                partner_products = (
-                    p.get("tds_products")
-                    or p.get("products")
-                    or (p.get("metadata") or {}).get("tds_products")
-                    or []
-                )
-
-                matched: list[dict] = []
-                if isinstance(partner_products, list) and partner_products:
-                    for it in partner_products:
-                        try:
-                            if not isinstance(it, dict):
-                                continue
-                            ct_id = (it.get("chemical_type_id") or it.get("type_id") or "").strip()
-                            if ct_id and ct_id in tds_by_type:
-                                for tds in tds_by_type.get(ct_id) or []:
-                                    meta = tds.get("metadata") or {}
-                                    matched.append({
-                                        "name": meta.get("product_name") or meta.get("generic_product_name") or (tds.get("brand") or "Unnamed"),
-                                        "category": meta.get("category") or "Others",
-                                        "tds_file_url": meta.get("tds_file_url"),
-                                        "tds_file_name": meta.get("tds_file_name"),
-                                    })
-                            else:
-                                # Fallback by name if provided
-                                nm = (it.get("name") or "").strip().lower()
-                                if nm:
-                                    for tds in tds_records_all:
-                                        meta = tds.get("metadata") or {}
-                                        hay = " ".join([
-                                            str(meta.get("product_name") or ""),
-                                            str(meta.get("generic_product_name") or ""),
-                                            str(tds.get("brand") or ""),
-                                        ]).lower()
-                                        if nm in hay:
-                                            matched.append({
-                                                "name": meta.get("product_name") or meta.get("generic_product_name") or (tds.get("brand") or "Unnamed"),
-                                                "category": meta.get("category") or "Others",
-                                                "tds_file_url": meta.get("tds_file_url"),
-                                                "tds_file_name": meta.get("tds_file_name"),
-                                            })
-                        except Exception:
-                            continue
-                else:
-                    # Fallback: match TDS by supplier/brand using robust token matching
-                    for tds in tds_records_all:
-                        meta = tds.get("metadata") or {}
-                        supplier = (meta.get("supplier_name") or "").strip().lower()
-                        brand = (tds.get("brand") or "").strip().lower()
-                        hay = f"{supplier} {brand}"
-                        hay_norm = _re_pv.sub(r"[^a-z0-9\s]", " ", hay)
-                        if pname_l and (pname_l in hay_norm):
-                            cond = True
-                        else:
-                            # token membership
-                            cond = any(t in hay_norm for t in partner_tokens)
-                        if cond:
-                            matched.append({
-                                "name": meta.get("product_name") or meta.get("generic_product_name") or (tds.get("brand") or "Unnamed"),
-                                "category": meta.get("category") or "Others",
-                                "tds_file_url": meta.get("tds_file_url"),
-                                "tds_file_name": meta.get("tds_file_name"),
-                            })
-
-                # Display partner information directly without view/close buttons
-                with st.expander(f"🤝 {pname} ({pcountry})", expanded=False):
-                    # Header info (view-only)
-                    cols = st.columns([3,2])
-                    with cols[0]:
-                        st.markdown(f"**Partner:** {pname or '-'}")
-                    with cols[1]:
-                        st.markdown(f"**Country:** {pcountry or '-'}")
-
-                    st.markdown("---")
-                    st.subheader("Assigned TDS-backed Products")
-                    # Show only chemicals assigned to this partner (like Manage)
-                    assigned_view = partner_get_products(p)
-                    if not assigned_view:
-                        st.caption("No chemicals assigned to this partner.")
-                    else:
-                        by_cat_ro: dict[str, list[dict]] = {}
-                        for r in assigned_view:
-                            by_cat_ro.setdefault(r.get("category") or "Others", []).append(r)
-                        for cat, items in by_cat_ro.items():
-                            with st.expander(f"📁 {cat}", expanded=False):
-                                for rec in items:
-                                    st.markdown(f"- {rec.get('name') or 'Unnamed'}")
-
-    st.markdown('</div>', unsafe_allow_html=True)
-
-# ==========================
-# UI - Pricing & Costing Master Data
-# ==========================
-if st.session_state.get("main_section") == "pricing" and has_sourcing_master_access(user_email):
-    st.markdown('<h1 style="color:#1976d2; font-weight:700;">Pricing & Costing Master Data</h1>', unsafe_allow_html=True)
-    st.markdown('<div class="form-card">', unsafe_allow_html=True)
-
-    # Helpers
-    def _fetch_partners_simple() -> list[dict]:
-        try:
-            return supabase.table("partner_data").select("id,partner,partner_country").order("partner").execute().data or []
-        except Exception:
-            return []
-
-    def _fetch_tds_simple() -> list[dict]:
-        try:
-            rows = supabase.table("tds_data").select("id,chemical_type_id,brand,metadata").order("created_at", desc=True).execute().data or []
-            items = []
-            for r in rows:
-                meta = r.get("metadata") or {}
-                items.append({
-                    "id": r.get("id"),
-                    "chemical_type_id": r.get("chemical_type_id"),
-                    "name": meta.get("product_name") or meta.get("generic_product_name") or (r.get("brand") or "Unnamed"),
-                    "category": meta.get("category") or "Others",
-                })
-            return items
-        except Exception:
-            return []
-
-    def _fetch_tds_for_partner(partner_id: str) -> list[dict]:
-        """Get TDS records assigned to a specific partner"""
-        try:
-            # Get partner's assigned products - check all possible fields like partner_get_products does
-            partner_resp = supabase.table("partner_data").select("metadata").eq("id", partner_id).execute()
-            if not partner_resp.data:
-                st.error(f"❌ No partner found with ID: {partner_id}")
-                return []
-            
-            partner_data = partner_resp.data[0]
-            
-            # Get assigned products from metadata field
-            assigned_products = []
-            try:
-                md = partner_data.get("metadata") or {}
-                if isinstance(md.get("tds_products"), list):
-                    assigned_products = md.get("tds_products") or []
-            except Exception:
-                pass
-            
-            if not assigned_products:
-                return []
-            
-            # Get TDS IDs from assigned products
-            tds_ids = [p.get("tds_id") for p in assigned_products if p.get("tds_id")]
-            if not tds_ids:
-                return []
-            
-            # Fetch TDS records for these IDs
-            rows = supabase.table("tds_data").select("id,chemical_type_id,brand,metadata").in_("id", tds_ids).order("created_at", desc=True).execute().data or []
-            items = []
-            for r in rows:
-                meta = r.get("metadata") or {}
-                items.append({
-                    "id": r.get("id"),
-                    "chemical_type_id": r.get("chemical_type_id"),
-                    "name": meta.get("product_name") or meta.get("generic_product_name") or (r.get("brand") or "Unnamed"),
-                    "category": meta.get("category") or "Others",
-                })
-            return items
-        except Exception:
-            return []
-
-    GLOBAL_INCOTERMS = ["FOB", "CIF Mombasa", "SEZ MCF", "Nairobi", "FCA", "Addis Ababa"]
-    KENYA_INCOTERMS = ["Kenya", "Nairobi", "FCA Moyale", "Addis"]
-
-    def _incoterm_rows_default():
-        rows = []
-        for inc in GLOBAL_INCOTERMS + KENYA_INCOTERMS:
-            rows.append({"incoterm": inc, "cost_usd": "", "cost_etb": "", "price_usd": "", "price_etb": ""})
-        return rows
-
-    def _split_rows(rows: list[dict]):
-        global_rows, kenya_rows, other_rows = [], [], []
-        try:
-            for r in rows or []:
-                inc = str(r.get("incoterm") or "").strip()
-                if inc in GLOBAL_INCOTERMS:
-                    global_rows.append(r)
-                elif inc in KENYA_INCOTERMS:
-                    kenya_rows.append(r)
-                else:
-                    other_rows.append(r)
-        except Exception:
-            pass
-        return global_rows, kenya_rows, other_rows
-
-    def _pricing_table_add(partner_id: str, tds_id: str, rows: list[dict]):
-        try:
-            payload = {
-                "partner_id": partner_id,
-                "tds_id": tds_id,
-                "rows": rows,
-            }
-            return supabase.table("costing_pricing_data").insert(payload).execute()
-        except Exception as e:
-            st.error(f"Failed to save pricing: {e}")
-            return None
-
-    def _pricing_table_update(pid: str, updates: dict):
-        try:
-            return supabase.table("costing_pricing_data").update(updates).eq("id", pid).execute()
-        except Exception as e:
-            st.error(f"Failed to update pricing: {e}")
-            return None
-
-    def _pricing_table_delete(pid: str):
-        try:
-            return supabase.table("costing_pricing_data").delete().eq("id", pid).execute()
-        except Exception as e:
-            st.error(f"Failed to delete pricing: {e}")
-            return None
-
-    def _pricing_fetch_all():
-        try:
-            return supabase.table("costing_pricing_data").select("*").order("created_at", desc=True).execute().data or []
-        except Exception as e:
-            st.info("Pricing table not found yet. It will be created when you save your first record.")
-            return []
-
-    # Create custom tab navigation with proper change detection
-    tab_col1, tab_col2, tab_col3 = st.columns(3)
-    
-    with tab_col1:
-        if st.button("Add", key="pricing_tab_add", type="primary" if st.session_state.get("pricing_current_tab") == "Add" else "secondary", use_container_width=True):
-            previous_tab = st.session_state.get("pricing_current_tab")
-            if previous_tab and previous_tab != "Add" and _has_unsaved_pricing_changes():
-                st.session_state["pending_pricing_tab"] = "Add"
-                st.rerun()
-            else:
-                # Clear session when switching to Add tab
-                if previous_tab and previous_tab != "Add":
-                    _clear_pricing_session()
-                st.session_state["pricing_current_tab"] = "Add"
-                st.rerun()
-    
-    with tab_col2:
-        if st.button("Manage", key="pricing_tab_manage", type="primary" if st.session_state.get("pricing_current_tab") == "Manage" else "secondary", use_container_width=True):
-            previous_tab = st.session_state.get("pricing_current_tab")
-            if previous_tab and previous_tab != "Manage" and _has_unsaved_pricing_changes():
-                st.session_state["pending_pricing_tab"] = "Manage"
-                st.rerun()
-            else:
-                # Clear session when switching to Manage tab
-                if previous_tab and previous_tab != "Manage":
-                    _clear_pricing_session()
-                st.session_state["pricing_current_tab"] = "Manage"
-                st.rerun()
-    
-    with tab_col3:
-        if st.button("View", key="pricing_tab_view", type="primary" if st.session_state.get("pricing_current_tab") == "View" else "secondary", use_container_width=True):
-            previous_tab = st.session_state.get("pricing_current_tab")
-            if previous_tab and previous_tab != "View" and _has_unsaved_pricing_changes():
-                st.session_state["pending_pricing_tab"] = "View"
-                st.rerun()
-            else:
-                # Clear session when switching to View tab
-                if previous_tab and previous_tab != "View":
-                    _clear_pricing_session()
-                st.session_state["pricing_current_tab"] = "View"
-                st.rerun()
-    
-    # Handle pending pricing tab changes with confirmation dialog
-    if st.session_state.get("pending_pricing_tab"):
-        new_tab = st.session_state.get("pending_pricing_tab")
-        previous_tab = st.session_state.get("pricing_current_tab")
-        
-        if previous_tab == "Add":
-            st.warning("⚠️ You have unsaved changes in the Add tab.")
-            col1, col2, col3 = st.columns([1, 1, 2])
-            with col1:
-                if st.button("🗑️ Discard & Continue", key="discard_pricing_add", type="primary"):
-                    _clear_pricing_session()
-                    st.session_state["pricing_current_tab"] = new_tab
-                    st.session_state.pop("pending_pricing_tab")
-                    st.rerun()
-            with col2:
-                if st.button("❌ Cancel", key="cancel_pricing_add"):
-                    st.session_state.pop("pending_pricing_tab")
-                    st.rerun()
-            with col3:
-                st.caption("Your unsaved changes will be lost if you continue.")
-            st.stop()
-        elif previous_tab == "Manage":
-            st.warning("⚠️ You have unsaved changes in the Manage tab.")
-            col1, col2, col3 = st.columns([1, 1, 2])
-            with col1:
-                if st.button("🗑️ Discard & Continue", key="discard_pricing_manage", type="primary"):
-                    _clear_pricing_session()
-                    st.session_state["pricing_current_tab"] = new_tab
-                    st.session_state.pop("pending_pricing_tab")
-                    st.rerun()
-            with col2:
-                if st.button("❌ Cancel", key="cancel_pricing_manage"):
-                    st.session_state.pop("pending_pricing_tab")
-                    st.rerun()
-            with col3:
-                st.caption("Your unsaved changes will be lost if you continue.")
-            st.stop()
-        elif previous_tab == "View":
-            st.warning("⚠️ You have unsaved changes in the View tab.")
-            col1, col2, col3 = st.columns([1, 1, 2])
-            with col1:
-                if st.button("🗑️ Discard & Continue", key="discard_pricing_view", type="primary"):
-                    _clear_pricing_session()
-                    st.session_state["pricing_current_tab"] = new_tab
-                    st.session_state.pop("pending_pricing_tab")
-                    st.rerun()
-            with col2:
-                if st.button("❌ Cancel", key="cancel_pricing_view"):
-                    st.session_state.pop("pending_pricing_tab")
-                    st.rerun()
-            with col3:
-                st.caption("Your unsaved changes will be lost if you continue.")
-            st.stop()
-    
-    # Get current tab for rendering
-    current_pricing_tab = st.session_state.get("pricing_current_tab", "Add")
-
-    # Add
-    if current_pricing_tab == "Add":
-        colp1, colp2 = st.columns(2)
-        partners = _fetch_partners_simple()
-        partner_opts = {f"{p.get('partner')} ({p.get('partner_country')})": p.get("id") for p in partners}
-
-        with colp1:
-            _partner_placeholder = "— Select —"
-            _partner_labels = [_partner_placeholder] + list(partner_opts.keys()) if partner_opts else [_partner_placeholder]
-            sel_partner_label = st.selectbox("Partner", _partner_labels, index=0)
-        
-        # Get selected partner ID
-        sel_partner_id = partner_opts.get(sel_partner_label) if sel_partner_label != _partner_placeholder else None
-        
-        # Get TDS items only for the selected partner
-        if sel_partner_id:
-            tds_items = _fetch_tds_for_partner(sel_partner_id)
-        else:
-            tds_items = []
-        
-        tds_opts = {f"{t.get('name')} — {t.get('category')}": t.get("id") for t in tds_items}
-
-        with colp2:
-            _tds_placeholder = "— Select —"
-            _tds_labels = [_tds_placeholder] + list(tds_opts.keys()) if tds_opts else [_tds_placeholder]
-            sel_tds_label = st.selectbox("Select TDS", _tds_labels, index=0)
-            
-            # Show message if no TDS available for selected partner
-            if sel_partner_label != _partner_placeholder and not tds_items:
-                st.info("ℹ️ No chemicals assigned to this partner. Please assign chemicals in Partner Master Data first.")
-
-        # Auto-clear pricing inputs when Partner or TDS selection changes
-        _prev_partner = st.session_state.get("pricing_prev_partner_label")
-        _prev_tds = st.session_state.get("pricing_prev_tds_label")
-        if sel_partner_label != _prev_partner or sel_tds_label != _prev_tds:
-            _reset_session_keys(["pricing_rows_add"]) 
-            # Bump reset token so all widget keys change and state is flushed
-            st.session_state["pricing_form_reset_token"] = str(uuid.uuid4())
-            st.session_state["pricing_prev_partner_label"] = sel_partner_label
-            st.session_state["pricing_prev_tds_label"] = sel_tds_label
-            # Reinitialize default rows for fresh input after change
-            st.session_state["pricing_rows_add"] = _incoterm_rows_default()
-
-        # Editable pricing table
-        st.markdown("---")
-        st.subheader("Pricing & Costing Table")
-        
-        # Check if both partner and TDS are selected
-        sel_partner_id = partner_opts.get(sel_partner_label) if sel_partner_label != _partner_placeholder else None
-        sel_tds_id = tds_opts.get(sel_tds_label) if sel_tds_label != _tds_placeholder else None
-        both_selected = sel_partner_id and sel_tds_id
-        
-        if not both_selected:
-            st.warning("⚠️ Please select both Partner and TDS to add pricing data")
-            st.stop()
-        
-        if "pricing_rows_add" not in st.session_state:
-            st.session_state["pricing_rows_add"] = _incoterm_rows_default()
-
-        rows = st.session_state["pricing_rows_add"]
-        _pricing_token = st.session_state.get("pricing_form_reset_token", "0")
-        global_rows, kenya_rows, other_rows = _split_rows(rows)
-
-        def _render_rows(prefix: str, rows_list: list[dict]):
-            st.caption("Incoterm | Costing USD | Costing ETB | Pricing USD | Pricing ETB")
-            for i, r in enumerate(rows_list):
-                c1, c2, c3, c4, c5 = st.columns([2,2,2,2,2])
-                with c1:
-                    st.text_input("Incoterm", value=r.get("incoterm", ""), key=f"{prefix}_{_pricing_token}_inc_{i}")
-                with c2:
-                    st.text_input("Costing USD", value=r.get("cost_usd", ""), key=f"{prefix}_{_pricing_token}_cu_{i}")
-                with c3:
-                    st.text_input("Costing ETB", value=r.get("cost_etb", ""), key=f"{prefix}_{_pricing_token}_ce_{i}")
-                with c4:
-                    st.text_input("Pricing USD", value=r.get("price_usd", ""), key=f"{prefix}_{_pricing_token}_pu_{i}")
-                with c5:
-                    st.text_input("Pricing ETB", value=r.get("price_etb", ""), key=f"{prefix}_{_pricing_token}_pe_{i}")
-
-        st.markdown("**Global Sourcing (FOB, CIF Mombasa, SEZ MCF, Nairobi, FCA, Addis Ababa)**")
-        _render_rows("g", global_rows)
-
-        st.markdown("**Kenya Pricing & Costing (Kenya, Nairobi, FCA Moyale, Addis)**")
-        _render_rows("k", kenya_rows)
-
-        # Save combined
-        if st.button("💾 Save Pricing", type="primary", key="p_save_add"):
-            def _collect(prefix: str, lst: list[dict]):
-                out = []
-                for i in range(len(lst)):
-                    out.append({
-                        "incoterm": st.session_state.get(f"{prefix}_{_pricing_token}_inc_{i}") or "",
-                        "cost_usd": st.session_state.get(f"{prefix}_{_pricing_token}_cu_{i}") or "",
-                        "cost_etb": st.session_state.get(f"{prefix}_{_pricing_token}_ce_{i}") or "",
-                        "price_usd": st.session_state.get(f"{prefix}_{_pricing_token}_pu_{i}") or "",
-                        "price_etb": st.session_state.get(f"{prefix}_{_pricing_token}_pe_{i}") or "",
-                    })
-                return out
-            out_rows = _collect("g", global_rows) + _collect("k", kenya_rows)
-            # Both partner and TDS are already validated above, so we can proceed directly
-            resp = _pricing_table_add(sel_partner_id, sel_tds_id, out_rows)
-            if resp is not None:
-                st.success("✅ Pricing saved")
-                # Reset add pricing session state and bump token so widgets clear
-                _reset_session_keys(["pricing_rows_add"]) 
-                st.session_state["pricing_form_reset_token"] = str(uuid.uuid4())
-                st.session_state["pricing_rows_add"] = _incoterm_rows_default()
-                st.rerun()
-        
-        # Add clear session button if there are unsaved changes
+def run_section(module: str):
+    path = os.path.join(SECTIONS_DIR, SECTION_PAGES[module])
+    exec(_compile_section(path, os.stat(path).st_mtime_ns), globals())
 
-    # Manage
-    elif current_pricing_tab == "Manage":
-        records = _pricing_fetch_all()
-        if not records:
-            st.info("No pricing records found")
-        else:
-            # Build partner id -> name map
-            _partners_map = {}
-            try:
-                for p in _fetch_partners_simple():
-                    _partners_map[p.get("id")] = p.get("partner")
-            except Exception:
-                _partners_map = {}
-            # Build tds id -> product code (product_name) map
-            _tds_name_map = {}
-            try:
-                _tds_rows = supabase.table("tds_data").select("id,metadata").execute().data or []
-                for _r in _tds_rows:
-                    _mid = (_r or {}).get("metadata") or {}
-                    _tds_name_map[_r.get("id")] = _mid.get("product_name") or _mid.get("generic_product_name")
-            except Exception:
-                _tds_name_map = {}
-            for rec in records:
-                rid = rec.get("id")
-                partner_id = rec.get("partner_id")
-                tds_id = rec.get("tds_id")
-                rows = rec.get("rows") or _incoterm_rows_default()
-
-                _pname = _partners_map.get(partner_id, partner_id or "-")
-                _prod_code = _tds_name_map.get(tds_id) or "-"
-                with st.expander(f"Costing & Pricing — {_pname} — {_prod_code}", expanded=False):
-                    # Split rows into groups
-                    g_rows, k_rows, o_rows = _split_rows(rows)
-
-                    def _render_manage(prefix: str, rows_list: list[dict], title: str):
-                        st.markdown(f"**{title}**")
-                        st.caption("Incoterm | Costing USD | Costing ETB | Pricing USD | Pricing ETB")
-                        for i, r in enumerate(rows_list):
-                            c1, c2, c3, c4, c5 = st.columns([2,2,2,2,2])
-                            with c1:
-                                st.text_input("Incoterm", value=r.get("incoterm", ""), key=f"pm_inc_{prefix}_{rid}_{i}")
-                            with c2:
-                                st.text_input("Costing USD", value=r.get("cost_usd", ""), key=f"pm_cu_{prefix}_{rid}_{i}")
-                            with c3:
-                                st.text_input("Costing ETB", value=r.get("cost_etb", ""), key=f"pm_ce_{prefix}_{rid}_{i}")
-                            with c4:
-                                st.text_input("Pricing USD", value=r.get("price_usd", ""), key=f"pm_pu_{prefix}_{rid}_{i}")
-                            with c5:
-                                st.text_input("Pricing ETB", value=r.get("price_etb", ""), key=f"pm_pe_{prefix}_{rid}_{i}")
-
-                    _render_manage("g", g_rows, "Global Sourcing (FOB, CIF Mombasa, SEZ MCF, Nairobi, FCA, Addis Ababa)")
-                    _render_manage("k", k_rows, "Kenya Pricing & Costing (Kenya, Nairobi, FCA Moyale, Addis)")
-
-                    mc1, mc2, mc3 = st.columns([1,1,1])
-                    with mc1:
-                        if st.button("💾 Save", key=f"pm_save_{rid}"):
-                            # collect per group
-                            def _collect(prefix: str, lst: list[dict]):
-                                out = []
-                                for i in range(len(lst)):
-                                    out.append({
-                                        "incoterm": st.session_state.get(f"pm_inc_{prefix}_{rid}_{i}") or "",
-                                        "cost_usd": st.session_state.get(f"pm_cu_{prefix}_{rid}_{i}") or "",
-                                        "cost_etb": st.session_state.get(f"pm_ce_{prefix}_{rid}_{i}") or "",
-                                        "price_usd": st.session_state.get(f"pm_pu_{prefix}_{rid}_{i}") or "",
-                                        "price_etb": st.session_state.get(f"pm_pe_{prefix}_{rid}_{i}") or "",
-                                    })
-                                return out
-                            new_rows = _collect("g", g_rows) + _collect("k", k_rows)
-                            _pricing_table_update(rid, {"rows": new_rows})
-                            st.success("Updated")
-                            # Reset manage pricing inputs for this record
-                            _reset_session_by_prefix([f"pm_inc_g_{rid}_", f"pm_cu_g_{rid}_", f"pm_ce_g_{rid}_", f"pm_pu_g_{rid}_", f"pm_pe_g_{rid}_", f"pm_inc_k_{rid}_", f"pm_cu_k_{rid}_", f"pm_ce_k_{rid}_", f"pm_pu_k_{rid}_", f"pm_pe_k_{rid}_"]) 
-                            st.rerun()
-                    with mc2:
-                        if st.button("🗑️ Delete", key=f"pm_del_{rid}"):
-                            _pricing_table_delete(rid)
-                            st.success("Deleted")
-                            st.rerun()
-                    with mc3:
-                        pass
-
-    # View
-    elif current_pricing_tab == "View":
-        records = _pricing_fetch_all()
-        if not records:
-            st.info("No pricing records found")
-        else:
-            _partners_map = {}
-            try:
-                for p in _fetch_partners_simple():
-                    _partners_map[p.get("id")] = p.get("partner")
-            except Exception:
-                _partners_map = {}
-            # Build tds id -> product code (product_name) map
-            _tds_name_map_v = {}
-            try:
-                _tds_rows_v = supabase.table("tds_data").select("id,metadata").execute().data or []
-                for _r in _tds_rows_v:
-                    _mid = (_r or {}).get("metadata") or {}
-                    _tds_name_map_v[_r.get("id")] = _mid.get("product_name") or _mid.get("generic_product_name")
-            except Exception:
-                _tds_name_map_v = {}
-            for rec in records:
-                rid = rec.get("id")
-                rows = rec.get("rows") or []
-                _pname = _partners_map.get(rec.get("partner_id"), rec.get("partner_id") or "-")
-                _prod_code = _tds_name_map_v.get(rec.get("tds_id")) or "-"
-                with st.expander(f"Costing & Pricing — {_pname} — {_prod_code}", expanded=False):
-                    # Split rows similar to Manage view and show as read-only tables
-                    g_rows, k_rows, o_rows = _split_rows(rows)
-
-                    def _render_table(title: str, data_rows: list[dict]):
-                        st.markdown(f"**{title}**")
-                        if not data_rows:
-                            st.caption("No rows")
-                            st.stop()
-                        try:
-                            import pandas as _pd
-                            df = _pd.DataFrame(data_rows, columns=["incoterm","cost_usd","cost_etb","price_usd","price_etb"])  # type: ignore
-                            st.dataframe(df, use_container_width=True, hide_index=True)
-                        except Exception:
-                            st.caption("Incoterm | Costing USD | Costing ETB | Pricing USD | Pricing ETB")
-                            for r in data_rows:
-                                st.write(f"- {r.get('incoterm','')} | {r.get('cost_usd','')} | {r.get('cost_etb','')} | {r.get('price_usd','')} | {r.get('price_etb','')}")
-
-                    # First table shows ALL incoterms (Global + Kenya + Others)
-                    all_rows = g_rows + k_rows + o_rows
-                    _render_table("All Pricing & Costing (FOB, CIF Mombasa, SEZ MCF, Nairobi, FCA, Addis Ababa)", all_rows)
-                    
-                    # Second table shows only Kenya-specific incoterms
-                    _render_table("Kenya Pricing & Costing (Kenya, Nairobi, FCA Moyale, Addis)", k_rows)
-
-    st.markdown('</div>', unsafe_allow_html=True)
\ No newline at end of file
+if st.session_state.get("main_section") in SECTION_PAGES:
+    run_section(st.session_state["main_section"])
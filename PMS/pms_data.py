@@ -0,0 +1,399 @@
+"""
+Batched Supabase queries shared by the PMS sections.
+
+The functions take the Supabase client as their first argument (instead of using the
+global client in pms.py) so they can be imported without starting the Streamlit app,
+e.g. by benchmarks/pms_queries.py, which runs them against a local stub client.
+"""
+
+from dataclasses import dataclass, field
+
+# tds_data.metadata keys tried, in order, for a TDS display name
+TDS_NAME_FIELDS = ("product_name", "generic_product_name", "tds_file_name")
+
+# Ids per `in.(...)` filter; keeps the PostgREST request URL well below common limits
+IN_FILTER_CHUNK = 200
+
+
+def tds_display_name(metadata: dict | None) -> str | None:
+    """Display name of a TDS from its metadata (product name, generic name or file name)."""
+    metadata = metadata or {}
+    for key in TDS_NAME_FIELDS:
+        if metadata.get(key):
+            return metadata[key]
+    return None
+
+
+def chunked(values: list, size: int = IN_FILTER_CHUNK):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+# Rows per request when a result can be large: PostgREST truncates responses to its
+# max-rows setting (1000 by default on Supabase) without an error
+PAGE_SIZE = 1000
+
+
+def fetch_all_pages(build_query, page_size: int = PAGE_SIZE) -> list[dict]:
+    """
+    Every row of a query, read with .range() until a page comes back short.
+    ``build_query()`` returns a fresh query builder with a total order, so that rows do not
+    move between pages.
+    """
+    rows, start = [], 0
+    while True:
+        page = build_query().range(start, start + page_size - 1).execute().data or []
+        rows.extend(page)
+        if len(page) < page_size:
+            return rows
+        start += page_size
+
+
+def fetch_tds_names(client, tds_ids) -> dict:
+    """
+    {tds_id: display name} for many TDS records in one query per IN_FILTER_CHUNK ids.
+
+    Only the name fields are selected (``metadata->>key``), not the whole metadata document.
+    Unknown ids are missing from the result.
+    """
+    ids = list(dict.fromkeys(str(i) for i in tds_ids if i))
+    columns = ",".join(["id"] + [f"{field}:metadata->>{field}" for field in TDS_NAME_FIELDS])
+    names = {}
+    for batch in chunked(ids):
+        rows = client.table("tds_data").select(columns).in_("id", batch).execute().data or []
+        for row in rows:
+            names[str(row.get("id"))] = tds_display_name(row)
+    return names
+
+
+# --- tds_data filters pushed to Postgres ---
+# metadata->>category and metadata->>product_type have expression indexes
+# (supabase/migrations/20240326000000_index_tds_category_type.sql), so these filters are
+# index lookups and only matching rows leave the database.
+
+def query_tds(client, columns: str = "*", *, category=None, product_type=None, brand=None, owner=None):
+    """tds_data rows (newest first) matching every filter that is set."""
+    q = client.table("tds_data").select(columns)
+    if category:
+        q = q.eq("metadata->>category", category)
+    if product_type:
+        q = q.eq("metadata->>product_type", product_type)
+    if brand:
+        q = q.eq("brand", brand)
+    if owner:
+        q = q.eq("owner", owner)
+    return q.order("created_at", desc=True).execute().data or []
+
+
+def fetch_tds_product_types(client, category=None) -> list[str]:
+    """Sorted distinct metadata.product_type of the TDS records (of one category, when given)."""
+    q = client.table("tds_data").select("product_type:metadata->>product_type")
+    if category:
+        q = q.eq("metadata->>category", category)
+    rows = q.execute().data or []
+    return sorted({(row.get("product_type") or "").strip() for row in rows} - {""})
+
+
+# --- chemical_types facet index ---
+
+@dataclass
+class ChemicalTypeFacets:
+    """The chemical_types taxonomy the PMS dropdowns need, built from one scan of the table."""
+    product_types: list[str]
+    categories: list[str]
+    types_by_category: dict[str, list[str]]
+    segments: list[str]
+    functional_by_segment: dict[str, list[str]]  # lower-cased segment -> functional categories
+    _segment_queries: dict = field(default_factory=dict, repr=False)
+
+    def types_for_category(self, category: str) -> list[str]:
+        return self.types_by_category.get(category, [])
+
+    def functional_categories_for_segment(self, segment: str) -> list[str]:
+        """Functional categories of the chemicals whose segment contains ``segment`` (case-insensitive)."""
+        wanted = (segment or "").strip().lower()
+        if not wanted:
+            return []
+        result = self._segment_queries.get(wanted)
+        if result is None:
+            values = set(self.functional_by_segment.get(wanted, []))
+            for seg, categories in self.functional_by_segment.items():
+                if wanted in seg:
+                    values.update(categories)
+            result = self._segment_queries[wanted] = sorted(values)
+        return result
+
+
+def _clean_strings(values) -> list[str]:
+    try:
+        return [s for s in (str(v).strip() for v in (values or [])) if s]
+    except TypeError:
+        return []
+
+
+def build_chemical_type_facets(rows) -> ChemicalTypeFacets:
+    product_types, categories, segments = set(), set(), set()
+    by_category: dict[str, set] = {}
+    by_segment: dict[str, set] = {}
+    for row in rows:
+        name = (row.get("name") or "").strip()
+        category = row.get("category")
+        if name:
+            product_types.add(name)
+            if category:
+                by_category.setdefault(category, set()).add(name)
+        if str(category or "").strip():
+            categories.add(str(category).strip())
+        row_segments = _clean_strings(row.get("industry_segments"))
+        segments.update(row_segments)
+        functional = _clean_strings(row.get("functional_categories"))
+        for seg in row_segments:
+            by_segment.setdefault(seg.lower(), set()).update(functional)
+    return ChemicalTypeFacets(
+        product_types=sorted(product_types),
+        categories=sorted(categories),
+        types_by_category={cat: sorted(names) for cat, names in by_category.items()},
+        segments=sorted(segments),
+        functional_by_segment={seg: sorted(values) for seg, values in by_segment.items()},
+    )
+
+
+def fetch_chemical_type_facets(client) -> ChemicalTypeFacets:
+    """Scan chemical_types once (only the taxonomy columns) and build the facet index."""
+    try:
+        rows = client.table("chemical_types").select("name,category,industry_segments,functional_categories").execute().data
+    except Exception:
+        # Older schemas without the segment columns still get the category/type facets
+        rows = client.table("chemical_types").select("name,category").execute().data
+    return build_chemical_type_facets(rows or [])
+
+
+# --- partner_data name index ---
+
+def normalize_partner_name(name: str | None) -> str:
+    return (name or "").strip().lower()
+
+
+@dataclass
+class PartnerIndex:
+    """partner_data names for duplicate checks: exact (name, country) lookups and fuzzy matches."""
+    rows: list[dict]
+    names: list[str]  # normalized, aligned with rows
+    by_key: dict[tuple[str, str], list[int]]
+    by_country: dict[str, list[int]]
+
+    def exists(self, partner: str, country: str | None = None) -> bool:
+        """Same name (case-insensitive) and, when given, the same country."""
+        pname = normalize_partner_name(partner)
+        if not pname:
+            return False
+        if country is None:
+            return any(name == pname for name, _ in self.by_key)
+        return (pname, normalize_partner_name(country)) in self.by_key
+
+    def similar(self, partner: str, country: str | None = None, threshold: float = 0.8) -> list[dict]:
+        """
+        Partners (in the given country) whose name similarity is at least ``threshold`` (0-1),
+        best first. Similarity is RapidFuzz's normalized Indel ratio, the measure difflib's
+        SequenceMatcher.ratio() approximates.
+        """
+        from rapidfuzz import fuzz, process
+
+        pname = normalize_partner_name(partner)
+        if not pname:
+            return []
+        if country is None:
+            candidates = list(range(len(self.rows)))
+        else:
+            candidates = self.by_country.get(normalize_partner_name(country), [])
+        matches = process.extract(
+            pname, [self.names[i] for i in candidates], scorer=fuzz.ratio,
+            score_cutoff=threshold * 100, limit=None,
+        )
+        out = []
+        for _, score, position in sorted(matches, key=lambda m: (-m[1], m[2])):
+            row = self.rows[candidates[position]]
+            out.append({
+                "id": row.get("id"),
+                "partner": row.get("partner"),
+                "partner_country": row.get("partner_country"),
+                "similarity": score / 100,
+            })
+        return out
+
+
+def build_partner_index(rows) -> PartnerIndex:
+    names, by_key, by_country = [], {}, {}
+    for i, row in enumerate(rows):
+        name = normalize_partner_name(row.get("partner"))
+        country = normalize_partner_name(row.get("partner_country"))
+        names.append(name)
+        by_key.setdefault((name, country), []).append(i)
+        by_country.setdefault(country, []).append(i)
+    return PartnerIndex(rows=list(rows), names=names, by_key=by_key, by_country=by_country)
+
+
+def fetch_partner_index(client) -> PartnerIndex:
+    """Scan partner_data once (id, name, country only) and build the name index."""
+    rows = client.table("partner_data").select("id,partner,partner_country").execute().data
+    return build_partner_index(rows or [])
+
+
+# --- price_points (normalized costing_pricing_data rows) ---
+
+PRICE_FIELDS = ("cost_usd", "cost_etb", "price_usd", "price_etb")
+# Records scanned per TDS when price_points is not available
+LEGACY_PRICE_RECORDS = 5
+
+
+def incoterm_key(incoterm: str | None) -> str:
+    """Matches price_points.incoterm_key (lower(btrim(incoterm)))."""
+    return (incoterm or "").strip().lower()
+
+
+def format_price(value) -> str:
+    """Numeric price as shown in the pricing tables ("1250", "12.5"); "" when missing."""
+    if value is None or value == "":
+        return ""
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return str(value)
+    return str(int(number)) if number.is_integer() else f"{number:g}"
+
+
+def _legacy_price_point(client, tds_id: str, incoterm: str) -> dict | None:
+    """Scan the latest pricing records' JSON rows (before the price_points migration)."""
+    key = incoterm_key(incoterm)
+    recs = (
+        client.table("costing_pricing_data").select("rows,created_at").eq("tds_id", tds_id)
+        .order("created_at", desc=True).limit(LEGACY_PRICE_RECORDS).execute().data or []
+    )
+    for rec in recs:
+        for row in rec.get("rows") or []:
+            if isinstance(row, dict) and incoterm_key(row.get("incoterm")) == key:
+                return {f: row.get(f) or "" for f in PRICE_FIELDS}
+    return None
+
+
+def fetch_price_point(client, tds_id: str, incoterm: str) -> dict:
+    """
+    Latest price of a TDS for an incoterm (case-insensitive): {"cost_usd", "cost_etb",
+    "price_usd", "price_etb"} as display strings, "" when there is no price.
+
+    One query on the (tds_id, incoterm_key, valid_from, ordinal) index of price_points: the
+    newest record's first row for the incoterm, as the JSON scan it replaces. Falls back to
+    that scan when the table does not exist yet.
+    """
+    empty = {f: "" for f in PRICE_FIELDS}
+    if not tds_id or not incoterm_key(incoterm):
+        return empty
+    try:
+        rows = (
+            client.table("price_points").select(",".join(PRICE_FIELDS))
+            .eq("tds_id", tds_id).eq("incoterm_key", incoterm_key(incoterm))
+            .order("valid_from", desc=True).order("ordinal").limit(1).execute().data
+        )
+    except Exception:
+        return _legacy_price_point(client, tds_id, incoterm) or empty
+    if not rows:
+        return empty
+    return {f: format_price(rows[0].get(f)) for f in PRICE_FIELDS}
+
+
+@dataclass
+class PriceMatrix:
+    """Latest price of each (tds_id, incoterm) pair, as display strings (see fetch_price_point)."""
+    prices: dict[tuple[str, str], dict] = field(default_factory=dict)
+    incoterms: dict[str, str] = field(default_factory=dict)  # incoterm_key -> label as entered
+
+    def get(self, tds_id, incoterm: str) -> dict:
+        return self.prices.get((str(tds_id), incoterm_key(incoterm))) or {f: "" for f in PRICE_FIELDS}
+
+    def incoterms_for(self, tds_id) -> list[str]:
+        return [self.incoterms[key] for (tid, key) in self.prices if tid == str(tds_id)]
+
+
+def _add_price(matrix: PriceMatrix, tds_id, incoterm: str, row: dict):
+    key = (str(tds_id), incoterm_key(incoterm))
+    if key[1] and key not in matrix.prices:
+        matrix.prices[key] = {f: format_price(row.get(f)) for f in PRICE_FIELDS}
+        matrix.incoterms.setdefault(key[1], (incoterm or "").strip())
+
+
+def _legacy_price_matrix(client, tds_ids=None) -> PriceMatrix:
+    """Latest JSON row per (tds_id, incoterm) from one (paged) scan of costing_pricing_data."""
+    def query(chunk=None):
+        q = client.table("costing_pricing_data").select("id,tds_id,rows,created_at")
+        if chunk is not None:
+            q = q.in_("tds_id", chunk)
+        return q.order("created_at", desc=True).order("id")
+
+    if tds_ids is None:
+        batches = [fetch_all_pages(query)]
+    else:
+        batches = [fetch_all_pages(lambda chunk=chunk: query(chunk)) for chunk in chunked(tds_ids)]
+    matrix = PriceMatrix()
+    for rec in sorted((r for batch in batches for r in batch), key=lambda r: r.get("created_at") or "", reverse=True):
+        if not rec.get("tds_id"):
+            continue
+        for row in rec.get("rows") or []:
+            if isinstance(row, dict):
+                _add_price(matrix, rec["tds_id"], row.get("incoterm"), row)
+    return matrix
+
+
+def fetch_price_matrix(client, tds_ids=None) -> PriceMatrix:
+    """
+    Latest prices of the given TDS ids (all TDS when None) for every incoterm, from the
+    latest_price_points view: one query per IN_FILTER_CHUNK ids and PAGE_SIZE rows. Falls
+    back to a scan of costing_pricing_data when the view does not exist yet.
+    """
+    if tds_ids is not None:
+        tds_ids = list(dict.fromkeys(str(t) for t in tds_ids if t))
+        if not tds_ids:
+            return PriceMatrix()
+    columns = "tds_id,incoterm," + ",".join(PRICE_FIELDS)
+    def query(chunk=None):
+        q = client.table("latest_price_points").select(columns)
+        if chunk is not None:
+            q = q.in_("tds_id", chunk)
+        return q.order("tds_id").order("incoterm_key")
+
+    try:
+        if tds_ids is None:
+            rows = fetch_all_pages(query)
+        else:
+            rows = [row for chunk in chunked(tds_ids) for row in fetch_all_pages(lambda chunk=chunk: query(chunk))]
+    except Exception:
+        return _legacy_price_matrix(client, tds_ids)
+    matrix = PriceMatrix()
+    for row in rows:
+        _add_price(matrix, row.get("tds_id"), row.get("incoterm"), row)
+    return matrix
+
+
+# --- chemical_type_versions (edit history of chemical_types) ---
+
+VERSION_PAGE_SIZE = 10
+
+
+def record_chemical_type_version(client, type_id: str, changed: dict, changed_by: str | None = None):
+    """Append one edit of a chemical type to its history."""
+    return client.table("chemical_type_versions").insert({
+        "type_id": type_id,
+        "changed": changed,
+        "changed_by": changed_by,
+    }).execute()
+
+
+def fetch_chemical_type_versions(client, type_id: str, page: int = 0,
+                                 page_size: int = VERSION_PAGE_SIZE) -> tuple[list[dict], int]:
+    """One page of a chemical type's history, newest first, and the total number of versions."""
+    start = max(page, 0) * page_size
+    res = (
+        client.table("chemical_type_versions").select("ts,changed,changed_by", count="exact")
+        .eq("type_id", type_id).order("ts", desc=True).range(start, start + page_size - 1).execute()
+    )
+    rows = res.data or []
+    return rows, res.count if res.count is not None else start + len(rows)
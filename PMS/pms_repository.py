@@ -0,0 +1,219 @@
+"""
+Write-through query cache in front of the PMS Supabase client.
+
+pms.py re-runs top to bottom on every widget interaction and reads the same tables from
+many places, so one click used to issue the same ``select`` several times.
+CachedSupabase wraps the supabase-py client and keeps every ``supabase.table(...)`` call
+site unchanged:
+
+* Reads (a ``select`` chain) are cached in a QueryCache shared by all sessions, with a
+  TTL per table (TABLE_TTLS). The TTL is a safety net for changes made outside this app.
+* Writes (insert/update/upsert/delete) go straight to the database. Afterwards every
+  cached read of that table is dropped, so the next read sees the write.
+* The same read issued again within one rerun is coalesced, even for tables without a
+  TTL. A new CachedSupabase is created per rerun, so ``stats`` counts that rerun's
+  queries.
+
+Everything else (``auth``, ``storage``, ``rpc``) is passed through to the real client.
+"""
+
+import copy
+import threading
+import time
+from collections import Counter, OrderedDict
+
+# Seconds a cached read of each table stays valid. Tables not listed are only coalesced
+# within a rerun.
+TABLE_TTLS = {
+    "categories": 300,
+    "chemical_types": 120,
+    "managers": 300,
+    "partner_data": 60,
+    "tds_data": 60,
+    "leanchem_products": 30,
+    "costing_pricing_data": 30,
+    "price_points": 30,
+    "latest_price_points": 30,
+    "market_opportunities": 30,
+}
+
+# Writes to a table also drop the cached reads of tables whose rows they can change
+# through foreign keys (ON DELETE CASCADE / SET NULL), fallback storage in metadata, or
+# triggers (costing_pricing_data rows are mirrored into price_points and its views).
+RELATED_TABLES = {
+    "chemical_types": ("tds_data", "chemical_type_versions"),
+    "tds_data": ("leanchem_products", "costing_pricing_data", "price_points", "latest_price_points"),
+    "costing_pricing_data": ("price_points", "latest_price_points"),
+}
+
+# The cache lives for the whole process, and most keys (e.g. per-id reads) are never read
+# again, so expired entries are swept every SWEEP_EVERY_PUTS puts and the least recently
+# used entries are evicted beyond MAX_CACHE_ENTRIES.
+MAX_CACHE_ENTRIES = 2000
+SWEEP_EVERY_PUTS = 200
+
+WRITE_METHODS = frozenset({"insert", "update", "upsert", "delete"})
+# Builder attributes that are used without being called (``.not_.is_(...)``)
+PROPERTY_METHODS = frozenset({"not_"})
+
+
+class CachedResponse:
+    """Stand-in for postgrest's APIResponse for cache hits (``data`` and ``count``)."""
+
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+
+class QueryCache:
+    """Thread-safe {(scope, table, query): (expires_at, data, count)} shared by all sessions."""
+
+    def __init__(self, ttls=None, max_entries: int = MAX_CACHE_ENTRIES):
+        self.ttls = dict(TABLE_TTLS if ttls is None else ttls)
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # least recently used first
+        self._puts = 0
+        self._lock = threading.Lock()
+        self.stats = Counter()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1:]
+
+    def put(self, key, data, count):
+        ttl = self.ttls.get(key[1], 0)
+        if ttl > 0:
+            with self._lock:
+                now = time.monotonic()
+                self._entries[key] = (now + ttl, data, count)
+                self._entries.move_to_end(key)
+                self._puts += 1
+                if self._puts % SWEEP_EVERY_PUTS == 0 or len(self._entries) > self.max_entries:
+                    expired = [k for k, entry in self._entries.items() if entry[0] < now]
+                    for k in expired:
+                        del self._entries[k]
+                    self.stats["expired"] += len(expired)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.stats["evicted"] += 1
+
+    def __len__(self):
+        return len(self._entries)
+
+    def invalidate(self, table: str):
+        with self._lock:
+            stale = [key for key in self._entries if key[1] == table]
+            for key in stale:
+                del self._entries[key]
+        return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class _QueryRecorder:
+    """Records a ``table(...)`` builder chain and runs it (or answers it from the cache) on execute()."""
+
+    def __init__(self, client, table):
+        self._client = client
+        self._table = table
+        self._calls = []
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        if name in PROPERTY_METHODS:
+            self._calls.append((name, None, None))
+            return self
+
+        def record(*args, **kwargs):
+            self._calls.append((name, args, kwargs))
+            return self
+        return record
+
+    def _build(self):
+        builder = self._client.client.table(self._table)
+        for name, args, kwargs in self._calls:
+            builder = getattr(builder, name) if args is None else getattr(builder, name)(*args, **kwargs)
+        return builder
+
+    def execute(self):
+        methods = {name for name, _, _ in self._calls}
+        if methods & WRITE_METHODS:
+            return self._client._write(self._table, self._build())
+        key = (self._client.scope, self._table, repr(self._calls))
+        return self._client._read(key, self._build)
+
+
+class CachedSupabase:
+    """Wraps a supabase-py Client; see the module docstring. Create one per rerun."""
+
+    def __init__(self, client, cache: QueryCache, scope: str = ""):
+        self.client = client
+        self.cache = cache
+        self.scope = scope  # e.g. "anon" / "authenticated": results are never shared across scopes
+        self._rerun_memo = {}
+        self.stats = Counter()  # this rerun: queries, cache_hits, coalesced, writes
+        self.by_table = Counter()  # this rerun: queries sent to Supabase per table
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    def table(self, name: str):
+        return _QueryRecorder(self, name)
+
+    def from_(self, name: str):
+        return self.table(name)
+
+    def _read(self, key, build):
+        memo = self._rerun_memo.get(key)
+        if memo is not None:
+            self.stats["coalesced"] += 1
+            return CachedResponse(copy.deepcopy(memo[0]), memo[1])
+        cached = self.cache.get(key)
+        if cached is not None:
+            self.stats["cache_hits"] += 1
+            self.cache.stats["hits"] += 1
+            self._rerun_memo[key] = cached
+            return CachedResponse(copy.deepcopy(cached[0]), cached[1])
+        response = build().execute()
+        self.stats["queries"] += 1
+        self.by_table[key[1]] += 1
+        self.cache.stats["misses"] += 1
+        entry = (copy.deepcopy(response.data), getattr(response, "count", None))
+        self._rerun_memo[key] = entry
+        self.cache.put(key, *entry)
+        return response
+
+    def _write(self, table, builder):
+        try:
+            return builder.execute()
+        finally:
+            # Invalidate even when the call raised: the write may have been applied anyway
+            self.stats["writes"] += 1
+            self.by_table[table] += 1
+            self.invalidate(table)
+
+    def invalidate(self, table: str):
+        """Drop every cached read of ``table`` and its RELATED_TABLES (shared cache and this rerun)."""
+        tables = {table, *RELATED_TABLES.get(table, ())}
+        for name in tables:
+            self.cache.invalidate(name)
+        for key in [k for k in list(self._rerun_memo) if k[1] in tables]:
+            self._rerun_memo.pop(key, None)  # bulk-ingest workers may invalidate concurrently
+
+    def summary(self) -> str:
+        tables = ", ".join(f"{table} {count}" for table, count in self.by_table.most_common())
+        return (
+            f"{self.stats['queries']} queries, {self.stats['writes']} writes, "
+            f"{self.stats['cache_hits']} cache hits, {self.stats['coalesced']} coalesced"
+            + (f" ({tables})" if tables else "")
+        )
@@ -0,0 +1,714 @@
+"""
+Chemical Master Data: chemical types, AI-assisted enrichment and management.
+
+Loaded by pms.py only while this module is the active one, and executed in pms.py's
+namespace: it uses the Supabase client, helpers and session/auth state defined there.
+"""
+
+# ==========================
+# UI - Chemical Master Data
+# ==========================
+if st.session_state.get("main_section") == "chemical" and has_chemical_master_access(user_email):
+    st.markdown('<h1 style="color:#1976d2; font-weight:700;">Chemical Master Data</h1>', unsafe_allow_html=True)
+    st.markdown('<div class="form-card">', unsafe_allow_html=True)
+
+    # Track current chemical tab to detect tab switches
+    if "chemical_current_tab" not in st.session_state:
+        st.session_state["chemical_current_tab"] = "Add Chemical"
+    
+    # Create custom tab navigation with proper change detection
+    tab_col1, tab_col2, tab_col3 = st.columns(3)
+    
+    with tab_col1:
+        if st.button("Add Chemical", key="chem_tab_add", type="primary" if st.session_state.get("chemical_current_tab") == "Add Chemical" else "secondary", use_container_width=True):
+            previous_tab = st.session_state.get("chemical_current_tab")
+            if previous_tab and previous_tab != "Add Chemical" and _has_unsaved_chemical_changes():
+                st.session_state["pending_chemical_tab"] = "Add Chemical"
+                st.rerun()
+            else:
+                st.session_state["chemical_current_tab"] = "Add Chemical"
+                st.rerun()
+    
+    with tab_col2:
+        if st.button("Manage Chemicals", key="chem_tab_manage", type="primary" if st.session_state.get("chemical_current_tab") == "Manage Chemicals" else "secondary", use_container_width=True):
+            previous_tab = st.session_state.get("chemical_current_tab")
+            if previous_tab and previous_tab != "Manage Chemicals" and _has_unsaved_chemical_changes():
+                st.session_state["pending_chemical_tab"] = "Manage Chemicals"
+                st.rerun()
+            else:
+                st.session_state["chemical_current_tab"] = "Manage Chemicals"
+                st.rerun()
+    
+    with tab_col3:
+        if st.button("View Chemicals", key="chem_tab_view", type="primary" if st.session_state.get("chemical_current_tab") == "View Chemicals" else "secondary", use_container_width=True):
+            previous_tab = st.session_state.get("chemical_current_tab")
+            if previous_tab and previous_tab != "View Chemicals" and _has_unsaved_chemical_changes():
+                st.session_state["pending_chemical_tab"] = "View Chemicals"
+                st.rerun()
+            else:
+                st.session_state["chemical_current_tab"] = "View Chemicals"
+                st.rerun()
+    
+    # Handle pending tab changes with confirmation dialog
+    if st.session_state.get("pending_chemical_tab"):
+        new_tab = st.session_state.get("pending_chemical_tab")
+        previous_tab = st.session_state.get("chemical_current_tab")
+        
+        if previous_tab == "Add Chemical":
+            st.warning("⚠️ You have unsaved changes in the Add Chemical tab.")
+            col1, col2, col3 = st.columns([1, 1, 2])
+            with col1:
+                if st.button("🗑️ Discard & Continue", key="discard_chem_add", type="primary"):
+                    _clear_chemical_editing_session()
+                    st.session_state["chemical_current_tab"] = new_tab
+                    st.session_state.pop("pending_chemical_tab")
+                    st.rerun()
+            with col2:
+                if st.button("❌ Cancel", key="cancel_chem_add"):
+                    st.session_state.pop("pending_chemical_tab")
+                    st.rerun()
+            with col3:
+                st.caption("Your unsaved changes will be lost if you continue.")
+            st.stop()
+        elif previous_tab == "Manage Chemicals":
+            st.warning("⚠️ You have unsaved changes in the Manage Chemicals tab.")
+            col1, col2, col3 = st.columns([1, 1, 2])
+            with col1:
+                if st.button("🗑️ Discard & Continue", key="discard_chem_manage", type="primary"):
+                    _clear_chemical_editing_session()
+                    st.session_state["chemical_current_tab"] = new_tab
+                    st.session_state.pop("pending_chemical_tab")
+                    st.rerun()
+            with col2:
+                if st.button("❌ Cancel", key="cancel_chem_manage"):
+                    st.session_state.pop("pending_chemical_tab")
+                    st.rerun()
+            with col3:
+                st.caption("Your unsaved changes will be lost if you continue.")
+            st.stop()
+    
+    # Get current tab for rendering
+    current_tab = st.session_state.get("chemical_current_tab", "Add Chemical")
+
+    # -------- Add Chemical --------
+    if current_tab == "Add Chemical":
+        st.subheader("Add Chemical")
+        if gemini_model:
+            st.caption("Type a chemical name and press Enter to analyze with AI and check duplicates.")
+        else:
+            st.caption("Type a chemical name and press Enter to check duplicates. AI analysis is not available.")
+
+        # Mapping selects at the top (before Type Chemical Name)
+        st.markdown("---")
+        st.caption("Select Category and Product Type from mapping")
+        _chem_cat_placeholder = "— Select —"
+        try:
+            _chem_cat_options = [_chem_cat_placeholder] + get_all_categories()
+        except Exception:
+            _chem_cat_options = [_chem_cat_placeholder] + FIXED_CATEGORIES
+        st.markdown("**Category**")
+        # Apply any pending selection before the widget is created to avoid Streamlit key mutation errors
+        try:
+            _pending_sel = st.session_state.get("chem_seg_select_pending")
+            if _pending_sel and _pending_sel in _chem_cat_options:
+                st.session_state["chem_seg_select"] = _pending_sel
+                st.session_state.pop("chem_seg_select_pending", None)
+        except Exception:
+            pass
+        _chem_cat_sel = st.selectbox(
+            "Category",
+            options=_chem_cat_options,
+            key="chem_seg_select",
+            label_visibility="collapsed"
+        )
+        selected_segment = "" if _chem_cat_sel == _chem_cat_placeholder else _chem_cat_sel
+        add_new_seg = st.checkbox("Add new category", key="chem_add_new_seg")
+        if add_new_seg:
+            new_seg = st.text_input("New Category Name", key="chem_new_seg")
+            # Save immediately when user presses the save button; keep selection synced
+            col_nc1, col_nc2 = st.columns([1,3])
+            with col_nc1:
+                if st.button("Save Category", key="chem_save_new_category", type="secondary"):
+                    if not (new_seg or "").strip():
+                        st.warning("Enter a category name first")
+                    else:
+                        saved = save_category_if_possible(new_seg)
+                        if saved:
+                            st.success("Category saved")
+                            try:
+                                get_all_categories.clear()
+                            except Exception:
+                                pass
+                            # Defer selection to next run before widget instantiation
+                            st.session_state["chem_seg_select_pending"] = new_seg.strip()
+                            st.rerun()
+                        else:
+                            st.info("Saved locally. It will appear after first record uses it.")
+            with col_nc2:
+                st.caption("Type a new category then click Save Category")
+            if new_seg:
+                selected_segment = new_seg.strip()
+
+        # Persist selections for save logic (no direct widget key to avoid conflicts)
+        st.session_state["chem_selected_category"] = selected_segment
+        st.markdown(f"**Selected Category:** {selected_segment or '-'}")
+
+        with st.form("chem_add_form", clear_on_submit=False):
+            st.markdown("**Type Chemical Name**")
+            chem_name_input = st.text_input("Type Chemical Name:", placeholder="e.g., Redispersible Polymer Powder", label_visibility="collapsed")
+            if gemini_model:
+                analyze_submit = st.form_submit_button("Analyze & Prefill")
+            else:
+                analyze_submit = st.form_submit_button("Check Duplicates")
+
+        # Always get the latest extracted data from session state
+        extracted = st.session_state.get("chem_ai_extracted", {})
+
+        # Trigger analysis when Enter pressed (form submitted)
+        if analyze_submit:
+            # Duplicate suggestions
+            duplicates = search_chemicals_by_name(chem_name_input)
+            if duplicates:
+                st.warning(f"Found {len(duplicates)} possible duplicates:")
+                for d in duplicates[:5]:
+                    dup_name = d.get("generic_name") or "(unnamed)"
+                    dup_seg = ", ".join(d.get("industry_segments") or [])
+                    dup_cat = ", ".join(d.get("functional_categories") or [])
+                    st.write(f"• {dup_name} — {dup_seg} | {dup_cat}")
+
+            # AI extraction
+            if gemini_model:
+                with st.spinner("Analyzing chemical with AI..."):
+                    ai_data = analyze_chemical_with_ai(chem_name_input)
+                    if ai_data:
+                        st.session_state["chem_ai_extracted"] = ai_data
+                        extracted = ai_data
+                        st.success("AI extraction completed.")
+                        st.rerun()  # Refresh the form to show prefilled data
+                    else:
+                        st.error("AI extraction failed or not configured.")
+            else:
+                st.info("AI analysis is not available. You can still manually fill in the fields below.")
+
+        # Helpers
+        def csv_default(val):
+            return ", ".join(val) if isinstance(val, list) else (val or "")
+        def parse_csv_list(text_val: str) -> list[str]:
+            return [s.strip() for s in (text_val or "").split(",") if s.strip()]
+        def parse_json_list(text_val: str):
+            try:
+                import json
+                data = json.loads(text_val)
+                return data if isinstance(data, list) else []
+            except Exception:
+                return []
+        # Accept either a JSON array or one-JSON-object-per-line without brackets
+        def parse_json_lines_or_array(text_val: str):
+            try:
+                import json as _json_p
+                txt = (text_val or "").strip()
+                if not txt:
+                    return []
+                # Try array first
+                try:
+                    arr = _json_p.loads(txt)
+                    if isinstance(arr, list):
+                        return arr
+                    if isinstance(arr, dict):
+                        return [arr]
+                except Exception:
+                    pass
+                # Fallback: parse one JSON object per non-empty line
+                items = []
+                for line in txt.splitlines():
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        obj = _json_p.loads(line)
+                        if isinstance(obj, dict):
+                            items.append(obj)
+                    except Exception:
+                        # ignore unparsable lines
+                        continue
+                return items
+            except Exception:
+                return []
+
+        # Helper to show AI suggestion text under each control
+        import json as _json_for_ai_view
+        def _ai_view(value):
+            if value is None:
+                return ""
+            if isinstance(value, (list, dict)):
+                try:
+                    return _json_for_ai_view.dumps(value, ensure_ascii=False)
+                except Exception:
+                    return str(value)
+            return str(value)
+        # Render list of objects as newline-delimited JSON objects (no square brackets)
+        def _ai_list_as_lines(value):
+            try:
+                if isinstance(value, list):
+                    # Render list of dicts as human-readable key: value pairs per line
+                    rendered_lines = []
+                    for item in value:
+                        if isinstance(item, dict):
+                            parts = []
+                            for k, v in item.items():
+                                if v is None:
+                                    continue
+                                parts.append(f"{k}: {v}")
+                            rendered_lines.append(", ".join(parts) if parts else _json_for_ai_view.dumps(item, ensure_ascii=False)
+                            )
+                        else:
+                            rendered_lines.append(str(item))
+                    return "\n".join(rendered_lines)
+                return _ai_view(value)
+            except Exception:
+                return _ai_view(value)
+
+        # Parse relaxed human-readable "key: value, key: value" lines into list of dicts
+        def _parse_kv_lines(text_val: str):
+            items = []
+            try:
+                txt = (text_val or "").strip()
+                if not txt:
+                    return []
+                for line in txt.splitlines():
+                    line = line.strip()
+                    if not line:
+                        continue
+                    entry = {}
+                    for pair in [p for p in line.split(",") if p.strip()]:
+                        if ":" in pair:
+                            k, v = pair.split(":", 1)
+                            k = k.strip()
+                            v = v.strip()
+                            if k:
+                                entry[k] = v
+                    if entry:
+                        items.append(entry)
+                return items
+            except Exception:
+                return items
+
+        # Prefilled editable fields (reordered to requested sequence)
+        # 1) Summary 80/20
+        st.markdown("**Summary 80/20 (5–7 bullets)**")
+        chem_sum_8020 = st.text_area("Summary 80/20 (5–7 bullets)", value=extracted.get("summary_80_20", ""), height=80, label_visibility="collapsed")
+        # 2) Synonyms
+        st.markdown("**Synonyms (comma-separated)**")
+        chem_syn = st.text_input("Synonyms (comma-separated)", value=csv_default(extracted.get("synonyms", [])), label_visibility="collapsed")
+        # 3) Family
+        st.markdown("**Family**")
+        chem_family = st.text_input("Family", value=extracted.get("family", ""), label_visibility="collapsed")
+        # 4) Generic Name
+        st.markdown("**Generic Name**")
+        chem_gen = st.text_input("Generic Name", value=extracted.get("generic_name", ""), label_visibility="collapsed")
+        # 5) HS Codes (code only)
+        def _hs_codes_as_csv():
+            try:
+                items = extracted.get("hs_codes") if extracted else []
+                codes = []
+                for it in items or []:
+                    if isinstance(it, dict) and it.get("code"):
+                        codes.append(str(it.get("code")))
+                return ", ".join(codes)
+            except Exception:
+                return ""
+        st.markdown("**HS Codes**")
+        chem_hs_codes = st.text_input("HS Codes", value=_hs_codes_as_csv(), label_visibility="collapsed")
+        # 6) CAS IDs
+        st.markdown("**CAS IDs**")
+        chem_cas = st.text_input("CAS IDs", value=csv_default(extracted.get("cas_ids", [])), label_visibility="collapsed")
+        # 7) Summary Technical
+        st.markdown("**Summary Technical**")
+        chem_sum_tech = st.text_area("Summary Technical", value=extracted.get("summary_technical", ""), height=100, label_visibility="collapsed")
+        # 8) Functional Categories
+        st.markdown("**Functional Categories**")
+        chem_func = st.text_input("Functional Categories", value=csv_default(extracted.get("functional_categories", [])), label_visibility="collapsed")
+        # 9) Industry Segments
+        st.markdown("**Industry Segments**")
+        chem_inds = st.text_input("Industry Segments", value=csv_default(extracted.get("industry_segments", [])), label_visibility="collapsed")
+        # 10) Key Applications
+        st.markdown("**Key Applications**")
+        chem_keys = st.text_input("Key Applications", value=csv_default(extracted.get("key_applications", [])), label_visibility="collapsed")
+        # 11) Typical Dosage
+        st.markdown("**Typical Dosage**")
+        chem_dosage_json = st.text_area("Typical Dosage", value=_ai_list_as_lines(extracted.get("typical_dosage")) if extracted else "", height=80, label_visibility="collapsed")
+        # 12) Physical Snapshot
+        st.markdown("**Physical Snapshot**")
+        chem_phys_json = st.text_area("Physical Snapshot", value=_ai_list_as_lines(extracted.get("physical_snapshot")) if extracted else "", height=80, label_visibility="collapsed")
+        # 13) Compatibilities
+        st.markdown("**Compatibilities**")
+        chem_compat = st.text_input("Compatibilities", value=csv_default(extracted.get("compatibilities", [])), label_visibility="collapsed")
+        # 14) Incompatibilities
+        st.markdown("**Incompatibilities**")
+        chem_incompat = st.text_input("Incompatibilities", value=csv_default(extracted.get("incompatibilities", [])), label_visibility="collapsed")
+        # 15) Sensitivities
+        st.markdown("**Sensitivities**")
+        chem_sens = st.text_input("Sensitivities", value=csv_default(extracted.get("sensitivities", [])), label_visibility="collapsed")
+        # 16) Appearance
+        st.markdown("**Appearance**")
+        chem_appearance = st.text_input("Appearance", value=extracted.get("appearance", ""), label_visibility="collapsed")
+        # 17) Storage Conditions
+        st.markdown("**Storage Conditions**")
+        chem_storage = st.text_input("Storage Conditions", value=extracted.get("storage_conditions", ""), label_visibility="collapsed")
+        # 18) Packaging Options
+        st.markdown("**Packaging Options**")
+        chem_pack = st.text_input("Packaging Options", value=csv_default(extracted.get("packaging_options", [])), label_visibility="collapsed")
+        # 19) Shelf Life (months)
+        st.markdown("**Shelf Life (months)**")
+        chem_shelf = st.number_input("Shelf Life (months)", min_value=0, max_value=120, value=int(extracted.get("shelf_life_months", 0) if extracted else 0), step=1, label_visibility="collapsed")
+        # 20) Data Completeness
+        st.markdown("**Data Completeness**")
+        chem_dc = st.slider("Data Completeness", min_value=0.0, max_value=1.0, value=float(extracted.get("data_completeness", 0.0) if extracted else 0.0), step=0.05, label_visibility="collapsed")
+
+        # Show one-line source indicator
+        if extracted:
+            src = st.session_state.get("chem_ai_source")
+            if src:
+                st.caption(f"Source: {src}")
+
+        if st.button("Save Chemical", type="primary"):
+            # Basic validations
+            base_name = normalize_chemical_name(chem_gen)
+            if not base_name:
+                st.error("Chemical name is required")
+            elif chemical_name_exists(base_name):
+                st.error("A chemical with this name already exists")
+            else:
+                try:
+                    ai = st.session_state.get("chem_ai_extracted", {}) or {}
+                    # Helper to choose manual value else AI
+                    def prefer_manual_str(manual: str, ai_key: str):
+                        v = (manual or "").strip()
+                        if v:
+                            return v
+                        return (ai.get(ai_key) or "").strip() or None
+                    def prefer_manual_csv(manual: str, ai_key: str):
+                        lst = parse_csv_list(manual)
+                        if lst:
+                            return lst
+                        return ai.get(ai_key) or []
+                    def prefer_manual_jsonarr(manual: str, ai_key: str):
+                        arr = parse_json_lines_or_array(manual)
+                        if arr:
+                            return arr
+                        return ai.get(ai_key) or []
+
+                    payload = {
+                        "id": str(uuid.uuid4()),
+                        "generic_name": base_name or ai.get("generic_name"),
+                        "family": prefer_manual_str(chem_family, "family"),
+                        "synonyms": prefer_manual_csv(chem_syn, "synonyms"),
+                        "cas_ids": prefer_manual_csv(chem_cas, "cas_ids"),
+                        "hs_codes": (
+                            [
+                                {"region": "WCO", "code": code}
+                                for code in parse_csv_list(chem_hs_codes)
+                            ]
+                            or ai.get("hs_codes")
+                            or []
+                        ),
+                        "functional_categories": prefer_manual_csv(chem_func, "functional_categories"),
+                        "industry_segments": prefer_manual_csv(chem_inds, "industry_segments"),
+                        "key_applications": prefer_manual_csv(chem_keys, "key_applications"),
+                        "typical_dosage": (
+                            _parse_kv_lines(chem_dosage_json)
+                            or prefer_manual_jsonarr(chem_dosage_json, "typical_dosage")
+                        ),
+                        "appearance": prefer_manual_str(chem_appearance, "appearance"),
+                        "physical_snapshot": (
+                            _parse_kv_lines(chem_phys_json)
+                            or prefer_manual_jsonarr(chem_phys_json, "physical_snapshot")
+                        ),
+                        "compatibilities": prefer_manual_csv(chem_compat, "compatibilities"),
+                        "incompatibilities": prefer_manual_csv(chem_incompat, "incompatibilities"),
+                        "sensitivities": prefer_manual_csv(chem_sens, "sensitivities"),
+                        "shelf_life_months": int(chem_shelf or ai.get("shelf_life_months") or 0),
+                        "storage_conditions": prefer_manual_str(chem_storage, "storage_conditions"),
+                        "packaging_options": prefer_manual_csv(chem_pack, "packaging_options"),
+                        "summary_80_20": prefer_manual_str(chem_sum_8020, "summary_80_20"),
+                        "summary_technical": prefer_manual_str(chem_sum_tech, "summary_technical"),
+                        "data_completeness": float(chem_dc or ai.get("data_completeness") or 0.0),
+                    }
+                    create_chemical(payload)
+                    st.success("✅ Chemical saved successfully")
+                    # Clear AI/session state and refresh Add form
+                    try:
+                        for k in [
+                            "chem_ai_extracted",
+                            "chem_ai_source",
+                            "chem_ai_last_raw",
+                        ]:
+                            st.session_state.pop(k, None)
+                    except Exception:
+                        pass
+                    st.rerun()
+                except Exception as e:
+                    st.error(f"Failed to save chemical: {e}")
+        
+        # Add clear session button if there are unsaved changes
+
+    # -------- Manage Chemicals --------
+    elif current_tab == "Manage Chemicals":
+        st.subheader("Manage Chemicals")
+        # Auth gate similar to Manage Products
+        if not sb_user:
+            st.info("Please sign in to access Manage Chemicals.")
+        elif not is_manager:
+            st.error("You do not have permission to access Manage Chemicals.")
+        else:
+            # Filters
+            colmf1, colmf2 = st.columns(2)
+            with colmf1:
+                seg_filter = st.text_input("Filter by Industry Segment", placeholder="e.g., Dry-mix")
+            with colmf2:
+                cat_filter = st.text_input("Filter by Functional Category", placeholder="e.g., Polymer")
+            search_chem = st.text_input("Search by generic name, synonym or application", placeholder="Start typing...")
+            if st.button("Reset Filters", type="secondary"):
+                seg_filter = ""
+                cat_filter = ""
+                search_chem = ""
+
+            chems = fetch_chemicals()
+            filtered_chems = []
+            # If no filters provided, show everything by default
+            if not seg_filter and not cat_filter and not search_chem:
+                filtered_chems = chems
+            else:
+                filtered_chems = []
+            for c in chems:
+                # Normalize fields for matching
+                seg_text = ", ".join(c.get("industry_segments") or []).lower()
+                cat_text = ", ".join(c.get("functional_categories") or []).lower()
+                gen_text = (c.get("generic_name") or "").lower()
+                syn_text = ", ".join(c.get("synonyms") or []).lower()
+                app_text = ", ".join(c.get("key_applications") or []).lower()
+
+                if seg_filter and seg_filter.lower() not in seg_text:
+                    continue
+                if cat_filter and cat_filter.lower() not in cat_text:
+                    continue
+                if search_chem:
+                    q = search_chem.lower()
+                    if all(q not in field for field in [gen_text, syn_text, cat_text, seg_text, app_text]):
+                        continue
+                if seg_filter or cat_filter or search_chem:
+                    filtered_chems.append(c)
+
+            if filtered_chems:
+                st.success(f"📋 Found {len(filtered_chems)} chemicals")
+            else:
+                # Fallback: show all chemicals so user can edit/delete
+                if chems:
+                    st.warning("No chemicals match the filters. Showing all chemicals.")
+                    filtered_chems = chems
+                else:
+                    st.info("No chemicals found in the database.")
+
+            for chem in filtered_chems:
+                cid = chem.get("id")
+                # Expander reset suffix to force collapse after save via refresh token
+                _chem_refresh_token = st.session_state.get("chem_manage_refresh_token", "")
+                try:
+                    _nzw = ((sum(ord(ch) for ch in _chem_refresh_token) % 5) + 1) if _chem_refresh_token else 0
+                except Exception:
+                    _nzw = 0
+                _zw_suffix = "\u200B" * _nzw if _nzw else ""
+                with st.expander(f"🧪 {chem.get('generic_name')}{_zw_suffix}", expanded=False):
+                    ec1, ec2 = st.columns(2)
+                    with ec1:
+                        ename = st.text_input("Generic Name", value=chem.get("generic_name", ""), key=f"cn_{cid}")
+                        efamily = st.text_input("Family", value=chem.get("family", ""), key=f"cf_{cid}")
+                        esyn = st.text_input("Synonyms (comma-separated)", value=", ".join(chem.get("synonyms") or []), key=f"csy_{cid}")
+                        ecas = st.text_input("CAS IDs (comma-separated)", value=", ".join(chem.get("cas_ids") or []), key=f"cca_{cid}")
+                    with ec2:
+                        # Human-readable HS Codes (comma-separated)
+                        _hs_list = []
+                        try:
+                            for it in (chem.get("hs_codes") or []):
+                                if isinstance(it, dict) and it.get("code"):
+                                    _hs_list.append(str(it.get("code")))
+                        except Exception:
+                            pass
+                        if not _hs_list and chem.get("hs_code"):
+                            _hs_list = [str(chem.get("hs_code"))]
+                        ehs_text = st.text_input("HS Codes (comma-separated)", value=", ".join(_hs_list), key=f"ch_{cid}")
+                        efunc = st.text_input("Functional Categories (comma-separated)", value=", ".join(chem.get("functional_categories") or []), key=f"cc_{cid}")
+                        eind = st.text_input("Industry Segments (comma-separated)", value=", ".join(chem.get("industry_segments") or []), key=f"ci_{cid}")
+                    ekeys = st.text_input("Key Applications (comma-separated)", value=", ".join(chem.get("key_applications") or []), key=f"cak_{cid}")
+                    # Human-readable Typical Dosage: one per line as "application: range"
+                    edosage_lines = st.text_area("Typical Dosage (one per line: application: range)", value=_ai_list_as_lines(chem.get("typical_dosage")) if chem.get("typical_dosage") else "", height=70, key=f"cdj_{cid}")
+                    eappearance = st.text_input("Appearance", value=chem.get("appearance", ""), key=f"cap_{cid}")
+                    # Human-readable Physical Snapshot: one per line as "key: value, unit: U, method: M"
+                    ephys_lines = st.text_area("Physical Snapshot (one per line: name: value, unit: U, method: M)", value=_ai_list_as_lines(chem.get("physical_snapshot")) if chem.get("physical_snapshot") else "", height=70, key=f"cps_{cid}")
+                    ecompat = st.text_input("Compatibilities (comma-separated)", value=", ".join(chem.get("compatibilities") or []), key=f"ccom_{cid}")
+                    eincompat = st.text_input("Incompatibilities (comma-separated)", value=", ".join(chem.get("incompatibilities") or []), key=f"cinc_{cid}")
+                    esens = st.text_input("Sensitivities (comma-separated)", value=", ".join(chem.get("sensitivities") or []), key=f"csen_{cid}")
+                    cs1, cs2 = st.columns(2)
+                    with cs1:
+                        eshelf = st.number_input("Shelf Life (months)", min_value=0, max_value=120, value=int(chem.get("shelf_life_months") or 0), step=1, key=f"csh_{cid}")
+                        estorage = st.text_input("Storage Conditions", value=chem.get("storage_conditions", ""), key=f"cst_{cid}")
+                    with cs2:
+                        epack = st.text_input("Packaging Options (comma-separated)", value=", ".join(chem.get("packaging_options") or []), key=f"cpa_{cid}")
+                        edc = st.slider("Data Completeness", 0.0, 1.0, float(chem.get("data_completeness") or 0.0), 0.05, key=f"cdc_{cid}")
+                    e8020 = st.text_area("Summary 80/20", value=chem.get("summary_80_20", ""), height=60, key=f"c80_{cid}")
+                    esumtech = st.text_area("Summary Technical", value=chem.get("summary_technical", ""), height=80, key=f"cstt_{cid}")
+
+                    colb1, colb2, colb3, colb4 = st.columns([1,1,1,5])
+                    with colb1:
+                        if st.button("💾 Save", key=f"csave_{cid}"):
+                            if not ename.strip():
+                                st.error("Generic name cannot be empty")
+                            elif chemical_name_exists(ename) and ename.strip() != (chem.get("generic_name") or ""):
+                                # Re-use product helper for duplicate logic semantics
+                                st.error("Another record already uses this name")
+                            else:
+                                try:
+                                    updates = {
+                                        "generic_name": ename.strip(),
+                                        "family": efamily.strip() or None,
+                                        "synonyms": [s.strip() for s in esyn.split(",") if s.strip()],
+                                        "cas_ids": [s.strip() for s in ecas.split(",") if s.strip()],
+                                        "hs_codes": (
+                                            [
+                                                {"region": "WCO", "code": code}
+                                                for code in [s.strip() for s in ehs_text.split(",") if s.strip()]
+                                            ]
+                                        ),
+                                        "functional_categories": [s.strip() for s in efunc.split(",") if s.strip()],
+                                        "industry_segments": [s.strip() for s in eind.split(",") if s.strip()],
+                                        "key_applications": [s.strip() for s in ekeys.split(",") if s.strip()],
+                                        "typical_dosage": _parse_kv_lines(edosage_lines),
+                                        "appearance": eappearance.strip() or None,
+                                        "physical_snapshot": _parse_kv_lines(ephys_lines),
+                                        "compatibilities": [s.strip() for s in ecompat.split(",") if s.strip()],
+                                        "incompatibilities": [s.strip() for s in eincompat.split(",") if s.strip()],
+                                        "sensitivities": [s.strip() for s in esens.split(",") if s.strip()],
+                                        "shelf_life_months": int(eshelf or 0),
+                                        "storage_conditions": estorage.strip() or None,
+                                        "packaging_options": [s.strip() for s in epack.split(",") if s.strip()],
+                                        "summary_80_20": e8020.strip() or None,
+                                        "summary_technical": esumtech.strip() or None,
+                                        "data_completeness": float(edc or 0.0),
+                                    }
+                                    update_chemical(cid, updates)
+                                    st.success("✅ Updated")
+                                    # Bump token so the expander identity changes and collapses on rerun
+                                    st.session_state["chem_manage_refresh_token"] = str(uuid.uuid4())
+                                    st.rerun()
+                                except Exception as e:
+                                    st.error(f"Failed to update: {e}")
+                    with colb2:
+                        if st.button("🗑️ Delete", key=f"cdel_{cid}"):
+                            try:
+                                delete_chemical(cid)
+                                st.success("Deleted")
+                                st.session_state["chem_manage_refresh_token"] = str(uuid.uuid4())
+                                st.rerun()
+                            except Exception as e:
+                                st.error(f"Failed to delete: {e}")
+                    with colb3:
+                        _hist_key = f"chist_open_{cid}"
+                        if st.button("🕘 History", key=f"chist_{cid}"):
+                            st.session_state[_hist_key] = not st.session_state.get(_hist_key, False)
+                            st.session_state[f"chist_page_{cid}"] = 0
+                    # Edit history: fetched only while open, one page at a time
+                    if st.session_state.get(f"chist_open_{cid}"):
+                        _page = st.session_state.get(f"chist_page_{cid}", 0)
+                        try:
+                            _versions, _total = fetch_chemical_type_versions(supabase, cid, page=_page)
+                        except Exception as e:
+                            _versions, _total = [], 0
+                            st.caption(f"History unavailable: {e}")
+                        if not _versions:
+                            st.caption("No edits recorded yet")
+                        else:
+                            _pages = max(1, -(-_total // VERSION_PAGE_SIZE))
+                            for _v in _versions:
+                                _changed = _v.get("changed") or {}
+                                st.markdown(f"**{(_v.get('ts') or '')[:19].replace('T', ' ')}** — {_v.get('changed_by') or 'unknown user'}")
+                                st.json(_changed, expanded=False)
+                            hp1, hp2, hp3 = st.columns([1,2,1])
+                            with hp1:
+                                if st.button("◀ Newer", key=f"chist_prev_{cid}", disabled=_page <= 0):
+                                    st.session_state[f"chist_page_{cid}"] = _page - 1
+                                    st.rerun()
+                            with hp2:
+                                st.caption(f"Page {_page + 1} of {_pages} · {_total} edits")
+                            with hp3:
+                                if st.button("Older ▶", key=f"chist_next_{cid}", disabled=_page + 1 >= _pages):
+                                    st.session_state[f"chist_page_{cid}"] = _page + 1
+                                    st.rerun()
+
+    # -------- View Chemicals --------
+    elif current_tab == "View Chemicals":
+        st.subheader("View Chemicals")
+        vcol1, vcol2 = st.columns(2)
+        with vcol1:
+            v_seg = st.text_input("Filter by Industry Segment")
+        with vcol2:
+            v_cat = st.text_input("Filter by Functional Category")
+        v_search = st.text_input("Search by generic name or applications")
+
+        def _chem_view_match(c: dict) -> bool:
+            if v_seg and (", ".join(c.get("industry_segments") or [])).lower().find(v_seg.lower()) < 0:
+                return False
+            if v_cat and (", ".join(c.get("functional_categories") or [])).lower().find(v_cat.lower()) < 0:
+                return False
+            if v_search:
+                hay = " ".join([
+                    c.get("generic_name", ""),
+                    ", ".join(c.get("industry_segments") or []),
+                    ", ".join(c.get("functional_categories") or []),
+                    ", ".join(c.get("key_applications") or []),
+                ]).lower()
+                if v_search.lower() not in hay:
+                    return False
+            return True
+
+        chems = fetch_chemicals()
+        v_filtered = [c for c in chems if _chem_view_match(c)]
+
+        # Compact table view from mapping
+        if v_filtered:
+            try:
+                import pandas as _pd_view
+            except Exception:
+                _pd_view = None
+            rows = _build_chem_view_rows(v_filtered, CHEM_VIEW_TABLE_FIELDS)
+            if rows:
+                try:
+                    import pandas as pd
+                    dfv = pd.DataFrame(rows)
+                    st.dataframe(dfv, use_container_width=True, hide_index=True)
+                except Exception:
+                    # Fallback simple list rendering
+                    for r in rows:
+                        st.write(r)
+
+        # Export: streams chemical_types page by page through the same filters, on click only
+        def _chem_export_rows():
+            for rec in export_rows("chemical_types", order="name"):
+                c = _map_type_record_to_legacy(rec)
+                if _chem_view_match(c):
+                    yield _build_chem_view_rows([c], CHEM_VIEW_TABLE_FIELDS)[0]
+
+        render_export(
+            "export_csv_view_chemicals", "chemicals",
+            [label for _, label in CHEM_VIEW_TABLE_FIELDS], _chem_export_rows, sheet_title="Chemicals",
+        )
+
+        if not v_filtered:
+            st.info("No chemicals found with current filters.")
+        else:
+            for c in v_filtered:
+                title_suffix = ", ".join(c.get('industry_segments') or [])
+                with st.expander(f"🧪 {c.get('generic_name')} — {title_suffix}"):
+                    for key, label in CHEM_VIEW_DETAIL_FIELDS:
+                        st.markdown(f"**{label}:** {_format_chem_field(c.get(key))}")
+
+    st.markdown('</div>', unsafe_allow_html=True)
@@ -0,0 +1,491 @@
+"""
+LeanChem Products: the LeanChem product portfolio with stock and prices.
+
+Loaded by pms.py only while this module is the active one, and executed in pms.py's
+namespace: it uses the Supabase client, helpers and session/auth state defined there.
+"""
+
+# ==========================
+# UI - LeanChem Product Master Data (placeholder)
+# ==========================
+if st.session_state.get("main_section") == "leanchem":
+    st.markdown('<h1 style="color:#1976d2; font-weight:700;">LeanChem Product Master Data</h1>', unsafe_allow_html=True)
+    st.markdown('<div class="form-card">', unsafe_allow_html=True)
+    # Show post-save success message after rerun
+    if st.session_state.get("lc_saved_ok"):
+        st.success("✅ LeanChem product saved")
+        st.session_state.pop("lc_saved_ok", None)
+    # Apply deferred reset of widget states safely before rendering widgets
+    if st.session_state.get("lc_reset"):
+        try:
+            _clear_leanchem_session()
+        except Exception:
+            pass
+        st.session_state.pop("lc_reset", None)
+
+    # Helpers
+    def _fetch_tds_by_cat_type(cat: str, ptype: str) -> list[dict]:
+        try:
+            return query_tds(supabase, "id,chemical_type_id,brand,grade,metadata", category=cat or None, product_type=ptype or None)
+        except Exception:
+            return []
+
+    def _fetch_price_for_incoterm(tds_id: str, incoterm: str) -> dict:
+        try:
+            return fetch_price_point(supabase, tds_id, incoterm)
+        except Exception:
+            return {"price_usd": "", "price_etb": ""}
+
+    def _save_leanchem_product(payload: dict) -> tuple[bool, str]:
+        """Save LeanChem product to primary table if available; otherwise
+        fallback to embedding under the referenced TDS record's metadata.
+
+        Returns (ok, message).
+        """
+        try:
+            # Try primary table first
+            try:
+                supabase.table("leanchem_products").insert(payload).execute()
+                return True, "saved"
+            except Exception as e:
+                # Probe whether table exists by attempting a trivial select
+                try:
+                    supabase.table("leanchem_products").select("id").limit(1).execute()
+                except Exception:
+                    # Table likely missing → fallback store under TDS metadata
+                    pass
+                # Fallback path: attach under tds_data.metadata.leanchem_product
+                tds_id = payload.get("tds_id")
+                if not tds_id:
+                    return False, "Missing TDS reference for fallback save"
+                rec = supabase.table("tds_data").select("metadata").eq("id", tds_id).limit(1).execute()
+                if not rec.data:
+                    return False, "Referenced TDS not found"
+                md = ((rec.data or [{}])[0] or {}).get("metadata") or {}
+                # Store a minimized snapshot (JSON-serializable)
+                md["leanchem_product"] = {
+                    "category": payload.get("category"),
+                    "product_type": payload.get("product_type"),
+                    "sample_addis": payload.get("sample_addis"),
+                    "stock_addis": payload.get("stock_addis"),
+                    "stock_nairobi": payload.get("stock_nairobi"),
+                    "prices": payload.get("prices"),
+                    "saved_at": datetime.utcnow().isoformat() + "Z",
+                }
+                supabase.table("tds_data").update({"metadata": md}).eq("id", tds_id).execute()
+                return True, "saved_fallback"
+        except Exception as e:
+            return False, str(e)
+
+    def _lean_fetch_all() -> list[dict]:
+        """Fetch LeanChem products from primary table when present; otherwise
+        assemble from TDS metadata fallback. Returns list of dicts with keys:
+        id, source ('table'|'tds'), tds_id, category, product_type, sample_addis,
+        stock_addis, stock_nairobi, prices, tds_name.
+        """
+        out: list[dict] = []
+        # Try table first
+        try:
+            rows = supabase.table("leanchem_products").select("*").order("created_at", desc=True).execute().data or []
+            # Resolve all TDS display names in one batched query instead of one query per product
+            try:
+                tds_names = fetch_tds_names(supabase, [r.get("tds_id") for r in rows])
+            except Exception:
+                tds_names = {}
+            for r in rows:
+                tds_id = r.get("tds_id")
+                tds_name = tds_names.get(str(tds_id)) if tds_id else None
+                out.append({
+                    "id": r.get("id"),
+                    "source": "table",
+                    "tds_id": tds_id,
+                    "category": r.get("category"),
+                    "product_type": r.get("product_type"),
+                    "sample_addis": r.get("sample_addis") or {},
+                    "stock_addis": r.get("stock_addis") or {},
+                    "stock_nairobi": r.get("stock_nairobi") or {},
+                    "prices": r.get("prices") or {},
+                    "tds_name": tds_name,
+                })
+        except Exception:
+            pass
+        if out:
+            return out
+        # Fallback: derive from TDS metadata
+        try:
+            rows = supabase.table("tds_data").select("id,metadata").order("created_at", desc=True).execute().data or []
+            for r in rows:
+                md = r.get("metadata") or {}
+                lcp = md.get("leanchem_product")
+                if not lcp:
+                    continue
+                out.append({
+                    "id": f"tds:{r.get('id')}",
+                    "source": "tds",
+                    "tds_id": r.get("id"),
+                    "category": lcp.get("category"),
+                    "product_type": lcp.get("product_type"),
+                    "sample_addis": lcp.get("sample_addis") or {},
+                    "stock_addis": lcp.get("stock_addis") or {},
+                    "stock_nairobi": lcp.get("stock_nairobi") or {},
+                    "prices": lcp.get("prices") or {},
+                    "tds_name": tds_display_name(md),
+                })
+        except Exception:
+            pass
+        return out
+
+    def _lean_update_record(record_id: str, source: str, updates: dict) -> tuple[bool, str]:
+        try:
+            if source == "table":
+                supabase.table("leanchem_products").update(updates).eq("id", record_id).execute()
+                return True, "updated"
+            # tds metadata fallback
+            if not record_id.startswith("tds:"):
+                return False, "invalid tds record id"
+            tds_id = record_id.split(":", 1)[1]
+            rec = supabase.table("tds_data").select("metadata").eq("id", tds_id).limit(1).execute()
+            if not rec.data:
+                return False, "tds not found"
+            md = ((rec.data or [{}])[0] or {}).get("metadata") or {}
+            curr = md.get("leanchem_product") or {}
+            curr.update(updates)
+            md["leanchem_product"] = curr
+            supabase.table("tds_data").update({"metadata": md}).eq("id", tds_id).execute()
+            return True, "updated"
+        except Exception as e:
+            return False, str(e)
+
+    def _lean_delete_record(record_id: str, source: str) -> tuple[bool, str]:
+        try:
+            if source == "table":
+                supabase.table("leanchem_products").delete().eq("id", record_id).execute()
+                return True, "deleted"
+            if not record_id.startswith("tds:"):
+                return False, "invalid tds record id"
+            tds_id = record_id.split(":", 1)[1]
+            rec = supabase.table("tds_data").select("metadata").eq("id", tds_id).limit(1).execute()
+            if not rec.data:
+                return False, "tds not found"
+            md = ((rec.data or [{}])[0] or {}).get("metadata") or {}
+            if "leanchem_product" in md:
+                del md["leanchem_product"]
+            supabase.table("tds_data").update({"metadata": md}).eq("id", tds_id).execute()
+            return True, "deleted"
+        except Exception as e:
+            return False, str(e)
+
+    # -------- LeanChem session helpers --------
+    def _has_unsaved_leanchem_changes() -> bool:
+        try:
+            if st.session_state.get("main_section") != "leanchem":
+                return False
+            # Any of these keys indicate in-progress edits
+            keys = [
+                "lc_category","lc_type","lc_tds",
+                "lc_sample_addis","lc_sample_addis_unit","lc_sample_addis_qty",
+                "lc_stock_addis","lc_stock_addis_unit","lc_stock_addis_qty",
+                "lc_stock_nairobi","lc_stock_nairobi_unit","lc_stock_nairobi_qty",
+            ]
+            return any(k in st.session_state and st.session_state.get(k) not in (None, "", "— Select —") for k in keys)
+        except Exception:
+            return False
+
+    def _clear_leanchem_session():
+        try:
+            for k in [
+                "lc_category","lc_type","lc_tds",
+                "lc_sample_addis","lc_sample_addis_unit","lc_sample_addis_qty",
+                "lc_stock_addis","lc_stock_addis_unit","lc_stock_addis_qty",
+                "lc_stock_nairobi","lc_stock_nairobi_unit","lc_stock_nairobi_qty",
+                "lc_price_addis","lc_price_nairobi",
+            ]:
+                st.session_state.pop(k, None)
+        except Exception:
+            pass
+
+    # Sub-tabs
+    if "leanchem_current_tab" not in st.session_state:
+        st.session_state["leanchem_current_tab"] = "Add"
+    col_tab1, col_tab2, col_tab3 = st.columns(3)
+    with col_tab1:
+        if st.button("Add", key="lc_tab_add", type="primary" if st.session_state.get("leanchem_current_tab") == "Add" else "secondary", use_container_width=True):
+            prev = st.session_state.get("leanchem_current_tab")
+            if prev != "Add" and _has_unsaved_leanchem_changes():
+                st.session_state["pending_leanchem_tab"] = "Add"
+                st.rerun()
+            else:
+                st.session_state["leanchem_current_tab"] = "Add"
+                st.rerun()
+    with col_tab2:
+        if st.button("Manage", key="lc_tab_manage", type="primary" if st.session_state.get("leanchem_current_tab") == "Manage" else "secondary", use_container_width=True):
+            prev = st.session_state.get("leanchem_current_tab")
+            if prev != "Manage" and _has_unsaved_leanchem_changes():
+                st.session_state["pending_leanchem_tab"] = "Manage"
+                st.rerun()
+            else:
+                st.session_state["leanchem_current_tab"] = "Manage"
+                st.rerun()
+    with col_tab3:
+        if st.button("View", key="lc_tab_view", type="primary" if st.session_state.get("leanchem_current_tab") == "View" else "secondary", use_container_width=True):
+            prev = st.session_state.get("leanchem_current_tab")
+            if prev != "View" and _has_unsaved_leanchem_changes():
+                st.session_state["pending_leanchem_tab"] = "View"
+                st.rerun()
+            else:
+                st.session_state["leanchem_current_tab"] = "View"
+                st.rerun()
+
+    # Pending tab change dialog
+    if st.session_state.get("pending_leanchem_tab"):
+        new_tab = st.session_state.get("pending_leanchem_tab")
+        st.warning("⚠️ You have unsaved changes in LeanChem Add.")
+        c1, c2, c3 = st.columns([1,1,2])
+        with c1:
+            if st.button("🗑️ Discard & Continue", key="lc_discard", type="primary"):
+                _clear_leanchem_session()
+                st.session_state["leanchem_current_tab"] = new_tab
+                st.session_state.pop("pending_leanchem_tab")
+                st.rerun()
+        with c2:
+            if st.button("❌ Cancel", key="lc_cancel"):
+                st.session_state.pop("pending_leanchem_tab")
+                st.rerun()
+        with c3:
+            st.caption("Your unsaved changes will be lost if you continue.")
+        st.stop()
+
+    current_lc_tab = st.session_state.get("leanchem_current_tab", "Add")
+
+    # Dynamic selectors (outside form for immediate rerun on change) - only for Add tab
+    if current_lc_tab == "Add":
+        col1, col2 = st.columns(2)
+        with col1:
+            lc_cat_placeholder = "— Select —"
+            lc_cat_sel = st.selectbox("Select Category", [lc_cat_placeholder] + FIXED_CATEGORIES, key="lc_category")
+            lc_category = "" if lc_cat_sel == lc_cat_placeholder else lc_cat_sel
+            # Product Type options depend on category using chemical master mapping
+            lc_types = get_types_for_category_enriched(lc_category)
+            lc_type_placeholder = "— Select —"
+            lc_type_sel = st.selectbox("Select Product Type", [lc_type_placeholder] + (lc_types or []), key="lc_type")
+            lc_product_type = "" if lc_type_sel == lc_type_placeholder else lc_type_sel
+            # TDS filtered by selected category immediately; further narrowed by product type if chosen
+            tds_items = _fetch_tds_by_cat_type(lc_category, lc_product_type) if lc_category else []
+            tds_label_map = {}
+            for r in tds_items:
+                md = r.get("metadata") or {}
+                label = md.get("product_name") or md.get("generic_product_name") or (r.get("brand") or "Unnamed")
+                tds_label_map[f"{label}"] = r.get("id")
+            tds_placeholder = "— Select —"
+            lc_tds_label = st.selectbox("Select TDS", [tds_placeholder] + list(tds_label_map.keys()), key="lc_tds")
+            lc_tds_id = tds_label_map.get(lc_tds_label) if lc_tds_label != tds_placeholder else None
+        with col2:
+            st.empty()
+
+    # Wide, centered Sample & Stock section (Add tab only)
+    if current_lc_tab == "Add":
+        st.markdown("---")
+        st.subheader("Sample & Stock")
+
+        # Add form (buttons and sample/stock fields)
+        with st.form("leanchem_add_form", clear_on_submit=False):
+            # Sample - Addis
+            s1_col1, s1_col2, s1_col3 = st.columns([1,1,1])
+            with s1_col1:
+                lc_sample_addis_yes = st.selectbox("Sample - Addis Ababa", ["No", "Yes"], key="lc_sample_addis")
+            with s1_col2:
+                lc_sample_addis_unit = st.text_input("Unit of measurement", key="lc_sample_addis_unit")
+            with s1_col3:
+                lc_sample_addis_qty = st.text_input("Qty", key="lc_sample_addis_qty")
+
+            # Stock - Addis
+            s2_col1, s2_col2, s2_col3 = st.columns([1,1,1])
+            with s2_col1:
+                lc_stock_addis_yes = st.selectbox("Stock - Addis Ababa", ["No", "Yes"], key="lc_stock_addis")
+            with s2_col2:
+                lc_stock_addis_unit = st.text_input("Unit of measurement", key="lc_stock_addis_unit")
+            with s2_col3:
+                lc_stock_addis_qty = st.text_input("Qty", key="lc_stock_addis_qty")
+
+            # Stock - Nairobi
+            s3_col1, s3_col2, s3_col3 = st.columns([1,1,1])
+            with s3_col1:
+                lc_stock_nairobi_yes = st.selectbox("Stock - Nairobi", ["No", "Yes"], key="lc_stock_nairobi")
+            with s3_col2:
+                lc_stock_nairobi_unit = st.text_input("Unit of measurement", key="lc_stock_nairobi_unit")
+            with s3_col3:
+                lc_stock_nairobi_qty = st.text_input("Qty", key="lc_stock_nairobi_qty")
+
+            st.markdown("---")
+            # Fetch data from master data
+            colf1, colf2 = st.columns([1,1])
+            with colf1:
+                fetch_clicked = st.form_submit_button("Fetch data from master data", type="secondary")
+            with colf2:
+                save_clicked = st.form_submit_button("Save", type="primary")
+
+    # Handle fetch (Add tab only)
+    if current_lc_tab == "Add" and st.session_state.get("lc_tds") and fetch_clicked:
+        pass
+    if current_lc_tab == "Add" and fetch_clicked:
+        if not lc_tds_id:
+            st.warning("Select TDS first.")
+        else:
+            # Selling Price pull from pricing master
+            price_addis = _fetch_price_for_incoterm(lc_tds_id, "Addis Ababa")
+            price_nairobi = _fetch_price_for_incoterm(lc_tds_id, "Nairobi")
+            st.success("Fetched pricing from master data")
+            st.write(f"Selling Price — Addis Ababa: USD {price_addis.get('price_usd') or '-'} | ETB {price_addis.get('price_etb') or '-'}")
+            st.write(f"Selling Price — Nairobi: USD {price_nairobi.get('price_usd') or '-'} | ETB {price_nairobi.get('price_etb') or '-'}")
+            try:
+                st.session_state["lc_price_addis"] = price_addis
+                st.session_state["lc_price_nairobi"] = price_nairobi
+            except Exception:
+                pass
+            # TDS link
+            try:
+                rec = supabase.table("tds_data").select("metadata").eq("id", lc_tds_id).limit(1).execute()
+                md = ((rec.data or [{}])[0] or {}).get("metadata") or {}
+                if md.get("tds_file_url"):
+                    st.markdown(f"[📄 TDS]({md.get('tds_file_url')})")
+            except Exception:
+                pass
+
+    # Save (Add tab only)
+    if current_lc_tab == "Add" and save_clicked:
+        # Basic validation
+        if not (lc_category and lc_product_type and lc_tds_id):
+            st.error("Category, Product Type and TDS are required")
+        else:
+            try:
+                payload = {
+                    "id": str(uuid.uuid4()),
+                    "category": lc_category,
+                    "product_type": lc_product_type,
+                    "tds_id": lc_tds_id,
+                    "sample_addis": {
+                        "yes": lc_sample_addis_yes,
+                        "unit": lc_sample_addis_unit,
+                        "qty": lc_sample_addis_qty,
+                    },
+                    "stock_addis": {
+                        "yes": lc_stock_addis_yes,
+                        "unit": lc_stock_addis_unit,
+                        "qty": lc_stock_addis_qty,
+                    },
+                    "stock_nairobi": {
+                        "yes": lc_stock_nairobi_yes,
+                        "unit": lc_stock_nairobi_unit,
+                        "qty": lc_stock_nairobi_qty,
+                    },
+                    "prices": {
+                        "addis_ababa": st.session_state.get("lc_price_addis") or {},
+                        "nairobi": st.session_state.get("lc_price_nairobi") or {},
+                    },
+                }
+                ok, msg = _save_leanchem_product(payload)
+                if ok:
+                    if msg == "saved_fallback":
+                        st.warning("Saved under the selected TDS record (metadata) because the 'leanchem_products' table is missing or insert was blocked by RLS. See setup instructions below.")
+                    # Mark for reset on next run to avoid modifying after widget instantiation
+                    st.session_state["lc_saved_ok"] = True
+                    st.session_state["lc_reset"] = True
+                    st.rerun()
+                else:
+                    st.error(f"Failed to save LeanChem product: {msg}")
+            except Exception as e:
+                st.error(f"Failed to save LeanChem product: {e}")
+
+    # Manage tab
+    if current_lc_tab == "Manage":
+        recs = _lean_fetch_all()
+        if not recs:
+            st.info("No LeanChem products found")
+        else:
+            for r in recs:
+                rid = r.get("id")
+                with st.expander(f"{r.get('product_type') or '-'} — {r.get('tds_name') or '-'}", expanded=False):
+                    c1, c2 = st.columns(2)
+                    with c1:
+                        ecat = st.text_input("Category", value=r.get("category") or "", key=f"lc_m_cat_{rid}")
+                        etype = st.text_input("Product Type", value=r.get("product_type") or "", key=f"lc_m_type_{rid}")
+                        esamp_yes = st.selectbox("Sample - Addis Ababa", ["No","Yes"], index=(0 if (r.get('sample_addis') or {}).get('yes') != 'Yes' else 1), key=f"lc_m_s_yes_{rid}")
+                        esamp_unit = st.text_input("Sample Unit", value=(r.get("sample_addis") or {}).get("unit") or "", key=f"lc_m_s_unit_{rid}")
+                        esamp_qty = st.text_input("Sample Qty", value=(r.get("sample_addis") or {}).get("qty") or "", key=f"lc_m_s_qty_{rid}")
+                    with c2:
+                        estock_yes = st.selectbox("Stock - Addis Ababa", ["No","Yes"], index=(0 if (r.get('stock_addis') or {}).get('yes') != 'Yes' else 1), key=f"lc_m_st_yes_{rid}")
+                        estock_unit = st.text_input("Stock Unit", value=(r.get("stock_addis") or {}).get("unit") or "", key=f"lc_m_st_unit_{rid}")
+                        estock_qty = st.text_input("Stock Qty", value=(r.get("stock_addis") or {}).get("qty") or "", key=f"lc_m_st_qty_{rid}")
+                        enairobi_yes = st.selectbox("Stock - Nairobi", ["No","Yes"], index=(0 if (r.get('stock_nairobi') or {}).get('yes') != 'Yes' else 1), key=f"lc_m_n_yes_{rid}")
+                        enairobi_unit = st.text_input("Nairobi Unit", value=(r.get("stock_nairobi") or {}).get("unit") or "", key=f"lc_m_n_unit_{rid}")
+                        enairobi_qty = st.text_input("Nairobi Qty", value=(r.get("stock_nairobi") or {}).get("qty") or "", key=f"lc_m_n_qty_{rid}")
+                    b1, b2 = st.columns(2)
+                    with b1:
+                        if st.button("💾 Save", key=f"lc_m_save_{rid}"):
+                            updates = {
+                                "category": ecat.strip() or None,
+                                "product_type": etype.strip() or None,
+                                "sample_addis": {"yes": esamp_yes, "unit": esamp_unit.strip(), "qty": esamp_qty.strip()},
+                                "stock_addis": {"yes": estock_yes, "unit": estock_unit.strip(), "qty": estock_qty.strip()},
+                                "stock_nairobi": {"yes": enairobi_yes, "unit": enairobi_unit.strip(), "qty": enairobi_qty.strip()},
+                            }
+                            ok, msg = _lean_update_record(rid, r.get("source"), updates)
+                            if ok:
+                                st.success("Updated")
+                                # Clear LeanChem session state after save and return to Manage tab
+                                try:
+                                    _clear_leanchem_session()
+                                except Exception:
+                                    pass
+                                st.session_state["leanchem_current_tab"] = "Manage"
+                                st.rerun()
+                            else:
+                                st.error(f"Failed to update: {msg}")
+                    with b2:
+                        if st.button("🗑️ Delete", key=f"lc_m_del_{rid}"):
+                            ok, msg = _lean_delete_record(rid, r.get("source"))
+                            if ok:
+                                st.success("Deleted")
+                                st.rerun()
+                            else:
+                                st.error(f"Failed to delete: {msg}")
+
+    # View tab
+    if current_lc_tab == "View":
+        recs = _lean_fetch_all()
+        if not recs:
+            st.info("No LeanChem products found")
+        else:
+            try:
+                import pandas as pd
+                # Current selling prices for the whole portfolio from one cached price matrix;
+                # the snapshot saved with the product is shown when the TDS has no price.
+                try:
+                    price_matrix = get_price_matrix()
+                except Exception:
+                    price_matrix = PriceMatrix()
+                rows = []
+                for r in recs:
+                    saved_prices = r.get("prices") or {}
+                    price_addis = price_matrix.get(r.get("tds_id"), "Addis Ababa")
+                    price_nairobi = price_matrix.get(r.get("tds_id"), "Nairobi")
+                    rows.append({
+                        "Category": r.get("category") or "",
+                        "Product Type": r.get("product_type") or "",
+                        "TDS": r.get("tds_name") or "",
+                        "Sample Addis": (r.get("sample_addis") or {}).get("qty") or "",
+                        "Stock Addis": (r.get("stock_addis") or {}).get("qty") or "",
+                        "Stock Nairobi": (r.get("stock_nairobi") or {}).get("qty") or "",
+                        "Price Addis USD": price_addis["price_usd"] or (saved_prices.get("addis_ababa") or {}).get("price_usd") or "",
+                        "Price Addis ETB": price_addis["price_etb"] or (saved_prices.get("addis_ababa") or {}).get("price_etb") or "",
+                        "Price Nairobi USD": price_nairobi["price_usd"] or (saved_prices.get("nairobi") or {}).get("price_usd") or "",
+                        "Price Nairobi ETB": price_nairobi["price_etb"] or (saved_prices.get("nairobi") or {}).get("price_etb") or "",
+                    })
+                df = pd.DataFrame(rows)
+                st.dataframe(df, use_container_width=True, hide_index=True)
+                render_export("lc_view_export", "leanchem", list(df.columns), lambda: rows, sheet_title="LeanChem Products")
+            except Exception:
+                for r in recs:
+                    st.write(f"- {r.get('category') or '-'} | {r.get('product_type') or '-'} | {r.get('tds_name') or '-'}")
+
+    st.markdown('</div>', unsafe_allow_html=True)
@@ -0,0 +1,489 @@
+"""
+Market Master Data: market data entry, import-data analysis and views.
+
+Loaded by pms.py only while this module is the active one, and executed in pms.py's
+namespace: it uses the Supabase client, helpers and session/auth state defined there.
+"""
+
+# ==========================
+# UI - Market Master Data
+# ==========================
+if st.session_state.get("main_section") == "market":
+    st.markdown('<h1 style="color:#1976d2; font-weight:700;">Market Master Data</h1>', unsafe_allow_html=True)
+    st.markdown('<div class="form-card">', unsafe_allow_html=True)
+
+    # Track current market tab to detect tab switches
+    if "market_current_tab" not in st.session_state:
+        st.session_state["market_current_tab"] = "Add"
+    
+    # Create custom tab navigation with proper change detection
+    tab_col1, tab_col2, tab_col3 = st.columns(3)
+    
+    with tab_col1:
+        if st.button("Add", key="market_tab_add", type="primary" if st.session_state.get("market_current_tab") == "Add" else "secondary", use_container_width=True):
+            previous_tab = st.session_state.get("market_current_tab")
+            if previous_tab and previous_tab != "Add" and _has_unsaved_market_changes():
+                st.session_state["pending_market_tab"] = "Add"
+                st.rerun()
+            else:
+                st.session_state["market_current_tab"] = "Add"
+                st.rerun()
+    
+    with tab_col2:
+        if st.button("Manage", key="market_tab_manage", type="primary" if st.session_state.get("market_current_tab") == "Manage" else "secondary", use_container_width=True):
+            previous_tab = st.session_state.get("market_current_tab")
+            if previous_tab and previous_tab != "Manage" and _has_unsaved_market_changes():
+                st.session_state["pending_market_tab"] = "Manage"
+                st.rerun()
+            else:
+                st.session_state["market_current_tab"] = "Manage"
+                st.rerun()
+    
+    with tab_col3:
+        if st.button("View", key="market_tab_view", type="primary" if st.session_state.get("market_current_tab") == "View" else "secondary", use_container_width=True):
+            previous_tab = st.session_state.get("market_current_tab")
+            if previous_tab and previous_tab != "View" and _has_unsaved_market_changes():
+                st.session_state["pending_market_tab"] = "View"
+                st.rerun()
+            else:
+                st.session_state["market_current_tab"] = "View"
+                st.rerun()
+
+    # Pending tab change dialog
+    if st.session_state.get("pending_market_tab"):
+        st.warning("⚠️ You have unsaved changes. Do you want to discard them and switch tabs?")
+        col1, col2 = st.columns(2)
+        with col1:
+            if st.button("Yes, discard changes", key="market_discard_yes"):
+                _clear_market_session()
+                st.session_state["market_current_tab"] = st.session_state["pending_market_tab"]
+                st.session_state.pop("pending_market_tab", None)
+                st.rerun()
+        with col2:
+            if st.button("No, stay here", key="market_discard_no"):
+                st.session_state.pop("pending_market_tab", None)
+                st.rerun()
+
+    current_tab = st.session_state.get("market_current_tab", "Add")
+
+    # Helpers
+    def _fetch_market_rows(*, hs_code: str | None, brand: str | None, chemical_type_id: str | None) -> list[dict]:
+        """Market rows matching the HS code / brand terms, filtered in the database (trigram-indexed search_text)."""
+        hs = (hs_code or "").strip().lower()
+        br = (brand or "").strip().lower()
+        try:
+            res = supabase.rpc("filter_market_opportunities", {
+                "p_hs_code": hs or None,
+                "p_brand": br or None,
+                "p_chemical_entity_id": chemical_type_id or None,
+                "p_limit": 5000,
+            }).execute()
+            return res.data or []
+        except Exception as e:
+            # RPC not deployed yet: fall back to filtering client-side
+            print(f"filter_market_opportunities RPC failed, filtering client-side: {e}")
+        try:
+            q = supabase.table("market_opportunities").select("*")
+            if chemical_type_id:
+                q = q.eq("chemical_entity_id", chemical_type_id)
+            res = q.order("period", desc=False).limit(5000).execute()
+            rows = res.data or []
+            out = []
+            for r in rows:
+                meta = r.get("metadata") or {}
+                raw = r.get("raw_data") or {}
+                hay_json = " ".join([
+                    str(meta.get("hs_code") or ""),
+                    str(meta.get("brand") or ""),
+                    str(meta.get("commercial_name") or ""),
+                    str(raw)
+                ]).lower()
+                if hs and hs not in hay_json:
+                    continue
+                if br and br not in hay_json:
+                    continue
+                out.append(r)
+            return out
+        except Exception as e:
+            st.error(f"Failed to fetch market data: {e}")
+            return []
+
+    def _resolve_type_id_by_cat_type(category: str, type_name: str) -> str | None:
+        try:
+            if not category or not type_name:
+                return None
+            res = supabase.table("chemical_types").select("id").eq("category", category).eq("name", type_name).limit(1).execute()
+            rows = res.data or []
+            return (rows[0] or {}).get("id") if rows else None
+        except Exception:
+            return None
+
+    def _fetch_all_market_data() -> list[dict]:
+        """Fetch all market data for display"""
+        try:
+            res = supabase.table("market_opportunities").select("*").order("created_at", desc=True).execute()
+            return res.data or []
+        except Exception as e:
+            st.error(f"Failed to fetch market data: {e}")
+            return []
+
+    def _update_market_record(record_id: str, updates: dict) -> tuple[bool, str]:
+        """Update a market record"""
+        try:
+            res = supabase.table("market_opportunities").update(updates).eq("id", record_id).execute()
+            if res.data:
+                return True, "Market record updated successfully"
+            else:
+                return False, "Failed to update market record"
+        except Exception as e:
+            return False, f"Error updating market record: {str(e)}"
+
+    def _delete_market_record(record_id: str) -> tuple[bool, str]:
+        """Delete a market record"""
+        try:
+            res = supabase.table("market_opportunities").delete().eq("id", record_id).execute()
+            if res.data:
+                return True, "Market record deleted successfully"
+            else:
+                return False, "Failed to delete market record"
+        except Exception as e:
+            return False, f"Error deleting market record: {str(e)}"
+
+    # -------- Add Market Data --------
+    if current_tab == "Add":
+        st.subheader("Add Market Data")
+        
+        mc1, mc2 = st.columns(2)
+        with mc1:
+            _market_cat_placeholder = "— Select —"
+            try:
+                _market_cats = [_market_cat_placeholder] + get_all_categories()
+            except Exception:
+                _market_cats = [_market_cat_placeholder] + FIXED_CATEGORIES
+            m_cat = st.selectbox("Select Category", _market_cats, key="market_cat_select")
+            sel_cat = "" if m_cat == _market_cat_placeholder else m_cat
+        with mc2:
+            m_types = get_types_for_category(sel_cat) if sel_cat else []
+            _market_type_placeholder = "— Select —"
+            m_type = st.selectbox("Select Product Type", [_market_type_placeholder] + (m_types or []), key="market_type_select")
+            sel_type = "" if m_type == _market_type_placeholder else m_type
+
+        mcol1, mcol2, mcol3 = st.columns([1,1,2])
+        with mcol1:
+            hs_code_in = st.text_input("HS Code", key="market_hs_code", placeholder="e.g., 390430")
+        with mcol2:
+            brand_in = st.text_input("Commercial/Brand Name", key="market_brand", placeholder="e.g., VINNAPAS 5010N")
+        with mcol3:
+            st.caption("Click to fetch from Import RAG Document (via stored market data)")
+            fetch_market = st.button("📥 Fetch Import Data", type="primary", key="market_fetch_btn")
+
+        # Results area
+        if fetch_market:
+            # Query the cached import-history dataset (shared with the logistics CRM)
+            try:
+                import pandas as pd
+                import import_data
+
+                aggregates = import_data.get_trader_aggregates()
+                if not len(aggregates):
+                    st.error("❌ Import Data RAG file is empty")
+                    st.stop()
+
+                # Brand names are searched in trader names; HS codes in the HS code of each row's sheet
+                selected = import_data.filter_traders(aggregates, brand_in, hs_code=hs_code_in)
+                if not selected.any():
+                    st.info("No matching records found in Import Data RAG file.")
+                    st.stop()
+
+                volumes_by_year = import_data.volume_by_year(aggregates, selected)
+                total_volume = sum(volumes_by_year.values())
+
+                # Output 1: Volume of Import by Year
+                st.markdown("---")
+                st.subheader("📊 Output 1: Volume of Import by Year")
+
+                if total_volume > 0:
+                    chart_data = pd.DataFrame({
+                        'Year': list(volumes_by_year.keys()),
+                        'Volume': list(volumes_by_year.values())
+                    })
+                    st.bar_chart(chart_data.set_index('Year'))
+
+                    summary = chart_data.rename(columns={'Volume': 'Volume (Tons)'})
+                    summary['Percentage'] = (summary['Volume (Tons)'] / total_volume * 100).map("{:.1f}%".format)
+                    summary['Volume (Tons)'] = summary['Volume (Tons)'].map("{:,.2f}".format)
+                    st.dataframe(summary, use_container_width=True)
+                else:
+                    st.info("No volume data available for the selected criteria.")
+
+                # Output 2: Pareto Analysis (80/20 rule)
+                st.markdown("---")
+                st.subheader("📈 Output 2: Pareto Analysis - Key Customers (80/20 Rule)")
+
+                pareto = import_data.pareto_analysis(aggregates, selected, share=80)
+                if pareto['total_customers']:
+                    st.write(f"**Total Customers:** {pareto['total_customers']}")
+                    st.write(f"**Key Customers (80% of volume):** {pareto['key_customers']}")
+                    st.write(f"**Volume Concentration:** {pareto['concentration']:.1f}%")
+
+                    key_customers = pareto['ranked'].head(pareto['key_customers'])
+                    st.dataframe(pd.DataFrame({
+                        'Rank': range(1, len(key_customers) + 1),
+                        'Customer': key_customers['Customer'],
+                        'Total Volume (Tons)': key_customers['Total Volume'].map("{:,.2f}".format),
+                        'Percentage': key_customers['Share %'].map("{:.1f}%".format),
+                    }), use_container_width=True, hide_index=True)
+
+                    # Pareto chart (top 10)
+                    st.bar_chart(key_customers.head(10).set_index('Customer')['Total Volume'].rename('Volume'))
+
+                # Output 3: Customer Consumption by Year and Brand
+                st.markdown("---")
+                st.subheader("🏢 Output 3: Customer Consumption by Year and Brand")
+
+                summary_pivot = import_data.year_pivot(aggregates, selected)
+                if not summary_pivot.empty:
+                    st.write("**Customer Consumption Summary by Year:**")
+                    st.dataframe(summary_pivot, use_container_width=True)
+
+                    # Detailed view: one row per customer and year with a positive volume
+                    with st.expander("📋 Detailed Customer Data"):
+                        details_df = (
+                            summary_pivot.drop(columns='Total')
+                            .stack()
+                            .rename('Volume (Tons)')
+                            .reset_index()
+                        )
+                        details_df = details_df[details_df['Volume (Tons)'] > 0]
+                        details_df['Brand/Commercial'] = brand_in if brand_in else 'N/A'
+                        details_df['HS Code'] = hs_code_in if hs_code_in else 'N/A'
+                        st.dataframe(details_df, use_container_width=True, hide_index=True)
+                else:
+                    st.info("No detailed consumption data available for the selected criteria.")
+
+            except FileNotFoundError as e:
+                st.error(f"❌ {e}")
+            except Exception as e:
+                st.error(f"❌ Error processing Import Data RAG file: {str(e)}")
+                st.write("Please ensure the Excel file exists and is accessible.")
+
+    # -------- View Market Data --------
+    elif current_tab == "View":
+        st.subheader("View Market Data")
+        
+        # Filters
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            hs_filter = st.text_input("Filter by HS Code", placeholder="e.g., 390430")
+        with col2:
+            brand_filter = st.text_input("Filter by Brand/Commercial Name", placeholder="e.g., VINNAPAS")
+        with col3:
+            search_filter = st.text_input("Search in all fields", placeholder="Search...")
+        
+        if st.button("Reset Filters", type="secondary"):
+            hs_filter = ""
+            brand_filter = ""
+            search_filter = ""
+            st.rerun()
+        
+        def _market_view_match(record: dict) -> bool:
+            metadata = record.get("metadata") or {}
+            raw_data = record.get("raw_data") or {}
+            if hs_filter and hs_filter.lower() not in str(metadata.get("hs_code", "")).lower():
+                return False
+            if brand_filter and brand_filter.lower() not in str(metadata.get("brand", "")).lower():
+                return False
+            if search_filter:
+                search_text = " ".join([
+                    str(metadata.get("hs_code", "")),
+                    str(metadata.get("brand", "")),
+                    str(metadata.get("commercial_name", "")),
+                    str(raw_data)
+                ]).lower()
+                if search_filter.lower() not in search_text:
+                    return False
+            return True
+
+        # Fetch and display data
+        market_data = _fetch_all_market_data()
+        filtered_data = [record for record in market_data if _market_view_match(record)]
+
+        # Export: streams market_opportunities page by page with the same filters, on click only
+        def _market_export_rows():
+            for record in export_rows("market_opportunities", desc=True):
+                if not _market_view_match(record):
+                    continue
+                metadata = record.get("metadata") or {}
+                yield {
+                    "HS Code": metadata.get("hs_code", ""),
+                    "Brand": metadata.get("brand", ""),
+                    "Commercial Name": metadata.get("commercial_name", ""),
+                    "Period": record.get("period", ""),
+                    "Market Data": record.get("raw_data") or {},
+                    "Created": record.get("created_at", ""),
+                }
+
+        if filtered_data:
+            render_export(
+                "export_view_market", "market_data",
+                ["HS Code", "Brand", "Commercial Name", "Period", "Market Data", "Created"],
+                _market_export_rows, sheet_title="Market Data",
+            )
+            st.success(f"Found {len(filtered_data)} market records")
+            
+            # Display data in expandable cards
+            for i, record in enumerate(filtered_data):
+                metadata = record.get("metadata", {})
+                raw_data = record.get("raw_data", {})
+                
+                with st.expander(f"📊 {metadata.get('commercial_name', 'Unnamed')} - {metadata.get('hs_code', 'No HS Code')}"):
+                    col1, col2 = st.columns(2)
+                    
+                    with col1:
+                        st.markdown("**Basic Information:**")
+                        st.write(f"**HS Code:** {metadata.get('hs_code', 'N/A')}")
+                        st.write(f"**Brand:** {metadata.get('brand', 'N/A')}")
+                        st.write(f"**Commercial Name:** {metadata.get('commercial_name', 'N/A')}")
+                        st.write(f"**Period:** {record.get('period', 'N/A')}")
+                    
+                    with col2:
+                        st.markdown("**Market Data:**")
+                        if raw_data:
+                            for key, value in raw_data.items():
+                                if isinstance(value, dict):
+                                    st.write(f"**{key}:**")
+                                    for sub_key, sub_value in value.items():
+                                        st.write(f"  - {sub_key}: {sub_value}")
+                                else:
+                                    st.write(f"**{key}:** {value}")
+                        else:
+                            st.write("No detailed market data available")
+                    
+                    st.markdown("---")
+                    st.write(f"**Created:** {record.get('created_at', 'N/A')}")
+        else:
+            st.info("No market data found matching the current filters.")
+
+    # -------- Manage Market Data --------
+    elif current_tab == "Manage":
+        st.subheader("Manage Market Data")
+        
+        # Auth gate
+        if not sb_user:
+            st.info("Please sign in to access Manage Market Data.")
+        elif not is_manager:
+            st.error("You do not have permission to access Manage Market Data.")
+        else:
+            # Filters for management
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                manage_hs_filter = st.text_input("Filter by HS Code", key="manage_hs_filter", placeholder="e.g., 390430")
+            with col2:
+                manage_brand_filter = st.text_input("Filter by Brand", key="manage_brand_filter", placeholder="e.g., VINNAPAS")
+            with col3:
+                manage_search_filter = st.text_input("Search", key="manage_search_filter", placeholder="Search...")
+            
+            if st.button("Reset Filters", key="manage_reset_filters", type="secondary"):
+                manage_hs_filter = ""
+                manage_brand_filter = ""
+                manage_search_filter = ""
+                st.rerun()
+            
+            # Fetch and display data for management
+            market_data = _fetch_all_market_data()
+            filtered_data = []
+            
+            for record in market_data:
+                metadata = record.get("metadata", {})
+                raw_data = record.get("raw_data", {})
+                
+                # Apply filters
+                if manage_hs_filter and manage_hs_filter.lower() not in str(metadata.get("hs_code", "")).lower():
+                    continue
+                if manage_brand_filter and manage_brand_filter.lower() not in str(metadata.get("brand", "")).lower():
+                    continue
+                if manage_search_filter:
+                    search_text = " ".join([
+                        str(metadata.get("hs_code", "")),
+                        str(metadata.get("brand", "")),
+                        str(metadata.get("commercial_name", "")),
+                        str(raw_data)
+                    ]).lower()
+                    if manage_search_filter.lower() not in search_text:
+                        continue
+                
+                filtered_data.append(record)
+            
+            if filtered_data:
+                st.success(f"Found {len(filtered_data)} market records")
+                
+                # Display data in management table
+                for i, record in enumerate(filtered_data):
+                    metadata = record.get("metadata", {})
+                    record_id = record.get("id")
+                    
+                    with st.container():
+                        st.markdown("---")
+                        col1, col2, col3 = st.columns([3, 1, 1])
+                        
+                        with col1:
+                            st.markdown(f"**{metadata.get('commercial_name', 'Unnamed')}**")
+                            st.caption(f"HS Code: {metadata.get('hs_code', 'N/A')} | Brand: {metadata.get('brand', 'N/A')} | Period: {record.get('period', 'N/A')}")
+                        
+                        with col2:
+                            if st.button("✏️ Edit", key=f"edit_market_{record_id}"):
+                                st.session_state[f"editing_market_{record_id}"] = True
+                                st.rerun()
+                        
+                        with col3:
+                            if st.button("🗑️ Delete", key=f"delete_market_{record_id}"):
+                                success, message = _delete_market_record(record_id)
+                                if success:
+                                    st.success(message)
+                                else:
+                                    st.error(message)
+                                st.rerun()
+                        
+                        # Edit form
+                        if st.session_state.get(f"editing_market_{record_id}"):
+                            st.markdown("**Edit Market Record:**")
+                            
+                            edit_col1, edit_col2 = st.columns(2)
+                            with edit_col1:
+                                new_hs_code = st.text_input("HS Code", value=metadata.get("hs_code", ""), key=f"edit_hs_{record_id}")
+                                new_brand = st.text_input("Brand", value=metadata.get("brand", ""), key=f"edit_brand_{record_id}")
+                                new_commercial_name = st.text_input("Commercial Name", value=metadata.get("commercial_name", ""), key=f"edit_commercial_{record_id}")
+                            
+                            with edit_col2:
+                                new_period = st.text_input("Period", value=record.get("period", ""), key=f"edit_period_{record_id}")
+                                new_notes = st.text_area("Notes", value=record.get("notes", ""), key=f"edit_notes_{record_id}")
+                            
+                            save_col1, save_col2 = st.columns(2)
+                            with save_col1:
+                                if st.button("💾 Save Changes", key=f"save_market_{record_id}"):
+                                    updates = {
+                                        "metadata": {
+                                            **metadata,
+                                            "hs_code": new_hs_code,
+                                            "brand": new_brand,
+                                            "commercial_name": new_commercial_name
+                                        },
+                                        "period": new_period,
+                                        "notes": new_notes
+                                    }
+                                    success, message = _update_market_record(record_id, updates)
+                                    if success:
+                                        st.success(message)
+                                        st.session_state.pop(f"editing_market_{record_id}", None)
+                                    else:
+                                        st.error(message)
+                                    st.rerun()
+                            
+                            with save_col2:
+                                if st.button("❌ Cancel", key=f"cancel_market_{record_id}"):
+                                    st.session_state.pop(f"editing_market_{record_id}", None)
+                                    st.rerun()
+            else:
+                st.info("No market data found matching the current filters.")
+
+    st.markdown('</div>', unsafe_allow_html=True)
@@ -0,0 +1,660 @@
+"""
+Partner Master Data: partners linked to TDS records.
+
+Loaded by pms.py only while this module is the active one, and executed in pms.py's
+namespace: it uses the Supabase client, helpers and session/auth state defined there.
+"""
+
+# ==========================
+# UI - Sourcing Master Data (coming soon)
+# ==========================
+if st.session_state.get("main_section") == "partner_master" and has_sourcing_master_access(user_email):
+    st.markdown('<h1 style="color:#1976d2; font-weight:700;">Partner Master Data</h1>', unsafe_allow_html=True)
+    st.markdown('<div class="form-card">', unsafe_allow_html=True)
+    st.caption("Business partner")
+
+    # If requested, programmatically switch to Manage tab after a save
+    if st.session_state.get("partner_go_manage"):
+        st.session_state.pop("partner_go_manage", None)
+        st.markdown(
+            """
+            <script>
+            setTimeout(function(){
+              const tabs = Array.from(document.querySelectorAll('button[role="tab"]'));
+              const manage = tabs.find(el => el.innerText && el.innerText.trim().toLowerCase().includes('manage'));
+              if (manage) { manage.click(); }
+            }, 50);
+            </script>
+            """,
+            unsafe_allow_html=True,
+        )
+
+    # Create custom tab navigation with proper change detection
+    tab_col1, tab_col2, tab_col3, tab_col4 = st.columns(4)
+    
+    with tab_col1:
+        if st.button("Add Partner", key="partner_tab_add", type="primary" if st.session_state.get("partner_current_tab") == "Add Partner" else "secondary", use_container_width=True):
+            previous_tab = st.session_state.get("partner_current_tab")
+            if previous_tab and previous_tab != "Add Partner" and _has_unsaved_partner_changes():
+                st.session_state["pending_partner_tab"] = "Add Partner"
+                st.rerun()
+            else:
+                st.session_state["partner_current_tab"] = "Add Partner"
+                st.rerun()
+    
+    with tab_col2:
+        if st.button("Add Chemical", key="partner_tab_chem", type="primary" if st.session_state.get("partner_current_tab") == "Add Chemical" else "secondary", use_container_width=True):
+            previous_tab = st.session_state.get("partner_current_tab")
+            if previous_tab and previous_tab != "Add Chemical" and _has_unsaved_partner_changes():
+                st.session_state["pending_partner_tab"] = "Add Chemical"
+                st.rerun()
+            else:
+                st.session_state["partner_current_tab"] = "Add Chemical"
+                st.rerun()
+    
+    with tab_col3:
+        if st.button("Manage", key="partner_tab_manage", type="primary" if st.session_state.get("partner_current_tab") == "Manage" else "secondary", use_container_width=True):
+            previous_tab = st.session_state.get("partner_current_tab")
+            if previous_tab and previous_tab != "Manage" and _has_unsaved_partner_changes():
+                st.session_state["pending_partner_tab"] = "Manage"
+                st.rerun()
+            else:
+                st.session_state["partner_current_tab"] = "Manage"
+                st.rerun()
+    
+    with tab_col4:
+        if st.button("View", key="partner_tab_view", type="primary" if st.session_state.get("partner_current_tab") == "View" else "secondary", use_container_width=True):
+            previous_tab = st.session_state.get("partner_current_tab")
+            if previous_tab and previous_tab != "View" and _has_unsaved_partner_changes():
+                st.session_state["pending_partner_tab"] = "View"
+                st.rerun()
+            else:
+                st.session_state["partner_current_tab"] = "View"
+                st.rerun()
+    
+    # Handle pending partner tab changes with confirmation dialog
+    if st.session_state.get("pending_partner_tab"):
+        new_tab = st.session_state.get("pending_partner_tab")
+        previous_tab = st.session_state.get("partner_current_tab")
+        
+        if previous_tab == "Add Partner":
+            st.warning("⚠️ You have unsaved changes in the Add Partner tab.")
+            col1, col2, col3 = st.columns([1, 1, 2])
+            with col1:
+                if st.button("🗑️ Discard & Continue", key="discard_partner_add", type="primary"):
+                    _clear_partner_session()
+                    st.session_state["partner_current_tab"] = new_tab
+                    st.session_state.pop("pending_partner_tab")
+                    st.rerun()
+            with col2:
+                if st.button("❌ Cancel", key="cancel_partner_add"):
+                    st.session_state.pop("pending_partner_tab")
+                    st.rerun()
+            with col3:
+                st.caption("Your unsaved changes will be lost if you continue.")
+            st.stop()
+        elif previous_tab == "Add Chemical":
+            st.warning("⚠️ You have unsaved changes in the Add Chemical tab.")
+            col1, col2, col3 = st.columns([1, 1, 2])
+            with col1:
+                if st.button("🗑️ Discard & Continue", key="discard_partner_chem", type="primary"):
+                    _clear_partner_session()
+                    st.session_state["partner_current_tab"] = new_tab
+                    st.session_state.pop("pending_partner_tab")
+                    st.rerun()
+            with col2:
+                if st.button("❌ Cancel", key="cancel_partner_chem"):
+                    st.session_state.pop("pending_partner_tab")
+                    st.rerun()
+            with col3:
+                st.caption("Your unsaved changes will be lost if you continue.")
+            st.stop()
+        elif previous_tab == "Manage":
+            st.warning("⚠️ You have unsaved changes in the Manage tab.")
+            col1, col2, col3 = st.columns([1, 1, 2])
+            with col1:
+                if st.button("🗑️ Discard & Continue", key="discard_partner_manage", type="primary"):
+                    _clear_partner_session()
+                    st.session_state["partner_current_tab"] = new_tab
+                    st.session_state.pop("pending_partner_tab")
+                    st.rerun()
+            with col2:
+                if st.button("❌ Cancel", key="cancel_partner_manage"):
+                    st.session_state.pop("pending_partner_tab")
+                    st.rerun()
+            with col3:
+                st.caption("Your unsaved changes will be lost if you continue.")
+            st.stop()
+    
+    # Get current tab for rendering
+    current_partner_tab = st.session_state.get("partner_current_tab", "Add Partner")
+
+    # Helpers for partner_data
+    def fetch_partners():
+        try:
+            res = supabase.table("partner_data").select("*").order("partner").execute()
+            return res.data or []
+        except Exception as e:
+            st.error(f"Failed to fetch partners: {e}")
+            return []
+
+    def _normalize_partner_name(name: str) -> str:
+        try:
+            return (name or "").strip().lower()
+        except Exception:
+            return name or ""
+
+    def _fuzzy_match_partners(partner: str, country: str | None = None, threshold: float = 0.8) -> list[dict]:
+        """Find similar partners using fuzzy matching (cached RapidFuzz index, see pms_data.PartnerIndex)"""
+        try:
+            return get_partner_index().similar(partner, country, threshold)
+        except Exception:
+            return []
+
+    def partner_exists(partner: str, country: str | None = None) -> bool:
+        """Return True if a partner with same name (case-insensitive) and optional country exists."""
+        try:
+            return get_partner_index().exists(partner, country)
+        except Exception:
+            return False
+
+    def create_partner(partner: str, country: str, selected_products: list[dict]):
+        try:
+            # Prevent duplicate partner by name+country
+            if partner_exists(partner, country):
+                st.error("Partner already exists with the same name and country")
+                return None
+            payload = {
+                # id generated by DB default
+                "partner": (partner or "").strip(),
+                "partner_country": (country or "").strip(),
+                # is_active defaults to true in DB
+            }
+            resp = supabase.table("partner_data").insert(payload).execute()
+            invalidate_partner_index()
+            return resp
+        except Exception as e:
+            # The unique (name, country) index rejects duplicates created since the index was built
+            if "23505" in str(e) or "duplicate key" in str(e):
+                invalidate_partner_index()
+                st.error("Partner already exists with the same name and country")
+                return None
+            st.error(f"Failed to create partner: {e}")
+            return None
+
+    def update_partner(pid: str, updates: dict):
+        try:
+            updates_with_ts = {**updates, "updated_at": datetime.utcnow().isoformat() + "Z"}
+            resp = supabase.table("partner_data").update(updates_with_ts).eq("id", pid).execute()
+            invalidate_partner_index()
+            return resp
+        except Exception as e:
+            if "23505" in str(e) or "duplicate key" in str(e):
+                invalidate_partner_index()
+                st.error("Another partner already exists with the same name and country")
+                return None
+            st.error(f"Failed to update partner: {e}")
+            return None
+
+    def delete_partner(pid: str):
+        try:
+            resp = supabase.table("partner_data").delete().eq("id", pid).execute()
+            invalidate_partner_index()
+            return resp
+        except Exception as e:
+            st.error(f"Failed to delete partner: {e}")
+            return None
+
+    def list_all_tds():
+        """Return list of products (name/category) that have a TDS uploaded, including file name/url."""
+        try:
+            res = supabase.table("tds_data").select("id,chemical_type_id,brand,grade,metadata").order("created_at", desc=True).execute()
+            rows = res.data or []
+            items = []
+            for r in rows:
+                meta = r.get("metadata") or {}
+                # Only include when a TDS file URL exists
+                if not meta.get("tds_file_url"):
+                    continue
+                items.append({
+                    "id": r.get("id"),  # tds record id (for unique widget keys)
+                    "chemical_type_id": r.get("chemical_type_id"),
+                    "name": meta.get("product_name") or meta.get("generic_product_name") or (r.get("brand") or "Unnamed"),
+                    "category": meta.get("category") or "Others",
+                    "brand": r.get("brand"),
+                    "tds_file_url": meta.get("tds_file_url"),
+                    "tds_file_name": meta.get("tds_file_name"),
+                })
+            # Sort by category then name for stable UI
+            items.sort(key=lambda x: (x.get("category") or "", x.get("name") or ""))
+            return items
+        except Exception as e:
+            st.error(f"Failed to fetch list: {e}")
+            return []
+
+    def _ensure_chemical_type(name: str, category: str) -> str | None:
+        """Find or create a chemical_types row by name and category; return id."""
+        try:
+            nm = (name or "").strip()
+            cat = (category or "").strip() or "Others"
+            if not nm:
+                return None
+            # Try find existing
+            res = supabase.table("chemical_types").select("id").eq("name", nm).eq("category", cat).limit(1).execute()
+            rows = res.data or []
+            if rows:
+                return rows[0].get("id")
+            # Create minimal record
+            payload = {"name": nm, "category": cat, "metadata": {}}
+            ins = supabase.table("chemical_types").insert(payload).execute()
+            invalidate_chemical_type_facets()
+            # Fetch id from insert result
+            newid = None
+            try:
+                newid = ((ins.data or [{}])[0] or {}).get("id")
+            except Exception:
+                newid = None
+            if not newid:
+                # Last resort: re-query
+                res2 = supabase.table("chemical_types").select("id").eq("name", nm).eq("category", cat).limit(1).execute()
+                rows2 = res2.data or []
+                if rows2:
+                    newid = rows2[0].get("id")
+            return newid
+        except Exception:
+            return None
+
+    def partner_get_products(partner_row: dict) -> list[dict]:
+        """Return assigned products from metadata.tds_products field.
+        Since tds_products and products columns don't exist, we only check metadata.tds_products.
+        """
+        try:
+            md = partner_row.get("metadata") or {}
+            if isinstance(md.get("tds_products"), list):
+                result = md.get("tds_products") or []
+                if result:
+                    return result
+        except Exception:
+            pass
+        return []
+
+    def partner_set_products(partner_id: str, products: list[dict]) -> None:
+        """Persist assigned products into metadata field.
+        Since tds_products and products columns don't exist, we use metadata.tds_products.
+        """
+        try:
+            curr = supabase.table("partner_data").select("metadata").eq("id", partner_id).limit(1).execute()
+            curr_meta = ((curr.data or [{}])[0] or {}).get("metadata") or {}
+            curr_meta["tds_products"] = products
+            supabase.table("partner_data").update({"metadata": curr_meta}).eq("id", partner_id).execute()
+        except Exception as e:
+            st.error(f"Failed to update partner products: {e}")
+            pass
+
+    def _reset_session_keys(keys: list[str]):
+        try:
+            for k in keys:
+                try:
+                    st.session_state.pop(k, None)
+                except Exception:
+                    pass
+        except Exception:
+            pass
+
+    def _reset_session_by_prefix(prefixes: list[str]):
+        try:
+            for k in list(st.session_state.keys()):
+                if any(k.startswith(pfx) for pfx in prefixes):
+                    try:
+                        st.session_state.pop(k, None)
+                    except Exception:
+                        pass
+        except Exception:
+            pass
+
+    if current_partner_tab == "Add Partner":
+        st.subheader("Add Partner")
+        partner_name = st.text_input("Partner Name *")
+        # Country dropdown (ISO list)
+        partner_country = st.selectbox("Partner Country *", COUNTRIES)
+        # Add Partner is now only for creating the partner record
+        st.markdown("---")
+        st.caption("Fill in partner info and save. Assign chemicals in the 'Add Chemical' tab.")
+
+        # Check for similar partners as user types
+        if partner_name and partner_country:
+            similar_partners = _fuzzy_match_partners(partner_name, partner_country, threshold=0.7)
+            if similar_partners:
+                st.warning("⚠️ Similar partners found:")
+                for similar in similar_partners[:3]:  # Show top 3 matches
+                    similarity_percent = int(similar["similarity"] * 100)
+                    st.write(f"• {similar['partner']} ({similar['partner_country']}) - {similarity_percent}% similar")
+                st.caption("Please review the list above to avoid creating duplicate partners.")
+
+        if st.button("Save Partner", type="primary"):
+            if not (partner_name and partner_country):
+                st.error("Partner name and country are required")
+            elif partner_exists(partner_name, partner_country):
+                st.error("Partner already exists with the same name and country")
+            else:
+                # Check for very similar partners (high threshold) and block if found
+                very_similar = _fuzzy_match_partners(partner_name, partner_country, threshold=0.9)
+                if very_similar:
+                    st.error("❌ Cannot create partner: Very similar partner already exists!")
+                    st.write("**Similar partners found:**")
+                    for similar in very_similar:
+                        similarity_percent = int(similar["similarity"] * 100)
+                        st.write(f"• {similar['partner']} ({similar['partner_country']}) - {similarity_percent}% similar")
+                    st.caption("Please use a different name or check if this is the same partner.")
+                else:
+                    resp = create_partner(partner_name, partner_country, [])
+                    if resp is not None:
+                        st.success("✅ Partner saved")
+                        # Reset Add Partner inputs
+                        _reset_session_by_prefix(["pn_","pc_"]) 
+                        st.rerun()
+        
+        # Add clear session button if there are unsaved changes
+
+    elif current_partner_tab == "Add Chemical":
+        st.subheader("Add Chemical to Partner")
+        partners = fetch_partners()
+        if not partners:
+            st.info("No partners found. Please add a partner first in 'Add Partner'.")
+        else:
+            partner_labels = {f"{p.get('partner')} ({p.get('partner_country')})": p for p in partners}
+            sel_label = st.selectbox("Select Partner", list(partner_labels.keys()))
+            partner_obj = partner_labels.get(sel_label)
+            tds_records = list_all_tds()
+            if not tds_records:
+                st.info("No TDS-backed chemicals found. Upload TDS in the TDS Master Data module.")
+            else:
+                # Get already assigned chemicals for this partner
+                existing = partner_get_products(partner_obj)
+                already_ids = {item.get('tds_id') for item in existing if isinstance(item, dict)}
+                
+                # Build label → id map only for unassigned chemicals
+                options_map = {}
+                for r in tds_records:
+                    # Skip if already assigned to this partner
+                    if r.get('id') in already_ids:
+                        continue
+                    
+                    meta = r
+                    label = f"{meta.get('name') or 'Unnamed'} — {meta.get('category') or 'Others'}"
+                    # Prefer showing Product Type — Brand
+                    label = f"{meta.get('name') or 'Unnamed'}"
+                    options_map[f"{label}"] = r.get('id')
+                
+                if not options_map:
+                    st.info("✅ All available chemicals are already assigned to this partner.")
+                else:
+                    st.markdown("**Select chemicals (with TDS) to assign**")
+                    sel_labels = st.multiselect(
+                        "Chemicals",
+                        options=list(options_map.keys()),
+                    )
+                    
+                    if st.button("Assign to Partner", type="primary"):
+                        to_add = []
+                        for lb in sel_labels:
+                            tid = options_map.get(lb)
+                            if not tid or tid in already_ids:
+                                continue
+                            rec = next((r for r in tds_records if r.get('id') == tid), None)
+                            if not rec:
+                                continue
+                            to_add.append({
+                                "tds_id": rec.get("id"),
+                                "chemical_type_id": rec.get("chemical_type_id"),
+                                "name": rec.get("name"),
+                                "category": rec.get("category"),
+                            })
+                        new_list = existing + to_add
+                        partner_set_products(partner_obj.get("id"), new_list)
+                        st.success("Assigned chemicals to partner")
+                        # Reset selection inputs
+                        _reset_session_by_prefix(["rem_","add_more_"])
+                        st.rerun()
+
+    elif current_partner_tab == "Manage":
+        st.subheader("Manage Partners")
+        partners = fetch_partners()
+        if not partners:
+            st.info("No partners found")
+        else:
+            for p in partners:
+                pid = p.get("id")
+                with st.expander(f"🤝 {p.get('partner')} ({p.get('partner_country')})", expanded=False):
+                    col1, col2 = st.columns([3,2])
+                    with col1:
+                        e_name = st.text_input("Partner", value=p.get("partner", ""), key=f"pn_{pid}")
+                    with col2:
+                        e_country = st.selectbox("Country", COUNTRIES, index=(COUNTRIES.index(p.get("partner_country", "")) if p.get("partner_country") in COUNTRIES else 0), key=f"pc_{pid}")
+
+                    # (Actions moved under TDS-backed Products below)
+
+                    st.markdown("---")
+                    st.subheader("Assigned TDS-backed Products")
+                    assigned = partner_get_products(p)
+                    if not assigned:
+                        st.caption("No chemicals assigned to this partner.")
+                    else:
+                        # Group by category for display
+                        by_cat_ro: dict[str, list[dict]] = {}
+                        for r in assigned:
+                            by_cat_ro.setdefault(r.get("category") or "Others", []).append(r)
+                        for cat, items in by_cat_ro.items():
+                            with st.expander(f"📁 {cat}", expanded=False):
+                                for rec in items:
+                                    st.write(rec.get("name") or "Unnamed")
+
+                    # 2) Remove link(s) from already linked TDS
+                    if assigned:
+                        st.markdown("**Remove linked chemicals**")
+                        # build label -> index mapping for assigned
+                        rem_labels_map = {}
+                        for idx, rec in enumerate(assigned):
+                            label = rec.get("name") or f"Item {idx+1}"
+                            rem_labels_map[f"{label}"] = idx
+                        to_remove_labels = st.multiselect(
+                            "Select assigned items to remove",
+                            list(rem_labels_map.keys()),
+                            key=f"rem_{pid}"
+                        )
+                        if st.button("Remove Selected", key=f"btn_rem_{pid}"):
+                            keep = []
+                            drop_indices = {rem_labels_map[lbl] for lbl in to_remove_labels}
+                            for idx, rec in enumerate(assigned):
+                                if idx not in drop_indices:
+                                    keep.append(rec)
+                            partner_set_products(pid, keep)
+                            st.success("Removed selected links")
+                            st.rerun()
+
+                    # Add additional chemicals to this partner
+                    st.markdown("---")
+                    st.subheader("Add Additional Chemical TDS")
+                    tds_records_all = list_all_tds()
+                    # 3) Only show unlinked TDS for adding
+                    current_ids = {it.get('tds_id') for it in assigned if isinstance(it, dict)}
+                    unlinked = [r for r in tds_records_all if r.get('id') not in current_ids]
+                    
+                    
+                    opts = {f"{r.get('name') or 'Unnamed'}": r.get('id') for r in unlinked}
+                    add_labels = st.multiselect("Select chemicals to add", list(opts.keys()), key=f"add_more_{pid}")
+                    if st.button("Add Selected", key=f"btn_add_more_{pid}"):
+                        add_items = []
+                        for lb in add_labels:
+                            tid = opts.get(lb)
+                            if tid in current_ids:
+                                continue
+                            rec = next((r for r in tds_records_all if r.get('id') == tid), None)
+                            if rec:
+                                add_items.append({
+                                    "tds_id": rec.get("id"),
+                                    "chemical_type_id": rec.get("chemical_type_id"),
+                                    "name": rec.get("name"),
+                                    "category": rec.get("category"),
+                                })
+                        new_list = assigned + add_items
+                        partner_set_products(pid, new_list)
+                        st.success("Added")
+                        _reset_session_by_prefix(["add_more_"])
+                        st.rerun()
+                    # Compact action buttons placed under TDS-backed Products
+                    st.markdown('<div class="partner-actions partner-actions-cta">', unsafe_allow_html=True)
+                    btn_col1, btn_col2 = st.columns([1,1])
+                    with btn_col1:
+                        if st.button("💾 Save", key=f"ps_{pid}"):
+                            if not e_name.strip() or not e_country.strip():
+                                st.error("Name and country cannot be empty")
+                            elif partner_exists(e_name, e_country) and _normalize_partner_name(e_name) != _normalize_partner_name(p.get("partner") or ""):
+                                st.error("Another partner already exists with the same name and country")
+                            else:
+                                # Check for very similar partners (excluding current partner)
+                                very_similar = _fuzzy_match_partners(e_name, e_country, threshold=0.9)
+                                # Filter out current partner from similar matches
+                                very_similar = [s for s in very_similar if s["id"] != pid]
+                                
+                                if very_similar:
+                                    st.error("❌ Cannot update partner: Very similar partner already exists!")
+                                    st.write("**Similar partners found:**")
+                                    for similar in very_similar:
+                                        similarity_percent = int(similar["similarity"] * 100)
+                                        st.write(f"• {similar['partner']} ({similar['partner_country']}) - {similarity_percent}% similar")
+                                    st.caption("Please use a different name or check if this is the same partner.")
+                                else:
+                                    update_partner(pid, {"partner": e_name.strip(), "partner_country": e_country.strip()})
+                                    st.success("Updated")
+                                    st.rerun()
+                    with btn_col2:
+                        if st.button("🗑️ Delete", key=f"pd_{pid}"):
+                            delete_partner(pid)
+                            st.success("Deleted")
+                            st.rerun()
+                    st.markdown('</div>', unsafe_allow_html=True)
+
+    elif current_partner_tab == "View":
+        st.subheader("View Partners")
+        partners = fetch_partners()
+        if not partners:
+            st.info("No partners found")
+        else:
+            # Fetch all TDS once for matching
+            try:
+                tds_records_all = supabase.table("tds_data").select("id,brand,metadata,chemical_type_id").execute().data or []
+            except Exception:
+                tds_records_all = []
+            # Index by chemical_type_id for quick partner links resolution
+            tds_by_type: dict[str, list[dict]] = {}
+            try:
+                for _tds in tds_records_all:
+                    _ctid = (_tds.get("chemical_type_id") or "").strip()
+                    if not _ctid:
+                        continue
+                    tds_by_type.setdefault(_ctid, []).append(_tds)
+            except Exception:
+                tds_by_type = {}
+
+            # Simple view-only list of partners with their TDS-backed products
+            for p in partners:
+                pname = (p.get("partner") or "").strip()
+                pcountry = (p.get("partner_country") or "").strip()
+                pname_l = pname.lower()
+                # Build robust tokens for matching (strip parentheses/punctuation)
+                import re as _re_pv
+                _base_name = _re_pv.sub(r"\(.*?\)", "", pname_l)  # remove parenthetical e.g., (china)
+                _base_name = _re_pv.sub(r"[^a-z0-9\s]", " ", _base_name)
+                partner_tokens = [t for t in _base_name.split() if len(t) >= 3]
+
+                # Prefer explicit TDS-backed products stored on partner record
+                partner_products = (
+                    p.get("tds_products")
+                    or p.get("products")
+                    or (p.get("metadata") or {}).get("tds_products")
+                    or []
+                )
+
+                matched: list[dict] = []
+                if isinstance(partner_products, list) and partner_products:
+                    for it in partner_products:
+                        try:
+                            if not isinstance(it, dict):
+                                continue
+                            ct_id = (it.get("chemical_type_id") or it.get("type_id") or "").strip()
+                            if ct_id and ct_id in tds_by_type:
+                                for tds in tds_by_type.get(ct_id) or []:
+                                    meta = tds.get("metadata") or {}
+                                    matched.append({
+                                        "name": meta.get("product_name") or meta.get("generic_product_name") or (tds.get("brand") or "Unnamed"),
+                                        "category": meta.get("category") or "Others",
+                                        "tds_file_url": meta.get("tds_file_url"),
+                                        "tds_file_name": meta.get("tds_file_name"),
+                                    })
+                            else:
+                                # Fallback by name if provided
+                                nm = (it.get("name") or "").strip().lower()
+                                if nm:
+                                    for tds in tds_records_all:
+                                        meta = tds.get("metadata") or {}
+                                        hay = " ".join([
+                                            str(meta.get("product_name") or ""),
+                                            str(meta.get("generic_product_name") or ""),
+                                            str(tds.get("brand") or ""),
+                                        ]).lower()
+                                        if nm in hay:
+                                            matched.append({
+                                                "name": meta.get("product_name") or meta.get("generic_product_name") or (tds.get("brand") or "Unnamed"),
+                                                "category": meta.get("category") or "Others",
+                                                "tds_file_url": meta.get("tds_file_url"),
+                                                "tds_file_name": meta.get("tds_file_name"),
+                                            })
+                        except Exception:
+                            continue
+                else:
+                    # Fallback: match TDS by supplier/brand using robust token matching
+                    for tds in tds_records_all:
+                        meta = tds.get("metadata") or {}
+                        supplier = (meta.get("supplier_name") or "").strip().lower()
+                        brand = (tds.get("brand") or "").strip().lower()
+                        hay = f"{supplier} {brand}"
+                        hay_norm = _re_pv.sub(r"[^a-z0-9\s]", " ", hay)
+                        if pname_l and (pname_l in hay_norm):
+                            cond = True
+                        else:
+                            # token membership
+                            cond = any(t in hay_norm for t in partner_tokens)
+                        if cond:
+                            matched.append({
+                                "name": meta.get("product_name") or meta.get("generic_product_name") or (tds.get("brand") or "Unnamed"),
+                                "category": meta.get("category") or "Others",
+                                "tds_file_url": meta.get("tds_file_url"),
+                                "tds_file_name": meta.get("tds_file_name"),
+                            })
+
+                # Display partner information directly without view/close buttons
+                with st.expander(f"🤝 {pname} ({pcountry})", expanded=False):
+                    # Header info (view-only)
+                    cols = st.columns([3,2])
+                    with cols[0]:
+                        st.markdown(f"**Partner:** {pname or '-'}")
+                    with cols[1]:
+                        st.markdown(f"**Country:** {pcountry or '-'}")
+
+                    st.markdown("---")
+                    st.subheader("Assigned TDS-backed Products")
+                    # Show only chemicals assigned to this partner (like Manage)
+                    assigned_view = partner_get_products(p)
+                    if not assigned_view:
+                        st.caption("No chemicals assigned to this partner.")
+                    else:
+                        by_cat_ro: dict[str, list[dict]] = {}
+                        for r in assigned_view:
+                            by_cat_ro.setdefault(r.get("category") or "Others", []).append(r)
+                        for cat, items in by_cat_ro.items():
+                            with st.expander(f"📁 {cat}", expanded=False):
+                                for rec in items:
+                                    st.markdown(f"- {rec.get('name') or 'Unnamed'}")
+
+    st.markdown('</div>', unsafe_allow_html=True)
@@ -0,0 +1,502 @@
+"""
+Pricing & Costing Master Data: partner/TDS costing and pricing by incoterm.
+
+Loaded by pms.py only while this module is the active one, and executed in pms.py's
+namespace: it uses the Supabase client, helpers and session/auth state defined there.
+"""
+
+# ==========================
+# UI - Pricing & Costing Master Data
+# ==========================
+if st.session_state.get("main_section") == "pricing" and has_sourcing_master_access(user_email):
+    st.markdown('<h1 style="color:#1976d2; font-weight:700;">Pricing & Costing Master Data</h1>', unsafe_allow_html=True)
+    st.markdown('<div class="form-card">', unsafe_allow_html=True)
+
+    # Helpers
+    def _fetch_partners_simple() -> list[dict]:
+        try:
+            return supabase.table("partner_data").select("id,partner,partner_country").order("partner").execute().data or []
+        except Exception:
+            return []
+
+    def _fetch_tds_simple() -> list[dict]:
+        try:
+            rows = supabase.table("tds_data").select("id,chemical_type_id,brand,metadata").order("created_at", desc=True).execute().data or []
+            items = []
+            for r in rows:
+                meta = r.get("metadata") or {}
+                items.append({
+                    "id": r.get("id"),
+                    "chemical_type_id": r.get("chemical_type_id"),
+                    "name": meta.get("product_name") or meta.get("generic_product_name") or (r.get("brand") or "Unnamed"),
+                    "category": meta.get("category") or "Others",
+                })
+            return items
+        except Exception:
+            return []
+
+    def _fetch_tds_for_partner(partner_id: str) -> list[dict]:
+        """Get TDS records assigned to a specific partner"""
+        try:
+            # Get partner's assigned products - check all possible fields like partner_get_products does
+            partner_resp = supabase.table("partner_data").select("metadata").eq("id", partner_id).execute()
+            if not partner_resp.data:
+                st.error(f"❌ No partner found with ID: {partner_id}")
+                return []
+            
+            partner_data = partner_resp.data[0]
+            
+            # Get assigned products from metadata field
+            assigned_products = []
+            try:
+                md = partner_data.get("metadata") or {}
+                if isinstance(md.get("tds_products"), list):
+                    assigned_products = md.get("tds_products") or []
+            except Exception:
+                pass
+            
+            if not assigned_products:
+                return []
+            
+            # Get TDS IDs from assigned products
+            tds_ids = [p.get("tds_id") for p in assigned_products if p.get("tds_id")]
+            if not tds_ids:
+                return []
+            
+            # Fetch TDS records for these IDs
+            rows = supabase.table("tds_data").select("id,chemical_type_id,brand,metadata").in_("id", tds_ids).order("created_at", desc=True).execute().data or []
+            items = []
+            for r in rows:
+                meta = r.get("metadata") or {}
+                items.append({
+                    "id": r.get("id"),
+                    "chemical_type_id": r.get("chemical_type_id"),
+                    "name": meta.get("product_name") or meta.get("generic_product_name") or (r.get("brand") or "Unnamed"),
+                    "category": meta.get("category") or "Others",
+                })
+            return items
+        except Exception:
+            return []
+
+    GLOBAL_INCOTERMS = ["FOB", "CIF Mombasa", "SEZ MCF", "Nairobi", "FCA", "Addis Ababa"]
+    KENYA_INCOTERMS = ["Kenya", "Nairobi", "FCA Moyale", "Addis"]
+
+    def _incoterm_rows_default():
+        rows = []
+        for inc in GLOBAL_INCOTERMS + KENYA_INCOTERMS:
+            rows.append({"incoterm": inc, "cost_usd": "", "cost_etb": "", "price_usd": "", "price_etb": ""})
+        return rows
+
+    def _split_rows(rows: list[dict]):
+        global_rows, kenya_rows, other_rows = [], [], []
+        try:
+            for r in rows or []:
+                inc = str(r.get("incoterm") or "").strip()
+                if inc in GLOBAL_INCOTERMS:
+                    global_rows.append(r)
+                elif inc in KENYA_INCOTERMS:
+                    kenya_rows.append(r)
+                else:
+                    other_rows.append(r)
+        except Exception:
+            pass
+        return global_rows, kenya_rows, other_rows
+
+    def _pricing_table_add(partner_id: str, tds_id: str, rows: list[dict]):
+        try:
+            payload = {
+                "partner_id": partner_id,
+                "tds_id": tds_id,
+                "rows": rows,
+            }
+            resp = supabase.table("costing_pricing_data").insert(payload).execute()
+            invalidate_price_matrix()
+            return resp
+        except Exception as e:
+            st.error(f"Failed to save pricing: {e}")
+            return None
+
+    def _pricing_table_update(pid: str, updates: dict):
+        try:
+            resp = supabase.table("costing_pricing_data").update(updates).eq("id", pid).execute()
+            invalidate_price_matrix()
+            return resp
+        except Exception as e:
+            st.error(f"Failed to update pricing: {e}")
+            return None
+
+    def _pricing_table_delete(pid: str):
+        try:
+            resp = supabase.table("costing_pricing_data").delete().eq("id", pid).execute()
+            invalidate_price_matrix()
+            return resp
+        except Exception as e:
+            st.error(f"Failed to delete pricing: {e}")
+            return None
+
+    def _pricing_fetch_all():
+        try:
+            return supabase.table("costing_pricing_data").select("*").order("created_at", desc=True).execute().data or []
+        except Exception as e:
+            st.info("Pricing table not found yet. It will be created when you save your first record.")
+            return []
+
+    # Create custom tab navigation with proper change detection
+    tab_col1, tab_col2, tab_col3 = st.columns(3)
+    
+    with tab_col1:
+        if st.button("Add", key="pricing_tab_add", type="primary" if st.session_state.get("pricing_current_tab") == "Add" else "secondary", use_container_width=True):
+            previous_tab = st.session_state.get("pricing_current_tab")
+            if previous_tab and previous_tab != "Add" and _has_unsaved_pricing_changes():
+                st.session_state["pending_pricing_tab"] = "Add"
+                st.rerun()
+            else:
+                # Clear session when switching to Add tab
+                if previous_tab and previous_tab != "Add":
+                    _clear_pricing_session()
+                st.session_state["pricing_current_tab"] = "Add"
+                st.rerun()
+    
+    with tab_col2:
+        if st.button("Manage", key="pricing_tab_manage", type="primary" if st.session_state.get("pricing_current_tab") == "Manage" else "secondary", use_container_width=True):
+            previous_tab = st.session_state.get("pricing_current_tab")
+            if previous_tab and previous_tab != "Manage" and _has_unsaved_pricing_changes():
+                st.session_state["pending_pricing_tab"] = "Manage"
+                st.rerun()
+            else:
+                # Clear session when switching to Manage tab
+                if previous_tab and previous_tab != "Manage":
+                    _clear_pricing_session()
+                st.session_state["pricing_current_tab"] = "Manage"
+                st.rerun()
+    
+    with tab_col3:
+        if st.button("View", key="pricing_tab_view", type="primary" if st.session_state.get("pricing_current_tab") == "View" else "secondary", use_container_width=True):
+            previous_tab = st.session_state.get("pricing_current_tab")
+            if previous_tab and previous_tab != "View" and _has_unsaved_pricing_changes():
+                st.session_state["pending_pricing_tab"] = "View"
+                st.rerun()
+            else:
+                # Clear session when switching to View tab
+                if previous_tab and previous_tab != "View":
+                    _clear_pricing_session()
+                st.session_state["pricing_current_tab"] = "View"
+                st.rerun()
+    
+    # Handle pending pricing tab changes with confirmation dialog
+    if st.session_state.get("pending_pricing_tab"):
+        new_tab = st.session_state.get("pending_pricing_tab")
+        previous_tab = st.session_state.get("pricing_current_tab")
+        
+        if previous_tab == "Add":
+            st.warning("⚠️ You have unsaved changes in the Add tab.")
+            col1, col2, col3 = st.columns([1, 1, 2])
+            with col1:
+                if st.button("🗑️ Discard & Continue", key="discard_pricing_add", type="primary"):
+                    _clear_pricing_session()
+                    st.session_state["pricing_current_tab"] = new_tab
+                    st.session_state.pop("pending_pricing_tab")
+                    st.rerun()
+            with col2:
+                if st.button("❌ Cancel", key="cancel_pricing_add"):
+                    st.session_state.pop("pending_pricing_tab")
+                    st.rerun()
+            with col3:
+                st.caption("Your unsaved changes will be lost if you continue.")
+            st.stop()
+        elif previous_tab == "Manage":
+            st.warning("⚠️ You have unsaved changes in the Manage tab.")
+            col1, col2, col3 = st.columns([1, 1, 2])
+            with col1:
+                if st.button("🗑️ Discard & Continue", key="discard_pricing_manage", type="primary"):
+                    _clear_pricing_session()
+                    st.session_state["pricing_current_tab"] = new_tab
+                    st.session_state.pop("pending_pricing_tab")
+                    st.rerun()
+            with col2:
+                if st.button("❌ Cancel", key="cancel_pricing_manage"):
+                    st.session_state.pop("pending_pricing_tab")
+                    st.rerun()
+            with col3:
+                st.caption("Your unsaved changes will be lost if you continue.")
+            st.stop()
+        elif previous_tab == "View":
+            st.warning("⚠️ You have unsaved changes in the View tab.")
+            col1, col2, col3 = st.columns([1, 1, 2])
+            with col1:
+                if st.button("🗑️ Discard & Continue", key="discard_pricing_view", type="primary"):
+                    _clear_pricing_session()
+                    st.session_state["pricing_current_tab"] = new_tab
+                    st.session_state.pop("pending_pricing_tab")
+                    st.rerun()
+            with col2:
+                if st.button("❌ Cancel", key="cancel_pricing_view"):
+                    st.session_state.pop("pending_pricing_tab")
+                    st.rerun()
+            with col3:
+                st.caption("Your unsaved changes will be lost if you continue.")
+            st.stop()
+    
+    # Get current tab for rendering
+    current_pricing_tab = st.session_state.get("pricing_current_tab", "Add")
+
+    # Add
+    if current_pricing_tab == "Add":
+        colp1, colp2 = st.columns(2)
+        partners = _fetch_partners_simple()
+        partner_opts = {f"{p.get('partner')} ({p.get('partner_country')})": p.get("id") for p in partners}
+
+        with colp1:
+            _partner_placeholder = "— Select —"
+            _partner_labels = [_partner_placeholder] + list(partner_opts.keys()) if partner_opts else [_partner_placeholder]
+            sel_partner_label = st.selectbox("Partner", _partner_labels, index=0)
+        
+        # Get selected partner ID
+        sel_partner_id = partner_opts.get(sel_partner_label) if sel_partner_label != _partner_placeholder else None
+        
+        # Get TDS items only for the selected partner
+        if sel_partner_id:
+            tds_items = _fetch_tds_for_partner(sel_partner_id)
+        else:
+            tds_items = []
+        
+        tds_opts = {f"{t.get('name')} — {t.get('category')}": t.get("id") for t in tds_items}
+
+        with colp2:
+            _tds_placeholder = "— Select —"
+            _tds_labels = [_tds_placeholder] + list(tds_opts.keys()) if tds_opts else [_tds_placeholder]
+            sel_tds_label = st.selectbox("Select TDS", _tds_labels, index=0)
+            
+            # Show message if no TDS available for selected partner
+            if sel_partner_label != _partner_placeholder and not tds_items:
+                st.info("ℹ️ No chemicals assigned to this partner. Please assign chemicals in Partner Master Data first.")
+
+        # Auto-clear pricing inputs when Partner or TDS selection changes
+        _prev_partner = st.session_state.get("pricing_prev_partner_label")
+        _prev_tds = st.session_state.get("pricing_prev_tds_label")
+        if sel_partner_label != _prev_partner or sel_tds_label != _prev_tds:
+            _reset_session_keys(["pricing_rows_add"]) 
+            # Bump reset token so all widget keys change and state is flushed
+            st.session_state["pricing_form_reset_token"] = str(uuid.uuid4())
+            st.session_state["pricing_prev_partner_label"] = sel_partner_label
+            st.session_state["pricing_prev_tds_label"] = sel_tds_label
+            # Reinitialize default rows for fresh input after change
+            st.session_state["pricing_rows_add"] = _incoterm_rows_default()
+
+        # Editable pricing table
+        st.markdown("---")
+        st.subheader("Pricing & Costing Table")
+        
+        # Check if both partner and TDS are selected
+        sel_partner_id = partner_opts.get(sel_partner_label) if sel_partner_label != _partner_placeholder else None
+        sel_tds_id = tds_opts.get(sel_tds_label) if sel_tds_label != _tds_placeholder else None
+        both_selected = sel_partner_id and sel_tds_id
+        
+        if not both_selected:
+            st.warning("⚠️ Please select both Partner and TDS to add pricing data")
+            st.stop()
+        
+        if "pricing_rows_add" not in st.session_state:
+            st.session_state["pricing_rows_add"] = _incoterm_rows_default()
+
+        rows = st.session_state["pricing_rows_add"]
+        _pricing_token = st.session_state.get("pricing_form_reset_token", "0")
+        global_rows, kenya_rows, other_rows = _split_rows(rows)
+
+        def _render_rows(prefix: str, rows_list: list[dict]):
+            st.caption("Incoterm | Costing USD | Costing ETB | Pricing USD | Pricing ETB")
+            for i, r in enumerate(rows_list):
+                c1, c2, c3, c4, c5 = st.columns([2,2,2,2,2])
+                with c1:
+                    st.text_input("Incoterm", value=r.get("incoterm", ""), key=f"{prefix}_{_pricing_token}_inc_{i}")
+                with c2:
+                    st.text_input("Costing USD", value=r.get("cost_usd", ""), key=f"{prefix}_{_pricing_token}_cu_{i}")
+                with c3:
+                    st.text_input("Costing ETB", value=r.get("cost_etb", ""), key=f"{prefix}_{_pricing_token}_ce_{i}")
+                with c4:
+                    st.text_input("Pricing USD", value=r.get("price_usd", ""), key=f"{prefix}_{_pricing_token}_pu_{i}")
+                with c5:
+                    st.text_input("Pricing ETB", value=r.get("price_etb", ""), key=f"{prefix}_{_pricing_token}_pe_{i}")
+
+        st.markdown("**Global Sourcing (FOB, CIF Mombasa, SEZ MCF, Nairobi, FCA, Addis Ababa)**")
+        _render_rows("g", global_rows)
+
+        st.markdown("**Kenya Pricing & Costing (Kenya, Nairobi, FCA Moyale, Addis)**")
+        _render_rows("k", kenya_rows)
+
+        # Save combined
+        if st.button("💾 Save Pricing", type="primary", key="p_save_add"):
+            def _collect(prefix: str, lst: list[dict]):
+                out = []
+                for i in range(len(lst)):
+                    out.append({
+                        "incoterm": st.session_state.get(f"{prefix}_{_pricing_token}_inc_{i}") or "",
+                        "cost_usd": st.session_state.get(f"{prefix}_{_pricing_token}_cu_{i}") or "",
+                        "cost_etb": st.session_state.get(f"{prefix}_{_pricing_token}_ce_{i}") or "",
+                        "price_usd": st.session_state.get(f"{prefix}_{_pricing_token}_pu_{i}") or "",
+                        "price_etb": st.session_state.get(f"{prefix}_{_pricing_token}_pe_{i}") or "",
+                    })
+                return out
+            out_rows = _collect("g", global_rows) + _collect("k", kenya_rows)
+            # Both partner and TDS are already validated above, so we can proceed directly
+            resp = _pricing_table_add(sel_partner_id, sel_tds_id, out_rows)
+            if resp is not None:
+                st.success("✅ Pricing saved")
+                # Reset add pricing session state and bump token so widgets clear
+                _reset_session_keys(["pricing_rows_add"]) 
+                st.session_state["pricing_form_reset_token"] = str(uuid.uuid4())
+                st.session_state["pricing_rows_add"] = _incoterm_rows_default()
+                st.rerun()
+        
+        # Add clear session button if there are unsaved changes
+
+    # Manage
+    elif current_pricing_tab == "Manage":
+        records = _pricing_fetch_all()
+        if not records:
+            st.info("No pricing records found")
+        else:
+            # Build partner id -> name map
+            _partners_map = {}
+            try:
+                for p in _fetch_partners_simple():
+                    _partners_map[p.get("id")] = p.get("partner")
+            except Exception:
+                _partners_map = {}
+            # Build tds id -> product code (product_name) map
+            _tds_name_map = {}
+            try:
+                _tds_rows = supabase.table("tds_data").select("id,metadata").execute().data or []
+                for _r in _tds_rows:
+                    _mid = (_r or {}).get("metadata") or {}
+                    _tds_name_map[_r.get("id")] = _mid.get("product_name") or _mid.get("generic_product_name")
+            except Exception:
+                _tds_name_map = {}
+            for rec in records:
+                rid = rec.get("id")
+                partner_id = rec.get("partner_id")
+                tds_id = rec.get("tds_id")
+                rows = rec.get("rows") or _incoterm_rows_default()
+
+                _pname = _partners_map.get(partner_id, partner_id or "-")
+                _prod_code = _tds_name_map.get(tds_id) or "-"
+                with st.expander(f"Costing & Pricing — {_pname} — {_prod_code}", expanded=False):
+                    # Split rows into groups
+                    g_rows, k_rows, o_rows = _split_rows(rows)
+
+                    def _render_manage(prefix: str, rows_list: list[dict], title: str):
+                        st.markdown(f"**{title}**")
+                        st.caption("Incoterm | Costing USD | Costing ETB | Pricing USD | Pricing ETB")
+                        for i, r in enumerate(rows_list):
+                            c1, c2, c3, c4, c5 = st.columns([2,2,2,2,2])
+                            with c1:
+                                st.text_input("Incoterm", value=r.get("incoterm", ""), key=f"pm_inc_{prefix}_{rid}_{i}")
+                            with c2:
+                                st.text_input("Costing USD", value=r.get("cost_usd", ""), key=f"pm_cu_{prefix}_{rid}_{i}")
+                            with c3:
+                                st.text_input("Costing ETB", value=r.get("cost_etb", ""), key=f"pm_ce_{prefix}_{rid}_{i}")
+                            with c4:
+                                st.text_input("Pricing USD", value=r.get("price_usd", ""), key=f"pm_pu_{prefix}_{rid}_{i}")
+                            with c5:
+                                st.text_input("Pricing ETB", value=r.get("price_etb", ""), key=f"pm_pe_{prefix}_{rid}_{i}")
+
+                    _render_manage("g", g_rows, "Global Sourcing (FOB, CIF Mombasa, SEZ MCF, Nairobi, FCA, Addis Ababa)")
+                    _render_manage("k", k_rows, "Kenya Pricing & Costing (Kenya, Nairobi, FCA Moyale, Addis)")
+
+                    mc1, mc2, mc3 = st.columns([1,1,1])
+                    with mc1:
+                        if st.button("💾 Save", key=f"pm_save_{rid}"):
+                            # collect per group
+                            def _collect(prefix: str, lst: list[dict]):
+                                out = []
+                                for i in range(len(lst)):
+                                    out.append({
+                                        "incoterm": st.session_state.get(f"pm_inc_{prefix}_{rid}_{i}") or "",
+                                        "cost_usd": st.session_state.get(f"pm_cu_{prefix}_{rid}_{i}") or "",
+                                        "cost_etb": st.session_state.get(f"pm_ce_{prefix}_{rid}_{i}") or "",
+                                        "price_usd": st.session_state.get(f"pm_pu_{prefix}_{rid}_{i}") or "",
+                                        "price_etb": st.session_state.get(f"pm_pe_{prefix}_{rid}_{i}") or "",
+                                    })
+                                return out
+                            new_rows = _collect("g", g_rows) + _collect("k", k_rows)
+                            _pricing_table_update(rid, {"rows": new_rows})
+                            st.success("Updated")
+                            # Reset manage pricing inputs for this record
+                            _reset_session_by_prefix([f"pm_inc_g_{rid}_", f"pm_cu_g_{rid}_", f"pm_ce_g_{rid}_", f"pm_pu_g_{rid}_", f"pm_pe_g_{rid}_", f"pm_inc_k_{rid}_", f"pm_cu_k_{rid}_", f"pm_ce_k_{rid}_", f"pm_pu_k_{rid}_", f"pm_pe_k_{rid}_"]) 
+                            st.rerun()
+                    with mc2:
+                        if st.button("🗑️ Delete", key=f"pm_del_{rid}"):
+                            _pricing_table_delete(rid)
+                            st.success("Deleted")
+                            st.rerun()
+                    with mc3:
+                        pass
+
+    # View
+    elif current_pricing_tab == "View":
+        records = _pricing_fetch_all()
+        if not records:
+            st.info("No pricing records found")
+        else:
+            _partners_map = {}
+            try:
+                for p in _fetch_partners_simple():
+                    _partners_map[p.get("id")] = p.get("partner")
+            except Exception:
+                _partners_map = {}
+            # Build tds id -> product code map (only the TDS that have pricing records)
+            try:
+                _tds_name_map_v = fetch_tds_names(supabase, [rec.get("tds_id") for rec in records])
+            except Exception:
+                _tds_name_map_v = {}
+            # Latest prices: one row per TDS, one column per incoterm (from the cached price matrix)
+            try:
+                _matrix = get_price_matrix()
+                _matrix_incoterms = list(dict.fromkeys(GLOBAL_INCOTERMS + KENYA_INCOTERMS))
+                _matrix_rows = []
+                for _tid in dict.fromkeys(str(rec.get("tds_id")) for rec in records if rec.get("tds_id")):
+                    _row = {"Product": _tds_name_map_v.get(_tid) or _tid}
+                    for _inc in _matrix_incoterms:
+                        _p = _matrix.get(_tid, _inc)
+                        _row[_inc] = " / ".join(v for v in (
+                            f"USD {_p['price_usd']}" if _p["price_usd"] else "",
+                            f"ETB {_p['price_etb']}" if _p["price_etb"] else "",
+                        ) if v)
+                    _matrix_rows.append(_row)
+                if _matrix_rows:
+                    import pandas as _pd
+                    st.markdown("**Latest selling prices**")
+                    st.dataframe(_pd.DataFrame(_matrix_rows, columns=["Product"] + _matrix_incoterms), use_container_width=True, hide_index=True)
+            except Exception:
+                pass
+            for rec in records:
+                rid = rec.get("id")
+                rows = rec.get("rows") or []
+                _pname = _partners_map.get(rec.get("partner_id"), rec.get("partner_id") or "-")
+                _prod_code = _tds_name_map_v.get(str(rec.get("tds_id"))) or "-"
+                with st.expander(f"Costing & Pricing — {_pname} — {_prod_code}", expanded=False):
+                    # Split rows similar to Manage view and show as read-only tables
+                    g_rows, k_rows, o_rows = _split_rows(rows)
+
+                    def _render_table(title: str, data_rows: list[dict]):
+                        st.markdown(f"**{title}**")
+                        if not data_rows:
+                            st.caption("No rows")
+                            st.stop()
+                        try:
+                            import pandas as _pd
+                            df = _pd.DataFrame(data_rows, columns=["incoterm","cost_usd","cost_etb","price_usd","price_etb"])  # type: ignore
+                            st.dataframe(df, use_container_width=True, hide_index=True)
+                        except Exception:
+                            st.caption("Incoterm | Costing USD | Costing ETB | Pricing USD | Pricing ETB")
+                            for r in data_rows:
+                                st.write(f"- {r.get('incoterm','')} | {r.get('cost_usd','')} | {r.get('cost_etb','')} | {r.get('price_usd','')} | {r.get('price_etb','')}")
+
+                    # First table shows ALL incoterms (Global + Kenya + Others)
+                    all_rows = g_rows + k_rows + o_rows
+                    _render_table("All Pricing & Costing (FOB, CIF Mombasa, SEZ MCF, Nairobi, FCA, Addis Ababa)", all_rows)
+                    
+                    # Second table shows only Kenya-specific incoterms
+                    _render_table("Kenya Pricing & Costing (Kenya, Nairobi, FCA Moyale, Addis)", k_rows)
+
+    st.markdown('</div>', unsafe_allow_html=True)
@@ -0,0 +1,1234 @@
+"""
+TDS Master Data (sourcing): add, manage and view TDS records.
+
+Loaded by pms.py only while this module is the active one, and executed in pms.py's
+namespace: it uses the Supabase client, helpers and session/auth state defined there.
+"""
+
+# Enhanced Sourcing sub-navigation when active
+if st.session_state.get("main_section") == "sourcing" and has_sourcing_master_access(user_email):
+    st.markdown('<div class="form-card" style="margin: 2rem 0;">', unsafe_allow_html=True)
+    st.markdown('''
+    <div style="text-align: center; margin-bottom: 1.5rem;">
+        <h3 style="color: #4a5568; font-weight: 600; margin-bottom: 0.5rem;">TDS Master Data</h3>
+        <p style="color: #718096; font-size: 0.9rem; margin: 0;">Technical Data Sheet Management</p>
+    </div>
+    ''', unsafe_allow_html=True)
+    
+    if "sourcing_section" not in st.session_state:
+        st.session_state["sourcing_section"] = "add"
+    
+    sub_cols = st.columns(4)
+    sub_nav_items = [
+        {"key": "add", "icon": "➕", "title": "Add TDS", "desc": "Upload new technical data sheets"},
+        {"key": "bulk", "icon": "📦", "title": "Bulk Upload", "desc": "Ingest many TDS files or a ZIP"},
+        {"key": "manage", "icon": "⚙️", "title": "Manage TDS", "desc": "Edit and organize existing TDS"},
+        {"key": "view", "icon": "👁️", "title": "View TDS", "desc": "Browse and search TDS library"}
+    ]
+    
+    for i, item in enumerate(sub_nav_items):
+        with sub_cols[i]:
+            is_active = st.session_state.get("sourcing_section") == item["key"]
+            
+            if st.button(
+                f"""{item["icon"]} {item["title"]}""",
+                key=f"sub_nav_{item['key']}",
+                use_container_width=True,
+                type="primary" if is_active else "secondary"
+            ):
+                # Check for unsaved changes when switching tabs within sourcing
+                current_section = st.session_state.get("sourcing_section")
+                if (current_section != item["key"] and current_section and _has_unsaved_sourcing_changes()):
+                    # Set pending navigation instead of showing dialog immediately
+                    st.session_state["pending_sourcing_section"] = item["key"]
+                    st.rerun()
+                else:
+                    st.session_state["sourcing_section"] = item["key"]
+                    st.rerun()
+            
+            st.markdown(f'''
+            <div style="text-align: center; margin-top: 0.5rem;">
+                <small style="color: #718096; font-size: 0.8rem;">
+                    {item["desc"]}
+                </small>
+            </div>
+            ''', unsafe_allow_html=True)
+    
+    st.markdown('</div>', unsafe_allow_html=True)
+    
+    # Handle pending TDS section changes with confirmation dialog
+    if st.session_state.get("pending_sourcing_section"):
+        new_section = st.session_state.get("pending_sourcing_section")
+        current_section = st.session_state.get("sourcing_section")
+        
+        if current_section == "add":
+            st.warning("⚠️ You have unsaved changes in the Add TDS tab.")
+            col1, col2, col3 = st.columns([1, 1, 2])
+            with col1:
+                if st.button("🗑️ Discard & Continue", key="discard_tds_add", type="primary"):
+                    _clear_sourcing_session()
+                    st.session_state["sourcing_section"] = new_section
+                    st.session_state.pop("pending_sourcing_section")
+                    st.rerun()
+            with col2:
+                if st.button("❌ Cancel", key="cancel_tds_add"):
+                    st.session_state.pop("pending_sourcing_section")
+                    st.rerun()
+            with col3:
+                st.caption("Your unsaved changes will be lost if you continue.")
+            st.stop()
+        elif current_section == "manage":
+            st.warning("⚠️ You have unsaved changes in the Manage TDS tab.")
+            col1, col2, col3 = st.columns([1, 1, 2])
+            with col1:
+                if st.button("🗑️ Discard & Continue", key="discard_tds_manage", type="primary"):
+                    _clear_sourcing_session()
+                    st.session_state["sourcing_section"] = new_section
+                    st.session_state.pop("pending_sourcing_section")
+                    st.rerun()
+            with col2:
+                if st.button("❌ Cancel", key="cancel_tds_manage"):
+                    st.session_state.pop("pending_sourcing_section")
+                    st.rerun()
+            with col3:
+                st.caption("Your unsaved changes will be lost if you continue.")
+            st.stop()
+        elif current_section == "bulk":
+            st.warning("⚠️ Bulk Upload has extractions waiting in the review queue. Discarding removes their uploaded files.")
+            col1, col2, col3 = st.columns([1, 1, 2])
+            with col1:
+                if st.button("🗑️ Discard & Continue", key="discard_tds_bulk", type="primary"):
+                    for _it in st.session_state.get("tds_bulk_items") or []:
+                        if _it.status == tds_ingest.REVIEW and _it.file_info:
+                            _delete_storage_object_by_url(_it.file_info[0])
+                    _clear_sourcing_session()
+                    st.session_state["sourcing_section"] = new_section
+                    st.session_state.pop("pending_sourcing_section")
+                    st.rerun()
+            with col2:
+                if st.button("❌ Cancel", key="cancel_tds_bulk"):
+                    st.session_state.pop("pending_sourcing_section")
+                    st.rerun()
+            with col3:
+                st.caption("Saved records are not affected.")
+            st.stop()
+
+# UI - Add Product
+if st.session_state.get("main_section") == "sourcing" and st.session_state.get("sourcing_section") == "add" and has_sourcing_master_access(user_email):
+    st.markdown('<h1 style="color:#1976d2; font-weight:700;">Add TDS</h1>', unsafe_allow_html=True)
+    st.markdown('<div class="form-card">', unsafe_allow_html=True)
+
+    with st.container():
+        st.subheader("Basic Information")
+        # Category select (selection only; no add) with placeholder
+        _cat_placeholder = "— Select —"
+        try:
+            _cat_options = [_cat_placeholder] + get_all_categories()
+        except Exception:
+            _cat_options = [_cat_placeholder] + FIXED_CATEGORIES
+        _category_sel = st.selectbox(
+            "Chemical Category *",
+            _cat_options,
+            key="category_select"
+        )
+        category = "" if _category_sel == _cat_placeholder else _category_sel
+        # Reset type controls when category changes
+        prev_cat = st.session_state.get("category_select_prev")
+        if prev_cat != category:
+            if prev_cat:
+                prev_key_base = (prev_cat or 'none').replace(' ', '_').replace('&', 'and')
+                prev_type_checkbox_key = f"add_new_type_{prev_key_base}"
+                prev_type_select_key = f"type_select_{prev_key_base}"
+                prev_type_input_key = f"new_type_name_{prev_key_base}"
+                st.session_state.pop(prev_type_checkbox_key, None)
+                st.session_state.pop(prev_type_select_key, None)
+                st.session_state.pop(prev_type_input_key, None)
+            st.session_state["category_select_prev"] = category
+            # Force a rerun so dependent widgets refresh their options for the new category
+            st.rerun()
+
+        # Product Type filtered by selected category (selection only; no add)
+        existing_types = get_types_for_category(category)
+        type_options = existing_types
+        if type_options:
+            _type_placeholder = "— Select —"
+            _type_opts = [_type_placeholder] + type_options
+            _type_sel = st.selectbox(
+                "Product Type *",
+                options=_type_opts,
+                key=f"type_select_{(category or 'none').replace(' ', '_').replace('&', 'and')}"
+            )
+            selected_type = "" if _type_sel == _type_placeholder else _type_sel
+        else:
+            st.info("No mapped product types for this category in Chemical Master Data.")
+            selected_type = ""
+
+        # Product Code after selecting category and type
+        name = st.text_input("Product Code *", placeholder="Unique product code", key="tds_product_code")
+
+        description = st.text_area("Description", placeholder="Optional description", height=100, key="tds_description")
+
+        st.markdown("---")
+        st.subheader("Product Status")
+        _yn_placeholder = "— Select —"
+        _yn_sel = st.selectbox(
+            "Is it Leanchems legacy/existing/coming product?",
+            [_yn_placeholder, "Yes", "No"],
+            index=0,
+            key="tds_product_status"
+        )
+        is_leanchems_product = None if _yn_sel == _yn_placeholder else _yn_sel
+
+        st.markdown("---")
+        st.subheader("Source of TDS")
+        _src_placeholder = "— Select —"
+        _src_sel = st.selectbox(
+            "Where did the TDS come from?",
+            [_src_placeholder, "Supplier", "Customer", "Competitor"],
+            index=0,
+            key="tds_source_select"
+        )
+        tds_source = None if _src_sel == _src_placeholder else _src_sel
+
+        st.markdown("---")
+        st.subheader("Technical Data Sheet (TDS)")
+        st.warning("⚠️ TDS upload is required. Products cannot be saved without a TDS file.")
+        # Single file picker only (mobile-friendly)
+        # Reset-aware file uploader (tokenized key so it fully clears after save)
+        _tds_file_token = st.session_state.get("tds_file_reset_token", "0")
+        uploaded_file = st.file_uploader(
+            "Upload TDS (PDF/DOCX/Images) — max 10MB *",
+            type=ALLOWED_FILE_EXTS,
+            key=f"tds_file_picker_{_tds_file_token}",
+            accept_multiple_files=False,
+            help="Tip: On mobile, choose 'Files' or 'Browse' to pick from device storage."
+        )
+
+        # If user removes the uploaded file after extraction, clear hydrated fields and extracted data
+        if not uploaded_file and (
+            st.session_state.get("extracted_tds_data") or st.session_state.get("tds_defaults")
+        ):
+            _cleared_any = False
+            for _k in [
+                "extracted_tds_data",
+                "extracted_tds_data_norm",
+                "tds_defaults",
+                "tds_hydrate_pending",
+            ]:
+                if _k in st.session_state:
+                    st.session_state.pop(_k, None)
+                    _cleared_any = True
+            # Clear widget values back to empty
+            for _w in [
+                "tds_generic_name",
+                "tds_trade_name",
+                "tds_supplier_name",
+                "tds_packaging",
+                "tds_net_weight",
+                "tds_tech_spec",
+            ]:
+                if st.session_state.get(_w):
+                    st.session_state[_w] = ""
+                    _cleared_any = True
+            if _cleared_any:
+                st.info("TDS removed — cleared AI-extracted fields.")
+                st.rerun()
+
+        # AI Processing Button (single source)
+        if uploaded_file and gemini_model:
+            col_ai_process1, col_ai_process2 = st.columns([1, 3])
+            with col_ai_process1:
+                if st.button("🤖 Extract with AI", type="secondary"):
+                    extracted_data = process_tds_with_ai(uploaded_file)
+                    if extracted_data is not None:
+                        # Normalize keys robustly (case/space/punctuation variations)
+                        import re as _re_norm_keys
+                        def _normalize_key(s: str) -> str:
+                            ns = str(s or "").strip().lower()
+                            ns = ns.replace("&", " and ")
+                            ns = ns.replace("-", "_")
+                            ns = ns.replace(" ", "_")
+                            ns = ns.replace("\u2013", "_").replace("\u2014", "_")
+                            ns = ns.replace('"', '').replace("'", "")
+                            ns = _re_norm_keys.sub(r"[^a-z0-9_]+", "", ns)
+                            return ns
+                        norm = { _normalize_key(k): v for k, v in extracted_data.items() }
+                        st.session_state["extracted_tds_data"] = extracted_data
+                        st.session_state["extracted_tds_data_norm"] = norm
+                        st.session_state["tds_hydrate_pending"] = True
+                        st.success("✅ AI extraction completed!")
+                        st.rerun()
+                    else:
+                        st.error("❌ AI extraction failed. Please check your file.")
+            with col_ai_process2:
+                if st.session_state.get("extracted_tds_data"):
+                    st.success("AI data extracted and ready to use!")
+
+        st.markdown("---")
+        st.subheader("AI Product Management System – TDS Information Extraction")
+        if gemini_model:
+            st.info("🤖 AI will automatically extract information from the uploaded TDS file")
+        else:
+            st.warning("⚠️ Gemini AI not configured. Please set GEMINI_API_KEY in your environment variables.")
+
+        # (Debug section removed)
+        
+        # AI TDS Information Extraction fields
+        # One-time hydration after an extract click
+        def _ensure_hydrated():
+            _n = st.session_state.get("extracted_tds_data_norm") or {}
+            if not _n and st.session_state.get("extracted_tds_data"):
+                # Build norm from legacy stored dict
+                _tmp = st.session_state.get("extracted_tds_data") or {}
+                import re as _re_norm_keys
+                def _normalize_key(s: str) -> str:
+                    ns = str(s or "").strip().lower()
+                    ns = ns.replace("&", " and ")
+                    ns = ns.replace("-", "_")
+                    ns = ns.replace(" ", "_")
+                    ns = ns.replace("\u2013", "_").replace("\u2014", "_")
+                    ns = ns.replace('"', '').replace("'", "")
+                    ns = _re_norm_keys.sub(r"[^a-z0-9_]+", "", ns)
+                    return ns
+                _n = {_normalize_key(k): v for k, v in _tmp.items()}
+                st.session_state["extracted_tds_data_norm"] = _n
+            if not _n:
+                st.stop()
+            def _get_first(keys: list[str], default: str = ""):
+                for k in keys:
+                    if k in _n and _n.get(k):
+                        return _n.get(k)
+                return default
+            # Store hydrated defaults in a separate dict to avoid widget key conflicts
+            st.session_state["tds_defaults"] = {
+                "generic_product_name": _get_first(["generic_product_name","generic_name","genericproductname"]) or "",
+                "trade_name": _get_first(["trade_name","model_name","tradename","modelname"]) or "",
+                "supplier_name": _get_first(["supplier_name","manufacturer","suppliername"]) or "",
+                # Include common normalized variants including double-underscore from " & " replacement
+                "packaging_size_type": _get_first([
+                    "packaging_size_type",
+                    "packaging_size_and_type",
+                    "packagingsizeandtype",
+                    "packaging_size__and__type",
+                    "packaging_sizeandtype",
+                    "packaging_and_type",
+                    "packaging",
+                    "packaging_size"
+                ]) or "",
+                "net_weight": _get_first(["net_weight","netweight","weight"]) or "",
+                "hs_code": _get_first(["hs_code","hscode","hs"]) or "",
+                "technical_specification": _get_first(["technical_specification","technical_specs","technicalspecification","technicalspecs","specification","specifications"]) or "",
+            }
+
+        # Capture whether we are in the immediate hydration pass to decide if we overwrite widget values
+        _hydrate_now = bool(st.session_state.get("tds_hydrate_pending"))
+        if _hydrate_now:
+            _ensure_hydrated()
+            st.session_state["tds_hydrate_pending"] = False
+        else:
+            # Also hydrate opportunistically if fields are empty but we have extracted data
+            if st.session_state.get("extracted_tds_data") and not st.session_state.get("tds_defaults"):
+                _ensure_hydrated()
+
+        # If we have defaults, push them into widget state before rendering inputs.
+        # Only overwrite existing user entries on the immediate hydration pass, otherwise fill blanks only.
+        _tds_defs_for_widgets = st.session_state.get("tds_defaults") or {}
+        if _tds_defs_for_widgets:
+            _widget_defaults_map = {
+                "tds_generic_name": _tds_defs_for_widgets.get("generic_product_name", ""),
+                "tds_trade_name": _tds_defs_for_widgets.get("trade_name", ""),
+                "tds_supplier_name": _tds_defs_for_widgets.get("supplier_name", ""),
+                "tds_packaging": _tds_defs_for_widgets.get("packaging_size_type", ""),
+                "tds_net_weight": _tds_defs_for_widgets.get("net_weight", ""),
+                "tds_tech_spec": _tds_defs_for_widgets.get("technical_specification", ""),
+            }
+            for _wkey, _wval in _widget_defaults_map.items():
+                if _hydrate_now or not st.session_state.get(_wkey):
+                    st.session_state[_wkey] = _wval
+
+        col_ai1, col_ai2 = st.columns(2)
+        _norm_vals = st.session_state.get("extracted_tds_data_norm") or {}
+        
+        with col_ai1:
+            _tds_defs = st.session_state.get("tds_defaults") or {}
+            _gen_default = _tds_defs.get("generic_product_name") or _norm_vals.get("generic_product_name", "")
+            _trade_default = _tds_defs.get("trade_name") or _norm_vals.get("trade_name", "")
+            _supp_default = _tds_defs.get("supplier_name") or _norm_vals.get("supplier_name", "")
+            # Resolve value from defaults or normalized key variants
+            _pkg_val = _tds_defs.get("packaging_size_type")
+            if not _pkg_val:
+                for _k in [
+                    "packaging_size_type",
+                    "packaging_size_and_type",
+                    "packagingsizeandtype",
+                    "packaging_size__and__type",
+                    "packaging_sizeandtype",
+                    "packaging_and_type",
+                    "packaging",
+                    "packaging_size",
+                ]:
+                    if _norm_vals.get(_k):
+                        _pkg_val = _norm_vals.get(_k)
+                        break
+            # Only pass value if key not in session state to avoid warning
+            _gen_kwargs = {"key": "tds_generic_name", "placeholder": "AI extracted generic name"}
+            if "tds_generic_name" not in st.session_state:
+                _gen_kwargs["value"] = _gen_default
+            generic_product_name = st.text_input("Generic Product Name", **_gen_kwargs)
+
+            _trade_kwargs = {"key": "tds_trade_name", "placeholder": "AI extracted trade/model name"}
+            if "tds_trade_name" not in st.session_state:
+                _trade_kwargs["value"] = _trade_default
+            trade_name = st.text_input("Trade Name (Model Name)", **_trade_kwargs)
+
+            _supp_kwargs = {"key": "tds_supplier_name", "placeholder": "AI extracted supplier name"}
+            if "tds_supplier_name" not in st.session_state:
+                _supp_kwargs["value"] = _supp_default
+            supplier_name = st.text_input("Supplier Name", **_supp_kwargs)
+
+            _pkg_kwargs = {"key": "tds_packaging", "placeholder": "AI extracted packaging info"}
+            if "tds_packaging" not in st.session_state:
+                _pkg_kwargs["value"] = _pkg_val or ""
+            packaging_size_type = st.text_input("Packaging Size & Type", **_pkg_kwargs)
+        with col_ai2:
+            _net_default = _tds_defs.get("net_weight") or _norm_vals.get("net_weight", "")
+            _net_kwargs = {"key": "tds_net_weight", "placeholder": "AI extracted weight"}
+            if "tds_net_weight" not in st.session_state:
+                _net_kwargs["value"] = _net_default
+            net_weight = st.text_input("Net Weight", **_net_kwargs)
+            # HS Code input removed; use AI-extracted/default value silently
+            hs_code = _tds_defs.get("hs_code") or _norm_vals.get("hs_code", "")
+            _tech_default = _tds_defs.get("technical_specification") or _norm_vals.get("technical_specification", "")
+            _tech_kwargs = {"key": "tds_tech_spec", "placeholder": "AI extracted technical specifications", "height": 100}
+            if "tds_tech_spec" not in st.session_state:
+                _tech_kwargs["value"] = _tech_default
+            technical_spec = st.text_area("Technical Specification", **_tech_kwargs)
+
+
+
+        submitted = st.button("Save Record", type="primary")
+
+    if submitted:
+        # Validate name
+        ok, msg = validate_product_name(name)
+        if not ok:
+            st.error(msg)
+        elif not category:
+            st.error("Category is required. Select a category or enter a new one.")
+        elif name_exists(name):
+            st.error("A product with this name already exists")
+        elif not selected_type:
+            st.error("Product Type is required. Select a type or enter a new one.")
+        elif not uploaded_file:
+            st.error("TDS file is required. Please upload a TDS file before saving the product.")
+        else:
+            # Validate file
+            source_file = uploaded_file
+            f_ok, f_msg = validate_file(source_file)
+            if not f_ok:
+                st.error(f_msg)
+            else:
+                tds_url = None
+                try:
+                    # Create a placeholder ID to use for storage path
+                    product_id = str(uuid.uuid4())
+
+                    # Upload TDS if provided
+                    tds_url, tds_name, tds_size, tds_type = upload_tds_to_supabase(source_file, product_id)
+
+                    # Save everything to tds_data table only
+                    # First, find or create the chemical type
+                    try:
+                        # Try to find existing chemical type
+                        existing_type = supabase.table("chemical_types").select("id").eq("name", selected_type.strip()).eq("category", category).limit(1).execute()
+                        if existing_type.data:
+                            chem_type_id = existing_type.data[0]["id"]
+                        else:
+                            # Create new chemical type if it doesn't exist
+                            new_type_payload = {
+                        "id": product_id,
+                                "name": selected_type.strip(),
+                        "category": category,
+                            }
+                            supabase.table("chemical_types").insert(new_type_payload).execute()
+                            invalidate_chemical_type_facets()
+                            chem_type_id = product_id
+                    except Exception as e:
+                        # Nothing references the stored file yet: release it
+                        _delete_storage_object_by_url(tds_url or "")
+                        st.error(f"Failed to handle chemical type: {e}")
+                        st.stop()
+                    brand, grade = _split_brand_grade(trade_name)
+                    
+                    # Build specs (actual technical specifications from TDS)
+                    specs = {}
+                    if technical_spec:
+                        specs["technical_specification"] = technical_spec
+                    if hs_code:
+                        specs["hs_code"] = hs_code
+                    if net_weight:
+                        specs["net_weight"] = net_weight
+                    
+                    # Build metadata (ALL TDS information goes here)
+                    metadata = {
+                        # Product info
+                        "product_name": name.strip(),
+                        "product_type": selected_type.strip(),
+                        "category": category,
+                        "is_leanchems_product": is_leanchems_product,
+                        "is_active": True,
+                        # TDS extracted info
+                        "generic_product_name": (generic_product_name or None),
+                        "trade_name": (trade_name or None),
+                        "supplier_name": (supplier_name or None),
+                        "packaging_size_type": (packaging_size_type or None),
+                        # Duplicate important fields for UI rendering (also stored in specs)
+                        "net_weight": (net_weight or None),
+                        "technical_spec": (technical_spec or None),
+                        "description": (description or None),
+                        # TDS file info
+                        "tds_file_url": tds_url,
+                        "tds_file_name": tds_name,
+                        "tds_file_size": tds_size,
+                        "tds_file_type": tds_type,
+                        "tds_source": tds_source,
+                    }
+                    
+                    # Create tds_data entry
+                    ok_entity, err_entity = create_tds_sourcing_entity(
+                        chemical_type_id=chem_type_id,
+                        brand=(brand or supplier_name or None),
+                        grade=grade,
+                        owner=tds_source,  # Supplier / Customer / Competitor
+                        source="TDS Upload",  # Where it came from
+                        specs=specs,
+                        metadata=metadata,
+                    )
+                    if not ok_entity:
+                        _delete_storage_object_by_url(tds_url or "")
+                        st.error(f"Failed to save TDS record: {err_entity}")
+                        st.stop()
+                    st.success("✅ Record saved successfully")
+                    # Clear Add TDS session artifacts and reset the form for a fresh insert
+                    try:
+                        for k in [
+                            "extracted_tds_data",
+                            "extracted_tds_data_norm",
+                            "tds_defaults",
+                            "tds_hydrate_pending",
+                            # old file uploader key (prior versions)
+                            "tds_file_picker",
+                            "category_select_prev",
+                            # Explicit keys for Add TDS widgets
+                            "tds_product_code",
+                            "tds_description",
+                            "tds_product_status",
+                            "tds_source_select",
+                            # Explicit input widget keys used in Add TDS
+                            "tds_generic_name",
+                            "tds_trade_name",
+                            "tds_supplier_name",
+                            "tds_packaging",
+                            "tds_net_weight",
+                            "tds_hs_code",
+                            "tds_tech_spec",
+                            # Selection keys
+                            "category_select",
+                        ]:
+                            st.session_state.pop(k, None)
+                        # Also clear dynamic type select key for the selected category if exists
+                        try:
+                            _cat = category or st.session_state.get("category_select_prev") or ""
+                            if _cat:
+                                _key_base = (_cat or 'none').replace(' ', '_').replace('&', 'and')
+                                st.session_state.pop(f"type_select_{_key_base}", None)
+                        except Exception:
+                            pass
+                        # Bump file-uploader token so Streamlit remounts the widget (clears selected file)
+                        try:
+                            st.session_state["tds_file_reset_token"] = str(uuid.uuid4())
+                        except Exception:
+                            pass
+                        # Explicitly reset key widget values back to placeholders/empty
+                        try:
+                            st.session_state["category_select"] = "— Select —"
+                        except Exception:
+                            pass
+                        try:
+                            st.session_state["tds_product_code"] = ""
+                            st.session_state["tds_description"] = ""
+                            st.session_state["tds_product_status"] = "— Select —"
+                            st.session_state["tds_source_select"] = "— Select —"
+                        except Exception:
+                            pass
+
+                        # Stay in Add tab with a fresh/empty form
+                        st.session_state["sourcing_section"] = "add"
+                    except Exception:
+                        pass
+                    st.rerun()
+                except Exception as e:
+                    if tds_url:
+                        _delete_storage_object_by_url(tds_url)
+                    st.error(f"Failed to save product: {e}")
+        
+        # Add clear session button if there are unsaved changes
+
+    st.markdown('</div>', unsafe_allow_html=True)
+
+# UI - Bulk Upload
+if st.session_state.get("main_section") == "sourcing" and st.session_state.get("sourcing_section") == "bulk" and has_sourcing_master_access(user_email):
+    import pandas as pd
+    st.markdown('<h1 style="color:#1976d2; font-weight:700;">Bulk Upload TDS</h1>', unsafe_allow_html=True)
+    st.markdown('<div class="form-card">', unsafe_allow_html=True)
+    st.caption(
+        f"Upload many TDS files (or ZIP archives of them). Up to {tds_ingest.MAX_WORKERS} files are processed "
+        "at a time: text extraction, AI extraction, upload and save. Extractions with low confidence "
+        "are held in the review queue below instead of being saved."
+    )
+
+    _ph = "— Select —"
+    try:
+        _bulk_cat_options = [_ph] + get_all_categories()
+    except Exception:
+        _bulk_cat_options = [_ph] + FIXED_CATEGORIES
+    bc1, bc2 = st.columns(2)
+    with bc1:
+        _bulk_cat = st.selectbox("Chemical Category *", _bulk_cat_options, key="tds_bulk_category")
+        bulk_category = "" if _bulk_cat == _ph else _bulk_cat
+        _bulk_type = st.selectbox("Product Type *", [_ph] + get_types_for_category(bulk_category), key="tds_bulk_type")
+        bulk_type = "" if _bulk_type == _ph else _bulk_type
+    with bc2:
+        _bulk_src = st.selectbox("Where did the TDS come from?", [_ph, "Supplier", "Customer", "Competitor"], key="tds_bulk_source")
+        _bulk_yn = st.selectbox("Is it Leanchems legacy/existing/coming product?", [_ph, "Yes", "No"], key="tds_bulk_status")
+    bulk_batch = {
+        "category": bulk_category,
+        "product_type": bulk_type,
+        "tds_source": None if _bulk_src == _ph else _bulk_src,
+        "is_leanchems_product": None if _bulk_yn == _ph else _bulk_yn,
+    }
+
+    _bulk_token = st.session_state.get("tds_bulk_reset_token", "0")
+    bulk_files = st.file_uploader(
+        f"Upload TDS files or ZIP archives — max {MAX_FILE_MB}MB per TDS",
+        type=ALLOWED_FILE_EXTS + ["zip"],
+        accept_multiple_files=True,
+        key=f"tds_bulk_picker_{_bulk_token}",
+    )
+
+    def _run_bulk(items, batch):
+        status_box = st.empty()
+        progress = st.progress(0.0, text="Starting…")
+
+        def _show(all_items):
+            done = sum(1 for i in all_items if i.status not in (tds_ingest.QUEUED, tds_ingest.RUNNING))
+            progress.progress(done / max(len(all_items), 1), text=f"{done}/{len(all_items)} files processed")
+            status_box.dataframe(pd.DataFrame([i.row() for i in all_items]), use_container_width=True, hide_index=True)
+
+        tds_ingest.run_pipeline(
+            items,
+            extract_text=extract_text_from_file,
+            extract_fields=lambda text: extract_tds_fields(text, notify=False),
+            upload=lambda item: upload_tds_to_supabase(item, str(uuid.uuid4())),
+            insert=lambda item: save_ingested_tds(
+                item.fields, item.file_info, product_name=tds_ingest.default_product_name(item), **batch
+            ),
+            release=lambda item: _delete_storage_object_by_url(item.file_info[0]),
+            on_update=_show,
+        )
+        for item in items:
+            if item.status in (tds_ingest.SAVED, tds_ingest.REVIEW, tds_ingest.SKIPPED):
+                item.data = b""  # keep file bytes only for retries
+        st.session_state["tds_bulk_items"] = items
+        st.session_state["tds_bulk_batch"] = batch
+
+    if not bulk_category or not bulk_type:
+        st.info("Select a category and product type for this batch.")
+    # A new batch replaces the last one: its review items (uploaded, not yet saved) must be
+    # saved or discarded first, as for "Clear batch"
+    _pending_reviews = sum(1 for i in st.session_state.get("tds_bulk_items") or [] if i.status == tds_ingest.REVIEW)
+    if _pending_reviews:
+        st.warning(f"Save or discard the {_pending_reviews} file(s) in the review queue before starting a new batch.")
+    if st.button("🚀 Start bulk upload", type="primary",
+                 disabled=bool(_pending_reviews) or not (bulk_files and bulk_category and bulk_type)):
+        items = tds_ingest.expand_uploads(bulk_files, ALLOWED_FILE_EXTS, MAX_FILE_MB * 1024 * 1024)
+        if not items:
+            st.warning("No files found in the upload.")
+        else:
+            _run_bulk(items, bulk_batch)
+            st.session_state["tds_bulk_reset_token"] = str(uuid.uuid4())
+            st.rerun()
+
+    bulk_items = st.session_state.get("tds_bulk_items") or []
+    if bulk_items:
+        st.markdown("---")
+        st.subheader("Last batch")
+        _by_status = {}
+        for _it in bulk_items:
+            _by_status[_it.status] = _by_status.get(_it.status, 0) + 1
+        m1, m2, m3, m4 = st.columns(4)
+        m1.metric("Saved", _by_status.get(tds_ingest.SAVED, 0))
+        m2.metric("Needs review", _by_status.get(tds_ingest.REVIEW, 0))
+        m3.metric("Failed", _by_status.get(tds_ingest.FAILED, 0))
+        m4.metric("Skipped", _by_status.get(tds_ingest.SKIPPED, 0))
+        st.dataframe(pd.DataFrame([i.row() for i in bulk_items]), use_container_width=True, hide_index=True)
+
+        a1, a2 = st.columns(2)
+        with a1:
+            if _by_status.get(tds_ingest.FAILED) and st.button("🔁 Retry failed files", key="tds_bulk_retry"):
+                for _it in bulk_items:
+                    if _it.status == tds_ingest.FAILED and _it.data:
+                        _it.status, _it.stage, _it.error = tds_ingest.QUEUED, "", ""
+                _run_bulk(bulk_items, st.session_state.get("tds_bulk_batch") or bulk_batch)
+                st.rerun()
+        with a2:
+            if not _by_status.get(tds_ingest.REVIEW) and st.button("🧹 Clear batch", key="tds_bulk_clear"):
+                st.session_state.pop("tds_bulk_items", None)
+                st.session_state.pop("tds_bulk_batch", None)
+                st.rerun()
+
+        # Review queue: uploaded but not saved until the fields are confirmed
+        review_items = [i for i in bulk_items if i.status == tds_ingest.REVIEW]
+        if review_items:
+            st.markdown("---")
+            st.subheader(f"Review queue ({len(review_items)})")
+            _batch = st.session_state.get("tds_bulk_batch") or bulk_batch
+            _labels = {
+                "generic_product_name": "Generic Product Name",
+                "trade_name": "Trade Name (Model Name)",
+                "supplier_name": "Supplier Name",
+                "packaging_size_type": "Packaging Size & Type",
+                "net_weight": "Net Weight",
+                "hs_code": "HS Code",
+                "technical_specification": "Technical Specification",
+            }
+            for idx, item in enumerate(bulk_items):
+                if item.status != tds_ingest.REVIEW:
+                    continue
+                with st.expander(f"📄 {item.name} — confidence {item.confidence:.0%} ({item.source or 'no AI'})"):
+                    if item.file_info and item.file_info[0]:
+                        st.markdown(f"[Open uploaded TDS]({item.file_info[0]})")
+                    _code = st.text_input("Product Code *", value=tds_ingest.default_product_name(item), key=f"tds_bulk_code_{idx}")
+                    _edited = {}
+                    for fname, label in _labels.items():
+                        if fname == "technical_specification":
+                            _edited[fname] = st.text_area(label, value=item.fields.get(fname, ""), key=f"tds_bulk_{fname}_{idx}", height=100)
+                        else:
+                            _edited[fname] = st.text_input(label, value=item.fields.get(fname, ""), key=f"tds_bulk_{fname}_{idx}")
+                    r1, r2 = st.columns(2)
+                    with r1:
+                        if st.button("✅ Save", key=f"tds_bulk_save_{idx}", type="primary"):
+                            ok, msg = validate_product_name(_code)
+                            if not ok:
+                                st.error(msg)
+                            else:
+                                ok, err = save_ingested_tds(_edited, item.file_info, product_name=_code, **_batch)
+                                if ok:
+                                    item.fields, item.status, item.stage = _edited, tds_ingest.SAVED, "done (reviewed)"
+                                    st.rerun()
+                                st.error(f"Failed to save: {err}")
+                    with r2:
+                        if st.button("🗑️ Discard", key=f"tds_bulk_discard_{idx}"):
+                            if item.file_info:
+                                _delete_storage_object_by_url(item.file_info[0])
+                            item.status, item.stage = tds_ingest.SKIPPED, "discarded in review"
+                            st.rerun()
+
+    st.markdown('</div>', unsafe_allow_html=True)
+
+# UI - Manage Products
+if st.session_state.get("main_section") == "sourcing" and st.session_state.get("sourcing_section") == "manage" and has_sourcing_master_access(user_email):
+    st.markdown('<h1 style="color:#1976d2; font-weight:700;">Manage TDS</h1>', unsafe_allow_html=True)
+    st.markdown('<div class="form-card">', unsafe_allow_html=True)
+
+    # Authorization: only managers can access Manage tab
+    if not sb_user:
+        st.info("Please sign in to access Manage Products.")
+    elif not is_manager:
+        if not st.session_state.get("user_name"):
+            pass
+        st.error("You do not have permission to access Manage Products.")
+    else:
+        # Throughput of the supporting documents sent by the last save (shown once)
+        _upload_report = st.session_state.pop("tds_upload_report", None)
+        if _upload_report:
+            st.caption("Last upload")
+            st.dataframe(_upload_report, use_container_width=True, hide_index=True)
+
+        # Enhanced Filters
+        st.subheader("📊 Filter TDS Records")
+        colf1, colf2, colf3 = st.columns([2, 2, 2])
+        with colf1:
+            filter_category = st.selectbox("Filter by Category", ["All"] + FIXED_CATEGORIES)
+        with colf2:
+            # Brand Filter
+            all_brands = []
+            try:
+                res = supabase.table("tds_data").select("brand").execute()
+                all_brands = sorted(list(set([row.get("brand") for row in (res.data or []) if row.get("brand")])))
+            except Exception:
+                pass
+            filter_brand = st.selectbox("Filter by Brand", ["All"] + all_brands)
+        with colf3:
+            # Owner Filter
+            filter_owner = st.selectbox("Filter by Owner", ["All", "Supplier", "Customer", "Competitor"])
+
+        # Search filter
+        search = st.text_input("Search by product name/brand/supplier", placeholder="Start typing...")
+
+        # Category, brand and owner filters run in the database
+        tds_records = fetch_tds_data(
+            category=None if filter_category == "All" else filter_category,
+            brand=None if filter_brand == "All" else filter_brand,
+            owner=None if filter_owner == "All" else filter_owner,
+        )
+        filtered = []
+        for tds in tds_records:
+            metadata = tds.get("metadata", {})
+            # (Source filter removed)
+            # Search filter
+            if search:
+                search_text = " ".join([
+                    metadata.get("product_name", ""),
+                    tds.get("brand", ""),
+                    metadata.get("supplier_name", ""),
+                    metadata.get("generic_product_name", "")
+                ]).lower()
+                if search.lower() not in search_text:
+                    continue
+            filtered.append(tds)
+
+        # Display filter summary
+        if filtered:
+            st.success(f"📋 Found {len(filtered)} TDS records matching your filters")
+        else:
+            st.info("No TDS records match the current filters.")
+
+        if not filtered:
+            st.info("No TDS records match the current filters.")
+        else:
+            # Group by category then brand
+            by_cat = {}
+            for tds in filtered:
+                metadata = tds.get("metadata", {})
+                category = metadata.get("category", "Unknown")
+                brand = tds.get("brand", "Unknown")
+                by_cat.setdefault(category, {}).setdefault(brand, []).append(tds)
+
+            for cat, brands in by_cat.items():
+                with st.expander(f"📁 {cat}", expanded=False):
+                    for brand, items in brands.items():
+                        for tds in items:
+                            tid = tds["id"]
+                            metadata = tds.get("metadata", {})
+                            cols = st.columns([3, 2, 2, 2])
+                            with cols[0]:
+                                _ptype = metadata.get('product_type', '') or 'N/A'
+                                _brand = tds.get('brand', '') or 'N/A'
+                                st.markdown(f"**{_ptype} — {_brand}**")
+                                st.caption(f"Product: {metadata.get('product_name', 'Unknown Product')}")
+                                st.caption(f"Generic: {metadata.get('generic_product_name', 'N/A')}")
+                                st.caption(f"Supplier: {metadata.get('supplier_name', 'N/A')}")
+                            with cols[1]:
+                                st.write(f"Owner: {tds.get('owner', 'N/A')}")
+                                st.write(f"Source: {tds.get('source', 'N/A')}")
+                            with cols[2]:
+                                tds_url = metadata.get("tds_file_url")
+                                if tds_url:
+                                    st.markdown(f"[📄 Download TDS]({tds_url})")
+                                else:
+                                    st.write("No TDS file")
+                            with cols[3]:
+                                if st.button("✏️ Edit", key=f"edit_{tid}"):
+                                    st.session_state[f"editing_{tid}"] = True
+
+                            if st.session_state.get(f"editing_{tid}"):
+                                # Use a refresh token to force expander identity change and collapse after save/cancel
+                                _tds_refresh_token = st.session_state.get("tds_manage_refresh_token", "")
+                                try:
+                                    _nzw_t = ((sum(ord(ch) for ch in _tds_refresh_token) % 5) + 1) if _tds_refresh_token else 0
+                                except Exception:
+                                    _nzw_t = 0
+                                _zw_sfx_t = "\u200B" * _nzw_t if _nzw_t else ""
+                                with st.expander(f"Edit: {metadata.get('product_name', 'Unknown Product')}{_zw_sfx_t}", expanded=False):
+                                    # Editable fields for TDS data
+                                    ename = st.text_input("Product Name", value=metadata.get("product_name", ""), key=f"n_{tid}")
+                                    ecat = st.selectbox("Category", FIXED_CATEGORIES, index=FIXED_CATEGORIES.index(metadata.get("category", "Others")), key=f"c_{tid}")
+                                    etype = st.text_input("Product Type", value=metadata.get("product_type", ""), key=f"t_{tid}")
+                                    ebrand = st.text_input("Brand", value=tds.get("brand", ""), key=f"b_{tid}")
+                                    egrade = st.text_input("Grade", value=tds.get("grade", ""), key=f"g_{tid}")
+                                    eowner = st.selectbox("Owner", ["Supplier", "Customer", "Competitor"], index=["Supplier", "Customer", "Competitor"].index(tds.get("owner", "Supplier")), key=f"o_{tid}")
+                                    esource = st.text_input("Source", value=tds.get("source", ""), key=f"s_{tid}")
+                                    egenname = st.text_input("Generic Product Name", value=metadata.get("generic_product_name", ""), key=f"gn_{tid}")
+                                    etradename = st.text_input("Trade Name", value=metadata.get("trade_name", ""), key=f"tn_{tid}")
+                                    esupplier = st.text_input("Supplier Name", value=metadata.get("supplier_name", ""), key=f"sn_{tid}")
+                                    epackaging = st.text_input("Packaging Size & Type", value=metadata.get("packaging_size_type", ""), key=f"p_{tid}")
+                                    _specs_src = tds.get("specs") or {}
+                                    _net_w_fallback = metadata.get("net_weight") or _specs_src.get("net_weight") or ""
+                                    _tech_fallback = (
+                                        metadata.get("technical_spec")
+                                        or _specs_src.get("technical_specification")
+                                        or _specs_src.get("technical_spec")
+                                        or ""
+                                    )
+                                    enetweight = st.text_input("Net Weight", value=_net_w_fallback, key=f"nw_{tid}")
+                                    etspec = st.text_area("Technical Specification", value=_tech_fallback, key=f"ts_{tid}")
+                                    edesc = st.text_area("Description", value=metadata.get("description", ""), key=f"desc_{tid}")
+                                    
+                                    # LeanChems Product Status
+                                    eleanchems = st.selectbox(
+                                        "Is it Leanchems legacy/existing/coming product?",
+                                        ["Yes", "No"],
+                                        index=0 if metadata.get("is_leanchems_product") == "Yes" else 1,
+                                        key=f"leanchems_{tid}"
+                                    )
+                                    
+                                    # Supporting Documents section (upload, list, delete)
+                                    st.markdown("---")
+                                    st.subheader("📎 Supporting Documents")
+                                    st.info("Upload any related files (e.g., brochures, test reports). Stored under this TDS record.")
+                                    supporting_files = metadata.get("supporting_files", [])
+                                    if supporting_files:
+                                        st.write("**Current Supporting Files:**")
+                                        sel_indices = st.multiselect(
+                                            "Select files to delete",
+                                            options=list(range(len(supporting_files))),
+                                            format_func=lambda i: supporting_files[i].get('name', f'File {i+1}') if i is not None else "",
+                                            key=f"supp_del_sel_{tid}"
+                                        )
+                                        for i, fobj in enumerate(supporting_files):
+                                            col_s1, col_s2, col_s3 = st.columns([4,1,1])
+                                            with col_s1:
+                                                name = fobj.get('name', 'Unknown file')
+                                                url = fobj.get('url')
+                                                if url:
+                                                    st.markdown(f"[📄 {name}]({url})")
+                                                else:
+                                                    st.write(f"📄 {name}")
+                                            with col_s2:
+                                                st.write(f"{(fobj.get('size') or 0) / 1024:.1f} KB")
+                                            with col_s3:
+                                                st.caption(fobj.get('type', '').upper())
+                                        if st.button("🗑️ Delete selected", key=f"del_supp_{tid}"):
+                                            try:
+                                                remaining = []
+                                                for i, f in enumerate(supporting_files):
+                                                    if i in sel_indices:
+                                                        _delete_storage_object_by_url(f.get('url') or '')
+                                                    else:
+                                                        remaining.append(f)
+                                                updated_meta = metadata.copy()
+                                                updated_meta["supporting_files"] = remaining
+                                                supabase.table("tds_data").update({"metadata": updated_meta}).eq("id", tid).execute()
+                                                st.success("Selected supporting files deleted")
+                                                st.rerun()
+                                            except Exception as e:
+                                                st.error(f"Failed to delete files: {e}")
+                                    
+                                    new_supporting = st.file_uploader(
+                                        "Upload Supporting Files",
+                                        type=ALLOWED_FILE_EXTS, 
+                                        accept_multiple_files=True,
+                                        key=f"supp_up_{tid}"
+                                    )
+
+                                    # Actions
+                                    ac1, ac2 = st.columns(2)
+                                    with ac1:
+                                        if st.button("💾 Save", key=f"save_{tid}"):
+                                            # Validations
+                                            n_ok, n_msg = validate_product_name(ename)
+                                            if not n_ok:
+                                                st.error(n_msg)
+                                            elif name_exists_other(ename, tds.get("chemical_type_id") or ""):
+                                                st.error("Another product already uses this name")
+                                            else:
+                                                # Build updates
+                                                def _strip_or_empty(v: str | None) -> str:
+                                                    try:
+                                                        return (v or "").strip()
+                                                    except Exception:
+                                                        return ""
+                                                def _strip_or_none(v: str | None):
+                                                    s = _strip_or_empty(v)
+                                                    return s if s else None
+                                                updates = {
+                                                    "name": _strip_or_empty(ename),
+                                                    "category": ecat,
+                                                    "description": _strip_or_none(edesc),
+                                                    "is_leanchems_product": eleanchems,
+                                                }
+
+                                                # Upload supporting files
+                                                new_supporting_urls = []
+                                                if new_supporting:
+                                                    supp_files = metadata.get("supporting_files", []).copy()
+                                                    # The uploader keeps its files after a save: files this record
+                                                    # already has (same content) are not added or referenced again
+                                                    _have_urls = {f.get("url") for f in supp_files if f.get("url")}
+                                                    valid_files = []
+                                                    for uploaded_file in new_supporting:
+                                                        okf, msgf = validate_file(uploaded_file)
+                                                        if not okf:
+                                                            st.error(f"File {uploaded_file.name}: {msgf}")
+                                                            continue
+                                                        _url = stored_document_url(uploaded_file)
+                                                        if _url in _have_urls:
+                                                            continue
+                                                        _have_urls.add(_url)
+                                                        valid_files.append(uploaded_file)
+                                                    # Uploaded concurrently; saving again only sends the files that failed
+                                                    for uploaded_file, (finfo, ferr) in zip(valid_files, upload_supporting_docs(valid_files, tid) if valid_files else []):
+                                                        if finfo is None:
+                                                            st.error(f"Failed to upload {uploaded_file.name}: {ferr}")
+                                                            continue
+                                                        url, fname, fsize, ftype = finfo
+                                                        new_supporting_urls.append(url)
+                                                        supp_files.append({
+                                                            "url": url,
+                                                            "name": fname,
+                                                            "size": fsize,
+                                                            "type": ftype,
+                                                            "uploaded_at": datetime.utcnow().isoformat() + "Z"
+                                                        })
+                                                    updates["supporting_files"] = supp_files
+
+                                                # Update TDS data
+                                                try:
+                                                    # Update metadata
+                                                    updated_metadata = metadata.copy()
+                                                    updated_metadata.update({
+                                                        "product_name": _strip_or_empty(ename),
+                                                        "category": ecat,
+                                                        "product_type": _strip_or_empty(etype),
+                                                        "generic_product_name": _strip_or_none(egenname),
+                                                        "trade_name": _strip_or_none(etradename),
+                                                        "supplier_name": _strip_or_none(esupplier),
+                                                        "packaging_size_type": _strip_or_none(epackaging),
+                                                        "net_weight": _strip_or_none(enetweight),
+                                                        "technical_spec": _strip_or_none(etspec),
+                                                        "description": _strip_or_none(edesc),
+                                                        "is_leanchems_product": eleanchems,
+                                                    })
+                                                    # Bring through file-related updates into metadata for consistency
+                                                    if "supporting_files" in updates:
+                                                        updated_metadata["supporting_files"] = updates["supporting_files"]
+                                                    for _k in ["tds_file_url","tds_file_name","tds_file_size","tds_file_type"]:
+                                                        if _k in updates:
+                                                            updated_metadata[_k] = updates[_k]
+                                                    
+                                                    # Update TDS record
+                                                    tds_updates = {
+                                                        "brand": _strip_or_none(ebrand),
+                                                        "grade": _strip_or_none(egrade),
+                                                        "owner": eowner,
+                                                        "source": _strip_or_none(esource),
+                                                        "metadata": updated_metadata
+                                                    }
+                                                    
+                                                    supabase.table("tds_data").update(tds_updates).eq("id", tid).execute()
+                                                    st.success("✅ TDS record updated")
+                                                    st.session_state.pop(f"editing_{tid}", None)
+                                                    # Bump token so the expander resets on rerun
+                                                    st.session_state["tds_manage_refresh_token"] = str(uuid.uuid4())
+                                                    st.rerun()
+                                                except Exception as e:
+                                                    # The record does not reference the new uploads: release them
+                                                    for _url in new_supporting_urls:
+                                                        _delete_storage_object_by_url(_url)
+                                                    st.error(f"Failed to update: {e}")
+
+                                    with ac2:
+                                        if st.button("❌ Cancel", key=f"cancel_{tid}"):
+                                            st.session_state.pop(f"editing_{tid}", None)
+                                            st.session_state["tds_manage_refresh_token"] = str(uuid.uuid4())
+
+    st.markdown('</div>', unsafe_allow_html=True)
+
+# UI - View TDS
+if st.session_state.get("main_section") == "sourcing" and st.session_state.get("sourcing_section") == "view" and has_sourcing_master_access(user_email):
+    st.markdown('<h1 style="color:#1976d2; font-weight:700;">View TDS</h1>', unsafe_allow_html=True)
+    st.markdown('<div class="form-card">', unsafe_allow_html=True)
+
+    # Filters (Category, Brand, Owner, Source, Search)
+    st.subheader("📊 Filter TDS Records")
+    colf1, colf2, colf3 = st.columns([2, 2, 2])
+    with colf1:
+        filter_category_v = st.selectbox("Filter by Category", ["All"] + FIXED_CATEGORIES, key="view_filter_category")
+    with colf2:
+        all_product_types_v = []
+        try:
+            # Types of the selected category only (all types when no category is selected)
+            all_product_types_v = fetch_tds_product_types(
+                supabase, None if filter_category_v == "All" else filter_category_v
+            )
+        except Exception:
+            pass
+        filter_product_type_v = st.selectbox("Filter by Product Type", ["All"] + all_product_types_v, key="view_filter_product_type")
+    with colf3:
+        filter_owner_v = st.selectbox("Filter by Owner", ["All", "Supplier", "Customer", "Competitor"], key="view_filter_owner")
+
+    search_view = st.text_input("Search by product name/brand/supplier", placeholder="Start typing...", key="view_filter_search")
+
+    # Fetch TDS records; category, product type and owner filters run in the database
+    try:
+        all_tds = query_tds(
+            supabase, "*",
+            category=None if filter_category_v == "All" else filter_category_v,
+            product_type=None if filter_product_type_v == "All" else filter_product_type_v,
+            owner=None if filter_owner_v == "All" else filter_owner_v,
+        )
+    except Exception as e:
+        st.error(f"Failed to fetch TDS records: {e}")
+        all_tds = []
+
+    def _tds_view_match(tds: dict) -> bool:
+        metadata = tds.get("metadata", {})
+        # (Source filter removed)
+        if search_view:
+            search_text = " ".join([
+                metadata.get("product_name", ""),
+                tds.get("brand", ""),
+                metadata.get("supplier_name", ""),
+                metadata.get("generic_product_name", "")
+            ]).lower()
+            if search_view.lower() not in search_text:
+                return False
+        return True
+
+    filtered_tds = [tds for tds in all_tds if _tds_view_match(tds)]
+
+    if not filtered_tds:
+        st.info("📭 No TDS records found with current filters.")
+        st.markdown("💡 Adjust filters or add new TDS records in the Add tab.")
+    else:
+        # Group by product type
+        by_product_type = {}
+        for tds in filtered_tds:
+            metadata = tds.get("metadata", {})
+            product_type = metadata.get("product_type", "Unknown")
+            by_product_type.setdefault(product_type, []).append(tds)
+
+        # Export: streams tds_data page by page with the same filters, on click only
+        def _tds_export_rows():
+            filters = [
+                (column, value) for column, value in (
+                    ("metadata->>category", filter_category_v),
+                    ("metadata->>product_type", filter_product_type_v),
+                    ("owner", filter_owner_v),
+                ) if value and value != "All"
+            ]
+            for tds in export_rows("tds_data", filters=filters, desc=True):
+                if not _tds_view_match(tds):
+                    continue
+                metadata = tds.get("metadata") or {}
+                yield {
+                    "Product Name": metadata.get("product_name", ""),
+                    "Generic Name": metadata.get("generic_product_name", ""),
+                    "Trade Name": metadata.get("trade_name", ""),
+                    "Brand": tds.get("brand", ""),
+                    "Grade": tds.get("grade", ""),
+                    "Supplier": metadata.get("supplier_name", ""),
+                    "Owner": tds.get("owner", ""),
+                    "Source": tds.get("source", ""),
+                    "Category": metadata.get("category", ""),
+                    "TDS File": metadata.get("tds_file_name", "No TDS"),
+                    "Leanchems Product": metadata.get("is_leanchems_product", "No"),
+                    "Created": tds.get("created_at", "")
+                }
+
+        render_export(
+            "export_csv_view_tds", "tds_records",
+            ["Product Name", "Generic Name", "Trade Name", "Brand", "Grade", "Supplier", "Owner",
+             "Source", "Category", "TDS File", "Leanchems Product", "Created"],
+            _tds_export_rows, sheet_title="TDS Records",
+        )
+
+        st.markdown(f"**Found {len(filtered_tds)} TDS records**")
+
+        # Display TDS records grouped by product type
+        for product_type, tds_list in by_product_type.items():
+            with st.expander(f"🏷️ {product_type} ({len(tds_list)} records)", expanded=False):
+                for tds in tds_list:
+                    tid = tds["id"]
+                    metadata = tds.get("metadata", {})
+                    
+                    # TDS record card
+                    with st.container():
+                        st.markdown("---")
+                        
+                        # Main info row
+                        col1, col2, col3 = st.columns([3, 2, 1])
+                        with col1:
+                            _ptype = metadata.get('product_type', '') or 'N/A'
+                            _brand = tds.get('brand', '') or 'N/A'
+                            st.markdown(f"**{_ptype} — {_brand}**")
+                            st.caption(f"Product: {metadata.get('product_name', 'Unknown Product')}")
+                            st.caption(f"Generic: {metadata.get('generic_product_name', 'N/A')}")
+                            # Show LeanChems status
+                            leanchems_status = metadata.get("is_leanchems_product", "No")
+                            if leanchems_status == "Yes":
+                                st.caption("🏢 Leanchems Product")
+                        
+                        with col2:
+                            # TDS status and download
+                            tds_url = metadata.get("tds_file_url")
+                            if tds_url:
+                                st.markdown("📄 **TDS:** Available")
+                                st.markdown(f"[Download TDS]({tds_url})")
+                                st.caption(f"File: {metadata.get('tds_file_name', 'Unknown')}")
+                            else:
+                                st.markdown("📄 **TDS:** Not available")
+                        
+                        with col3:
+                            if st.button("👁️ View Details", key=f"view_{tid}"):
+                                st.session_state[f"viewing_{tid}"] = True
+
+                        # View Details Modal
+                        if st.session_state.get(f"viewing_{tid}"):
+                            with st.expander(f"📋 Full Details: {metadata.get('product_name', 'Unknown Product')}", expanded=False):
+                                st.markdown("**Product Information**")
+                                st.write(f"**Product Name:** {metadata.get('product_name', 'N/A')}")
+                                st.write(f"**Generic Product Name:** {metadata.get('generic_product_name', 'N/A')}")
+                                st.write(f"**Trade Name:** {metadata.get('trade_name', 'N/A')}")
+                                st.write(f"**Category:** {metadata.get('category', 'N/A')}")
+                                st.write(f"**Product Type:** {metadata.get('product_type', 'N/A')}")
+                                
+                                st.markdown("**Supplier Information**")
+                                st.write(f"**Supplier Name:** {metadata.get('supplier_name', 'N/A')}")
+                                st.write(f"**Brand:** {tds.get('brand', 'N/A')}")
+                                st.write(f"**Grade:** {tds.get('grade', 'N/A')}")
+                                st.write(f"**Owner:** {tds.get('owner', 'N/A')}")
+                                st.write(f"**Source:** {tds.get('source', 'N/A')}")
+                                
+                                st.markdown("**Packaging & Specifications**")
+                                _specs_src = tds.get("specs") or {}
+                                _net_w = metadata.get('net_weight') or _specs_src.get('net_weight') or 'N/A'
+                                st.write(f"**Packaging Size & Type:** {metadata.get('packaging_size_type', 'N/A')}")
+                                st.write(f"**Net Weight:** {_net_w}")
+                                
+                                # Technical Specification (render as normal text to keep consistent font)
+                                tech_spec = metadata.get("technical_spec") or _specs_src.get("technical_specification") or _specs_src.get("technical_spec")
+                                if tech_spec:
+                                    st.markdown("**Technical Specification:**")
+                                    st.text(tech_spec)
+                                
+                                # TDS Information
+                                st.markdown("**Technical Data Sheet**")
+                                tds_url = metadata.get("tds_file_url")
+                                if tds_url:
+                                    col_tds1, col_tds2 = st.columns(2)
+                                    with col_tds1:
+                                        st.write(f"**TDS File:** {metadata.get('tds_file_name', 'Unknown')}")
+                                        st.write(f"**Size:** {metadata.get('tds_file_size', 0) / 1024:.1f} KB")
+                                    with col_tds2:
+                                        st.write(f"**Type:** {metadata.get('tds_file_type', 'Unknown')}")
+                                        st.markdown(f"[📥 Download TDS]({tds_url})")
+                                else:
+                                    st.write("No TDS file uploaded")
+                                
+                                # Close button
+                                if st.button("❌ Close Details", key=f"close_{tid}"):
+                                    st.session_state.pop(f"viewing_{tid}", None)
+
+    st.markdown('</div>', unsafe_allow_html=True)
@@ -0,0 +1,118 @@
+"""
+Streaming CSV/XLSX export of PMS tables.
+
+Rows are read from Supabase one page at a time (``.range()``) and each page is written to
+the output file before the next one is fetched. The output is a spooled temporary file, so
+a large export moves to disk instead of growing in memory. XLSX files are written with
+openpyxl's write-only workbook, which streams rows instead of building a sheet in memory.
+Nothing here runs until an export is requested.
+
+Like pms_data.py, functions take the Supabase client as their first argument. Pass the
+underlying supabase-py client rather than the CachedSupabase wrapper (pms_repository.py):
+export pages are read once, so they should not fill the query cache.
+"""
+
+import csv
+import io
+import json
+import tempfile
+from datetime import datetime
+
+EXPORT_PAGE_SIZE = 1000
+# Exports larger than this are spooled to a file on disk
+SPOOL_MAX_BYTES = 8 * 1024 * 1024
+
+FORMATS = {
+    "csv": "text/csv",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+
+def iter_table(client, table: str, columns: str = "*", *, filters=None, order: str = "created_at",
+               desc: bool = False, page_size: int = EXPORT_PAGE_SIZE):
+    """
+    Yield the rows of a table page by page. ``filters`` is a list of (column, value) equality
+    filters. Pages are ordered by ``order`` and then id, so that rows do not move between
+    pages.
+    """
+    start = 0
+    while True:
+        q = client.table(table).select(columns)
+        for column, value in filters or ():
+            q = q.eq(column, value)
+        q = q.order(order, desc=desc)
+        if order != "id":
+            q = q.order("id")
+        rows = q.range(start, start + page_size - 1).execute().data or []
+        yield from rows
+        if len(rows) < page_size:
+            return
+        start += page_size
+
+
+def cell_value(value):
+    """A value as written to a cell: lists joined with ", ", dicts as JSON, None as ""."""
+    if value is None:
+        return ""
+    if isinstance(value, (list, tuple)):
+        return ", ".join(str(cell_value(v)) for v in value)
+    if isinstance(value, dict):
+        return json.dumps(value, ensure_ascii=False, default=str)
+    return value
+
+
+def write_csv(rows, columns: list[str], out) -> int:
+    """Write rows (dicts keyed by column) as CSV to a binary file; returns the row count."""
+    text = io.TextIOWrapper(out, encoding="utf-8", newline="", write_through=True)
+    writer = csv.writer(text)
+    writer.writerow(columns)
+    count = 0
+    for row in rows:
+        writer.writerow([cell_value(row.get(c)) for c in columns])
+        count += 1
+    text.detach()  # leave ``out`` open
+    return count
+
+
+def write_xlsx(rows, columns: list[str], out, sheet_title: str = "Export") -> int:
+    """Write rows (dicts keyed by column) as a one-sheet workbook; returns the row count."""
+    from openpyxl import Workbook
+    from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+
+    def xlsx_value(value):
+        value = cell_value(value)
+        if isinstance(value, str):
+            return ILLEGAL_CHARACTERS_RE.sub("", value)
+        if isinstance(value, (int, float, bool, datetime)):
+            return value
+        return str(value)
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title=sheet_title[:31])
+    ws.append(columns)
+    count = 0
+    for row in rows:
+        ws.append([xlsx_value(row.get(c)) for c in columns])
+        count += 1
+    wb.save(out)
+    return count
+
+
+def export_file(rows, columns: list[str], fmt: str, sheet_title: str = "Export"):
+    """
+    (file, row count): the rows written in ``fmt`` ("csv" or "xlsx") to a spooled temporary
+    file, rewound for reading. ``rows`` may be any iterable, e.g. an iter_table generator.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported export format: {fmt}")
+    out = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+    try:
+        if fmt == "csv":
+            count = write_csv(rows, columns, out)
+        else:
+            count = write_xlsx(rows, columns, out, sheet_title=sheet_title)
+    except Exception:
+        out.close()
+        raise
+    out.seek(0)
+    return out, count
@@ -0,0 +1,231 @@
+"""
+Bulk TDS ingestion: many files (or ZIP archives of them) through the Add TDS pipeline.
+
+Each file goes through text extraction -> AI field extraction -> storage upload ->
+tds_data insert. A thread pool of ``max_workers`` runs files side by side. AI calls are
+further limited to ``ai_concurrency`` at a time, so a large batch doesn't hit the Gemini/Groq
+rate limits. Extractions with a confidence below ``review_threshold`` are uploaded but not
+inserted: they wait in a review queue until someone confirms or corrects the fields.
+
+The stages are passed in as callables (pms.py supplies its extract/upload/insert helpers),
+so this module doesn't depend on Streamlit or the app's Supabase client. Stage callables
+run in worker threads and must not call ``st.*``.
+"""
+
+import io
+import os
+import re
+import threading
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+
+MAX_WORKERS = int(os.getenv("TDS_BULK_WORKERS", "4"))
+AI_CONCURRENCY = int(os.getenv("TDS_BULK_AI_CONCURRENCY", "2"))
+REVIEW_THRESHOLD = 0.5
+
+# Canonical field -> normalized keys the AI may use for it (same variants as Add TDS)
+TDS_FIELD_KEYS = {
+    "generic_product_name": ["generic_product_name", "generic_name", "genericproductname"],
+    "trade_name": ["trade_name", "model_name", "tradename", "modelname"],
+    "supplier_name": ["supplier_name", "manufacturer", "suppliername"],
+    "packaging_size_type": [
+        "packaging_size_type", "packaging_size_and_type", "packagingsizeandtype",
+        "packaging_size__and__type", "packaging_sizeandtype", "packaging_and_type",
+        "packaging", "packaging_size",
+    ],
+    "net_weight": ["net_weight", "netweight", "weight"],
+    "hs_code": ["hs_code", "hscode", "hs"],
+    "technical_specification": [
+        "technical_specification", "technical_specs", "technicalspecification",
+        "technicalspecs", "specification", "specifications",
+    ],
+}
+# Fields that count towards the confidence score (HS code is often absent from a TDS)
+SCORED_FIELDS = ("generic_product_name", "trade_name", "supplier_name",
+                 "packaging_size_type", "net_weight", "technical_specification")
+SOURCE_WEIGHTS = {"gemini": 1.0, "groq": 1.0, "heuristic": 0.5}
+MISSING_VALUES = {"", "not found", "n/a", "na", "none", "unknown", "-"}
+
+# Item statuses
+QUEUED, RUNNING, SAVED, REVIEW, FAILED, SKIPPED = "queued", "running", "saved", "review", "failed", "skipped"
+
+
+@dataclass
+class IngestItem:
+    """One file of a batch. Quacks like Streamlit's UploadedFile (name, size, getvalue())."""
+    name: str
+    data: bytes = field(repr=False)
+    status: str = QUEUED
+    stage: str = ""
+    fields: dict = field(default_factory=dict)
+    source: str = ""
+    confidence: float = 0.0
+    error: str = ""
+    file_info: tuple | None = None  # (url, name, size, type) from the storage upload
+    seconds: float = 0.0
+
+    @property
+    def size(self) -> int:
+        return len(self.data)
+
+    def getvalue(self) -> bytes:
+        return self.data
+
+    def row(self) -> dict:
+        return {
+            "File": self.name,
+            "Status": self.status,
+            "Stage": self.stage,
+            "Confidence": f"{self.confidence:.0%}" if self.status in (SAVED, REVIEW) else "",
+            "Product": self.fields.get("trade_name") or self.fields.get("generic_product_name") or "",
+            "Seconds": round(self.seconds, 1),
+            "Error": self.error,
+        }
+
+
+def _extension(name: str) -> str:
+    return name.rsplit(".", 1)[-1].lower() if "." in name else ""
+
+
+def expand_uploads(files, allowed_exts, max_bytes: int) -> list[IngestItem]:
+    """
+    IngestItems for uploaded files, with ZIP archives replaced by the files inside them.
+    Unsupported or oversized files are returned as SKIPPED items so they show up in the
+    status table.
+    """
+    items = []
+
+    def add(name, data):
+        item = IngestItem(name=name, data=data)
+        if _extension(name) not in allowed_exts:
+            item.status, item.error = SKIPPED, "unsupported file type"
+        elif len(data) > max_bytes:
+            item.status, item.error = SKIPPED, f"larger than {max_bytes // (1024 * 1024)}MB"
+        items.append(item)
+
+    for f in files or []:
+        data = f.getvalue()
+        if _extension(f.name) != "zip":
+            add(f.name, data)
+            continue
+        try:
+            with zipfile.ZipFile(io.BytesIO(data)) as archive:
+                for info in archive.infolist():
+                    base = os.path.basename(info.filename)
+                    if info.is_dir() or not base or base.startswith(".") or "__MACOSX" in info.filename:
+                        continue
+                    if info.file_size > max_bytes:
+                        items.append(IngestItem(name=base, data=b"", status=SKIPPED,
+                                                error=f"larger than {max_bytes // (1024 * 1024)}MB"))
+                        continue
+                    add(base, archive.read(info))
+        except zipfile.BadZipFile:
+            items.append(IngestItem(name=f.name, data=b"", status=SKIPPED, error="not a valid ZIP archive"))
+    return items
+
+
+def normalize_key(s: str) -> str:
+    ns = str(s or "").strip().lower()
+    ns = ns.replace("&", " and ").replace("-", "_").replace(" ", "_")
+    ns = ns.replace("–", "_").replace("—", "_").replace('"', "").replace("'", "")
+    return re.sub(r"[^a-z0-9_]+", "", ns)
+
+
+def _is_missing(value) -> bool:
+    return str(value or "").strip().lower() in MISSING_VALUES
+
+
+def map_extracted_fields(extracted: dict | None) -> dict:
+    """The canonical TDS fields (TDS_FIELD_KEYS) from an AI extraction; missing ones are ''."""
+    norm = {normalize_key(k): v for k, v in (extracted or {}).items()}
+    fields = {}
+    for name, keys in TDS_FIELD_KEYS.items():
+        value = next((norm[k] for k in keys if not _is_missing(norm.get(k))), "")
+        fields[name] = value if isinstance(value, str) else str(value)
+    return fields
+
+
+def extraction_confidence(fields: dict, source: str) -> float:
+    """Share of SCORED_FIELDS found, weighted by how reliable the extraction source is."""
+    found = sum(1 for name in SCORED_FIELDS if not _is_missing(fields.get(name)))
+    return found / len(SCORED_FIELDS) * SOURCE_WEIGHTS.get(source, 0.5)
+
+
+def needs_review(item: IngestItem, review_threshold: float = REVIEW_THRESHOLD) -> bool:
+    named = not (_is_missing(item.fields.get("trade_name")) and _is_missing(item.fields.get("generic_product_name")))
+    return item.confidence < review_threshold or not named
+
+
+def default_product_name(item: IngestItem) -> str:
+    """Product code for a bulk-ingested TDS: trade name, else generic name, else the file name."""
+    for name in ("trade_name", "generic_product_name"):
+        if not _is_missing(item.fields.get(name)):
+            return str(item.fields[name]).strip()
+    return os.path.splitext(item.name)[0].replace("_", " ").strip()
+
+
+def run_pipeline(items, *, extract_text, extract_fields, upload, insert, release=None, on_update=None,
+                 max_workers: int = MAX_WORKERS, ai_concurrency: int = AI_CONCURRENCY,
+                 review_threshold: float = REVIEW_THRESHOLD, poll_seconds: float = 0.5):
+    """
+    Run every QUEUED item through the pipeline; blocks until the batch is done.
+
+    extract_text(item) -> str, extract_fields(text) -> (dict | None, source),
+    upload(item) -> (url, name, size, type), insert(item) -> (ok, error).
+    release(item) drops the stored file of an item that failed after its upload, so that
+    retrying it does not leave an extra reference behind.
+    on_update(items) is called on the calling thread while the batch runs and once at the
+    end, e.g. to redraw a status table.
+    """
+    ai_slots = threading.Semaphore(max(1, ai_concurrency))
+
+    def process(item):
+        started = time.perf_counter()
+        item.status = RUNNING
+        try:
+            item.stage = "extracting text"
+            text = extract_text(item)
+            if not text or text == "Unsupported file format" or str(text).startswith("Error"):
+                raise ValueError(f"could not extract text: {text or 'empty document'}")
+            item.stage = "waiting for AI"
+            with ai_slots:
+                item.stage = "AI extraction"
+                extracted, item.source = extract_fields(text)
+            item.fields = map_extracted_fields(extracted)
+            item.confidence = extraction_confidence(item.fields, item.source)
+            item.stage = "uploading"
+            item.file_info = upload(item)
+            if needs_review(item, review_threshold):
+                item.status, item.stage = REVIEW, "awaiting review"
+                return
+            item.stage = "saving"
+            ok, err = insert(item)
+            if not ok:
+                raise RuntimeError(err or "insert failed")
+            item.status, item.stage = SAVED, "done"
+        except Exception as e:
+            item.status, item.error = FAILED, str(e)
+            if item.file_info and release:
+                try:
+                    release(item)
+                    item.file_info = None
+                except Exception:
+                    pass
+        finally:
+            item.seconds = time.perf_counter() - started
+
+    pending_items = [item for item in items if item.status == QUEUED]
+    if not pending_items:
+        return items
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(pending_items))),
+                            thread_name_prefix="tds-ingest") as executor:
+        pending = {executor.submit(process, item) for item in pending_items}
+        while pending:
+            _, pending = wait(pending, timeout=poll_seconds, return_when=FIRST_COMPLETED)
+            if on_update:
+                on_update(items)
+    if on_update:
+        on_update(items)
+    return items
@@ -0,0 +1,250 @@
+"""
+Staged, cached text extraction for uploaded TDS files (PDF, DOCX, images).
+
+PDF stages, each run only when the previous one produced too little text:
+
+1. PyPDF2 text layer, kept per page;
+2. pdfplumber, then pdfminer.six, for text PDFs with unusual layouts;
+3. OCR of the first OCR_MAX_PAGES pages that still have no usable text. Each page is
+   rasterized on its own (pdftoppm with first_page/last_page) and OCR'd in a worker,
+   so nothing is rendered that is not OCR'd. pdftoppm and tesseract are external
+   processes, so a thread pool runs them in parallel without forking the app.
+
+Results are cached on disk by the SHA-256 of the file and EXTRACTOR_VERSION, so
+re-uploading the same TDS returns its text without parsing it again. Bump
+EXTRACTOR_VERSION whenever the stages change.
+
+Optional env vars: TESSERACT_CMD, POPPLER_PATH, TDS_TEXT_CACHE_DIR, OCR_MAX_WORKERS.
+"""
+
+import hashlib
+import io
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+EXTRACTOR_VERSION = "2"
+CACHE_DIR = Path(os.getenv(
+    "TDS_TEXT_CACHE_DIR", Path(__file__).resolve().parent.parent / ".cache" / "tds_text"
+))
+
+MIN_TEXT_CHARS = 150      # below this the document counts as not extracted yet
+MIN_PAGE_TEXT_CHARS = 20  # pages with less text-layer text are OCR'd
+OCR_MAX_PAGES = 10
+OCR_DPI = 200
+OCR_MAX_WORKERS = int(os.getenv("OCR_MAX_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+IMAGE_EXTENSIONS = ("png", "jpg", "jpeg", "heic", "heif", "webp")
+SUPPORTED_EXTENSIONS = ("pdf", "docx", "doc") + IMAGE_EXTENSIONS
+
+
+def normalize_text(txt: str) -> str:
+    try:
+        return (txt or "").replace("\r", "\n").replace("\u0000", "").strip()
+    except Exception:
+        return txt or ""
+
+
+def _is_insufficient(text: str) -> bool:
+    return len((text or "").strip()) < MIN_TEXT_CHARS
+
+
+# --- Cache ---
+
+def cache_key(data: bytes) -> str:
+    return f"{hashlib.sha256(data).hexdigest()}-v{EXTRACTOR_VERSION}"
+
+
+def _cache_file(key: str) -> Path:
+    return CACHE_DIR / key[:2] / f"{key}.txt"
+
+
+def get_cached_text(data: bytes) -> str | None:
+    try:
+        return _cache_file(cache_key(data)).read_text(encoding="utf-8")
+    except OSError:
+        return None
+
+
+def _store_text(data: bytes, text: str):
+    path = _cache_file(cache_key(data))
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(text, encoding="utf-8")
+        os.replace(tmp, path)
+    except OSError:
+        pass  # read-only deployments just don't cache
+
+
+# --- OCR ---
+
+def _configure_tesseract():
+    import pytesseract  # type: ignore
+
+    tess_cmd = os.getenv("TESSERACT_CMD")
+    if tess_cmd:
+        pytesseract.pytesseract.tesseract_cmd = tess_cmd
+    return pytesseract
+
+
+def _ocr_pdf_page(pdf_path: str, page_number: int) -> str:
+    """Rasterize one page (1-based) and OCR it."""
+    from pdf2image import convert_from_path  # type: ignore
+
+    pytesseract = _configure_tesseract()
+    kwargs = {"dpi": OCR_DPI, "first_page": page_number, "last_page": page_number}
+    if os.getenv("POPPLER_PATH"):
+        kwargs["poppler_path"] = os.getenv("POPPLER_PATH")
+    try:
+        images = convert_from_path(pdf_path, **kwargs)
+        return "\n".join(pytesseract.image_to_string(img) or "" for img in images)
+    except Exception:
+        return ""
+
+
+def _ocr_pdf_pages(raw: bytes, page_numbers: list[int]) -> dict[int, str]:
+    """OCR the given pages concurrently; returns {page_number: text}."""
+    if not page_numbers:
+        return {}
+    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as f:
+        f.write(raw)
+        pdf_path = f.name
+    try:
+        workers = max(1, min(OCR_MAX_WORKERS, len(page_numbers)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ocr") as executor:
+            texts = executor.map(lambda n: _ocr_pdf_page(pdf_path, n), page_numbers)
+            return dict(zip(page_numbers, texts))
+    finally:
+        try:
+            os.unlink(pdf_path)
+        except OSError:
+            pass
+
+
+# --- Per-format extraction ---
+
+def _pypdf2_pages(raw: bytes) -> list[str]:
+    import PyPDF2
+
+    try:
+        reader = PyPDF2.PdfReader(io.BytesIO(raw))
+    except Exception:
+        return []
+    pages = []
+    for page in reader.pages:
+        try:
+            pages.append(page.extract_text() or "")
+        except Exception:
+            pages.append("")
+    return pages
+
+
+def _pdfplumber_text(raw: bytes) -> str:
+    try:
+        import pdfplumber  # type: ignore
+        with pdfplumber.open(io.BytesIO(raw)) as pdf:
+            parts = []
+            for p in pdf.pages:
+                try:
+                    parts.append(p.extract_text() or "")
+                except Exception:
+                    parts.append("")
+            return "\n".join(parts)
+    except Exception:
+        return ""
+
+
+def _pdfminer_text(raw: bytes) -> str:
+    try:
+        from pdfminer.high_level import extract_text as _pdfminer_extract  # type: ignore
+        return _pdfminer_extract(io.BytesIO(raw)) or ""
+    except Exception:
+        return ""
+
+
+def _pdf_page_count(raw: bytes, text_pages: list[str]) -> int:
+    if text_pages:
+        return len(text_pages)
+    try:
+        from pdf2image import pdfinfo_from_bytes  # type: ignore
+        kwargs = {"poppler_path": os.getenv("POPPLER_PATH")} if os.getenv("POPPLER_PATH") else {}
+        return int(pdfinfo_from_bytes(raw, **kwargs).get("Pages", 0))
+    except Exception:
+        return OCR_MAX_PAGES
+
+
+def extract_pdf_text(raw: bytes) -> str:
+    pages = _pypdf2_pages(raw)
+    text = "".join(page + "\n" for page in pages if page)
+    if not _is_insufficient(text):
+        return text
+
+    plumber_text = _pdfplumber_text(raw)
+    if plumber_text:
+        text = plumber_text
+    if not _is_insufficient(text):
+        return text
+    miner_text = _pdfminer_text(raw)
+    if miner_text and len(miner_text.strip()) > len(text.strip()):
+        text = miner_text
+    if not _is_insufficient(text):
+        return text
+
+    # OCR only the first pages, and only those without a usable text layer
+    page_count = min(_pdf_page_count(raw, pages), OCR_MAX_PAGES)
+    pages = (pages + [""] * page_count)[:page_count]
+    to_ocr = [n for n, page in enumerate(pages, 1) if len(page.strip()) < MIN_PAGE_TEXT_CHARS]
+    try:
+        ocr_text = _ocr_pdf_pages(raw, to_ocr)
+    except Exception:
+        return text
+    combined = "\n".join(ocr_text.get(n, page) for n, page in enumerate(pages, 1))
+    return combined if len(combined.strip()) > len(text.strip()) else text
+
+
+def extract_docx_text(raw: bytes) -> str:
+    from docx import Document
+
+    doc = Document(io.BytesIO(raw))
+    return "".join(paragraph.text + "\n" for paragraph in doc.paragraphs)
+
+
+def extract_image_text(raw: bytes) -> str:
+    try:
+        import PIL.Image as _PIL_Image  # type: ignore
+        try:
+            import pillow_heif  # type: ignore  # optional HEIC/HEIF support
+            pillow_heif.register_heif_opener()
+        except Exception:
+            pass
+        pytesseract = _configure_tesseract()
+        return pytesseract.image_to_string(_PIL_Image.open(io.BytesIO(raw))) or ""
+    except Exception:
+        return ""
+
+
+def extract_document_text(raw: bytes, filename: str) -> str:
+    """
+    Text of an uploaded file, from the cache when this exact file was extracted before.
+
+    Raises ValueError for unsupported file types. Empty results are not cached, so a
+    file retried after installing OCR tools is extracted again.
+    """
+    extension = (filename or "").rsplit(".", 1)[-1].lower()
+    if extension not in SUPPORTED_EXTENSIONS:
+        raise ValueError(f"Unsupported file format: .{extension}")
+    cached = get_cached_text(raw)
+    if cached is not None:
+        return cached
+    if extension == "pdf":
+        text = extract_pdf_text(raw)
+    elif extension in ("docx", "doc"):
+        text = extract_docx_text(raw)
+    else:
+        text = extract_image_text(raw)
+    text = normalize_text(text)
+    if text:
+        _store_text(raw, text)
+    return text
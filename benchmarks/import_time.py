@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Import-time benchmark for the Streamlit apps.
+
+Streamlit re-executes the app script on every interaction and pays the full import
+cost on every cold start, so module-level imports must stay cheap. This script
+collects the module-level imports of each app, runs them under
+``python -X importtime`` in a fresh interpreter and checks them against the budgets
+below:
+
+* ``max_total_ms``: cumulative import time of the app's module-level imports
+  (median of ``--repeat`` runs).
+* ``lazy``: heavy, feature-specific packages that must only be imported inside the
+  functions that use them. They may still show up when a framework the app imports at
+  the top (e.g. streamlit) pulls them in itself; those are reported but not counted.
+
+Usage (from the repository root):
+    python benchmarks/import_time.py            # all apps
+    python benchmarks/import_time.py --repeat 5 iterations/v6-gemini-final.py
+"""
+
+import argparse
+import ast
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+CRM_LAZY_MODULES = [
+    "mem0", "openai", "serpapi", "bs4", "fpdf", "reportlab",
+    "PyPDF2", "pandas", "numpy", "telegram", "openpyxl",
+]
+
+BUDGETS = {
+    "iterations/v6-gemini-final.py": {"max_total_ms": 1500, "lazy": CRM_LAZY_MODULES},
+    "lean-logistics-app/logistics-app.py": {"max_total_ms": 1500, "lazy": CRM_LAZY_MODULES},
+}
+
+
+def collect_module_imports(app_path: Path) -> list[str]:
+    """Return the source of every import statement executed at module level (including top-level try blocks)."""
+    tree = ast.parse(app_path.read_text(encoding="utf-8"))
+    source = app_path.read_text(encoding="utf-8")
+    statements = []
+
+    def visit(body):
+        for node in body:
+            if isinstance(node, (ast.Import, ast.ImportFrom)):
+                if isinstance(node, ast.ImportFrom) and node.level:
+                    continue
+                statements.append(ast.get_source_segment(source, node))
+            elif isinstance(node, ast.Try):
+                visit(node.body)
+            elif isinstance(node, ast.If):
+                visit(node.body)
+                visit(node.orelse)
+
+    visit(tree.body)
+    return statements
+
+
+def run_importtime(statements: list[str], cwd: Path = PROJECT_ROOT) -> list[tuple[int, int, str]]:
+    """Import the statements in a fresh interpreter; returns (depth, cumulative_us, module) rows."""
+    guarded = "\n".join(
+        f"try:\n    {stmt}\nexcept Exception as e:\n    print('import failed:', {stmt!r}, e)"
+        for stmt in statements
+    )
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", guarded],
+        # Run from the app's directory so its sibling modules resolve like under `streamlit run`
+        capture_output=True, text=True, cwd=cwd,
+    )
+    if proc.stdout.strip():
+        print(proc.stdout.strip())
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|", 2)
+        # Nested imports are indented by two extra spaces per level
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        rows.append((depth, int(cumulative.strip()), name.strip()))
+    return rows
+
+
+def group_by_root(rows, ignore=frozenset()):
+    """Attribute every module to the top-level import that first pulled it in (children are listed before their root)."""
+    groups, pending = [], []
+    for depth, cumulative, name in rows:
+        pending.append(name)
+        if depth == 0:
+            if name not in ignore:
+                groups.append((name, cumulative, pending))
+            pending = []
+    return groups
+
+
+def benchmark_app(app: str, budget: dict, repeat: int) -> bool:
+    statements = collect_module_imports(PROJECT_ROOT / app)
+    # Modules the bare interpreter imports during startup are not the app's cost
+    startup = frozenset(name for depth, _, name in run_importtime([]) if depth == 0)
+    totals, groups = [], []
+    for _ in range(repeat):
+        rows = run_importtime(statements, cwd=(PROJECT_ROOT / app).parent)
+        groups = group_by_root(rows, ignore=startup)
+        totals.append(sum(cumulative for _, cumulative, _ in groups) / 1000)
+    total_ms = statistics.median(totals)
+
+    print(f"\n=== {app} ===")
+    print(f"module-level imports: {len(statements)}")
+    print(f"total import time:   {total_ms:.0f} ms (budget {budget['max_total_ms']} ms, median of {repeat})")
+    print("slowest top-level imports:")
+    for root, cumulative, _ in sorted(groups, key=lambda g: g[1], reverse=True)[:10]:
+        print(f"  {cumulative / 1000:8.1f} ms  {root}")
+
+    violations = []
+    lazy = set(budget.get("lazy", []))
+    for root, _, modules in groups:
+        for module in modules:
+            if module.split(".")[0] in lazy and module == module.split(".")[0]:
+                if root.split(".")[0] == module:
+                    violations.append(module)
+                else:
+                    print(f"  note: {module} is imported indirectly by {root}")
+
+    ok = total_ms <= budget["max_total_ms"] and not violations
+    if violations:
+        print(f"❌ eagerly imported heavy modules: {', '.join(sorted(set(violations)))}")
+    if total_ms > budget["max_total_ms"]:
+        print(f"❌ import time over budget by {total_ms - budget['max_total_ms']:.0f} ms")
+    if ok:
+        print("✅ within budget")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("apps", nargs="*", help="app scripts to check (default: all apps with a budget)")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per app; the median is compared to the budget")
+    args = parser.parse_args()
+
+    apps = args.apps or list(BUDGETS)
+    results = [benchmark_app(app, BUDGETS.get(app, {"max_total_ms": float("inf")}), args.repeat) for app in apps]
+    sys.exit(0 if all(results) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Round-trip micro-benchmark for the PMS Supabase query helpers (PMS/pms_data.py).
+
+Runs each query pattern against a local stub of the supabase-py query builder that keeps
+tables in memory and sleeps ``--latency`` ms per request, standing in for the network
+round trip to Supabase. Reports requests, rows transferred and wall time per pattern and
+size, and exits non-zero when an optimized helper needs more round trips than its budget
+or returns something different from the old pattern.
+
+Usage (from the repository root):
+    python benchmarks/pms_queries.py
+    python benchmarks/pms_queries.py --sizes 10 100 1000 --latency 20
+"""
+
+import argparse
+import sys
+import time
+import uuid
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT / "PMS"))
+
+import pms_data  # noqa: E402
+
+
+def _value(row, column):
+    """Column value, resolving ``field->>key`` JSON paths like PostgREST."""
+    if "->>" in column:
+        field, key = column.split("->>", 1)
+        return (row.get(field) or {}).get(key)
+    return row.get(column)
+
+
+class StubQuery:
+    """The subset of the postgrest query builder the PMS helpers use."""
+
+    def __init__(self, client, table):
+        self.client = client
+        self.rows = client.tables.get(table, [])
+        self.columns = None
+        self.filters = []
+        self.order_by = None
+        self.row_limit = None
+
+    def select(self, columns="*"):
+        self.columns = None if columns == "*" else [c.strip() for c in columns.split(",")]
+        return self
+
+    def eq(self, column, value):
+        self.filters.append(lambda row: _value(row, column) == value)
+        return self
+
+    def in_(self, column, values):
+        values = set(values)
+        self.filters.append(lambda row: _value(row, column) in values)
+        return self
+
+    def order(self, column, desc=False):
+        self.order_by = (column, desc)
+        return self
+
+    def limit(self, count):
+        self.row_limit = count
+        return self
+
+    def _project(self, row):
+        if self.columns is None:
+            return dict(row)
+        out = {}
+        for column in self.columns:
+            alias, _, path = column.rpartition(":")
+            out[alias or path.split("->>")[-1]] = _value(row, path)
+        return out
+
+    def execute(self):
+        self.client.requests += 1
+        time.sleep(self.client.latency)
+        rows = [row for row in self.rows if all(f(row) for f in self.filters)]
+        if self.order_by:
+            column, desc = self.order_by
+            rows.sort(key=lambda row: row.get(column) or "", reverse=desc)
+        if self.row_limit is not None:
+            rows = rows[:self.row_limit]
+        self.client.rows_returned += len(rows)
+        return type("Response", (), {"data": [self._project(row) for row in rows]})()
+
+
+class StubClient:
+    def __init__(self, tables, latency_ms):
+        self.tables = tables
+        self.latency = latency_ms / 1000
+        self.requests = 0
+        self.rows_returned = 0
+
+    def table(self, name):
+        return StubQuery(self, name)
+
+
+def make_portfolio(size):
+    tds = [
+        {"id": str(uuid.uuid4()), "created_at": f"2024-01-{i % 28 + 1:02d}",
+         "metadata": {"product_name": f"Product {i}", "specs": {"x": "y" * 200}}}
+        for i in range(size)
+    ]
+    products = [
+        {"id": str(uuid.uuid4()), "tds_id": t["id"], "created_at": t["created_at"], "category": "Cement"}
+        for t in tds
+    ]
+    return {"tds_data": tds, "leanchem_products": products}
+
+
+CATEGORIES = ("Cement", "Paint & Coatings", "Dry-Mix Mortar", "Admixtures", "Polymers")
+
+
+def make_tds_catalog(size):
+    return {"tds_data": [
+        {"id": str(uuid.uuid4()), "brand": f"Brand {i % 7}", "owner": "Supplier",
+         "created_at": f"2024-{i % 12 + 1:02d}-01",
+         "metadata": {"category": CATEGORIES[i % len(CATEGORIES)], "product_type": f"Type {i % 11}",
+                      "product_name": f"Product {i}"}}
+        for i in range(size)
+    ]}
+
+
+# --- Query patterns ---
+
+def portfolio_names_n_plus_one(client):
+    """The old _lean_fetch_all: one tds_data query per product."""
+    rows = client.table("leanchem_products").select("*").order("created_at", desc=True).execute().data
+    names = {}
+    for r in rows:
+        md = ((client.table("tds_data").select("metadata").eq("id", r["tds_id"]).limit(1).execute().data or [{}])[0]
+              or {}).get("metadata") or {}
+        names[r["tds_id"]] = pms_data.tds_display_name(md)
+    return names
+
+
+def portfolio_names_batched(client):
+    rows = client.table("leanchem_products").select("*").order("created_at", desc=True).execute().data
+    return pms_data.fetch_tds_names(client, [r["tds_id"] for r in rows])
+
+
+def tds_by_category_client_side(client):
+    """The old _fetch_tds_by_cat_type / Manage TDS filter: whole table, filtered in Python."""
+    rows = client.table("tds_data").select("*").order("created_at", desc=True).execute().data
+    return [r["id"] for r in rows
+            if r["metadata"].get("category") == "Cement" and r["metadata"].get("product_type") == "Type 3"]
+
+
+def tds_by_category_server_side(client):
+    return [r["id"] for r in pms_data.query_tds(client, "id", category="Cement", product_type="Type 3")]
+
+
+# name -> (make tables(size), baseline, optimized, max requests of the optimized pattern for size)
+CASES = {
+    "leanchem portfolio TDS names": (
+        make_portfolio, portfolio_names_n_plus_one, portfolio_names_batched,
+        lambda size: 1 + -(-size // pms_data.IN_FILTER_CHUNK),
+    ),
+    "TDS list by category/type": (
+        make_tds_catalog, tds_by_category_client_side, tds_by_category_server_side,
+        lambda size: 1,
+    ),
+}
+
+
+def run(pattern, tables, latency_ms):
+    client = StubClient(tables, latency_ms)
+    start = time.perf_counter()
+    result = pattern(client)
+    return result, client.requests, client.rows_returned, (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 500])
+    parser.add_argument("--latency", type=float, default=5.0, help="simulated round trip per request (ms)")
+    args = parser.parse_args()
+
+    ok = True
+    for name, (make_tables, baseline, optimized, budget) in CASES.items():
+        print(f"\n=== {name} ===")
+        print(f"{'size':>6} | {'before: req':>11} {'rows':>6} {'ms':>8} | {'after: req':>10} {'rows':>6} {'ms':>8}")
+        for size in args.sizes:
+            tables = make_tables(size)
+            expected, base_requests, base_rows, base_ms = run(baseline, tables, args.latency)
+            result, requests, rows, ms = run(optimized, tables, args.latency)
+            print(f"{size:>6} | {base_requests:>11} {base_rows:>6} {base_ms:>8.1f} | {requests:>10} {rows:>6} {ms:>8.1f}")
+            if result != expected:
+                print("  ❌ results differ from the baseline")
+                ok = False
+            if requests > budget(size):
+                print(f"  ❌ {requests} requests, budget {budget(size)}")
+                ok = False
+    if ok:
+        print("\n✅ all patterns within budget")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
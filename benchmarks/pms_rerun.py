@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Rerun-latency benchmark for the PMS Streamlit app (PMS/pms.py).
+
+Runs the app headless with Streamlit's AppTest, signed in as a user with access to every
+module, against an in-memory Supabase stub (see pms_queries.py) with simulated latency.
+For each module it measures:
+
+* first run: a cold start of the module (script compiled, caches empty), as after a
+  deploy or an edit of the script;
+* rerun: the median wall time of the following reruns, i.e. the work Streamlit does on
+  every widget interaction.
+
+Usage (from the repository root; needs the PMS requirements installed):
+    python benchmarks/pms_rerun.py
+    python benchmarks/pms_rerun.py --reruns 10 --latency 20 chemical market
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+import uuid
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+APP = PROJECT_ROOT / "PMS" / "pms.py"
+sys.path.insert(0, str(PROJECT_ROOT / "benchmarks"))
+
+import pms_queries  # noqa: E402
+
+MODULES = ["chemical", "sourcing", "partner_master", "pricing", "leanchem", "market"]
+USER = {"id": "bench-user", "email": "daniel@leanchems.com", "role": "manager"}
+
+
+class AppStubQuery(pms_queries.StubQuery):
+    """Accepts every builder method the app uses; filters other than eq/in_ are ignored."""
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        if name == "not_":
+            return self
+        return lambda *args, **kwargs: self
+
+    def insert(self, payload, **kwargs):
+        rows = payload if isinstance(payload, list) else [payload]
+        for row in rows:
+            row.setdefault("id", str(uuid.uuid4()))
+            self.rows.append(row)
+        return self
+
+
+class _Noop:
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self
+
+    data = None
+
+
+class AppStubClient(pms_queries.StubClient):
+    auth = _Noop()
+    storage = _Noop()
+
+    def table(self, name):
+        self.tables.setdefault(name, [])
+        return AppStubQuery(self, name)
+
+    def rpc(self, name, params=None):
+        raise RuntimeError(f"rpc {name} is not available in the stub")
+
+
+def make_tables(size):
+    tables = pms_queries.make_tds_catalog(size)
+    tables["chemical_types"] = [
+        {"id": str(uuid.uuid4()), "name": f"Type {i}", "category": pms_queries.CATEGORIES[i % 5],
+         "industry_segments": ["Construction"], "functional_categories": ["Binder"], "metadata": {}}
+        for i in range(max(size // 5, 1))
+    ]
+    return tables
+
+
+def share_script_cache():
+    """
+    The Streamlit server compiles a script once and reuses the bytecode on every rerun
+    (Runtime keeps one ScriptCache). AppTest builds a new ScriptCache per run, which would
+    add a full parse and compile of the script to every measured rerun.
+    """
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+    from streamlit.testing.v1 import local_script_runner
+
+    shared = ScriptCache()
+    local_script_runner.ScriptCache = lambda: shared
+    return shared
+
+
+def benchmark(module, tables, latency_ms, reruns):
+    import streamlit as st
+    import supabase
+    from streamlit.testing.v1 import AppTest
+
+    client = AppStubClient(tables, latency_ms)
+    supabase.create_client = lambda *args, **kwargs: client  # pms.py calls create_client on every rerun
+    share_script_cache()
+    st.cache_data.clear()
+    st.cache_resource.clear()
+
+    at = AppTest.from_file(str(APP), default_timeout=120)
+    at.session_state["sb_user"] = USER
+    at.session_state["main_section"] = module
+    start = time.perf_counter()
+    at.run()
+    first_ms = (time.perf_counter() - start) * 1000
+    if at.exception:
+        print(f"  {module}: app raised {at.exception[0].value}")
+    timings, requests = [], []
+    for _ in range(reruns):
+        client.requests = 0
+        start = time.perf_counter()
+        at.run()
+        timings.append((time.perf_counter() - start) * 1000)
+        requests.append(client.requests)
+    return first_ms, statistics.median(timings), statistics.median(requests)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("modules", nargs="*", default=MODULES)
+    parser.add_argument("--reruns", type=int, default=5)
+    parser.add_argument("--rows", type=int, default=200, help="tds_data rows in the stub")
+    parser.add_argument("--latency", type=float, default=5.0, help="simulated round trip per request (ms)")
+    args = parser.parse_args()
+
+    os.environ.setdefault("SUPABASE_URL", "https://stub.supabase.co")
+    os.environ.setdefault("SUPABASE_KEY", "stub")
+    tables = make_tables(args.rows)
+    benchmark(args.modules[0], tables, args.latency, 1)  # imports the app's dependencies outside the timings
+    print(f"{'module':<16} {'first run ms':>13} {'rerun ms':>9} {'requests/rerun':>15}")
+    for module in args.modules:
+        first_ms, ms, requests = benchmark(module, tables, args.latency, args.reruns)
+        print(f"{module:<16} {first_ms:>13.1f} {ms:>9.1f} {requests:>15.0f}")
+
+
+if __name__ == "__main__":
+    main()
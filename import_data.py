@@ -0,0 +1,469 @@
+"""
+Cached, columnar access to the import-history dataset.
+
+The dataset is assets/Import Data - RAG.xlsx plus any workbook dropped into
+assets/import_data/. Every sheet with a trader column and year columns is loaded; the
+schema is detected from the header (``Trader``/``Importer``/``Customer``/``Company``,
+any year-like column such as ``2024``, and an optional ``Grand Total``), so a new year
+or an extra HS-code sheet needs no code change.
+
+Parsing xlsx with openpyxl takes seconds, so each workbook is converted once into NumPy
+arrays saved in an .npz file under CACHE_DIR, keyed by the workbook's mtime and size.
+Adding a workbook only converts that file; the others are read from their .npz in
+milliseconds and within a process everything is memoized. Trader names are normalized
+once at conversion time so fuzzy matching is a single vectorized RapidFuzz ``cdist``
+call instead of a Python loop over every trader.
+
+Used by the logistics CRM (customer import history and the batch enrichment of all
+customers) and by the PMS market analysis, which queries per-trader aggregates that are
+precomputed once per dataset version (get_trader_aggregates) with vectorized filters,
+Pareto ranking and year pivots. pandas is only imported when a workbook has to be
+re-read or a result table is built.
+"""
+
+import hashlib
+import os
+import re
+import threading
+from dataclasses import dataclass, replace
+from pathlib import Path
+
+import numpy as np
+
+PROJECT_ROOT = Path(__file__).resolve().parent
+DEFAULT_WORKBOOK = PROJECT_ROOT / "assets" / "Import Data - RAG.xlsx"
+IMPORT_DATA_DIR = PROJECT_ROOT / "assets" / "import_data"  # additional workbooks (new years, HS-code sheets)
+CACHE_DIR = Path(os.getenv("IMPORT_DATA_CACHE_DIR", PROJECT_ROOT / ".cache" / "import_data"))
+CACHE_VERSION = 2  # bump when the cached array layout changes
+
+TRADER_COLUMNS = ("trader", "importer", "customer", "company")
+TOTAL_COLUMNS = ("grand total", "total")
+YEAR_PATTERN = re.compile(r"^(19|20)\d{2}(\.0)?$")
+MATCH_THRESHOLD = 70
+# An HS code in a sheet name: 6-10 digits, optionally dotted or spaced ("390430", "HS 3904.30")
+HS_CODE_PATTERN = re.compile(r"(?<!\d)\d{4}[.\s]?\d{2}(?:[.\s]?\d{2}){0,2}(?!\d)")
+
+
+@dataclass(frozen=True)
+class ImportIndex:
+    """Columnar view of the dataset: one row per trader and sheet, volumes in K tons."""
+    traders: np.ndarray      # original (stripped) trader names
+    normalized: tuple        # normalize_trader_name(trader), aligned with ``traders``
+    years: tuple             # year column labels (ints, ascending), aligned with the columns of ``volumes``
+    volumes: np.ndarray      # float64, shape (len(traders), len(years)); NaN where empty
+    grand_total: np.ndarray  # float64, shape (len(traders),)
+    sheets: np.ndarray = None  # "<workbook>/<sheet>" each row came from
+    source_key: str = ""     # identifies the dataset version the index was built from
+
+    def __len__(self):
+        return len(self.traders)
+
+    def year_volumes(self, row: int) -> dict:
+        return {year: self.volumes[row, col] for col, year in enumerate(self.years)}
+
+
+_index_cache = {}
+_dataset_cache = {}
+_index_lock = threading.Lock()
+
+
+def normalize_trader_name(name) -> str:
+    """Lower-case and collapse whitespace so names compare the same way on both sides."""
+    return " ".join(str(name).lower().split())
+
+
+def discover_workbooks():
+    """The main workbook followed by every .xlsx in IMPORT_DATA_DIR (sorted by name)."""
+    paths = [DEFAULT_WORKBOOK]
+    if IMPORT_DATA_DIR.is_dir():
+        paths += sorted(p for p in IMPORT_DATA_DIR.glob("*.xlsx") if not p.name.startswith("~$"))
+    return paths
+
+
+def _source_key(path: Path):
+    stat = path.stat()
+    return (CACHE_VERSION, stat.st_mtime_ns, stat.st_size)
+
+
+def _format_source_key(path: Path, key) -> str:
+    return f"{path.name}:{'-'.join(str(part) for part in key)}"
+
+
+def _cache_file(path: Path) -> Path:
+    digest = hashlib.sha1(str(path).encode("utf-8")).hexdigest()[:8]
+    return CACHE_DIR / f"{path.stem}-{digest}.npz"
+
+
+def detect_columns(columns):
+    """
+    Map a sheet header to ``(trader_column, {year: column}, total_column)``.
+
+    Returns None when the sheet has no trader column or no year columns (notes, pivots).
+    """
+    trader = total = None
+    years = {}
+    for col in columns:
+        label = str(col).strip()
+        if trader is None and label.lower() in TRADER_COLUMNS:
+            trader = col
+        elif total is None and label.lower() in TOTAL_COLUMNS:
+            total = col
+        elif YEAR_PATTERN.match(label):
+            years.setdefault(int(float(label)), col)
+    if trader is None or not years:
+        return None
+    return trader, dict(sorted(years.items())), total
+
+
+def _read_sheet(df, schema):
+    import pandas as pd
+
+    trader_col, year_cols, total_col = schema
+    df = df[df[trader_col].notna()]
+    volumes = np.column_stack([
+        pd.to_numeric(df[col], errors="coerce").to_numpy(dtype=float) for col in year_cols.values()
+    ])
+    if total_col is not None:
+        grand_total = pd.to_numeric(df[total_col], errors="coerce").to_numpy(dtype=float)
+    else:
+        grand_total = np.where(np.isnan(volumes).all(axis=1), np.nan, np.nansum(volumes, axis=1))
+    traders = df[trader_col].astype(str).str.strip().to_numpy(dtype=str)
+    return traders, tuple(year_cols), volumes, grand_total
+
+
+def _read_workbook(path: Path) -> ImportIndex:
+    import pandas as pd
+
+    parts = []
+    for sheet, df in pd.read_excel(path, sheet_name=None, engine="openpyxl").items():
+        schema = detect_columns(df.columns)
+        if schema is not None:
+            parts.append((f"{path.name}/{sheet}", *_read_sheet(df, schema)))
+    if not parts:
+        raise ValueError(
+            f"No sheet in {path.name} has a trader column ({', '.join(TRADER_COLUMNS)}) and year columns"
+        )
+    return _concat([
+        ImportIndex(
+            traders=traders,
+            normalized=tuple(normalize_trader_name(t) for t in traders),
+            years=years,
+            volumes=volumes,
+            grand_total=grand_total,
+            sheets=np.full(len(traders), sheet),
+        )
+        for sheet, traders, years, volumes, grand_total in parts
+    ])
+
+
+def _concat(indexes) -> ImportIndex:
+    """Stack indexes row-wise over the union of their years (missing years are NaN)."""
+    if len(indexes) == 1:
+        return indexes[0]
+    years = tuple(sorted({year for index in indexes for year in index.years}))
+    volumes = []
+    for index in indexes:
+        block = np.full((len(index), len(years)), np.nan)
+        block[:, [years.index(year) for year in index.years]] = index.volumes
+        volumes.append(block)
+    return ImportIndex(
+        traders=np.concatenate([index.traders for index in indexes]),
+        normalized=tuple(name for index in indexes for name in index.normalized),
+        years=years,
+        volumes=np.vstack(volumes),
+        grand_total=np.concatenate([index.grand_total for index in indexes]),
+        sheets=np.concatenate([index.sheets for index in indexes]),
+    )
+
+
+def _save_cache(cache_file: Path, key, index: ImportIndex):
+    cache_file.parent.mkdir(parents=True, exist_ok=True)
+    tmp_file = cache_file.with_suffix(f".{os.getpid()}.tmp.npz")
+    np.savez(
+        tmp_file,
+        key=np.array(key, dtype=np.int64),
+        traders=index.traders,
+        normalized=np.array(index.normalized, dtype=str),
+        years=np.array(index.years, dtype=np.int64),
+        volumes=index.volumes,
+        grand_total=index.grand_total,
+        sheets=index.sheets,
+    )
+    os.replace(tmp_file, cache_file)  # atomic, so concurrent readers never see a partial file
+
+
+def _load_cache(cache_file: Path, key):
+    if not cache_file.exists():
+        return None
+    try:
+        with np.load(cache_file, allow_pickle=False) as data:
+            if tuple(int(v) for v in data["key"]) != key:
+                return None
+            return ImportIndex(
+                traders=data["traders"],
+                normalized=tuple(data["normalized"].tolist()),
+                years=tuple(data["years"].tolist()),
+                volumes=data["volumes"],
+                grand_total=data["grand_total"],
+                sheets=data["sheets"],
+            )
+    except Exception:
+        return None  # unreadable or stale layout: rebuild from the workbook
+
+
+def load_import_index(path=DEFAULT_WORKBOOK) -> ImportIndex:
+    """
+    Return the columnar index for one workbook (all its sheets), converting it only when
+    it changed.
+
+    Raises FileNotFoundError when the workbook is missing and ValueError when no sheet
+    has a trader column and year columns.
+    """
+    path = Path(path).resolve()
+    if not path.exists():
+        raise FileNotFoundError(f"Import history file not found at: {path}")
+    key = _source_key(path)
+    with _index_lock:
+        cached = _index_cache.get(path)
+        if cached and cached[0] == key:
+            return cached[1]
+        cache_file = _cache_file(path)
+        index = _load_cache(cache_file, key)
+        if index is None:
+            index = _read_workbook(path)
+            try:
+                _save_cache(cache_file, key, index)
+            except OSError:
+                pass  # read-only deployments still get the in-process cache
+        index = replace(index, source_key=_format_source_key(path, key))
+        _index_cache[path] = (key, index)
+        return index
+
+
+def load_import_dataset(paths=None) -> ImportIndex:
+    """
+    Every workbook of the dataset (default: discover_workbooks()) as one index.
+
+    Each workbook is cached on its own, so adding or replacing a workbook only converts
+    that file. The merged ``source_key`` changes whenever any workbook changes.
+    """
+    indexes = [load_import_index(path) for path in (paths or discover_workbooks())]
+    source_key = "|".join(index.source_key for index in indexes)
+    with _index_lock:
+        dataset = _dataset_cache.get(source_key)
+        if dataset is None:
+            dataset = replace(_concat(indexes), source_key=source_key)
+            _dataset_cache.clear()  # only the current dataset version is worth keeping
+            _dataset_cache[source_key] = dataset
+        return dataset
+
+
+def load_trader_index() -> ImportIndex:
+    """The dataset collapsed to one row per trader (volumes summed over sheets and workbooks)."""
+    return get_trader_aggregates().by_trader
+
+
+def match_traders(names, index: ImportIndex = None, threshold: int = MATCH_THRESHOLD):
+    """
+    Fuzzy-match many names against all traders in one vectorized pass.
+
+    Returns a list aligned with ``names`` of ``(row, score)`` for the best trader scoring at
+    least ``threshold`` (ties go to the first trader, as before), or None.
+    """
+    from rapidfuzz import fuzz, process
+
+    if index is None:
+        index = load_trader_index()
+    queries = [normalize_trader_name(name) for name in names]
+    if not queries or not len(index):
+        return [None] * len(queries)
+    # Scores are rounded like thefuzz's fuzz.ratio, so allow values that round up to the threshold
+    scores = np.rint(process.cdist(
+        queries, index.normalized, scorer=fuzz.ratio, score_cutoff=threshold - 0.5, workers=-1
+    ))
+    best_rows = scores.argmax(axis=1)
+    best_scores = scores[np.arange(len(queries)), best_rows]
+    return [
+        (int(row), int(score)) if score >= threshold else None
+        for row, score in zip(best_rows, best_scores)
+    ]
+
+
+def match_record(index: ImportIndex, row: int, score: int) -> dict:
+    """Plain-dict (JSON-serializable) view of one trader match: {'trader_name', 'score', '<year>'..., 'grand_total'}."""
+    def as_float(value):
+        return None if np.isnan(value) else float(value)
+
+    result = {"trader_name": str(index.traders[row]), "score": score}
+    for year, volume in index.year_volumes(row).items():
+        result[str(year)] = as_float(volume)
+    result["grand_total"] = as_float(index.grand_total[row])
+    return result
+
+
+def find_best_trader(customer_name: str, index: ImportIndex = None, threshold: int = MATCH_THRESHOLD):
+    """Best trader match for one customer (see match_record), or None."""
+    if index is None:
+        index = load_trader_index()
+    match = match_traders([customer_name], index, threshold)[0]
+    return match_record(index, *match) if match else None
+
+
+# --- Analytics (PMS market analysis) ---
+
+def sheet_hs_code(sheet) -> str:
+    """Digits of the HS code in a row's sheet name ("<workbook>/<sheet>"), or "" (e.g. "Sheet1")."""
+    match = HS_CODE_PATTERN.search(str(sheet).rsplit("/", 1)[-1])
+    return re.sub(r"\D", "", match.group()) if match else ""
+
+
+@dataclass(frozen=True)
+class TraderAggregates:
+    """Row-level search arrays plus per-trader totals, precomputed once per dataset version."""
+    index: ImportIndex      # row-level dataset (one row per trader and sheet)
+    names: np.ndarray       # normalized trader name per row, for vectorized substring filters
+    hs_codes: np.ndarray    # HS code digits from the row's sheet name ("" when the sheet has none)
+    codes: np.ndarray       # trader number of every row of ``index``
+    by_trader: ImportIndex  # one row per trader: volumes and Grand Total summed over all sheets
+
+    @property
+    def years(self):
+        return self.index.years
+
+    def __len__(self):
+        return len(self.index)
+
+
+_aggregates_cache = {}
+
+
+def get_trader_aggregates(index: ImportIndex = None) -> TraderAggregates:
+    """Group the dataset by normalized trader name (memoized per dataset version)."""
+    if index is None:
+        index = load_import_dataset()
+    with _index_lock:
+        cached = _aggregates_cache.get(index.source_key)
+        if cached is not None:
+            return cached
+    normalized, first_rows, codes = np.unique(
+        np.array(index.normalized, dtype=str), return_index=True, return_inverse=True
+    )
+    # np.unique sorts traders alphabetically; number them in workbook order instead, so that
+    # match_traders() ties go to the first trader of the workbook
+    order = np.argsort(first_rows, kind="stable")
+    normalized, first_rows = normalized[order], first_rows[order]
+    renumber = np.empty_like(order)
+    renumber[order] = np.arange(len(order))
+    codes = renumber[codes.reshape(-1)]
+    volumes = np.full((len(normalized), len(index.years)), np.nan)
+    present = ~np.isnan(index.volumes)
+    for col in range(len(index.years)):
+        rows = present[:, col]
+        sums = np.bincount(codes[rows], weights=index.volumes[rows, col], minlength=len(normalized))
+        # Keep NaN for traders without any value in that year
+        volumes[:, col] = np.where(np.bincount(codes[rows], minlength=len(normalized)) > 0, sums, np.nan)
+    by_trader = ImportIndex(
+        traders=index.traders[first_rows],
+        normalized=tuple(normalized.tolist()),
+        years=index.years,
+        volumes=volumes,
+        grand_total=np.bincount(codes, weights=np.nan_to_num(index.grand_total), minlength=len(normalized)),
+        sheets=np.full(len(normalized), ""),
+        source_key=index.source_key,
+    )
+    sheets = index.sheets if index.sheets is not None else np.full(len(index), "")
+    aggregates = TraderAggregates(
+        index=index,
+        names=np.array(index.normalized, dtype=str),
+        hs_codes=np.array([sheet_hs_code(sheet) for sheet in sheets.tolist()], dtype=str),
+        codes=codes,
+        by_trader=by_trader,
+    )
+    with _index_lock:
+        _aggregates_cache.clear()
+        _aggregates_cache[index.source_key] = aggregates
+    return aggregates
+
+
+def filter_traders(aggregates: TraderAggregates, *terms, hs_code: str = None) -> np.ndarray:
+    """
+    Boolean row mask: the trader name contains every non-empty term, and the row matches
+    ``hs_code``. A row matches an HS code when its sheet's HS code starts with the code's
+    digits, or, for rows from sheets without an HS code, when the trader name contains it.
+    Workbook and sheet names are never searched as text.
+    """
+    mask = np.ones(len(aggregates), dtype=bool)
+    for term in terms:
+        term = normalize_trader_name(term or "")
+        if term:
+            mask &= np.char.find(aggregates.names, term) >= 0
+    hs_term = normalize_trader_name(hs_code or "")
+    if hs_term:
+        digits = re.sub(r"\D", "", hs_term)
+        in_name = np.char.find(aggregates.names, hs_term) >= 0
+        has_code = aggregates.hs_codes != ""
+        in_sheet = np.char.startswith(aggregates.hs_codes, digits) if digits else np.zeros(len(aggregates), dtype=bool)
+        mask &= np.where(has_code, in_sheet, in_name)
+    return mask
+
+
+def volume_by_year(aggregates: TraderAggregates, mask: np.ndarray) -> dict:
+    """{year: total volume} over the selected rows."""
+    sums = np.nansum(aggregates.index.volumes[mask], axis=0)
+    return {year: float(total) for year, total in zip(aggregates.years, sums)}
+
+
+def _per_trader(aggregates: TraderAggregates, mask: np.ndarray, values: np.ndarray):
+    """Sum ``values`` (one per row, or rows x columns) of the selected rows per trader; returns (trader numbers, sums)."""
+    codes = aggregates.codes[mask]
+    selected = np.unique(codes)
+    values = np.nan_to_num(values[mask])
+    if values.ndim == 1:
+        return selected, np.bincount(codes, weights=values, minlength=len(aggregates.by_trader))[selected]
+    sums = np.column_stack([
+        np.bincount(codes, weights=values[:, col], minlength=len(aggregates.by_trader))[selected]
+        for col in range(values.shape[1])
+    ]) if values.shape[1] else np.zeros((len(selected), 0))
+    return selected, sums
+
+
+def pareto_analysis(aggregates: TraderAggregates, mask: np.ndarray, share: float = 80.0) -> dict:
+    """
+    Rank the selected traders by Grand Total and find the key customers that together make
+    up ``share`` percent of the volume (cumulative share <= ``share``).
+    """
+    import pandas as pd
+
+    traders, totals = _per_trader(aggregates, mask, aggregates.index.grand_total)
+    order = np.argsort(-totals, kind="stable")
+    totals = totals[order]
+    grand_total = totals.sum()
+    shares = totals / grand_total * 100 if grand_total else np.zeros_like(totals)
+    cumulative = np.cumsum(shares)
+    key_count = int(np.count_nonzero(cumulative <= share))
+    ranked = pd.DataFrame({
+        "Customer": aggregates.by_trader.traders[traders[order]],
+        "Total Volume": totals,
+        "Share %": shares,
+        "Cumulative %": cumulative,
+    })
+    return {
+        "ranked": ranked,
+        "total_customers": len(ranked),
+        "key_customers": key_count,
+        "concentration": float(cumulative[key_count - 1]) if key_count else 0.0,
+        "total_volume": float(grand_total),
+    }
+
+
+def year_pivot(aggregates: TraderAggregates, mask: np.ndarray):
+    """Customer x year volume table (plus Total), largest first; traders without any volume are dropped."""
+    import pandas as pd
+
+    traders, volumes = _per_trader(aggregates, mask, aggregates.index.volumes)
+    keep = (volumes > 0).any(axis=1)
+    pivot = pd.DataFrame(volumes[keep], index=aggregates.by_trader.traders[traders[keep]], columns=list(aggregates.years))
+    pivot.index.name = "Customer"
+    pivot.columns.name = "Year"
+    pivot["Total"] = pivot.sum(axis=1)
+    return pivot.sort_values("Total", ascending=False)
@@ -1,7 +1,6 @@
 import os
 import streamlit as st
 from streamlit_lottie import st_lottie
-import openpyxl  # Explicitly import openpyxl for Excel file reading
 # Streamlit page configuration must be the first Streamlit command
 st.set_page_config(
     page_title="AI Powered CRM",
@@ -10,8 +9,6 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 from dotenv import load_dotenv
-from openai import OpenAI
-from mem0 import Memory
 import supabase
 from supabase.client import Client, ClientOptions
 from pathlib import Path
@@ -19,122 +16,62 @@ import uuid
 import sys
 from tenacity import retry, stop_after_attempt, wait_exponential
 import re
-import openai
 import locale
-from PyPDF2 import PdfReader, PdfWriter
 from thefuzz import fuzz
 import datetime
-import pandas as pd
 import json
 import requests
 import urllib.parse
-from serpapi import GoogleSearch  # Keep SerpAPI for combined results
-from bs4 import BeautifulSoup
-import numpy as np
-from fpdf import FPDF
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
-from reportlab.lib.utils import ImageReader
 import io
+import hashlib
+import zipfile
+import atexit
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 def search_customer_import_history(customer_name: str, debug=False):
     """
-    Search for customer import history in the Excel file using fuzzy matching.
+    Search for customer import history in the import workbooks using fuzzy matching.
+    The workbooks are converted once (per file change) into a cached columnar index,
+    see import_data.py, so a lookup is one vectorized RapidFuzz match instead of an
+    xlsx parse plus a loop over every trader.
     Returns import data if found, None otherwise.
     """
     try:
-        # Explicitly import openpyxl to ensure it's available
-        import openpyxl
-        
-        # Read the Excel file (assets folder located in parent directory)
-        excel_path = Path("assets") / "Import Data - RAG.xlsx"
+        from import_data import DEFAULT_WORKBOOK, MATCH_THRESHOLD, discover_workbooks, find_best_trader, load_trader_index
+
+        excel_path = DEFAULT_WORKBOOK
         
         if debug:
-            st.info(f"🔍 Looking for import history file at: {excel_path}")
-            st.info(f"🔍 Current working directory: {Path.cwd()}")
+            st.info(f"🔍 Looking for import history workbooks: {[str(p) for p in discover_workbooks()]}")
             st.info(f"🔍 File exists: {excel_path.exists()}")
         
         # Check if file exists
         if not excel_path.exists():
             st.error(f"❌ Import history file not found at: {excel_path}")
-            if debug:
-                st.info(f"🔍 Available files in assets directory:")
-                assets_dir = excel_path.parent
-                if assets_dir.exists():
-                    for file in assets_dir.iterdir():
-                        st.info(f"  - {file.name}")
-                else:
-                    st.info(f"  - Assets directory does not exist: {assets_dir}")
-            return None
-            
-        # Try to read the Excel file with explicit engine specification
-        try:
-            df = pd.read_excel(excel_path, engine='openpyxl')
-        except ImportError as ie:
-            st.error(f"❌ openpyxl is not installed. Please install it with: pip install openpyxl")
             return None
-        except Exception as excel_error:
-            st.error(f"❌ Error reading Excel file: {str(excel_error)}")
-            return None
-        
-        if debug:
-            st.info(f"✅ Successfully loaded Excel file")
-            st.info(f"🔍 File shape: {df.shape}")
-            st.info(f"🔍 Columns: {list(df.columns)}")
-            st.info(f"🔍 First few rows:")
-            st.dataframe(df.head())
         
-        # Check if required columns exist
-        required_columns = ['Trader', 2022, 2023, 'Grand Total']
-        missing_columns = [col for col in required_columns if col not in df.columns]
-        if missing_columns:
-            st.error(f"❌ Missing required columns in import history file: {missing_columns}")
-            if debug:
-                st.info(f"🔍 Available columns: {list(df.columns)}")
-            return None
-        
-        # Clean the trader names (remove extra spaces, convert to string)
-        df['Trader'] = df['Trader'].astype(str).str.strip()
-        
-        # Find the best match using fuzzy matching
-        best_match = None
-        best_score = 0
-        threshold = 70  # Minimum similarity score
+        index = load_trader_index()
         
         if debug:
+            st.info(f"✅ Loaded import index: {len(index)} traders, years {list(index.years)}")
             st.info(f"🔍 Searching for customer: '{customer_name}'")
-            st.info(f"🔍 Using threshold: {threshold}%")
+            st.info(f"🔍 Using threshold: {MATCH_THRESHOLD}%")
         
-        for idx, trader_name in enumerate(df['Trader']):
-            # Calculate similarity score
-            score = fuzz.ratio(customer_name.lower(), trader_name.lower())
-            
-            if debug and idx < 5:  # Show first 5 matches for debugging
-                st.info(f"🔍 '{trader_name}' -> Score: {score}%")
-            
-            if score > best_score and score >= threshold:
-                best_score = score
-                best_match = {
-                    'trader_name': trader_name,
-                    'score': score,
-                    '2022': df.iloc[idx][2022],
-                    '2023': df.iloc[idx][2023],
-                    'grand_total': df.iloc[idx]['Grand Total']
-                }
+        best_match = find_best_trader(customer_name, index)
         
         if debug:
             if best_match:
                 st.info(f"✅ Best match found: '{best_match['trader_name']}' with {best_match['score']}% confidence")
             else:
-                st.info(f"❌ No match found above {threshold}% threshold")
+                st.info(f"❌ No match found above {MATCH_THRESHOLD}% threshold")
         
         return best_match
         
-    except FileNotFoundError:
-        st.error(f"Import history file not found at: {excel_path}")
-        return None
-    except pd.errors.EmptyDataError:
-        st.error("Import history file is empty or corrupted")
+    except ValueError as ve:
+        st.error(f"❌ {str(ve)}")
         return None
     except ImportError as ie:
         if "openpyxl" in str(ie):
@@ -146,10 +83,116 @@ def search_customer_import_history(customer_name: str, debug=False):
         st.error(f"Error reading import history: {str(e)}")
         return None
 
+# --- Batch import-history enrichment ---
+def enrich_customers_with_import_history(force: bool = False):
+    """
+    Match every CRM customer against the import dataset in one vectorized pass and store
+    the match (trader, score, yearly volumes) on the customer row.
+    Incremental: only customers that were never matched, or were matched against an older
+    version of the workbook, are re-matched unless ``force`` is set.
+    Returns a summary dict.
+    """
+    from import_data import load_trader_index, match_record, match_traders
+
+    index = load_trader_index()
+    response = supabase_client.table('customers').select('customer_id, customer_name, import_source_key').execute()
+    customers = response.data or []
+    pending = [
+        c for c in customers
+        if c.get('customer_name') and (force or c.get('import_source_key') != index.source_key)
+    ]
+    summary = {'customers': len(customers), 'processed': len(pending), 'matched': 0}
+    if not pending:
+        return summary
+
+    matches = []
+    for customer, match in zip(pending, match_traders([c['customer_name'] for c in pending], index)):
+        record = match_record(index, *match) if match else None
+        summary['matched'] += 1 if record else 0
+        matches.append({
+            'customer_id': customer['customer_id'],
+            'import_match': record,
+            'import_total_volume': record['grand_total'] if record else None,
+            'import_source_key': index.source_key
+        })
+
+    try:
+        supabase_client.rpc('apply_customer_import_matches', {'matches': matches}).execute()
+    except Exception as e:
+        # RPC not deployed yet: fall back to one update per customer
+        print(f"apply_customer_import_matches RPC failed, updating row by row: {str(e)}")
+        matched_at = datetime.datetime.now().isoformat()
+        for m in matches:
+            supabase_client.table('customers').update({
+                'import_match': m['import_match'],
+                'import_total_volume': m['import_total_volume'],
+                'import_source_key': m['import_source_key'],
+                'import_matched_at': matched_at
+            }).eq('customer_id', m['customer_id']).execute()
+    return summary
+
+def get_customers_ranked_by_import_volume(limit: int = 100):
+    """Customers with an import-history match, largest total import volume first (indexed query)."""
+    response = supabase_client.table('customers') \
+        .select('customer_name, display_id, import_match, import_total_volume, import_matched_at') \
+        .not_.is_('import_total_volume', 'null') \
+        .order('import_total_volume', desc=True) \
+        .limit(limit) \
+        .execute()
+    return response.data or []
+
+def render_import_ranking_ui(user_id):
+    """Rank CRM customers by their matched import volume."""
+    from import_data import load_trader_index
+
+    st.title("📊 Customers by Import Volume")
+    col_new, col_all = st.columns(2)
+    with col_new:
+        match_new = st.button("Match New Customers", key="btn_match_new_imports",
+                              help="Match customers added since the last run.")
+    with col_all:
+        force = st.button("Re-match All Customers", key="btn_rematch_imports",
+                          help="Match every customer again, including those already matched.")
+    try:
+        # Scanning the customers for pending matches is only worth it when asked to, or once
+        # per session and workbook version; a normal page view is just the ranking query
+        source_key = load_trader_index().source_key
+        if match_new or force or st.session_state.get('import_enriched_source_key') != source_key:
+            with st.spinner("Matching customers against import history..."):
+                summary = enrich_customers_with_import_history(force=force)
+            st.session_state['import_enriched_source_key'] = source_key
+            if summary['processed']:
+                st.success(f"Matched {summary['matched']} of {summary['processed']} customers against the import dataset.")
+        ranked = get_customers_ranked_by_import_volume()
+    except Exception as e:
+        st.error(f"Error loading import history ranking: {str(e)}")
+        return
+
+    if not ranked:
+        st.info("No customers matched the import dataset yet.")
+        return
+    rows = []
+    for rank, customer in enumerate(ranked, 1):
+        match = customer.get('import_match') or {}
+        row = {
+            'Rank': rank,
+            'Customer': customer.get('customer_name'),
+            'ID': customer.get('display_id'),
+            'Matched Trader': match.get('trader_name'),
+            'Match %': match.get('score')
+        }
+        for key, value in match.items():
+            if key.isdigit():
+                row[f"{key} (K ton)"] = round(value or 0, 1)
+        row['Total (K ton)'] = round(customer.get('import_total_volume') or 0, 1)
+        rows.append(row)
+    st.dataframe(rows, use_container_width=True)
+
 def format_import_history(import_data):
     """
     Format import history data for display
     """
+    import pandas as pd
     if not import_data:
         return None
     
@@ -166,8 +209,8 @@ def format_import_history(import_data):
     
     try:
         return {
-            '2022': format_k_ton(import_data.get('2022', 0)),
-            '2023': format_k_ton(import_data.get('2023', 0)),
+            # Year keys are whatever years the import dataset has (e.g. '2022', '2023', ...)
+            'years': {key: format_k_ton(value) for key, value in import_data.items() if key.isdigit()},
             'grand_total': format_k_ton(import_data.get('grand_total', 0)),
             'confidence': f"{import_data.get('score', 0)}% match"
         }
@@ -345,6 +388,11 @@ project_root = Path(__file__).resolve().parent.parent
 dotenv_path = project_root / '.env'
 load_dotenv(dotenv_path, override=True)
 
+# Shared helpers (import_data.py, quote_engine.py) live at the repository root
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+from quote_engine import QUOTATION_LAYOUT, render_quote_pdf, render_quotes_batch
+
 # Initialize Supabase client
 supabase_url = os.environ.get("SUPABASE_URL", "")
 supabase_key = os.environ.get("SUPABASE_KEY", "")
@@ -430,13 +478,18 @@ def gemini_embed(text):
         st.error(f"Unexpected error in gemini_embed: {str(e)}")
         raise
 
-# Cache OpenAI client and Memory instance
+# Cache OpenAI client and Memory instance.
+# Both are created on first use rather than at import time: importing openai/mem0 and
+# building the mem0 Memory (LLM + vector store clients) would otherwise delay the first
+# page render on every cold start.
 @st.cache_resource
 def get_openai_client():
+    from openai import OpenAI
     return OpenAI()
 
 @st.cache_resource
 def get_memory():
+    from mem0 import Memory
     config = {
         "llm": {
             "provider": LLM_PROVIDER,
@@ -454,9 +507,119 @@ def get_memory():
     }
     return Memory.from_config(config)
 
-# Get cached resources
-openai_client = get_openai_client()
-memory = get_memory()
+# --- Deferred mem0 writes ---
+# memory.add() runs mem0's own LLM extraction plus a vector write, which used to block
+# the chat turn for seconds after the answer was already on screen. Writes are queued to
+# a background worker instead; turns from the same user that arrive within the coalesce
+# window are written as one batch.
+MEMORY_WRITE_QUEUE_SIZE = int(os.getenv('MEMORY_WRITE_QUEUE_SIZE', '200'))
+MEMORY_WRITE_COALESCE_SECONDS = float(os.getenv('MEMORY_WRITE_COALESCE_SECONDS', '2.0'))
+
+class MemoryWriteQueue:
+    """Bounded, per-user batching queue that performs mem0 ``add`` calls on a daemon thread."""
+
+    def __init__(self, memory_backend, maxsize: int = MEMORY_WRITE_QUEUE_SIZE,
+                 coalesce_seconds: float = MEMORY_WRITE_COALESCE_SECONDS):
+        self._memory = memory_backend
+        self._maxsize = maxsize
+        self._coalesce_seconds = coalesce_seconds
+        self._pending = OrderedDict()  # user_id -> list of queued turns (message lists)
+        self._due = OrderedDict()  # user_id -> monotonic time at which the user's batch is written
+        self._depth = 0
+        self._in_flight = 0
+        self._cond = threading.Condition()
+        self._metrics = {
+            "enqueued": 0, "coalesced": 0, "dropped": 0,
+            "batches_written": 0, "turns_written": 0, "failed": 0, "max_depth": 0,
+        }
+        self._thread = threading.Thread(target=self._run, name="mem0-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, messages: list, user_id: str) -> bool:
+        """Queue one chat turn for ``user_id``. Returns False (and counts a drop) when the queue is full."""
+        with self._cond:
+            if self._depth >= self._maxsize:
+                self._metrics["dropped"] += 1
+                dropped = self._metrics["dropped"]
+            else:
+                if user_id in self._pending:
+                    self._metrics["coalesced"] += 1
+                else:
+                    # Rapid follow-up turns from the same user join the batch until it is due
+                    self._due[user_id] = time.monotonic() + self._coalesce_seconds
+                self._pending.setdefault(user_id, []).append(list(messages))
+                self._depth += 1
+                self._metrics["enqueued"] += 1
+                self._metrics["max_depth"] = max(self._metrics["max_depth"], self._depth)
+                self._cond.notify()
+                return True
+        print(f"Memory write queue full ({self._maxsize}); dropped write #{dropped} for user {user_id}")
+        return False
+
+    def stats(self) -> dict:
+        """Snapshot of queue depth and write/drop counters."""
+        with self._cond:
+            return dict(self._metrics, depth=self._depth, in_flight=self._in_flight, capacity=self._maxsize)
+
+    def flush(self, timeout: float = 30.0) -> bool:
+        """Block until every queued write has been attempted (or ``timeout`` expires)."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._depth or self._in_flight:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def _take_due(self):
+        """Wait until at least one user's coalesce window has closed, then pop every such user."""
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                # Users are queued in order of their first pending turn, so the due ones come first
+                due = [user_id for user_id, at in self._due.items() if at <= now]
+                if due:
+                    break
+                if self._due:
+                    self._cond.wait(next(iter(self._due.values())) - now)
+                else:
+                    self._cond.wait()
+            batches = []
+            for user_id in due:
+                del self._due[user_id]
+                turns = self._pending.pop(user_id)
+                self._depth -= len(turns)
+                self._in_flight += len(turns)
+                batches.append((user_id, turns))
+            return batches
+
+    def _run(self):
+        while True:
+            for user_id, turns in self._take_due():
+                if len(turns) == 1:
+                    batch = turns[0]
+                else:
+                    # Only the conversation itself is worth extracting from; the per-turn system
+                    # prompts just repeat retrieved context (including earlier memories).
+                    batch = [m for turn in turns for m in turn if m.get("role") != "system"]
+                try:
+                    self._memory.add(batch, user_id=user_id)
+                    outcome = {"batches_written": 1, "turns_written": len(turns)}
+                except Exception as e:
+                    print(f"Background memory write failed for user {user_id}: {str(e)}")
+                    outcome = {"failed": len(turns)}
+                with self._cond:
+                    for key, value in outcome.items():
+                        self._metrics[key] += value
+                    self._in_flight -= len(turns)
+                    self._cond.notify_all()
+
+@st.cache_resource
+def get_memory_writer():
+    writer = MemoryWriteQueue(get_memory())
+    atexit.register(writer.flush, 10.0)
+    return writer
 
 def generate_customer_id():
     """Generate a unique customer ID"""
@@ -505,6 +668,8 @@ def find_similar_customers(customer_name: str, threshold: int = 80):
 
 def search_web_for_company(company_name: str):
     """Search the web for company information using both Google PSE, SerpAPI, and force-include Wikipedia and official site."""
+    from serpapi import GoogleSearch
+    from bs4 import BeautifulSoup
     try:
         combined_results = []
         # 1. Google PSE Search
@@ -600,6 +765,7 @@ def search_web_for_company(company_name: str):
 
 def search_linkedin_profiles_ethiopia(company_name: str):
     """Search for LinkedIn profiles in Ethiopia using both Google PSE and SerpAPI"""
+    from serpapi import GoogleSearch
     try:
         all_profiles = []
         
@@ -1199,16 +1365,17 @@ def create_new_customer(customer_name: str, user_id: str):
                 st.markdown("### 📊 Import History")
                 st.info(f"**Matched Customer:** {import_history['trader_name']} ({formatted_history['confidence']})")
                 
-                col1, col2, col3 = st.columns(3)
-                with col1:
-                    st.metric("2022 Import", formatted_history['2022'])
-                with col2:
-                    st.metric("2023 Import", formatted_history['2023'])
-                with col3:
+                year_volumes = formatted_history['years']
+                metric_cols = st.columns(len(year_volumes) + 1)
+                for col, (year, volume) in zip(metric_cols, year_volumes.items()):
+                    with col:
+                        st.metric(f"{year} Import", volume)
+                with metric_cols[-1]:
                     st.metric("Total Import", formatted_history['grand_total'])
                 
                 # Add import history to the profile
-                profile += f"\n\nImport History:\n- 2022: {formatted_history['2022']}\n- 2023: {formatted_history['2023']}\n- Total: {formatted_history['grand_total']}"
+                history_lines = "".join(f"\n- {year}: {volume}" for year, volume in year_volumes.items())
+                profile += f"\n\nImport History:{history_lines}\n- Total: {formatted_history['grand_total']}"
             
             # Store the enhanced profile
             state['profile'] = profile
@@ -1254,6 +1421,7 @@ def create_new_customer(customer_name: str, user_id: str):
         }
         try:
             response = supabase_client.table('logistics_customers').insert(data).execute()
+            invalidate_open_deals()
             if response.data:
                 # Clear the creation state first
                 st.session_state.customer_creation_state = None
@@ -1362,7 +1530,7 @@ def sign_out():
 @st.cache_data(ttl=300)  # Cache for 5 minutes
 def get_cached_memories(query, user_id):
     try:
-        return memory.search(query=query, user_id=user_id, limit=2)
+        return get_memory().search(query=query, user_id=user_id, limit=2)
     except Exception as e:
         st.error(f"Error retrieving memories: {str(e)}")
         return {"results": []}
@@ -1372,7 +1540,7 @@ def get_cached_memories(query, user_id):
 def get_llm_response(messages, model):
     try:
         if LLM_PROVIDER == 'openai':
-            return openai_client.chat.completions.create(
+            return get_openai_client().chat.completions.create(
                 model=model,
                 messages=messages,
                 stream=True
@@ -1434,6 +1602,7 @@ def store_customer_conversation(customer_name: str, user_input: str, ai_output:
         'input_conversation': [user_input],
         'output_conversation': [ai_output]
     }).execute()
+    invalidate_open_deals()
     return response.data
 
 def fetch_customer(customer_name: str):
@@ -1451,6 +1620,7 @@ def update_customer_memory(customer_id: str, new_input: str, new_output: str):
             'input_conversation': updated_inputs,
             'output_conversation': updated_outputs
         }).eq('customer_id', customer_id).execute()
+        invalidate_open_deals()
         return response.data
     return None
 
@@ -1606,9 +1776,9 @@ Customer context:
                         st.write(f"Interaction {i} (Similarity: {interaction['similarity']:.2f}):")
                         st.write(f"User: {interaction['input']}")
                         st.write(f"AI: {interaction['output']}")
-        # Create new memories from the conversation
+        # Create new memories from the conversation (written in the background)
         messages.append({"role": "assistant", "content": full_response})
-        memory.add(messages, user_id=user_id)
+        get_memory_writer().submit(messages, user_id=user_id)
         # --- New: Automatically store conversation if customer is mentioned ---
         try:
             if mentioned_customer:
@@ -2175,6 +2345,7 @@ def update_customer_interaction(customer_id: str, new_input: str, new_output: st
             'interaction_metadata': updated_metas,    # list of dicts (JSON)
             'updated_at': datetime.datetime.now().isoformat()
         }).eq('customer_id', customer_id).execute()
+        invalidate_open_deals()
         return response.data
     except Exception as e:
         print("Supabase update error:", e)
@@ -2232,6 +2403,7 @@ def retrieve_relevant_interactions(customer_id: str, query: str, top_k: int = 3)
 
 def extract_file_content(file):
     """Extract content from different file types"""
+    from PyPDF2 import PdfReader
     try:
         file_type = file.name.split('.')[-1].lower()
         
@@ -2262,15 +2434,145 @@ def extract_file_content(file):
     except Exception as e:
         raise Exception(f"Error extracting file content: {str(e)}")
 
+# --- Map-reduce document summarization ---
+# Large uploads are split into chunks that are summarized concurrently (map) and the
+# partial summaries are merged into the final analysis (reduce). Chunk summaries are
+# cached by content hash, so re-uploading an edited document only re-summarizes the
+# chunks that actually changed.
+SUMMARY_CHUNK_CHARS = int(os.getenv('SUMMARY_CHUNK_CHARS', '8000'))
+SUMMARY_MAX_CONCURRENCY = int(os.getenv('SUMMARY_MAX_CONCURRENCY', '4'))
+SUMMARY_CACHE_MAX_ENTRIES = int(os.getenv('SUMMARY_CACHE_MAX_ENTRIES', '2000'))
+SUMMARY_PROMPT_VERSION = "v1"  # bump when the map/reduce prompts change to invalidate the cache
+
+@st.cache_resource
+def get_chunk_summary_cache():
+    """Process-wide LRU of chunk summaries keyed by sha256 (shared across sessions and reruns)."""
+    return {"lock": threading.Lock(), "entries": OrderedDict(), "hits": 0, "misses": 0}
+
+def split_document_into_chunks(text: str, max_chars: int = SUMMARY_CHUNK_CHARS):
+    """
+    Split text into line-aligned chunks of at most ``max_chars`` characters.
+    Boundaries are content-defined: once a chunk is a quarter full it is closed after any
+    line whose hash hits the boundary condition, so an edit only shifts the chunk it lands
+    in and the following chunks re-synchronise (and keep their cache keys).
+    """
+    lines = [line.rstrip() for line in (text or "").splitlines() if line.strip()]
+    min_chars = max_chars // 4
+    chunks, current, size = [], [], 0
+    for line in lines:
+        # Hard-split pathological lines (e.g. PDFs extracted without newlines)
+        for start in range(0, len(line), max_chars):
+            piece = line[start:start + max_chars]
+            if current and size + len(piece) > max_chars:
+                chunks.append("\n".join(current))
+                current, size = [], 0
+            current.append(piece)
+            size += len(piece) + 1
+            if size >= min_chars and hashlib.sha1(piece.encode("utf-8")).digest()[0] % 8 == 0:
+                chunks.append("\n".join(current))
+                current, size = [], 0
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+def _cached_gemini_summary(cache: dict, system_prompt: str, user_prompt: str):
+    """Run a summarization prompt through Gemini, memoized by a hash of the prompt. Returns (text, cached)."""
+    key = hashlib.sha256(
+        f"{SUMMARY_PROMPT_VERSION}|{GEMINI_CHAT_MODEL}|{system_prompt}|{user_prompt}".encode("utf-8")
+    ).hexdigest()
+    with cache["lock"]:
+        if key in cache["entries"]:
+            cache["entries"].move_to_end(key)
+            cache["hits"] += 1
+            return cache["entries"][key], True
+        cache["misses"] += 1
+    summary = gemini_chat([
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt}
+    ])
+    with cache["lock"]:
+        cache["entries"][key] = summary
+        while len(cache["entries"]) > SUMMARY_CACHE_MAX_ENTRIES:
+            cache["entries"].popitem(last=False)
+    return summary, False
+
+def _summarize_concurrently(system_prompt: str, prompts: list, max_concurrency: int):
+    """Summarize prompts with at most ``max_concurrency`` Gemini calls in flight, preserving order."""
+    # Resolve the cache on the script thread; worker threads have no Streamlit context
+    cache = get_chunk_summary_cache()
+    if len(prompts) == 1:
+        return [_cached_gemini_summary(cache, system_prompt, prompts[0])]
+    with ThreadPoolExecutor(max_workers=max(1, min(max_concurrency, len(prompts)))) as executor:
+        return list(executor.map(lambda p: _cached_gemini_summary(cache, system_prompt, p), prompts))
+
+def summarize_document_map_reduce(text: str, system_prompt: str, map_instructions: str, build_final_prompt,
+                                  max_chars: int = SUMMARY_CHUNK_CHARS,
+                                  max_concurrency: int = SUMMARY_MAX_CONCURRENCY):
+    """
+    Summarize a document of any size.
+
+    Small documents go straight to ``build_final_prompt(text)``. Larger ones are chunked,
+    each chunk is condensed with ``map_instructions`` (concurrently, cached by hash), the
+    partial notes are merged level by level until they fit in one prompt, and the result is
+    passed to ``build_final_prompt``. Returns (summary, stats).
+    """
+    chunks = split_document_into_chunks(text, max_chars)
+    stats = {"chunks": len(chunks), "cached": 0, "reduce_rounds": 0}
+    if len(chunks) <= 1:
+        summary = gemini_chat([
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": build_final_prompt(text)}
+        ])
+        return summary, stats
+
+    # Map: condense every chunk. The prompt holds only the chunk, not its position, so a
+    # section's cached notes are reused when the same text appears in another upload; the
+    # partial notes are merged in document order below.
+    map_prompts = [f"{map_instructions}\n\nDocument section:\n{chunk}" for chunk in chunks]
+    results = _summarize_concurrently(system_prompt, map_prompts, max_concurrency)
+    stats["cached"] = sum(1 for _, cached in results if cached)
+    partials = [summary for summary, _ in results]
+
+    # Reduce: merge neighbouring partial notes until everything fits in a single prompt
+    while len(partials) > 1 and sum(len(p) for p in partials) > max_chars:
+        groups, current, size = [], [], 0
+        for partial in partials:
+            if current and size + len(partial) > max_chars:
+                groups.append(current)
+                current, size = [], 0
+            current.append(partial)
+            size += len(partial)
+        groups.append(current)
+        if len(groups) == len(partials):
+            break  # every partial already fills a prompt on its own; merging cannot shrink further
+        reduce_prompts = [
+            "Merge the following partial notes from consecutive sections of one document into a single "
+            "set of notes. Keep every concrete fact (names, products, quantities, prices, dates, requirements) "
+            "and drop repetition.\n\n" + "\n\n---\n\n".join(group)
+            for group in groups
+        ]
+        partials = [summary for summary, _ in _summarize_concurrently(system_prompt, reduce_prompts, max_concurrency)]
+        stats["reduce_rounds"] += 1
+
+    combined = "\n\n---\n\n".join(
+        f"[Notes {i}]\n{partial}" for i, partial in enumerate(partials, 1)
+    )
+    summary = gemini_chat([
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": build_final_prompt(combined)}
+    ])
+    return summary, stats
+
 def process_uploaded_file(file, customer_id: str):
     """Process uploaded file, extract content, and generate summary."""
     try:
         # Extract file content based on file type
         file_content = extract_file_content(file)
 
-        # Create a summary of the file content
-        summary_prompt = f"""Analyze the following document for LeanLogistiQ business development purposes:
-{file_content}
+        # Create a summary of the file content (map-reduce for large documents)
+        def build_summary_prompt(document_text):
+            return f"""Analyze the following document for LeanLogistiQ business development purposes:
+{document_text}
 
 Format the analysis to include:
 
@@ -2309,13 +2611,15 @@ Format the analysis to include:
 Return results in structured markdown with headings for each section.
 """
 
-        messages = [
-            {"role": "system", "content": "You are a document intelligence assistant specialized in logistics and supply chain (LeanLogistiQ). Your job is to analyze documents for CRM purposes: identify customer requirements, map opportunities to LeanLogistiQ services, flag decision makers and influencers, assign a sales stage, and propose next steps."},
-            {"role": "user", "content": summary_prompt}
-        ]
+        system_prompt = "You are a document intelligence assistant specialized in logistics and supply chain (LeanLogistiQ). Your job is to analyze documents for CRM purposes: identify customer requirements, map opportunities to LeanLogistiQ services, flag decision makers and influencers, assign a sales stage, and propose next steps."
+        map_instructions = (
+            "Condense this section of a larger document into concise notes for LeanLogistiQ business development. "
+            "Keep routes, volumes, Incoterms, HS codes, timelines, FX/payment terms, service expectations, "
+            "people and companies. Do not add information that is not in the section."
+        )
 
         # Get AI summary
-        summary = gemini_chat(messages)
+        summary, stats = summarize_document_map_reduce(file_content, system_prompt, map_instructions, build_summary_prompt)
 
         # Instead of storing directly, return the content and summary
         # update_customer_interaction(
@@ -2324,8 +2628,12 @@ Return results in structured markdown with headings for each section.
         #     f"File Analysis:\n{summary}"
         # )
 
+        message = "Document analyzed successfully! Review analysis below and save."
+        if stats["chunks"] > 1:
+            message += f" ({stats['chunks']} sections, {stats['cached']} reused from cache)"
+
         # Return both the file content and the generated summary
-        return True, "Document analyzed successfully! Review analysis below and save.", file_content, summary
+        return True, message, file_content, summary
     except Exception as e:
         return False, f"Error processing file: {str(e)}", None, None
 
@@ -2764,7 +3072,7 @@ def test_api_connectivity():
     openai_key = os.getenv('OPENAI_API_KEY')
     if openai_key:
         try:
-            response = openai_client.embeddings.create(
+            response = get_openai_client().embeddings.create(
                 input="test",
                 model="text-embedding-3-small"
             )
@@ -2935,98 +3243,259 @@ def generate_quote_with_items(
     start_y=380,   # moved down from 365 → 380 for better spacing below headers
     row_height=20
 ):
-    reader = PdfReader(template_path)
-    first_page = reader.pages[0]
-    width = float(first_page.mediabox.width)
-    height = float(first_page.mediabox.height)
-
-    # Create overlay for page 1 only (fields live on the first page)
-    packet = io.BytesIO()
-    can = canvas.Canvas(packet, pagesize=(width, height))
-    # We'll set font per-section: tiny for header fields, default for table
-
-    # --- COMPANY NAME (Customer Name aligned under Company Name label) ---
-    # Align left with the "COMPANY NAME" label position on the template
-    company_x = 61.5
-    # Move a lot higher (smaller offset = higher on page)
-    company_y_offset = 120.0
-    can.setFont("Helvetica", 6.5)
-    can.drawString(company_x, height - company_y_offset, customer_name)
-
-    # --- REPRESENTATIVE NAME (input field value) ---
-    # Draw just below or at the Representative Name field line on the template
-    representative_x = company_x
-    # Move higher and closer to label
-    representative_y_offset = company_y_offset + 8
-    if representative_name:
-        can.drawString(representative_x, height - representative_y_offset, representative_name)
-
-    # Reset to default font for items table rendering
-    can.setFont("Helvetica", 12)
-
-    # --- Column X positions with proper spacing to prevent overlap ---
-    x_name = 60      # Left-aligned with "NAME" header
-    x_unit_price = 180  # Right-aligned with "UNIT PRICE" header
-    x_quantity = 280  # Right-aligned with "QUANTITY" header  
-    x_vat = 380      # Right-aligned with "VAT" header
-    x_total = 480    # Right-aligned with "TOTAL PRICE" header
-
-    # --- Items table ---
-    y_position = start_y + 20  # moved down by 20pt to lower the table values
-    for item in items:
-        # Item name (left-aligned)
-        can.drawString(x_name, height - y_position, str(item["name"]))
-        
-        # Numbers (right-aligned with proper column widths to prevent overlap)
-        # Unit price - right align within a 80pt width
-        unit_price_text = str(item["unit_price"])
-        unit_price_width = can.stringWidth(unit_price_text, "Helvetica", 12)
-        unit_price_x = x_unit_price + 80 - unit_price_width
-        can.drawString(unit_price_x, height - y_position, unit_price_text)
-        
-        # Quantity - left align (changed from right align)
-        quantity_text = str(item["quantity"])
-        can.drawString(x_quantity, height - y_position, quantity_text)
-        
-        # VAT - right align within a 80pt width
-        vat_text = str(item["vat"])
-        vat_width = can.stringWidth(vat_text, "Helvetica", 12)
-        vat_x = x_vat + 80 - vat_width
-        can.drawString(vat_x, height - y_position, vat_text)
-        
-        # Total price - right align within a 100pt width
-        total_text = str(item["total_price"])
-        total_width = can.stringWidth(total_text, "Helvetica", 12)
-        total_x = x_total + 100 - total_width
-        can.drawString(total_x, height - y_position, total_text)
-        
-        y_position += row_height
-
-    can.save()
-
-    packet.seek(0)
-    overlay_pdf = PdfReader(packet)
-    output = PdfWriter()
-
-    # Merge overlay with page 1, and include remaining pages unchanged
-    for idx, page in enumerate(reader.pages):
-        base_page = page
-        if idx == 0:
-            base_page.merge_page(overlay_pdf.pages[0])
-        output.add_page(base_page)
-
-    # Ensure output directory exists
-    import os
-    output_dir = os.path.dirname(output_path)
-    if output_dir:
-        os.makedirs(output_dir, exist_ok=True)
-    
-    with open(output_path, "wb") as f:
-        output.write(f)
+    """Render a quote onto the cached template in memory and return the PDF bytes.
+
+    ``output_path`` is optional; when given the PDF is also written there.
+    """
+    pdf_bytes = render_quote_pdf(
+        template_path, customer_name, items,
+        representative_name=representative_name, layout=QUOTATION_LAYOUT,
+        start_y=start_y, row_height=row_height
+    )
+    if output_path:
+        output_dir = os.path.dirname(output_path)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        with open(output_path, "wb") as f:
+            f.write(pdf_bytes)
+    return pdf_bytes
+
+# --- Bulk quote generation from stored deals ---
+# analyze_deals_multi() writes a "CURRENT DEALS:" markdown table into every saved
+# interaction output. Bulk mode parses the latest table per customer, turns the open
+# deals into quote line items and renders every quote concurrently into one ZIP.
+OPEN_DEAL_STAGES = {'open', 'inprocess'}
+QUOTE_VAT_RATE = 0.15
+DEAL_NAME_COLUMNS = ('Product', 'Service/Route')
+DEAL_QTY_COLUMNS = ('Qty', 'Volume')
+# Units deal quantities and prices are stated in: (dimension, size in the dimension's base unit)
+QUOTE_UNITS = {
+    'g': ('mass', 0.001), 'gram': ('mass', 0.001), 'grams': ('mass', 0.001),
+    'kg': ('mass', 1), 'kgs': ('mass', 1), 'kilo': ('mass', 1), 'kilos': ('mass', 1),
+    'kilogram': ('mass', 1), 'kilograms': ('mass', 1),
+    'mt': ('mass', 1000), 't': ('mass', 1000), 'ton': ('mass', 1000), 'tons': ('mass', 1000),
+    'tonne': ('mass', 1000), 'tonnes': ('mass', 1000),
+    'l': ('volume', 1), 'lt': ('volume', 1), 'ltr': ('volume', 1), 'liter': ('volume', 1),
+    'liters': ('volume', 1), 'litre': ('volume', 1), 'litres': ('volume', 1),
+}
+
+def parse_deal_table(output_text: str, section: str = 'CURRENT DEALS:'):
+    """Parse a markdown deal table from an interaction output into dicts keyed by column header."""
+    if not output_text or section not in output_text:
+        return []
+    rows, headers = [], None
+    for line in output_text.split(section, 1)[1].split('\n'):
+        line = line.strip()
+        if not line:
+            if headers:
+                break
+            continue
+        if not line.startswith('|'):
+            if headers:
+                break  # next section
+            continue
+        cells = [cell.strip() for cell in line.strip('|').split('|')]
+        if headers is None:
+            headers = cells
+        elif all(set(cell) <= set('-: ') for cell in cells):
+            continue  # separator row
+        elif any(cell not in ('', '…', '...') for cell in cells):
+            rows.append(dict(zip(headers, cells)))
+    return rows
+
+def _deal_field(deal: dict, columns):
+    for column in columns:
+        if deal.get(column):
+            return deal[column]
+    return ''
+
+def _parse_amount(text: str):
+    """First number in a free-text amount ("1,200 USD/kg", "25 MT") or None."""
+    match = re.search(r'\d[\d,]*(?:\.\d+)?', str(text or ''))
+    if not match:
+        return None
+    try:
+        return float(match.group(0).replace(',', ''))
+    except ValueError:
+        return None
+
+def _amount_unit(text: str, per: bool = False):
+    """
+    Unit of a free-text amount, lowercased: the word after the number of a quantity ("25 MT"),
+    or with ``per`` the unit a price is quoted per ("1,200 USD/kg", "ETB 900 per bag"). '' if none.
+    """
+    number = r'(?:/|\bper\s+)' if per else r'\d[\d,]*(?:\.\d+)?\s*'
+    match = re.search(number + r'(?:metric\s+)?([a-z]+)', str(text or '').lower())
+    return match.group(1) if match else ''
+
+def _quantity_in_price_units(qty: float, qty_unit: str, price_unit: str):
+    """
+    The quantity expressed in the unit the price is quoted per (25 MT at a price per kg -> 25000),
+    or None when the units cannot be reconciled. A unit stated on one side only is assumed to
+    apply to both.
+    """
+    if not qty_unit or not price_unit or qty_unit.rstrip('s') == price_unit.rstrip('s'):
+        return qty
+    qty_dim, price_dim = QUOTE_UNITS.get(qty_unit), QUOTE_UNITS.get(price_unit)
+    if qty_dim and price_dim and qty_dim[0] == price_dim[0]:
+        return qty * qty_dim[1] / price_dim[1]
+    return None
+
+@st.cache_data(ttl=300, show_spinner=False)
+def get_open_deals_by_customer():
+    """
+    Return {customer_id: {'customer_name': ..., 'deals': [open deal dicts]}} from the latest deal
+    table of every customer (one query). Cached; writes to customer conversations call
+    invalidate_open_deals().
+    """
+    response = supabase_client.table('logistics_customers').select('customer_id, customer_name, output_conversation').execute()
+    deals_by_customer = {}
+    for customer in response.data or []:
+        outputs = customer.get('output_conversation') or []
+        # The newest output that carries a deal table reflects the current state of all deals
+        latest_table = next((out for out in reversed(outputs) if out and 'CURRENT DEALS:' in out), None)
+        open_deals = [
+            deal for deal in parse_deal_table(latest_table)
+            if deal.get('Stage', '').replace(' ', '').lower() in OPEN_DEAL_STAGES
+        ]
+        if open_deals:
+            deals_by_customer[customer['customer_id']] = {
+                'customer_name': customer.get('customer_name') or 'Unknown',
+                'deals': open_deals
+            }
+    return deals_by_customer
+
+def invalidate_open_deals():
+    """Drop the cached open deals after a customer's conversation changed."""
+    get_open_deals_by_customer.clear()
+
+def build_quote_items_from_deals(deals: list):
+    """Convert deal rows into quote line items. Returns (items, skipped) where skipped explains unusable deals."""
+    items, skipped = [], []
+    for deal in deals:
+        name = _deal_field(deal, DEAL_NAME_COLUMNS)
+        qty_text = _deal_field(deal, DEAL_QTY_COLUMNS)
+        qty, unit_price = _parse_amount(qty_text), _parse_amount(deal.get('Price'))
+        if not name or not qty or not unit_price:
+            skipped.append(f"{deal.get('Deal_ID', '?')}: missing product, quantity or price")
+            continue
+        qty_unit, price_unit = _amount_unit(qty_text), _amount_unit(deal.get('Price'), per=True)
+        billed_qty = _quantity_in_price_units(qty, qty_unit, price_unit)
+        if billed_qty is None:
+            skipped.append(f"{deal.get('Deal_ID', '?')}: quantity in {qty_unit} but price per {price_unit}")
+            continue
+        if billed_qty != qty:
+            qty_text = f"{billed_qty:,.3f}".rstrip('0').rstrip('.') + f" {price_unit} ({qty_text})"
+        qty = billed_qty
+        currency_match = re.search(r'\b(USD|ETB|EUR|US\$|\$)', deal.get('Price', ''), re.IGNORECASE)
+        currency = currency_match.group(1).upper().replace('US$', 'USD').replace('$', 'USD') if currency_match else 'ETB'
+        vat = round(unit_price * qty * QUOTE_VAT_RATE, 2)
+        total_price = round(unit_price * qty + vat, 2)
+        items.append({
+            'name': f"{name} ({deal['Deal_ID']})" if deal.get('Deal_ID') else name,
+            'unit_price': f"{format_currency_with_commas(unit_price)} {currency}",
+            'quantity': qty_text,
+            'vat': f"{format_currency_with_commas(vat)} {currency}",
+            'total_price': f"{format_currency_with_commas(total_price)} {currency}"
+        })
+    return items, skipped
+
+def generate_bulk_quotes_zip(deals_by_customer: dict, template_path: str, **quote_fields):
+    """
+    Render one quote per customer ({customer_id: {'customer_name', 'deals'}}) concurrently and
+    pack them into a ZIP. Returns (zip_bytes, report_rows).
+    """
+    quotes, report = [], {}
+    for customer_id, customer in deals_by_customer.items():
+        items, skipped = build_quote_items_from_deals(customer['deals'])
+        if items:
+            quotes.append(dict(quote_fields, key=customer_id, customer_name=customer['customer_name'], items=items))
+        report[customer_id] = {'Customer': customer['customer_name'], 'Deals': len(customer['deals']),
+                               'Items': len(items), 'Status': 'queued' if items else 'skipped',
+                               'Notes': '; '.join(skipped)}
+
+    rendered = {key: (pdf, error) for key, pdf, error in render_quotes_batch(template_path, quotes, layout=QUOTATION_LAYOUT)}
+    buffer, file_names = io.BytesIO(), set()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for customer_id, row in report.items():
+            if row['Status'] != 'queued':
+                continue
+            pdf, error = rendered.get(customer_id, (None, 'not rendered'))
+            if pdf:
+                safe_name = re.sub(r'[^\w\-]+', '_', row['Customer']).strip('_') or 'customer'
+                file_name = f"quote_{safe_name}.pdf"
+                if file_name in file_names:  # customers sharing a name
+                    file_name = f"quote_{safe_name}_{customer_id}.pdf"
+                file_names.add(file_name)
+                archive.writestr(file_name, pdf)
+                row['Status'] = 'generated'
+            else:
+                row['Status'] = 'failed'
+                row['Notes'] = '; '.join(filter(None, [row['Notes'], error]))
+    return buffer.getvalue(), list(report.values())
+
+def render_bulk_quote_ui(user_id):
+    """Bulk mode: pick open deals across customers and download all quotes as one ZIP."""
+    st.subheader("Bulk Quotes from Open Deals")
+    with st.spinner("Loading open deals..."):
+        deals_by_customer = get_open_deals_by_customer()
+    if not deals_by_customer:
+        st.info("No open deals found in customer interactions.")
+        return
+
+    deal_options = {
+        f"{customer['customer_name']} — {deal.get('Deal_ID', '?')} {_deal_field(deal, DEAL_NAME_COLUMNS)}": (customer_id, deal)
+        for customer_id, customer in sorted(deals_by_customer.items(), key=lambda kv: kv[1]['customer_name'])
+        for deal in customer['deals']
+    }
+    selected_labels = st.multiselect(
+        "Open deals to quote (one quote per customer)",
+        options=list(deal_options.keys()),
+        default=list(deal_options.keys()),
+        key="bulk_quote_deals"
+    )
+    selected = {}
+    for label in selected_labels:
+        customer_id, deal = deal_options[label]
+        selected.setdefault(customer_id, {
+            'customer_name': deals_by_customer[customer_id]['customer_name'], 'deals': []
+        })['deals'].append(deal)
+    st.caption(f"{len(selected_labels)} deals across {len(selected)} customers selected.")
+    representative_name = st.text_input("Representative Name", key="bulk_quote_representative_name")
+    if st.button(f"Generate {len(selected)} Quotes (ZIP)", key="bulk_quote_generate", disabled=not selected):
+        with st.spinner(f"Rendering {len(selected)} quotes..."):
+            zip_bytes, report = generate_bulk_quotes_zip(
+                selected,
+                template_path=str(project_root / "assets/Lean_Sample_quotation.pdf"),
+                representative_name=representative_name
+            )
+        st.session_state['bulk_quote_result'] = {
+            'zip': zip_bytes,
+            'report': report,
+            'file_name': f"quotes_{datetime.datetime.now().strftime('%Y%m%d_%H%M')}.zip"
+        }
+
+    result = st.session_state.get('bulk_quote_result')
+    if result:
+        generated = sum(1 for row in result['report'] if row['Status'] == 'generated')
+        st.success(f"Generated {generated} of {len(result['report'])} quotes.")
+        st.dataframe(result['report'], use_container_width=True)
+        if generated:
+            st.download_button(
+                label="Download All Quotes (ZIP)",
+                data=result['zip'],
+                file_name=result['file_name'],
+                mime="application/zip",
+                key="bulk_quote_download"
+            )
 
 def render_quote_generation_ui(user_id):
     st.title("📝 Quote Generation")
     st.write("Generate a quote for a customer, including items you specify and deals from their interaction history.")
+    quote_mode = st.radio("Mode", ["Single quote", "Bulk from open deals"], horizontal=True, key="quote_mode")
+    if quote_mode == "Bulk from open deals":
+        render_bulk_quote_ui(user_id)
+        return
 
 
 
@@ -3111,22 +3580,15 @@ def render_quote_generation_ui(user_id):
         notes = "We prioritize customer satisfaction. Our team of passionate skiers and snowboarders is dedicated to delivering exceptional service and ensuring your safety and enjoyment on the slopes."
         bank_details = "Beneficiary: Alhadi Maru Import and Export\nBank: Dashen Bank\nBank Branch: Bulgaria\nBank Account: 7981270984511"
         contact_info = "+251966274550"
-        import io
-        # Generate the quote PDF
-        safe_name = selected_customer_name.replace(' ', '_').replace('/', '_').replace('\\', '_')
-        output_path = f"temp_quote_{safe_name}.pdf"
-        generate_quote_with_items(
+        # Generate the quote PDF in memory (no temp file shared between sessions)
+        pdf_data = generate_quote_with_items(
             template_path=str(project_root / "assets/Lean_Sample_quotation.pdf"),
-            output_path=output_path,
+            output_path=None,
             customer_name=selected_customer_name,
             representative_name=representative_name,
             items=items
         )
-        
-        # Read the generated file and provide download
-        with open(output_path, "rb") as f:
-            pdf_data = f.read()
-        
+
         st.download_button(
             label="Download Quote PDF",
             data=pdf_data,
@@ -3221,7 +3683,7 @@ if st.session_state.authenticated and st.session_state.user:
     if st.session_state.crm_view is None:
         st.title("CRM Dashboard")
         st.write("Select an action to get started.")
-        col1, col2, col3 = st.columns(3)
+        col1, col2, col3, col4 = st.columns(4)
         with col1:
             if st.button("Create New Customer", key="btn_create_customer", use_container_width=True, type="primary"):
                 st.session_state.crm_view = 'create'
@@ -3234,6 +3696,10 @@ if st.session_state.authenticated and st.session_state.user:
             if st.button("Quote Generation", key="btn_quote_generation", use_container_width=True, type="primary"):
                 st.session_state.crm_view = 'quote'
                 st.rerun()
+        with col4:
+            if st.button("Import Volume Ranking", key="btn_import_ranking", use_container_width=True, type="primary"):
+                st.session_state.crm_view = 'imports'
+                st.rerun()
 
 
     else:
@@ -3256,6 +3722,8 @@ if st.session_state.authenticated and st.session_state.user:
             render_choose_existing_ui(user_id)
         elif st.session_state.crm_view == 'quote':
             render_quote_generation_ui(user_id)
+        elif st.session_state.crm_view == 'imports':
+            render_import_ranking_ui(user_id)
 
         
 
@@ -3298,6 +3766,7 @@ else:
         st.markdown('</div>', unsafe_allow_html=True)
 
 def upload_pdf_to_documents(pdf_path: str, user_id: str = "default_user"):
+    from PyPDF2 import PdfReader
     # 1. Read PDF content
     reader = PdfReader(pdf_path)
     text = ""
@@ -3305,7 +3774,7 @@ def upload_pdf_to_documents(pdf_path: str, user_id: str = "default_user"):
         text += page.extract_text() + "\n"
     
     # 2. Get embedding for the content (using OpenAI)
-    response = openai_client.embeddings.create(
+    response = get_openai_client().embeddings.create(
         input=text,
         model="text-embedding-3-small"
     )
@@ -0,0 +1,203 @@
+"""
+In-memory quote PDF rendering for the CRM and logistics quote generators.
+
+The proforma template is parsed once per process and cached (keyed by path and mtime).
+Each quote is drawn as a reportlab overlay into a BytesIO buffer and merged onto a copy
+of the cached template pages, so nothing is written to the working directory and
+concurrent users never share a file. Where the fields go depends on the template; see
+QuoteLayout. render_quotes_batch() renders many quotes at once (e.g. one per open deal)
+on a pool of worker processes.
+
+PyPDF2 and reportlab are imported inside the functions so importing
+this module stays cheap for the Streamlit apps.
+"""
+
+import atexit
+import io
+import os
+import threading
+from dataclasses import dataclass
+from functools import lru_cache
+
+FONT_NAME = "Helvetica"
+FONT_SIZE = 12
+
+# Item table columns (points from the left of the page)
+X_NAME = 60          # Left-aligned with "NAME" header
+X_UNIT_PRICE = 180   # Right-aligned with "UNIT PRICE" header
+X_QUANTITY = 280     # Left-aligned under "QUANTITY" header
+X_VAT = 380          # Right-aligned with "VAT" header
+X_TOTAL = 480        # Right-aligned with "TOTAL PRICE" header
+
+
+@dataclass(frozen=True)
+class QuoteLayout:
+    """Where a template expects the customer (and representative) name; points from the top of the page."""
+    name_x: float
+    name_y_offset: float
+    name_font_size: float = FONT_SIZE
+    representative_y_offset: float | None = None  # None: the template has no representative field
+
+
+# "Kadisco PI.pdf" (CRM): customer name next to the "CUSTOMER :" label
+PROFORMA_LAYOUT = QuoteLayout(name_x=61.45, name_y_offset=237.55 + 35)
+# assets/Lean_Sample_quotation.pdf (logistics): tiny "COMPANY NAME" header field, with the
+# representative just below it
+QUOTATION_LAYOUT = QuoteLayout(name_x=61.5, name_y_offset=120.0, name_font_size=6.5,
+                               representative_y_offset=128.0)
+
+# Batches smaller than this are rendered in the calling process: handing a quote to a
+# worker costs about as much as rendering it.
+MIN_POOL_BATCH = 8
+
+# PdfReader resolves objects lazily from its stream, so cloning the cached template pages
+# must not run in two threads at once.
+_TEMPLATE_LOCK = threading.Lock()
+_pool_lock = threading.Lock()
+_pool = None
+
+
+@lru_cache(maxsize=8)
+def _load_template(template_path: str, mtime: float):
+    from PyPDF2 import PdfReader
+    with open(template_path, "rb") as f:
+        reader = PdfReader(io.BytesIO(f.read()))
+    page = reader.pages[0]
+    return reader, float(page.mediabox.width), float(page.mediabox.height)
+
+
+def load_template(template_path: str):
+    """Return (reader, width, height) for the template, parsing it only when the file changed."""
+    path = os.path.abspath(template_path)
+    return _load_template(path, os.path.getmtime(path))
+
+
+def _draw_overlay(width, height, layout, customer_name, representative_name, items, start_y, row_height) -> io.BytesIO:
+    from reportlab.pdfgen import canvas
+
+    packet = io.BytesIO()
+    can = canvas.Canvas(packet, pagesize=(width, height))
+
+    # --- CUSTOMER / COMPANY NAME and REPRESENTATIVE NAME ---
+    can.setFont(FONT_NAME, layout.name_font_size)
+    can.drawString(layout.name_x, height - layout.name_y_offset, customer_name)
+    if representative_name and layout.representative_y_offset is not None:
+        can.drawString(layout.name_x, height - layout.representative_y_offset, representative_name)
+
+    # Reset to default font for items table rendering
+    can.setFont(FONT_NAME, FONT_SIZE)
+
+    def draw_right(text, x, column_width, y):
+        text = str(text)
+        can.drawString(x + column_width - can.stringWidth(text, FONT_NAME, FONT_SIZE), y, text)
+
+    # --- Items table ---
+    y_position = start_y + 20  # moved down by 20pt to lower the table values
+    for item in items:
+        y = height - y_position
+        can.drawString(X_NAME, y, str(item["name"]))
+        draw_right(item["unit_price"], X_UNIT_PRICE, 80, y)
+        can.drawString(X_QUANTITY, y, str(item["quantity"]))
+        draw_right(item["vat"], X_VAT, 80, y)
+        draw_right(item["total_price"], X_TOTAL, 100, y)
+        y_position += row_height
+
+    can.save()
+    packet.seek(0)
+    return packet
+
+
+def render_quote_pdf(template_path, customer_name, items, representative_name=None,
+                     layout: QuoteLayout = PROFORMA_LAYOUT, start_y=380, row_height=20) -> bytes:
+    """Render one quote onto the cached template and return the PDF bytes (all template pages kept)."""
+    from PyPDF2 import PdfReader, PdfWriter
+
+    reader, width, height = load_template(template_path)
+    overlay = PdfReader(_draw_overlay(
+        width, height, layout, customer_name, representative_name, items, start_y, row_height
+    ))
+
+    output = PdfWriter()
+    with _TEMPLATE_LOCK:
+        # add_page clones the pages into the writer; the cached template stays untouched
+        pages = [output.add_page(page) for page in reader.pages]
+    # Fields live on the first page; the remaining pages are copied unchanged
+    pages[0].merge_page(overlay.pages[0])
+
+    buffer = io.BytesIO()
+    output.write(buffer)
+    return buffer.getvalue()
+
+
+def _render_job(job: dict):
+    try:
+        return job.get("key"), render_quote_pdf(
+            job["template_path"], job["customer_name"], job["items"],
+            representative_name=job.get("representative_name"), layout=job["layout"],
+        ), None
+    except Exception as e:
+        return job.get("key"), None, str(e)
+
+
+def _shutdown_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def _get_pool():
+    """The process pool shared by all sessions, started on first use."""
+    global _pool
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    with _pool_lock:
+        if _pool is None:
+            # spawn, not fork: forking the multithreaded Streamlit server can copy locks held
+            # by other threads (the template lock, logging, HTTP clients) into the children
+            _pool = ProcessPoolExecutor(
+                max_workers=os.cpu_count() or 1, mp_context=multiprocessing.get_context("spawn")
+            )
+            atexit.register(_shutdown_pool)
+        return _pool
+
+
+def render_quotes_batch(template_path, quotes, layout: QuoteLayout = PROFORMA_LAYOUT, max_workers=None):
+    """
+    Render many quotes concurrently.
+
+    ``quotes`` is a list of dicts with ``customer_name``, ``items`` and optional
+    ``representative_name`` and ``key`` (defaults to the customer name). Returns
+    ``(key, pdf_bytes, error)`` tuples in input order; a failed quote has ``pdf_bytes=None``
+    and the error message instead of raising.
+
+    The overlay merge is pure Python and holds the GIL, so batches of MIN_POOL_BATCH or
+    more quotes go to a process pool shared across reruns. Its workers are started with
+    spawn and keep their own template cache. With a single CPU (or ``max_workers=1``)
+    everything is rendered in this process.
+    """
+    from concurrent.futures.process import BrokenProcessPool
+
+    jobs = [
+        {
+            "key": quote.get("key", quote["customer_name"]),
+            "template_path": os.path.abspath(template_path),
+            "customer_name": quote["customer_name"],
+            "items": quote["items"],
+            "representative_name": quote.get("representative_name"),
+            "layout": layout,
+        }
+        for quote in quotes
+    ]
+    workers = min(max_workers or os.cpu_count() or 1, len(jobs))
+    if len(jobs) < MIN_POOL_BATCH or workers <= 1:
+        return [_render_job(job) for job in jobs]
+
+    try:
+        return list(_get_pool().map(_render_job, jobs, chunksize=max(1, len(jobs) // (workers * 4))))
+    except BrokenProcessPool:
+        # A worker died (e.g. killed for memory); start a new pool next time, render here now
+        _shutdown_pool()
+        return [_render_job(job) for job in jobs]
@@ -0,0 +1,38 @@
+-- Import-history match stored on each CRM customer.
+-- Filled by the batch enrichment job in the logistics app (enrich_customers_with_import_history).
+-- import_source_key identifies the workbook version a match was computed against, so the job
+-- only re-matches customers that are new or were matched against an older workbook.
+ALTER TABLE customers
+    ADD COLUMN IF NOT EXISTS import_match JSONB,
+    ADD COLUMN IF NOT EXISTS import_total_volume DOUBLE PRECISION,
+    ADD COLUMN IF NOT EXISTS import_source_key TEXT,
+    ADD COLUMN IF NOT EXISTS import_matched_at TIMESTAMP WITH TIME ZONE;
+
+-- Rank customers by import volume without a scan
+CREATE INDEX IF NOT EXISTS idx_customers_import_total_volume ON customers (import_total_volume DESC NULLS LAST);
+
+-- Apply a batch of matches in one round trip.
+-- matches: [{"customer_id": ..., "import_match": {...} | null, "import_total_volume": ..., "import_source_key": ...}, ...]
+CREATE OR REPLACE FUNCTION apply_customer_import_matches(matches JSONB)
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    updated_count INTEGER;
+BEGIN
+    UPDATE customers AS c
+    SET import_match = m.import_match,
+        import_total_volume = m.import_total_volume,
+        import_source_key = m.import_source_key,
+        import_matched_at = NOW()
+    FROM jsonb_to_recordset(matches) AS m(
+        customer_id TEXT,
+        import_match JSONB,
+        import_total_volume DOUBLE PRECISION,
+        import_source_key TEXT
+    )
+    WHERE c.customer_id = m.customer_id;
+    GET DIAGNOSTICS updated_count = ROW_COUNT;
+    RETURN updated_count;
+END;
+$$;
@@ -0,0 +1,70 @@
+-- Server-side HS code / brand search for PMS market data (PMS _fetch_market_rows).
+-- The app used to download up to 5000 market_opportunities rows and filter them in Python
+-- on a lower-cased "metadata + raw_data" string. That string is now a generated column with
+-- a trigram index, so substring searches are index lookups returning only the matches.
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+ALTER TABLE public.market_opportunities
+    ADD COLUMN IF NOT EXISTS metadata JSONB;
+
+ALTER TABLE public.market_opportunities
+    -- Everything the old client-side filter searched, lower-cased once at write time
+    ADD COLUMN IF NOT EXISTS search_text TEXT GENERATED ALWAYS AS (
+        lower(
+            coalesce(metadata->>'hs_code', '') || ' ' ||
+            coalesce(metadata->>'brand', '') || ' ' ||
+            coalesce(metadata->>'commercial_name', '') || ' ' ||
+            coalesce(raw_data::text, '')
+        )
+    ) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_market_search_text_trgm ON public.market_opportunities USING gin (search_text gin_trgm_ops);
+
+-- A search term as a LIKE pattern matching it anywhere: 'a%b_c' -> '%a\%b\_c%', so user input
+-- cannot add wildcards
+CREATE OR REPLACE FUNCTION like_contains_pattern(p_term TEXT)
+RETURNS TEXT
+LANGUAGE sql
+IMMUTABLE
+AS $$
+    SELECT '%' || replace(replace(replace(p_term, '\', '\\'), '%', '\%'), '_', '\_') || '%';
+$$;
+
+-- Filtered market rows in one round trip. Empty filters are ignored; every given term must
+-- appear (case-insensitively) in the HS code, brand, commercial name or raw data. Returns the
+-- table's own columns, not the generated search_text.
+DROP FUNCTION IF EXISTS filter_market_opportunities(TEXT, TEXT, UUID, INTEGER);
+CREATE OR REPLACE FUNCTION filter_market_opportunities(
+    p_hs_code TEXT DEFAULT NULL,
+    p_brand TEXT DEFAULT NULL,
+    p_chemical_entity_id UUID DEFAULT NULL,
+    p_limit INTEGER DEFAULT 5000
+)
+RETURNS TABLE (
+    id UUID,
+    organization TEXT,
+    chemical_entity_id UUID,
+    period DATE,
+    volume_ton NUMERIC,
+    price_usd_per_ton NUMERIC,
+    local_price_per_kg NUMERIC,
+    trust_score INT,
+    value_score INT,
+    raw_data JSONB,
+    metadata JSONB,
+    created_at TIMESTAMPTZ
+)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT m.id, m.organization, m.chemical_entity_id, m.period, m.volume_ton, m.price_usd_per_ton,
+           m.local_price_per_kg, m.trust_score, m.value_score, m.raw_data, m.metadata, m.created_at
+    FROM public.market_opportunities AS m
+    WHERE (p_chemical_entity_id IS NULL OR m.chemical_entity_id = p_chemical_entity_id)
+      AND (coalesce(btrim(p_hs_code), '') = ''
+           OR m.search_text LIKE like_contains_pattern(lower(btrim(p_hs_code))))
+      AND (coalesce(btrim(p_brand), '') = ''
+           OR m.search_text LIKE like_contains_pattern(lower(btrim(p_brand))))
+    ORDER BY m.period
+    LIMIT p_limit;
+$$;
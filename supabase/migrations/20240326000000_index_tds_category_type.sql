@@ -0,0 +1,9 @@
+-- Category / product type filters on tds_data (PMS Manage TDS, View TDS, LeanChem portfolio
+-- and product type dropdowns). Both live in the metadata JSONB; the app now filters with
+-- metadata->>category / metadata->>product_type in PostgREST instead of downloading the whole
+-- table, and these expression indexes make those filters index lookups.
+CREATE INDEX IF NOT EXISTS idx_tds_data_category ON public.tds_data ((metadata->>'category'));
+CREATE INDEX IF NOT EXISTS idx_tds_data_category_product_type
+    ON public.tds_data ((metadata->>'category'), (metadata->>'product_type'));
+CREATE INDEX IF NOT EXISTS idx_tds_data_product_type ON public.tds_data ((metadata->>'product_type'));
+CREATE INDEX IF NOT EXISTS idx_tds_data_created_at ON public.tds_data (created_at DESC);
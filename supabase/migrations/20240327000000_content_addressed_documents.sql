@@ -0,0 +1,74 @@
+-- Reference counts for content-addressed files in the product-documents bucket (PMS
+-- document_store.py). TDS and supporting documents are stored under the SHA-256 of their
+-- content, so uploading the same file again reuses the existing object. Every record that
+-- points at an object holds one reference. The object is deleted from storage when the
+-- last reference is released.
+CREATE TABLE IF NOT EXISTS public.storage_objects (
+    key TEXT PRIMARY KEY,              -- object key in the product-documents bucket
+    sha256 TEXT NOT NULL,
+    size_bytes BIGINT,
+    content_type TEXT,
+    ref_count INTEGER NOT NULL DEFAULT 0 CHECK (ref_count >= 0),
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS idx_storage_objects_sha256 ON public.storage_objects (sha256);
+
+-- Take a reference to an object; returns the new count (1 = first reference, upload needed)
+CREATE OR REPLACE FUNCTION acquire_storage_object(
+    p_key TEXT,
+    p_sha256 TEXT,
+    p_size BIGINT DEFAULT NULL,
+    p_content_type TEXT DEFAULT NULL
+)
+RETURNS INTEGER
+LANGUAGE sql
+AS $$
+    INSERT INTO public.storage_objects (key, sha256, size_bytes, content_type, ref_count)
+    VALUES (p_key, p_sha256, p_size, p_content_type, 1)
+    ON CONFLICT (key) DO UPDATE
+        SET ref_count = public.storage_objects.ref_count + 1,
+            updated_at = now()
+    RETURNING ref_count;
+$$;
+
+-- Drop a reference; returns the remaining count (0 = orphaned, delete the object) or NULL
+-- for objects that are not tracked here (uploaded before content addressing).
+CREATE OR REPLACE FUNCTION release_storage_object(p_key TEXT)
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    remaining INTEGER;
+BEGIN
+    UPDATE public.storage_objects
+    SET ref_count = greatest(ref_count - 1, 0),
+        updated_at = now()
+    WHERE key = p_key
+    RETURNING ref_count INTO remaining;
+
+    IF remaining = 0 THEN
+        DELETE FROM public.storage_objects WHERE key = p_key AND ref_count = 0;
+    END IF;
+    RETURN remaining;
+END;
+$$;
+
+-- Row Level Security: like the other PMS tables (supabase/pms_schema.sql), reference counts
+-- are only visible to and changed by signed-in users, never with the anon key alone
+ALTER TABLE public.storage_objects ENABLE ROW LEVEL SECURITY;
+
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_policies WHERE tablename = 'storage_objects' AND policyname = 'storage_objects_all_auth') THEN
+        CREATE POLICY storage_objects_all_auth ON public.storage_objects
+            FOR ALL TO authenticated USING (true) WITH CHECK (true);
+    END IF;
+END;
+$$;
+
+REVOKE EXECUTE ON FUNCTION acquire_storage_object(TEXT, TEXT, BIGINT, TEXT) FROM PUBLIC, anon;
+REVOKE EXECUTE ON FUNCTION release_storage_object(TEXT) FROM PUBLIC, anon;
+GRANT EXECUTE ON FUNCTION acquire_storage_object(TEXT, TEXT, BIGINT, TEXT) TO authenticated;
+GRANT EXECUTE ON FUNCTION release_storage_object(TEXT) TO authenticated;
@@ -0,0 +1,23 @@
+-- Duplicate-partner checks in PMS Partner Master Data (partner_exists / _fuzzy_match_partners).
+-- The app used to download every partner_data row for each check. Exact checks and fuzzy
+-- matching now use a cached in-app name index; this unique index on the normalized
+-- (name, country) pair makes the database the final guard against duplicates, including two
+-- sessions creating the same partner at once.
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1
+        FROM public.partner_data
+        GROUP BY lower(btrim(partner)), lower(btrim(coalesce(partner_country, '')))
+        HAVING count(*) > 1
+    ) THEN
+        -- Existing duplicates have to be merged first; index the pair without the constraint
+        RAISE NOTICE 'partner_data has duplicate (name, country) pairs; creating a non-unique index';
+        CREATE INDEX IF NOT EXISTS idx_partner_data_name_country
+            ON public.partner_data (lower(btrim(partner)), lower(btrim(coalesce(partner_country, ''))));
+    ELSE
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_partner_data_name_country
+            ON public.partner_data (lower(btrim(partner)), lower(btrim(coalesce(partner_country, ''))));
+    END IF;
+END;
+$$;
@@ -0,0 +1,111 @@
+-- Normalized prices for PMS pricing lookups (pms_data.fetch_price_point).
+-- Pricing is edited as a JSON array in costing_pricing_data.rows. To find a price for a TDS
+-- and incoterm, the app fetched the last records of the TDS and scanned their rows in Python.
+-- price_points holds one row per (pricing record, incoterm) with numeric values. A trigger
+-- keeps it in sync with costing_pricing_data, so the app keeps writing rows as before and a
+-- price lookup is a single index scan.
+CREATE EXTENSION IF NOT EXISTS pgcrypto;
+
+-- '1,250.50' / ' 1250.5 USD' -> 1250.50; empty or unparseable -> NULL
+CREATE OR REPLACE FUNCTION parse_price(p_value TEXT)
+RETURNS NUMERIC
+LANGUAGE plpgsql
+IMMUTABLE
+AS $$
+BEGIN
+    RETURN nullif(regexp_replace(coalesce(p_value, ''), '[^0-9.\-]', '', 'g'), '')::NUMERIC;
+EXCEPTION WHEN others THEN
+    RETURN NULL;
+END;
+$$;
+
+CREATE TABLE IF NOT EXISTS public.price_points (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    pricing_id UUID NOT NULL REFERENCES public.costing_pricing_data(id) ON DELETE CASCADE,
+    tds_id UUID,
+    partner_id UUID,
+    ordinal INTEGER NOT NULL DEFAULT 1,  -- position in costing_pricing_data.rows (1-based)
+    incoterm TEXT NOT NULL,
+    incoterm_key TEXT GENERATED ALWAYS AS (lower(btrim(incoterm))) STORED,
+    cost_usd NUMERIC,
+    cost_etb NUMERIC,
+    price_usd NUMERIC,
+    price_etb NUMERIC,
+    valid_from TIMESTAMPTZ NOT NULL DEFAULT now(),  -- created_at of the pricing record
+    edited_at TIMESTAMPTZ  -- last edit of the pricing record's rows, NULL if never edited
+);
+
+-- Latest price of a TDS for an incoterm: equality on (tds_id, incoterm_key), newest record
+-- first, then the first row of that record (templates list "Nairobi" in both the global and
+-- Kenya incoterms, so one record can hold the same incoterm twice)
+CREATE INDEX IF NOT EXISTS idx_price_points_tds_incoterm
+    ON public.price_points (tds_id, incoterm_key, valid_from DESC, ordinal);
+CREATE INDEX IF NOT EXISTS idx_price_points_pricing_id ON public.price_points (pricing_id);
+CREATE INDEX IF NOT EXISTS idx_price_points_partner_id ON public.price_points (partner_id);
+
+-- Row Level Security, as on the other PMS tables (supabase/pms_schema.sql)
+ALTER TABLE public.price_points ENABLE ROW LEVEL SECURITY;
+
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_policies WHERE tablename = 'price_points' AND policyname = 'price_points_all_auth') THEN
+        CREATE POLICY price_points_all_auth ON public.price_points
+            FOR ALL TO authenticated USING (true) WITH CHECK (true);
+    END IF;
+END;
+$$;
+
+-- Rows of one costing_pricing_data record as price points. Rows without an incoterm or without
+-- any value are skipped.
+CREATE OR REPLACE FUNCTION insert_price_points(
+    p_pricing_id UUID,
+    p_tds_id UUID,
+    p_partner_id UUID,
+    p_rows JSONB,
+    p_valid_from TIMESTAMPTZ,
+    p_edited_at TIMESTAMPTZ DEFAULT NULL
+)
+RETURNS VOID
+LANGUAGE sql
+AS $$
+    INSERT INTO public.price_points
+        (pricing_id, tds_id, partner_id, ordinal, incoterm, cost_usd, cost_etb, price_usd, price_etb,
+         valid_from, edited_at)
+    SELECT p_pricing_id, p_tds_id, p_partner_id, e.ordinal::INTEGER, btrim(r->>'incoterm'),
+           parse_price(r->>'cost_usd'), parse_price(r->>'cost_etb'),
+           parse_price(r->>'price_usd'), parse_price(r->>'price_etb'),
+           coalesce(p_valid_from, now()), p_edited_at
+    FROM jsonb_array_elements(CASE WHEN jsonb_typeof(p_rows) = 'array' THEN p_rows ELSE '[]'::jsonb END)
+         WITH ORDINALITY AS e(r, ordinal)
+    WHERE coalesce(btrim(r->>'incoterm'), '') <> ''
+      AND coalesce(parse_price(r->>'cost_usd'), parse_price(r->>'cost_etb'),
+                   parse_price(r->>'price_usd'), parse_price(r->>'price_etb')) IS NOT NULL;
+$$;
+
+-- Prices are valid from their record's creation, also after an edit: correcting an old
+-- record must not make it override newer ones. Edits are recorded in edited_at.
+CREATE OR REPLACE FUNCTION sync_price_points()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF TG_OP = 'UPDATE' THEN
+        DELETE FROM public.price_points WHERE pricing_id = NEW.id;
+    END IF;
+    PERFORM insert_price_points(
+        NEW.id, NEW.tds_id, NEW.partner_id, to_jsonb(NEW.rows), NEW.created_at,
+        CASE WHEN TG_OP = 'UPDATE' THEN now() END
+    );
+    RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_sync_price_points ON public.costing_pricing_data;
+CREATE TRIGGER trg_sync_price_points
+    AFTER INSERT OR UPDATE OF rows, tds_id, partner_id ON public.costing_pricing_data
+    FOR EACH ROW EXECUTE FUNCTION sync_price_points();
+
+-- Backfill from the existing JSON rows
+DELETE FROM public.price_points;
+SELECT insert_price_points(c.id, c.tds_id, c.partner_id, to_jsonb(c.rows), c.created_at)
+FROM public.costing_pricing_data AS c;
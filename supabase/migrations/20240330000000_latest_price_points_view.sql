@@ -0,0 +1,22 @@
+-- Latest price of every TDS for every incoterm, for the bulk price matrix in PMS
+-- (pms_data.fetch_price_matrix). One query returns the current prices of the whole portfolio.
+-- Before this view, building a portfolio needed one lookup per (TDS, incoterm).
+-- DISTINCT ON reads idx_price_points_tds_incoterm in order. Filters on tds_id are pushed into
+-- the view, so the price matrix of a few TDS only scans their index entries. The view runs
+-- with the caller's rights (security_invoker), so price_points' row level security applies.
+CREATE OR REPLACE VIEW public.latest_price_points
+WITH (security_invoker = true) AS
+SELECT DISTINCT ON (tds_id, incoterm_key)
+    tds_id,
+    incoterm_key,
+    incoterm,
+    partner_id,
+    pricing_id,
+    cost_usd,
+    cost_etb,
+    price_usd,
+    price_etb,
+    valid_from
+FROM public.price_points
+WHERE tds_id IS NOT NULL
+ORDER BY tds_id, incoterm_key, valid_from DESC, ordinal;
@@ -0,0 +1,63 @@
+-- Edit history of chemical_types, one row per edit (PMS chemical master data). The history
+-- used to be appended to chemical_types.version_history, so every select("*") of the
+-- product list returned every past edit of every product. Versions are now append-only rows
+-- here, read a page at a time per product through the (type_id, ts) index.
+CREATE TABLE IF NOT EXISTS public.chemical_type_versions (
+    id BIGINT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+    type_id UUID NOT NULL REFERENCES public.chemical_types(id) ON DELETE CASCADE,
+    ts TIMESTAMPTZ NOT NULL DEFAULT now(),
+    changed JSONB NOT NULL DEFAULT '{}'::jsonb,  -- the fields written by the edit
+    changed_by TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_chemical_type_versions_type_ts
+    ON public.chemical_type_versions (type_id, ts DESC);
+
+-- Row Level Security, as on the other PMS tables (supabase/pms_schema.sql)
+ALTER TABLE public.chemical_type_versions ENABLE ROW LEVEL SECURITY;
+
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_policies WHERE tablename = 'chemical_type_versions' AND policyname = 'chemical_type_versions_all_auth') THEN
+        CREATE POLICY chemical_type_versions_all_auth ON public.chemical_type_versions
+            FOR ALL TO authenticated USING (true) WITH CHECK (true);
+    END IF;
+END;
+$$;
+
+-- Append-only: versions are never edited (rows still go when their product is deleted)
+CREATE OR REPLACE FUNCTION reject_chemical_type_version_update()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    RAISE EXCEPTION 'chemical_type_versions is append-only';
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_chemical_type_versions_append_only ON public.chemical_type_versions;
+CREATE TRIGGER trg_chemical_type_versions_append_only
+    BEFORE UPDATE ON public.chemical_type_versions
+    FOR EACH ROW EXECUTE FUNCTION reject_chemical_type_version_update();
+
+-- Move existing entries ({"ts": "...Z", "changed": {...}}) out of the product rows
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = 'public' AND table_name = 'chemical_types' AND column_name = 'version_history'
+    ) THEN
+        INSERT INTO public.chemical_type_versions (type_id, ts, changed)
+        SELECT t.id,
+               coalesce((e->>'ts')::timestamptz, now()),
+               coalesce(e->'changed', '{}'::jsonb)
+        FROM public.chemical_types AS t
+        CROSS JOIN LATERAL jsonb_array_elements(
+            CASE WHEN jsonb_typeof(to_jsonb(t.version_history)) = 'array'
+                 THEN to_jsonb(t.version_history) ELSE '[]'::jsonb END
+        ) AS e;
+
+        ALTER TABLE public.chemical_types DROP COLUMN version_history;
+    END IF;
+END;
+$$;